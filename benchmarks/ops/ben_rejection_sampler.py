@@ -0,0 +1,216 @@
+import numpy as np
+import pytest
+import torch
+import torch_npu  # noqa: F401
+import vllm  # noqa: F401
+
+import vllm_ascend.platform  # noqa: F401
+from vllm_ascend.sample.rejection_sampler import (
+    PLACEHOLDER_TOKEN_ID, expand_pytorch, rejection_random_sample_pytorch,
+    sample_recovered_tokens_pytorch)
+
+
+def benchmark_npu(fn, num_iterations=100, num_warmup_iterations=50):
+    """
+    Benchmark function for NPU operations
+
+    Args:
+        fn: Function to benchmark
+        num_iterations: Number of timing iterations
+        num_warmup_iterations: Number of warmup iterations
+
+    Returns:
+        float: Minimum elapsed time in seconds
+    """
+    start = torch.npu.Event(enable_timing=True)
+    end = torch.npu.Event(enable_timing=True)
+    times = np.zeros(num_iterations + num_warmup_iterations)
+
+    # Run iterations
+    for i in range(num_warmup_iterations + num_iterations):
+        with torch.no_grad():
+            start.record()
+            fn()  # Execute the function
+            end.record()
+        torch.npu.synchronize()
+        times[i] = start.elapsed_time(end)
+
+    # Remove warmup iterations and convert to seconds
+    times = times[num_warmup_iterations:]
+    elapsed_time = np.amin(times) / 1000
+    return elapsed_time
+
+
+def rejection_random_sample_ref(
+    output_token_ids,
+    cu_num_draft_tokens,
+    draft_token_ids,
+    draft_probs,
+    target_probs,
+    bonus_token_ids,
+    recovered_token_ids,
+    uniform_probs,
+    is_greedy,
+    IS_NGRAM=False,
+):
+    """Reference per-token loop implementation for verification"""
+    batch_size = output_token_ids.shape[0]
+    for req_idx in range(batch_size):
+        if is_greedy[req_idx]:
+            continue
+        start_idx = 0 if req_idx == 0 else cu_num_draft_tokens[req_idx -
+                                                               1].item()
+        end_idx = cu_num_draft_tokens[req_idx].item()
+        rejected = False
+        for pos in range(end_idx - start_idx):
+            draft_token_id = draft_token_ids[start_idx + pos].item()
+            if IS_NGRAM:
+                draft_prob = 1.0
+            else:
+                draft_prob = draft_probs[start_idx + pos,
+                                         draft_token_id].item()
+            target_prob = target_probs[start_idx + pos, draft_token_id].item()
+            uniform_prob = uniform_probs[start_idx + pos].item()
+            if draft_prob > 0 and target_prob / draft_prob >= uniform_prob:
+                token_id = draft_token_id
+            else:
+                rejected = True
+                token_id = recovered_token_ids[start_idx + pos].item()
+            output_token_ids[req_idx, pos] = token_id
+            if rejected:
+                break
+        if not rejected:
+            output_token_ids[req_idx, end_idx - start_idx] = \
+                bonus_token_ids[req_idx].item()
+
+
+def sample_recovered_tokens_ref(
+    output_token_ids,
+    cu_num_draft_tokens,
+    draft_token_ids,
+    draft_probs,
+    target_probs,
+    q,
+    IS_NGRAM=False,
+):
+    """Reference per-token loop implementation for verification"""
+    batch_size = len(cu_num_draft_tokens)
+    for req_idx in range(batch_size):
+        start_idx = 0 if req_idx == 0 else cu_num_draft_tokens[req_idx - 1]
+        end_idx = cu_num_draft_tokens[req_idx]
+        for token_idx in range(start_idx, end_idx):
+            if IS_NGRAM:
+                prob = target_probs[token_idx].clone()
+                prob[draft_token_ids[token_idx]] = 0
+            else:
+                prob = torch.clamp_min(
+                    target_probs[token_idx] - draft_probs[token_idx], 0)
+            output_token_ids[token_idx] = torch.argmax(prob /
+                                                       q[req_idx]).item()
+
+
+def expand_ref(output, x, cu_num_tokens):
+    """Reference per-request loop implementation for verification"""
+    for req_idx in range(len(x)):
+        start_idx = 0 if req_idx == 0 else cu_num_tokens[req_idx - 1]
+        output[start_idx:cu_num_tokens[req_idx]] = x[req_idx]
+
+
+BATCH_SIZES = [1, 32, 128]
+SPEC_LENS = [1, 3, 5]
+NGRAM = [False, True]
+VOCAB_SIZE = 32000
+DEVICES = [f"npu:{0}"]
+SEEDS = [0]
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+@pytest.mark.parametrize("spec_len", SPEC_LENS)
+@pytest.mark.parametrize("is_ngram", NGRAM)
+@pytest.mark.parametrize("device", DEVICES)
+@pytest.mark.parametrize("seed", SEEDS)
+@torch.inference_mode()
+def test_rejection_sampler(
+    batch_size: int,
+    spec_len: int,
+    is_ngram: bool,
+    device: str,
+    seed: int,
+) -> None:
+    # Set random seed and device
+    torch.manual_seed(seed)
+    torch.set_default_device(device)
+
+    # Generate random inputs, every request proposes `spec_len` tokens.
+    num_tokens = batch_size * spec_len
+    cu_num_draft_tokens = torch.arange(1, batch_size + 1) * spec_len
+    draft_token_ids = torch.randint(0, VOCAB_SIZE, (num_tokens, ))
+    draft_probs = None if is_ngram else torch.softmax(
+        torch.randn(num_tokens, VOCAB_SIZE), dim=-1)
+    target_probs = torch.softmax(torch.randn(num_tokens, VOCAB_SIZE), dim=-1)
+    # Make about half of the draft tokens likely to be accepted.
+    target_probs[torch.arange(num_tokens), draft_token_ids] = 0.5
+    bonus_token_ids = torch.randint(0, VOCAB_SIZE, (batch_size, 1))
+    uniform_probs = torch.rand(num_tokens)
+    is_greedy = torch.zeros(batch_size, dtype=torch.bool)
+    q = torch.empty(batch_size, VOCAB_SIZE).exponential_()
+    temperature = torch.rand(batch_size)
+
+    def new_output():
+        return torch.full((batch_size, spec_len + 1),
+                          PLACEHOLDER_TOKEN_ID,
+                          dtype=torch.int32)
+
+    ref_recovered = torch.empty_like(draft_token_ids)
+    custom_recovered = torch.empty_like(draft_token_ids)
+    ref_output, custom_output = new_output(), new_output()
+    ref_expanded = torch.empty(num_tokens)
+    custom_expanded = torch.empty(num_tokens)
+
+    def ref_fn():
+        sample_recovered_tokens_ref(ref_recovered, cu_num_draft_tokens,
+                                    draft_token_ids, draft_probs,
+                                    target_probs, q, is_ngram)
+        ref_output.fill_(PLACEHOLDER_TOKEN_ID)
+        rejection_random_sample_ref(ref_output, cu_num_draft_tokens,
+                                    draft_token_ids, draft_probs,
+                                    target_probs, bonus_token_ids,
+                                    ref_recovered, uniform_probs, is_greedy,
+                                    is_ngram)
+        expand_ref(ref_expanded, temperature, cu_num_draft_tokens)
+
+    def custom_fn():
+        sample_recovered_tokens_pytorch(custom_recovered, cu_num_draft_tokens,
+                                        draft_token_ids, draft_probs,
+                                        target_probs, q, VOCAB_SIZE, is_ngram)
+        custom_output.fill_(PLACEHOLDER_TOKEN_ID)
+        rejection_random_sample_pytorch(custom_output, cu_num_draft_tokens,
+                                        draft_token_ids, draft_probs,
+                                        target_probs, bonus_token_ids,
+                                        custom_recovered, uniform_probs,
+                                        is_greedy, spec_len, VOCAB_SIZE,
+                                        is_ngram)
+        expand_pytorch(custom_expanded, temperature, cu_num_draft_tokens, -1,
+                       1, spec_len)
+
+    # Get results for correctness testing
+    ref_fn()
+    custom_fn()
+
+    # Benchmark both implementations
+    ref_time = benchmark_npu(ref_fn,
+                             num_iterations=10,
+                             num_warmup_iterations=2)
+    custom_time = benchmark_npu(custom_fn)
+
+    # Print performance results
+    print(f"\nPerformance Results (batch_size={batch_size}, "
+          f"spec_len={spec_len}, ngram={is_ngram}):")
+    print(f"Reference implementation: {ref_time * 1000:.3f} ms")
+    print(f"Custom implementation: {custom_time * 1000:.3f} ms")
+    print(f"Speedup: {ref_time / custom_time:.2f}x")
+
+    # Compare results for correctness
+    torch.testing.assert_close(custom_recovered, ref_recovered)
+    torch.testing.assert_close(custom_output, ref_output)
+    torch.testing.assert_close(custom_expanded, ref_expanded)
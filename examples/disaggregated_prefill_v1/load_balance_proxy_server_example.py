@@ -79,7 +79,27 @@
 #
 # Notes:
 # - You can scale the number of prefiller and decoder servers as needed.
+# - With `--layerwise`, the request is sent to the decoder right away and the
+#   decoder pulls the KV cache layer by layer while the prefiller is running.
+#   The prefillers must enable `"use_layerwise": true` in the
+#   kv_connector_extra_config of MooncakeConnector, and the proxy needs the
+#   side channel port and engine id of each prefiller:
+#     --layerwise --prefiller-kv-ports 30000 30100 \
+#     --prefiller-engine-ids 0 1
+#   Prefill has to be done in a single step, so chunked prefill must be
+#   disabled on the prefillers and max_num_batched_tokens must be at least
+#   max_model_len, the connector refuses to start otherwise.
+# - With `--prefix-aware-routing`, the proxy tokenizes the prompts, hashes
+#   their full blocks like the prefix cache of the engine and remembers which
+#   blocks were sent to each prefiller (an LRU index of at most
+#   `--prefix-cache-blocks` blocks per prefiller). A request goes to the
+#   prefiller with the lowest load plus remaining prefill work, the blocks it
+#   probably has cached being free, so requests sharing a system prompt land
+#   where their prefix is cached:
+#     --prefix-aware-routing --tokenizer /path/to/model --block-size 128
 # - The proxy will round-robin requests to balance load.
+# - proxy_load_test.py measures the throughput and the routing overhead of
+#   the proxy against local stub servers.
 # - For production, ensure your backend servers are robust and secure.
 #
 # For more details, see the code and comments in this file.
@@ -92,13 +112,15 @@ import heapq
 import os
 import sys
 import uuid
+from collections import OrderedDict
 from contextlib import asynccontextmanager
-from typing import List
+from typing import List, Optional
 
 import httpx
 from fastapi import FastAPI, Request
 from fastapi.responses import StreamingResponse
 from vllm.logger import init_logger
+from vllm.transformers_utils.tokenizer import get_tokenizer
 
 logger = init_logger(__name__)
 
@@ -110,6 +132,61 @@ except ImportError:
     pass
 
 
+class PrefixIndex:
+    """Approximate LRU index of the prompt blocks cached by a server.
+
+    The proxy can't see the evictions of the engine, so the index only
+    remembers the most recently routed `capacity` blocks.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.blocks: OrderedDict[int, None] = OrderedDict()
+
+    def match(self, block_hashes: List[int]) -> int:
+        """Return the number of leading blocks found in the index."""
+        num_hits = 0
+        for block_hash in block_hashes:
+            if block_hash not in self.blocks:
+                break
+            num_hits += 1
+        return num_hits
+
+    def insert(self, block_hashes: List[int]):
+        for block_hash in block_hashes:
+            self.blocks[block_hash] = None
+            self.blocks.move_to_end(block_hash)
+        while len(self.blocks) > self.capacity:
+            self.blocks.popitem(last=False)
+
+
+def hash_prompt_blocks(token_ids: List[int], block_size: int) -> List[int]:
+    """Hash the full blocks of a prompt, chaining the hash of the previous
+    block like the prefix cache of the engine, so that a block hash
+    identifies the whole prefix up to that block."""
+    block_hashes: List[int] = []
+    parent_hash = None
+    for start in range(0, len(token_ids) - block_size + 1, block_size):
+        parent_hash = hash(
+            (parent_hash, tuple(token_ids[start:start + block_size])))
+        block_hashes.append(parent_hash)
+    return block_hashes
+
+
+def tokenize_prompt(tokenizer, req_data: dict) -> List[int]:
+    if "messages" in req_data:
+        return tokenizer.apply_chat_template(req_data["messages"],
+                                             tokenize=True,
+                                             add_generation_prompt=True)
+    prompt = req_data.get("prompt", "")
+    if isinstance(prompt, list):
+        if prompt and isinstance(prompt[0], int):
+            return prompt
+        # Batched prompts: route by the first one.
+        prompt = prompt[0] if prompt else ""
+    return tokenizer.encode(prompt)
+
+
 class ServerState:
 
     def __init__(self, host, port):
@@ -125,15 +202,62 @@ class ServerState:
         self.active_kv_cache = 0  # Only for prefiller
         self.active_requests = 0  # Number of active requests
         self.aborted_requests = set()  # Track aborted requests
+        # Prompt blocks probably cached by the server, only for prefiller
+        self.prefix_index: Optional[PrefixIndex] = None
         # Removed individual server lock - will use global locks instead
 
 
+class ServerHeap:
+    """Min-heap of server indices keyed by priority, with lazy deletion.
+
+    Updating a server pushes a new entry and bumps the server version, so
+    both pop and update are O(log n). Stale entries are skipped when popped
+    and dropped once they outnumber the live ones.
+    """
+
+    def __init__(self, num_servers: int):
+        self.versions = [0] * num_servers
+        # Each entry is (priority_score, server_index, version)
+        self.heap = [(0.0, i, 0) for i in range(num_servers)]
+
+    def __len__(self):
+        return len(self.versions)
+
+    def pop(self) -> int:
+        """Pop the server with the lowest priority, it has no entry until
+        the next update."""
+        while self.heap:
+            _, server_idx, version = heapq.heappop(self.heap)
+            if version == self.versions[server_idx]:
+                return server_idx
+        raise RuntimeError("No server left in the heap")
+
+    def update(self, server_idx: int, priority: float):
+        self.versions[server_idx] += 1
+        heapq.heappush(self.heap,
+                       (priority, server_idx, self.versions[server_idx]))
+        if len(self.heap) > 2 * len(self.versions):
+            self.heap = [
+                entry for entry in self.heap
+                if entry[2] == self.versions[entry[1]]
+            ]
+            heapq.heapify(self.heap)
+
+
 class ProxyState:
 
-    def __init__(self, prefiller_instances, decoder_instances):
+    def __init__(self,
+                 prefiller_instances,
+                 decoder_instances,
+                 prefix_cache_blocks: int = 0):
         self.prefillers: List[ServerState] = [
             ServerState(h, p) for h, p in prefiller_instances
         ]
+        if prefix_cache_blocks > 0:
+            for server in self.prefillers:
+                server.prefix_index = PrefixIndex(prefix_cache_blocks)
+        self.num_prefix_blocks = 0
+        self.num_prefix_hit_blocks = 0
         self.decoders: List[ServerState] = [
             ServerState(h, p) for h, p in decoder_instances
         ]
@@ -142,35 +266,24 @@ class ProxyState:
         # Removed selection locks - no longer needed for synchronous methods
 
         # Initialize priority queues for efficient server selection
-        # Each entry is (priority_score, server_index, server_reference)
         # Lower priority score = higher priority (less loaded)
-        self.prefiller_heap = [(0, i, server)
-                               for i, server in enumerate(self.prefillers)]
-        self.decoder_heap = [(0, i, server)
-                             for i, server in enumerate(self.decoders)]
-        heapq.heapify(self.prefiller_heap)
-        heapq.heapify(self.decoder_heap)
+        self.prefiller_heap = ServerHeap(len(self.prefillers))
+        self.decoder_heap = ServerHeap(len(self.decoders))
 
     def _update_prefiller_priority(self, server_idx: int):
         """Update the priority of a prefiller server in the heap."""
         server = self.prefillers[server_idx]
+        self.prefiller_heap.update(server_idx, self._prefiller_load(server))
+
+    @staticmethod
+    def _prefiller_load(server: ServerState) -> float:
         # Priority based on active_tokens and active_kv_cache
-        priority = server.active_tokens + server.active_kv_cache * 0.3
-        # Remove old entry and add new one
-        self.prefiller_heap = [(p, i, s) for p, i, s in self.prefiller_heap
-                               if i != server_idx]
-        heapq.heappush(self.prefiller_heap,
-                       (priority, server_idx, server))  # type: ignore
+        return server.active_tokens + server.active_kv_cache * 0.3
 
     def _update_decoder_priority(self, server_idx: int):
         """Update the priority of a decoder server in the heap."""
         server = self.decoders[server_idx]
-        priority = server.active_tokens
-        # Remove old entry and add new one
-        self.decoder_heap = [(p, i, s) for p, i, s in self.decoder_heap
-                             if i != server_idx]
-        heapq.heappush(self.decoder_heap,
-                       (priority, server_idx, server))  # type: ignore
+        self.decoder_heap.update(server_idx, server.active_tokens)
 
     def abort_prefiller_request(self, server_idx: int,
                                 request_id):  # Changed to synchronous
@@ -196,12 +309,22 @@ class ProxyState:
         async with self.req_id_lock:
             return str(uuid.uuid4())
 
-    def select_prefiller(self, token_count):  # Changed to synchronous
+    def select_prefiller(self,
+                         token_count,
+                         block_hashes: Optional[List[int]] = None
+                         ):  # Changed to synchronous
         # No lock needed - entire function is atomic
         if not self.prefiller_heap:
             raise RuntimeError("No prefiller servers available")
 
-        priority, chosen, server = heapq.heappop(self.prefiller_heap)
+        chosen = None
+        if block_hashes:
+            chosen = self._select_prefiller_by_prefix(token_count,
+                                                      block_hashes)
+        if chosen is None:
+            chosen = self.prefiller_heap.pop()
+        if block_hashes:
+            self.prefillers[chosen].prefix_index.insert(block_hashes)
 
         # Update the chosen server atomically
         self.prefillers[chosen].active_tokens += token_count
@@ -212,6 +335,27 @@ class ProxyState:
 
         return chosen
 
+    def _select_prefiller_by_prefix(self, token_count,
+                                    block_hashes: List[int]) -> Optional[int]:
+        """Pick the prefiller with the lowest load plus remaining prefill
+        work, the blocks it probably has cached being free. Return None if
+        no prefiller has any of the blocks, the least loaded one is used."""
+        num_hits = [
+            server.prefix_index.match(block_hashes)
+            for server in self.prefillers
+        ]
+        self.num_prefix_blocks += len(block_hashes)
+        if max(num_hits) == 0:
+            return None
+        costs = [
+            self._prefiller_load(server) + token_count *
+            (1 - num_hit / len(block_hashes))
+            for server, num_hit in zip(self.prefillers, num_hits)
+        ]
+        chosen = min(range(len(self.prefillers)), key=costs.__getitem__)
+        self.num_prefix_hit_blocks += num_hits[chosen]
+        return chosen
+
     def release_prefiller(self, idx, token_count):  # Changed to synchronous
         # No lock needed - atomic operation
         self.prefillers[idx].active_tokens -= token_count
@@ -230,7 +374,7 @@ class ProxyState:
         if not self.decoder_heap:
             raise RuntimeError("No decoder servers available")
 
-        priority, chosen, server = heapq.heappop(self.decoder_heap)
+        chosen = self.decoder_heap.pop()
 
         # Update the chosen server atomically
         self.decoders[chosen].active_tokens += token_count
@@ -257,6 +401,7 @@ class ProxyState:
 
 
 proxy_state = None
+tokenizer = None
 
 
 def parse_args():
@@ -276,6 +421,44 @@ def parse_args():
                         nargs="+",
                         default=["localhost"])
     parser.add_argument("--decoder-ports", type=int, nargs="+", default=[8002])
+    parser.add_argument(
+        "--layerwise",
+        action="store_true",
+        help="Start decode before prefill finishes and pull the KV cache "
+        "layer by layer")
+    parser.add_argument(
+        "--prefiller-kv-ports",
+        type=int,
+        nargs="+",
+        default=[],
+        help="Mooncake side channel port of each prefiller, for --layerwise")
+    parser.add_argument(
+        "--prefiller-engine-ids",
+        type=str,
+        nargs="+",
+        default=[],
+        help="KV transfer engine id of each prefiller, for --layerwise")
+    parser.add_argument(
+        "--prefix-aware-routing",
+        action="store_true",
+        help="Route the requests to the prefiller that probably holds their "
+        "prefix in its cache, needs --tokenizer")
+    parser.add_argument("--tokenizer",
+                        type=str,
+                        default=None,
+                        help="Tokenizer of the served model, for "
+                        "--prefix-aware-routing")
+    parser.add_argument("--block-size",
+                        type=int,
+                        default=128,
+                        help="KV cache block size of the prefillers, for "
+                        "--prefix-aware-routing")
+    parser.add_argument(
+        "--prefix-cache-blocks",
+        type=int,
+        default=65536,
+        help="Number of blocks remembered per prefiller, roughly its number "
+        "of KV cache blocks, for --prefix-aware-routing")
     parser.add_argument("--max-retries",
                         type=int,
                         default=3,
@@ -292,6 +475,12 @@ def parse_args():
     if len(args.decoder_hosts) != len(args.decoder_ports):
         raise ValueError(
             "Number of decoder hosts must match number of decoder ports")
+    if args.layerwise and not (len(args.prefiller_hosts) == len(
+            args.prefiller_kv_ports) == len(args.prefiller_engine_ids)):
+        raise ValueError(
+            "--layerwise needs one kv port and engine id per prefiller")
+    if args.prefix_aware_routing and args.tokenizer is None:
+        raise ValueError("--prefix-aware-routing needs --tokenizer")
     args.prefiller_instances = list(
         zip(args.prefiller_hosts, args.prefiller_ports))
     args.decoder_instances = list(zip(args.decoder_hosts, args.decoder_ports))
@@ -300,9 +489,14 @@ def parse_args():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global proxy_state
+    global proxy_state, tokenizer
+    prefix_cache_blocks = 0
+    if global_args.prefix_aware_routing:
+        tokenizer = get_tokenizer(global_args.tokenizer)
+        prefix_cache_blocks = global_args.prefix_cache_blocks
     proxy_state = ProxyState(global_args.prefiller_instances,
-                             global_args.decoder_instances)
+                             global_args.decoder_instances,
+                             prefix_cache_blocks)
     print(
         f"Initialized {len(proxy_state.prefillers)} prefill clients and {len(proxy_state.decoders)} decode clients."
     )
@@ -361,6 +555,8 @@ async def send_request_to_service(client: httpx.AsyncClient,
         "remote_port": None,
         "aborted_request": list(aborted_requests),
     }
+    if global_args.layerwise:
+        req_data['kv_transfer_params']["layerwise"] = True
     req_data["stream"] = False
     req_data["max_tokens"] = 1
     if "stream_options" in req_data:
@@ -452,23 +648,54 @@ async def _handle_completions(api: str, request: Request):
             f"Request length: {request_length}, Prefiller score: {prefiller_score}"
         )
         request_id = await proxy_state.next_req_id()
+        block_hashes = None
+        if tokenizer is not None:
+            # Tokenizing long prompts would block the event loop.
+            token_ids = await asyncio.to_thread(tokenize_prompt, tokenizer,
+                                                req_data)
+            block_hashes = hash_prompt_blocks(token_ids,
+                                              global_args.block_size)
         # Select prefiller
-        prefiller_idx = proxy_state.select_prefiller(prefiller_score)
+        prefiller_idx = proxy_state.select_prefiller(prefiller_score,
+                                                     block_hashes)
         prefiller = proxy_state.prefillers[prefiller_idx]
         # Send request to prefiller
-        response = await send_request_to_service(
-            prefiller.client,
-            prefiller_idx,
-            api,
-            req_data,
-            request_id,
-            max_retries=global_args.max_retries,
-            base_delay=global_args.retry_delay)
-        proxy_state.release_prefiller(prefiller_idx, prefiller_score)
-        response_json = response.json()
-        kv_transfer_params = response_json.get('kv_transfer_params', {})
-        if kv_transfer_params:
-            req_data["kv_transfer_params"] = kv_transfer_params
+        prefill_task = asyncio.create_task(
+            send_request_to_service(prefiller.client,
+                                    prefiller_idx,
+                                    api,
+                                    req_data,
+                                    request_id,
+                                    max_retries=global_args.max_retries,
+                                    base_delay=global_args.retry_delay))
+        if global_args.layerwise:
+            # The decoder pulls each layer once the prefiller computed it, so
+            # decode is started without waiting for the prefill response.
+            def on_prefill_done(task: asyncio.Task):
+                proxy_state.release_prefiller(prefiller_idx, prefiller_score)
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(
+                        f"Layerwise prefill of request {request_id} failed: "
+                        f"{str(task.exception())}")
+
+            prefill_task.add_done_callback(on_prefill_done)
+            req_data["kv_transfer_params"] = {
+                "do_remote_decode": False,
+                "do_remote_prefill": True,
+                "remote_engine_id":
+                global_args.prefiller_engine_ids[prefiller_idx],
+                "remote_block_ids": None,
+                "remote_host": prefiller.host,
+                "remote_port": global_args.prefiller_kv_ports[prefiller_idx],
+                "layerwise": True,
+            }
+        else:
+            response = await prefill_task
+            proxy_state.release_prefiller(prefiller_idx, prefiller_score)
+            response_json = response.json()
+            kv_transfer_params = response_json.get('kv_transfer_params', {})
+            if kv_transfer_params:
+                req_data["kv_transfer_params"] = kv_transfer_params
         # Select decoder
         decoder_score = proxy_state.calculate_decode_scores(request_length)
         logger.debug("Decoder score: %f", decoder_score)
@@ -495,6 +722,9 @@ async def _handle_completions(api: str, request: Request):
                             prefiller_idx, prefiller_score)
                         released_kv = True
                     yield chunk
+                if global_args.layerwise:
+                    # Surface the errors of the prefill running alongside.
+                    await prefill_task
             except Exception as e:
                 logger.error(
                     f"Error during streaming from decoder {decoder.url}: {str(e)} the aborted request {request_id} will be routing to the target prefiller when new request is ready to dispatch to it"
@@ -532,11 +762,15 @@ async def handle_chat_completions(request: Request):
 
 @app.get("/healthcheck")
 async def healthcheck():
-    return {
+    status = {
         "status": "ok",
         "prefill_instances": len(proxy_state.prefillers),
         "decode_instances": len(proxy_state.decoders)
     }
+    if proxy_state.num_prefix_blocks > 0:
+        status["prefix_hit_rate"] = (proxy_state.num_prefix_hit_blocks /
+                                     proxy_state.num_prefix_blocks)
+    return status
 
 
 if __name__ == '__main__':
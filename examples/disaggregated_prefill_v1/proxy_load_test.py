@@ -0,0 +1,249 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Load test of load_balance_proxy_server_example.py.
+#
+# The proxy is started against local stub prefiller and decoder servers, so
+# that only the proxy itself is measured:
+#
+#   python proxy_load_test.py --num-prefillers 64 --num-decoders 64 \
+#     --num-requests 20000 --concurrency 512
+#
+# reports the requests per second served by the proxy and the request
+# latency. The stubs answer the prefill request at once and stream
+# `--output-chunks` chunks for decode. They run in the load test process, use
+# as many stubs as needed but keep in mind that they share the CPU with the
+# client.
+#
+#   python proxy_load_test.py --routing-only --num-prefillers 512
+#
+# only measures the cost of selecting and releasing the servers in
+# ProxyState, which runs on the event loop of the proxy for every request.
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROXY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "load_balance_proxy_server_example.py")
+
+stub_app = FastAPI()
+
+
+@stub_app.post("/v1/completions")
+@stub_app.post("/v1/chat/completions")
+async def stub_completions(request: Request):
+    req_data = await request.json()
+    kv_transfer_params = req_data.get("kv_transfer_params") or {}
+    if kv_transfer_params.get("do_remote_decode"):
+        # Prefill: return the KV cache location right away.
+        return JSONResponse({
+            "choices": [{
+                "text": "a"
+            }],
+            "kv_transfer_params": {
+                "do_remote_decode": False,
+                "do_remote_prefill": True,
+                "remote_engine_id": "0",
+                "remote_block_ids": [0],
+                "remote_host": "127.0.0.1",
+                "remote_port": 0,
+            },
+        })
+
+    async def generate():
+        chunk = json.dumps({"choices": [{"text": "a"}]})
+        for _ in range(stub_app.state.output_chunks):
+            yield f"data: {chunk}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+async def start_stub_servers(ports):
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(stub_app,
+                           host="127.0.0.1",
+                           port=port,
+                           log_level="warning")) for port in ports
+    ]
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    while not all(server.started for server in servers):
+        await asyncio.sleep(0.1)
+    return servers, tasks
+
+
+def start_proxy(args, prefiller_ports, decoder_ports):
+    num_prefillers, num_decoders = len(prefiller_ports), len(decoder_ports)
+    cmd = [
+        sys.executable, PROXY_PATH, "--host", "127.0.0.1", "--port",
+        str(args.proxy_port), "--prefiller-hosts",
+        *["127.0.0.1"] * num_prefillers, "--prefiller-ports",
+        *map(str, prefiller_ports), "--decoder-hosts",
+        *["127.0.0.1"] * num_decoders, "--decoder-ports",
+        *map(str, decoder_ports)
+    ]
+    return subprocess.Popen(cmd)
+
+
+async def wait_for_proxy(client: httpx.AsyncClient, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/healthcheck")
+            if response.status_code == 200:
+                return
+        except httpx.RequestError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError("The proxy didn't start in time")
+
+
+async def run_load(client: httpx.AsyncClient, num_requests: int,
+                   concurrency: int, prompt: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    num_failed = 0
+
+    async def send_one():
+        nonlocal num_failed
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with client.stream("POST",
+                                         "/v1/completions",
+                                         json={
+                                             "model": "stub",
+                                             "prompt": prompt,
+                                             "max_tokens": 16,
+                                             "stream": True
+                                         }) as response:
+                    response.raise_for_status()
+                    async for _ in response.aiter_bytes():
+                        pass
+            except httpx.HTTPError:
+                num_failed += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send_one() for _ in range(num_requests)))
+    return time.perf_counter() - start, np.array(latencies), num_failed
+
+
+async def run_end_to_end(args):
+    prefiller_ports = list(
+        range(args.base_port, args.base_port + args.num_prefillers))
+    decoder_ports = list(
+        range(prefiller_ports[-1] + 1,
+              prefiller_ports[-1] + 1 + args.num_decoders))
+    stub_app.state.output_chunks = args.output_chunks
+    servers, tasks = await start_stub_servers(prefiller_ports +
+                                              decoder_ports)
+    proxy = start_proxy(args, prefiller_ports, decoder_ports)
+    try:
+        async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{args.proxy_port}",
+                timeout=None,
+                limits=httpx.Limits(max_connections=args.concurrency,
+                                    max_keepalive_connections=args.
+                                    concurrency)) as client:
+            await wait_for_proxy(client)
+            # Warm up the connections of the proxy to the stubs.
+            await run_load(client, args.concurrency, args.concurrency,
+                           args.prompt)
+            duration, latencies, num_failed = await run_load(
+                client, args.num_requests, args.concurrency, args.prompt)
+    finally:
+        proxy.terminate()
+        proxy.wait()
+        for server in servers:
+            server.should_exit = True
+        await asyncio.gather(*tasks)
+
+    print(f"Prefillers: {args.num_prefillers}, "
+          f"decoders: {args.num_decoders}, "
+          f"concurrency: {args.concurrency}")
+    print(f"Requests: {len(latencies)} succeeded, {num_failed} failed "
+          f"in {duration:.2f} s")
+    print(f"Throughput: {len(latencies) / duration:.1f} requests/s")
+    if len(latencies) > 0:
+        print(f"Latency (ms): mean {latencies.mean() * 1000:.2f}, "
+              f"p50 {np.percentile(latencies, 50) * 1000:.2f}, "
+              f"p99 {np.percentile(latencies, 99) * 1000:.2f}")
+
+
+def run_routing_only(args):
+    spec = importlib.util.spec_from_file_location("proxy", PROXY_PATH)
+    proxy_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(proxy_module)
+    proxy_state = proxy_module.ProxyState(
+        [("127.0.0.1", port) for port in range(args.num_prefillers)],
+        [("127.0.0.1", port) for port in range(args.num_decoders)])
+
+    rng = random.Random(0)
+    in_flight: deque = deque()
+    start = time.perf_counter()
+    for _ in range(args.num_requests):
+        score = rng.randint(100, 10000)
+        prefiller_idx = proxy_state.select_prefiller(score)
+        decoder_idx = proxy_state.select_decoder(score)
+        in_flight.append((prefiller_idx, decoder_idx, score))
+        if len(in_flight) > args.concurrency:
+            prefiller_idx, decoder_idx, score = in_flight.popleft()
+            proxy_state.release_prefiller(prefiller_idx, score)
+            proxy_state.release_prefiller_kv(prefiller_idx, score)
+            proxy_state.release_decoder(decoder_idx, score)
+    duration = time.perf_counter() - start
+
+    print(f"Prefillers: {args.num_prefillers}, "
+          f"decoders: {args.num_decoders}, "
+          f"in flight requests: {args.concurrency}")
+    print(f"Routing overhead: "
+          f"{duration / args.num_requests * 1e6:.2f} us/request")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-prefillers", type=int, default=8)
+    parser.add_argument("--num-decoders", type=int, default=8)
+    parser.add_argument("--num-requests", type=int, default=10000)
+    parser.add_argument("--concurrency",
+                        type=int,
+                        default=256,
+                        help="Number of requests in flight")
+    parser.add_argument("--output-chunks",
+                        type=int,
+                        default=16,
+                        help="Number of chunks streamed by the stub decoders")
+    parser.add_argument("--prompt", type=str, default="Hello " * 100)
+    parser.add_argument("--proxy-port", type=int, default=9000)
+    parser.add_argument("--base-port",
+                        type=int,
+                        default=20000,
+                        help="First port of the stub servers")
+    parser.add_argument("--routing-only",
+                        action="store_true",
+                        help="Only measure the server selection of the proxy")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.routing_only:
+        run_routing_only(args)
+    else:
+        asyncio.run(run_end_to_end(args))
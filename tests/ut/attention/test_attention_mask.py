@@ -82,6 +82,32 @@ class TestAttentionMaskBuilder(TestBase):
         self.assertEqual(attention_mask_builder.attn_mask_cache[0][-1],
                          torch.tensor(float("-inf"), dtype=torch.float16))
 
+    def test_mask_cache_growth_stops_at_max_model_len(self):
+        attention_mask_builder = AttentionMaskBuilder(max_seq_len=1024,
+                                                      dtype=torch.float16,
+                                                      max_model_len=1500)
+        attention_mask_builder.get_attn_mask(max_seq_len=1100,
+                                             dtype=torch.float16,
+                                             device=torch.device("cpu"))
+        self.assertEqual(attention_mask_builder._seq_len_cached, 1500)
+        self.assertEqual(attention_mask_builder.attn_mask_cache.shape,
+                         (1500, 1500))
+
+        attention_mask_builder.get_splitfuse_attn_mask(
+            seq_lens=torch.tensor([1000]),
+            position=torch.tensor([999]),
+            dtype=torch.float16,
+            device=torch.device("cpu"),
+        )
+        self.assertEqual(attention_mask_builder._key_positions.shape[0], 1000)
+        attention_mask_builder.get_splitfuse_attn_mask(
+            seq_lens=torch.tensor([1200]),
+            position=torch.tensor([1199]),
+            dtype=torch.float16,
+            device=torch.device("cpu"),
+        )
+        self.assertEqual(attention_mask_builder._key_positions.shape[0], 1500)
+
     def test_get_splitfuse_attn_mask(self):
         attention_mask_builder = AttentionMaskBuilder(max_seq_len=1024,
                                                       dtype=torch.float16)
@@ -93,6 +119,7 @@ class TestAttentionMaskBuilder(TestBase):
         )
         self.assertEqual(attn_mask.shape, (6, 100))
         self.assertEqual(attention_mask_builder._seq_len_cached, 1024)
+        self.assertEqual(attention_mask_builder._key_positions.shape[0], 100)
 
         attn_mask = attention_mask_builder.get_splitfuse_attn_mask(
             seq_lens=torch.tensor([10, 3000, 2000]),
@@ -101,7 +128,9 @@ class TestAttentionMaskBuilder(TestBase):
             device=torch.device("cpu"),
         )
         self.assertEqual(attn_mask.shape, (5, 3000))
-        self.assertEqual(attention_mask_builder._seq_len_cached, 3000)
+        # The splitfuse mask does not need the full mask cache.
+        self.assertEqual(attention_mask_builder._seq_len_cached, 1024)
+        self.assertEqual(attention_mask_builder._key_positions.shape[0], 3000)
 
         # splitfuse_attn_mask now only supports data types: torch.float16 and torch.bfloat16
         # otherwise raise ValueError
@@ -113,6 +142,61 @@ class TestAttentionMaskBuilder(TestBase):
                 device=torch.device("cpu"),
             )
 
+    def test_splitfuse_attn_mask_matches_attn_mask_rows(self):
+        position = torch.tensor([0, 5, 6, 7, 30, 31, 32, 33])
+        for dtype in [torch.float16, torch.bfloat16]:
+            attention_mask_builder = AttentionMaskBuilder(max_seq_len=64,
+                                                          dtype=dtype)
+            attn_mask = attention_mask_builder.get_splitfuse_attn_mask(
+                seq_lens=torch.tensor([8, 34]),
+                position=position,
+                dtype=dtype,
+                device=torch.device("cpu"),
+            )
+            expected = attention_mask_builder.get_attn_mask(
+                64, dtype, torch.device("cpu"))[position, :34]
+            expected = expected * AttentionMaskBuilder.get_mask_scale_factor(
+                dtype)
+            self.assertEqual(attn_mask.dtype, dtype)
+            self.assertTrue(torch.equal(attn_mask, expected))
+
+        # The key positions grow geometrically.
+        attention_mask_builder.get_splitfuse_attn_mask(
+            seq_lens=torch.tensor([40]),
+            position=torch.tensor([39]),
+            dtype=torch.float16,
+            device=torch.device("cpu"),
+        )
+        self.assertEqual(attention_mask_builder._key_positions.shape[0], 68)
+
+    def test_get_tree_attn_mask(self):
+        attention_mask_builder = AttentionMaskBuilder(max_seq_len=16,
+                                                      dtype=torch.float16)
+        # A root at position 2 followed by a tree with the nodes 0 and 1 at
+        # depth 1 and the node 2 under the node 0, then a decode token.
+        ancestor_mask = torch.tensor([[True, False, False],
+                                      [False, True, False],
+                                      [True, False, True]])
+        position = torch.tensor([2, 3, 4, 5, 1])
+        node_ids = torch.tensor([-1, 0, 1, 2, -1])
+        attn_mask = attention_mask_builder.get_tree_attn_mask(
+            torch.tensor([6, 2]), position, node_ids, ancestor_mask,
+            torch.float16, torch.device("cpu"))
+
+        visible = attn_mask == 0
+        self.assertEqual(attn_mask.shape, (5, 6))
+        self.assertEqual(visible[0].tolist(),
+                         [True, True, True, False, False, False])
+        self.assertEqual(visible[1].tolist(),
+                         [True, True, True, True, False, False])
+        # The node 1 does not attend to its sibling.
+        self.assertEqual(visible[2].tolist(),
+                         [True, True, True, False, True, False])
+        self.assertEqual(visible[3].tolist(),
+                         [True, True, True, True, False, True])
+        self.assertEqual(visible[4].tolist(),
+                         [True, True, False, False, False, False])
+
     def test_mask_value_cleanliness(self):
         attention_mask_builder = AttentionMaskBuilder(max_seq_len=6,
                                                       dtype=torch.bfloat16)
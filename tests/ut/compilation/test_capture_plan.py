@@ -0,0 +1,97 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import itertools
+import json
+import random
+
+import pytest
+
+from vllm_ascend.compilation.capture_plan import (CapturePlanRecorder,
+                                                  load_capture_plan,
+                                                  plan_capture_sizes)
+
+
+def padding(histogram, sizes):
+    return sum(count * (min(s for s in sizes if s >= num_tokens) - num_tokens)
+               for num_tokens, count in histogram.items()
+               if num_tokens <= max(sizes))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_plan_capture_sizes_minimizes_padding(seed):
+    rng = random.Random(seed)
+    candidate_sizes = sorted(rng.sample(range(1, 40), rng.randint(2, 8)))
+    histogram = {
+        rng.randint(1, 45): rng.randint(1, 9)
+        for _ in range(rng.randint(1, 10))
+    }
+    max_size = max(candidate_sizes)
+    all_sizes = sorted(
+        set(candidate_sizes) | {n
+                                for n in histogram if n <= max_size})
+    max_num_sizes = rng.randint(2, len(all_sizes))
+
+    sizes = plan_capture_sizes(histogram, candidate_sizes, max_num_sizes)
+
+    if max_num_sizes == len(all_sizes):
+        assert sizes == all_sizes
+        return
+    assert sizes == sorted(sizes)
+    assert len(sizes) == max_num_sizes
+    assert sizes[-1] == max_size
+    # Brute force over all the choices keeping the largest size.
+    min_padding = min(
+        padding(histogram, list(smaller_sizes) + [max_size])
+        for smaller_sizes in itertools.combinations(all_sizes[:-1],
+                                                    max_num_sizes - 1))
+    assert padding(histogram, sizes) == min_padding
+
+
+def test_plan_capture_sizes_follows_traffic():
+    candidate_sizes = [1, 2, 4, 8, 16, 32, 64]
+    # Most of the steps have 24 or 40 tokens, which the candidates pad a lot.
+    histogram = {24: 100, 40: 100, 3: 1}
+    assert plan_capture_sizes(histogram, candidate_sizes, 3) == [24, 40, 64]
+    assert plan_capture_sizes(histogram, candidate_sizes, 1) == [64]
+
+
+def test_capture_plan_recorder(tmp_path):
+    path = str(tmp_path / "capture_plan.json")
+    recorder = CapturePlanRecorder(path, [16, 1, 2, 4, 8], save_interval=3)
+    recorder.record(3)
+    recorder.record(3)
+    assert load_capture_plan(path) == {}
+    # Batches larger than the graphs are not recorded.
+    recorder.record(17)
+    recorder.record(5)
+    assert load_capture_plan(path) == {3: 2}
+    recorder.save()
+    with open(path) as f:
+        plan = json.load(f)
+    # No padding with 5 sizes.
+    assert len(plan["capture_sizes"]) == 5
+    assert {3, 5, 16} <= set(plan["capture_sizes"])
+
+    # The histogram of the previous runs is kept.
+    recorder = CapturePlanRecorder(path, [1, 2, 4, 8, 16])
+    recorder.record(5)
+    assert recorder.histogram == {3: 2, 5: 2}
+
+
+def test_load_invalid_capture_plan(tmp_path):
+    path = tmp_path / "capture_plan.json"
+    assert load_capture_plan(str(path)) == {}
+    path.write_text("{\"capture_sizes\": [1, 2]")
+    assert load_capture_plan(str(path)) == {}
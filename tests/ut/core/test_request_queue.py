@@ -0,0 +1,129 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import math
+import random
+
+from vllm.sampling_params import SamplingParams
+from vllm.v1.core.sched.request_queue import FCFSRequestQueue
+from vllm.v1.request import Request
+
+from tests.ut.base import TestBase
+from vllm_ascend.core.request_queue import (IndexedPriorityRequestQueue,
+                                            create_ascend_request_queue,
+                                            get_request_key,
+                                            get_ttft_deadline, priority_key)
+
+
+def make_request(request_id, priority=0, arrival_time=0.0, extra_args=None):
+    request = Request(request_id=str(request_id),
+                      prompt_token_ids=[1, 2, 3],
+                      sampling_params=SamplingParams(extra_args=extra_args),
+                      pooling_params=None,
+                      eos_token_id=None,
+                      arrival_time=arrival_time,
+                      priority=priority)
+    return request
+
+
+class TestIndexedPriorityRequestQueue(TestBase):
+
+    def test_pop_in_priority_order(self):
+        queue = IndexedPriorityRequestQueue(priority_key)
+        requests = [
+            make_request(i, priority=random.randint(0, 5), arrival_time=i)
+            for i in range(50)
+        ]
+        for request in requests:
+            queue.add_request(request)
+
+        expected = sorted(requests, key=priority_key)
+        self.assertEqual(list(queue), expected)
+        self.assertEqual(list(reversed(queue)), expected[::-1])
+        popped = [queue.pop_request() for _ in range(len(requests))]
+        self.assertEqual(popped, expected)
+        self.assertFalse(queue)
+
+    def test_remove_request(self):
+        queue = IndexedPriorityRequestQueue(priority_key)
+        requests = [make_request(i, priority=i % 3) for i in range(20)]
+        for request in requests:
+            queue.add_request(request)
+
+        removed = requests[::3]
+        queue.remove_request(removed[0])
+        queue.remove_requests(removed[1:])
+        self.assertEqual(len(queue), len(requests) - len(removed))
+        self.assertNotIn(removed[0], queue)
+        self.assertEqual(
+            list(queue),
+            sorted([r for r in requests if r not in removed],
+                   key=priority_key))
+        with self.assertRaises(ValueError):
+            queue.remove_request(removed[0])
+
+    def test_peek_and_prepend(self):
+        queue = IndexedPriorityRequestQueue(priority_key)
+        with self.assertRaises(IndexError):
+            queue.peek_request()
+        low = make_request("low", priority=1)
+        high = make_request("high", priority=0)
+        queue.add_request(low)
+        queue.prepend_request(high)
+        self.assertEqual(queue.peek_request(), high)
+        with self.assertRaises(ValueError):
+            queue.add_request(high)
+
+    def test_peek_requests(self):
+        queue = IndexedPriorityRequestQueue(priority_key)
+        requests = [
+            make_request(i, priority=random.randint(0, 5), arrival_time=i)
+            for i in range(20)
+        ]
+        for request in requests:
+            queue.add_request(request)
+        self.assertEqual(queue.peek_requests(3),
+                         sorted(requests, key=priority_key)[:3])
+        self.assertEqual(len(queue.peek_requests(30)), 20)
+        self.assertEqual(len(queue), 20)
+
+
+class TestRequestKey(TestBase):
+
+    def test_ttft_deadline(self):
+        request = make_request(0, arrival_time=10.0)
+        self.assertEqual(get_ttft_deadline(request, 0), math.inf)
+        self.assertEqual(get_ttft_deadline(request, 500), 10.5)
+        request = make_request(1,
+                               arrival_time=10.0,
+                               extra_args={"ttft_slo_ms": 100})
+        self.assertEqual(get_ttft_deadline(request, 500), 10.1)
+
+    def test_slo_key_orders_by_deadline(self):
+        key = get_request_key("slo", default_ttft_slo_ms=1000)
+        relaxed = make_request(0, arrival_time=0.0)
+        urgent = make_request(1,
+                              arrival_time=0.5,
+                              extra_args={"ttft_slo_ms": 100})
+        self.assertLess(key(urgent), key(relaxed))
+
+    def test_create_queue(self):
+        self.assertIsInstance(create_ascend_request_queue("fcfs"),
+                              FCFSRequestQueue)
+        self.assertIsInstance(create_ascend_request_queue("priority"),
+                              IndexedPriorityRequestQueue)
+        self.assertIsInstance(create_ascend_request_queue("slo", 200),
+                              IndexedPriorityRequestQueue)
+        with self.assertRaises(ValueError):
+            get_request_key("custom_policy")
@@ -74,7 +74,7 @@ class TestAscendSchedulerConfig(TestBase):
                 ),
             )
         self.assertIn(
-            "currently AscendScheduler only supports fcfs policy",
+            "currently AscendScheduler only supports",
             str(context.exception),
         )
 
@@ -178,3 +178,71 @@ class TestAscendSchedulerConfig(TestBase):
         )
         self.assertEqual(ascend_config.enable_pd_transfer, True)
         self.assertEqual(ascend_config.decode_max_num_seqs, 48)
+
+    def test_initialize_from_config_with_priority_policies(self):
+        for policy in ("priority", "slo"):
+            ascend_config = AscendSchedulerConfig.initialize_from_config(
+                self.basic_scheduler_config,
+                AscendSchedulerConfig(
+                    policy=policy,
+                    ttft_slo_ms=500,
+                    max_num_batched_tokens=2048,
+                    max_model_len=2048,
+                ),
+            )
+            self.assertEqual(ascend_config.policy, policy)
+            self.assertEqual(ascend_config.ttft_slo_ms, 500)
+
+    def test_invalid_ttft_slo_ms(self):
+        with self.assertRaises(ValueError) as context:
+            AscendSchedulerConfig.initialize_from_config(
+                self.basic_scheduler_config,
+                AscendSchedulerConfig(
+                    policy="slo",
+                    ttft_slo_ms=-1,
+                    max_num_batched_tokens=2048,
+                    max_model_len=2048,
+                ),
+            )
+        self.assertIn("ttft_slo_ms must be non-negative",
+                      str(context.exception))
+
+    def test_initialize_from_config_with_prefill_chunk_size(self):
+        ascend_config = AscendSchedulerConfig.initialize_from_config(
+            self.basic_scheduler_config,
+            AscendSchedulerConfig(
+                prefill_chunk_size=1024,
+                max_prefill_tokens_per_step=1536,
+                max_num_batched_tokens=2048,
+                max_model_len=32768,
+            ),
+        )
+        self.assertEqual(ascend_config.prefill_chunk_size, 1024)
+        self.assertEqual(ascend_config.max_prefill_tokens_per_step, 1536)
+        self.assertEqual(ascend_config.max_model_len, 32768)
+
+    def test_invalid_lora_prefetch_depth(self):
+        with self.assertRaises(ValueError) as context:
+            AscendSchedulerConfig.initialize_from_config(
+                self.basic_scheduler_config,
+                AscendSchedulerConfig(
+                    lora_prefetch_depth=-1,
+                    max_num_batched_tokens=2048,
+                    max_model_len=2048,
+                ),
+            )
+        self.assertIn("lora_prefetch_depth must be non-negative",
+                      str(context.exception))
+
+    def test_invalid_prefill_chunk_size(self):
+        with self.assertRaises(ValueError) as context:
+            AscendSchedulerConfig.initialize_from_config(
+                self.basic_scheduler_config,
+                AscendSchedulerConfig(
+                    prefill_chunk_size=4096,
+                    max_num_batched_tokens=2048,
+                    max_model_len=2048,
+                ),
+            )
+        self.assertIn("must not be larger than max_num_batched_tokens",
+                      str(context.exception))
@@ -6,12 +6,14 @@ from unittest.mock import MagicMock, patch
 import torch
 from vllm.config import (CacheConfig, KVTransferConfig, ModelConfig,
                          SchedulerConfig, SpeculativeConfig, VllmConfig)
+from vllm.lora.request import LoRARequest
 from vllm.multimodal.inputs import PlaceholderRange
 from vllm.sampling_params import SamplingParams
 from vllm.utils import sha256
 from vllm.v1.core.kv_cache_utils import (get_request_block_hasher,
                                          init_none_hash)
 from vllm.v1.core.sched.output import SchedulerOutput
+from vllm.v1.core.sched.request_queue import SchedulingPolicy
 from vllm.v1.kv_cache_interface import (FullAttentionSpec, KVCacheConfig,
                                         KVCacheGroupSpec)
 from vllm.v1.outputs import DraftTokenIds, ModelRunnerOutput
@@ -19,7 +21,9 @@ from vllm.v1.request import Request, RequestStatus
 from vllm.v1.structured_output import StructuredOutputManager
 
 from tests.ut.base import TestBase
+from vllm_ascend.core.schedule_output import AscendSchedulerOutput
 from vllm_ascend.core.scheduler import AscendScheduler
+from vllm_ascend.lora.adapter_cache import LoRAResidencyTracker
 
 EOS_TOKEN_ID = 50256
 MODEL = "Qwen3-0.6B"
@@ -85,7 +89,7 @@ class TestAscendScheduler(TestBase):
     @patch("vllm.config.ModelConfig.__post_init__", MagicMock())
     @patch("vllm.config.VllmConfig.__post_init__", MagicMock())
     @patch('vllm.v1.core.sched.scheduler.compute_encoder_budget')
-    def create_scheduler(self, mock_compute_encoder_budget):
+    def create_scheduler(self, mock_compute_encoder_budget, policy="fcfs"):
         mock_compute_encoder_budget.return_value = [10, 20]
         use_kv_connector = False
         block_size = 16
@@ -102,6 +106,7 @@ class TestAscendScheduler(TestBase):
         scheduler_config.max_num_encoder_input_tokens = 10000
         scheduler_config.encoder_cache_size = 10000
         scheduler_config.chunked_prefill_enabled = False
+        scheduler_config.policy = policy
 
         model_config = ModelConfig(
             model=MODEL,
@@ -737,3 +742,203 @@ class TestAscendScheduler(TestBase):
         model_runner_output = make_output(scheduler)
         scheduler.update_from_output(scheduler_output, model_runner_output)
         self.assertEqual(scheduler.phase, "decode")
+
+    def test_schedule_priority_policy(self):
+        scheduler = self.create_scheduler(policy="priority")
+        # Only 6 requests fit into the token budget of one step.
+        requests = create_requests(num_requests=10,
+                                   num_tokens=MAX_NUM_BATCHED_TOKENS // 6)
+        for i, request in enumerate(requests):
+            # Later requests get a higher priority (lower value).
+            request.priority = len(requests) - i
+            scheduler.add_request(request)
+
+        output = scheduler.schedule()
+        scheduled_ids = {req.req_id for req in output.scheduled_new_reqs}
+        self.assertEqual(scheduled_ids,
+                         {req.request_id
+                          for req in requests[4:]})
+        self.assertEqual([req.request_id for req in scheduler.waiting],
+                         [req.request_id for req in reversed(requests[:4])])
+
+    def test_schedule_slo_policy(self):
+        scheduler = self.create_scheduler(policy="slo")
+        requests = create_requests(num_requests=3,
+                                   num_tokens=MAX_NUM_BATCHED_TOKENS // 2)
+        for i, request in enumerate(requests):
+            request.arrival_time = 100.0 + i
+        # The last request carries the tightest TTFT SLO.
+        requests[2].sampling_params = SamplingParams(
+            max_tokens=16, extra_args={"ttft_slo_ms": 100})
+        for request in requests:
+            scheduler.add_request(request)
+
+        self.assertEqual(scheduler.waiting.peek_request(), requests[2])
+        output = scheduler.schedule()
+        self.assertEqual([req.req_id for req in output.scheduled_new_reqs],
+                         [requests[2].request_id, requests[0].request_id])
+
+    def test_preempt_lowest_priority_request(self):
+        scheduler = self.create_scheduler(policy="priority")
+        requests = create_requests(num_requests=3)
+        for i, request in enumerate(requests):
+            request.priority = [1, 0, 2][i]
+            scheduler.running.append(request)
+
+        preempted_req = scheduler._pick_preempted_request(0)
+        self.assertEqual(preempted_req, requests[2])
+        # The scheduled part of the running queue is never preempted.
+        preempted_req = scheduler._pick_preempted_request(1)
+        self.assertEqual(preempted_req, requests[1])
+        self.assertEqual(scheduler.running, [requests[0]])
+
+    def test_slo_policy_interaction_with_vllm(self):
+        scheduler = self.create_scheduler(policy="slo")
+        # vLLM has no slo policy, it runs with the priority one while the
+        # configured policy is kept.
+        self.assertEqual(scheduler.policy, SchedulingPolicy.PRIORITY)
+        self.assertEqual(scheduler.scheduler_config.policy, "slo")
+
+        # The prefill-first path preempts by TTFT deadline, not priority.
+        requests = create_requests(num_requests=3)
+        for i, request in enumerate(requests):
+            request.arrival_time = 100.0
+            request.priority = [2, 0, 1][i]
+            request.sampling_params = SamplingParams(
+                max_tokens=16, extra_args={"ttft_slo_ms": [100, 300, 200][i]})
+            scheduler.running.append(request)
+        preempted_req = scheduler._pick_preempted_request(0)
+        self.assertEqual(preempted_req, requests[1])
+
+    def test_schedule_with_prefill_chunk_size(self):
+        scheduler = self.create_scheduler()
+        scheduler.prefill_chunk_size = 1000
+        scheduler.max_prefill_tokens_per_step = 1500
+        requests = create_requests(num_requests=2, num_tokens=2500)
+        for request in requests:
+            scheduler.add_request(request)
+
+        def step():
+            output = scheduler.schedule()
+            # Partially prefilled requests don't sample a token.
+            sampled_token_ids = [
+                [] if req.num_computed_tokens < req.num_tokens else [1000]
+                for req in scheduler.running
+            ]
+            model_runner_output = ModelRunnerOutput(
+                req_ids=[req.request_id for req in scheduler.running],
+                req_id_to_index={
+                    req.request_id: i
+                    for i, req in enumerate(scheduler.running)
+                },
+                sampled_token_ids=sampled_token_ids,
+                logprobs=None,
+                prompt_logprobs_dict={},
+                pooler_output=[])
+            scheduler.update_from_output(output, model_runner_output)
+            return output.num_scheduled_tokens
+
+        # Prompts are split into chunks and capped per step.
+        self.assertEqual(step(), {"0": 1000, "1": 500})
+        self.assertEqual(step(), {"0": 1000, "1": 500})
+        self.assertEqual(step(), {"0": 500, "1": 1000})
+        # Request 0 finished its prefill, a decode step is interleaved
+        # before the rest of request 1 is prefilled.
+        self.assertEqual(step(), {"0": 1})
+        self.assertEqual(step(), {"1": 500})
+        self.assertEqual(step(), {"0": 1, "1": 1})
+
+    def test_partial_prefill_preempts_when_out_of_kv_cache(self):
+        scheduler = self.create_scheduler()
+        scheduler.prefill_chunk_size = 1000
+        scheduler.max_prefill_tokens_per_step = 1500
+        requests = create_requests(num_requests=2, num_tokens=2500)
+        for request in requests:
+            scheduler.add_request(request)
+        output = scheduler.schedule()
+        self.assertEqual(output.num_scheduled_tokens, {"0": 1000, "1": 500})
+        model_runner_output = ModelRunnerOutput(
+            req_ids=["0", "1"],
+            req_id_to_index={
+                "0": 0,
+                "1": 1
+            },
+            sampled_token_ids=[[], []],
+            logprobs=None,
+            prompt_logprobs_dict={},
+            pooler_output=[])
+        scheduler.update_from_output(output, model_runner_output)
+
+        # The KV cache is exhausted, the partial prefills are preempted
+        # instead of waiting for a decode step which never schedules them.
+        with patch.object(scheduler.kv_cache_manager.block_pool,
+                          "get_num_free_blocks",
+                          return_value=0):
+            output = scheduler.schedule()
+        self.assertEqual(output.num_scheduled_tokens, {})
+        self.assertEqual(scheduler.running, [])
+        self.assertEqual([req.request_id for req in scheduler.waiting],
+                         ["0", "1"])
+        self.assertTrue(
+            all(req.status == RequestStatus.PREEMPTED for req in requests))
+
+        # They are prefilled again once the KV cache is available.
+        output = scheduler.schedule()
+        self.assertEqual(output.num_scheduled_tokens, {"0": 1000, "1": 500})
+
+    def test_schedule_with_lora_prefetch(self):
+        scheduler = self.create_scheduler()
+        scheduler.lora_config = MagicMock(max_loras=4)
+        scheduler.lora_prefetch_depth = 2
+        scheduler.lora_residency = LoRAResidencyTracker(capacity=8)
+        requests = create_requests(num_requests=3)
+        for i, lora_id in enumerate([1, 2, 1]):
+            requests[i].lora_request = LoRARequest(f"adapter_{lora_id}",
+                                                   lora_id,
+                                                   f"/adapters/{lora_id}")
+
+        # Nothing is running, so the adapter is loaded in the step.
+        scheduler.add_request(requests[0])
+        output = scheduler.schedule()
+        self.assertEqual([req.req_id for req in output.scheduled_new_reqs],
+                         ["0"])
+        self.assertEqual(output.prefetch_lora_requests, [])
+
+        # The adapter of request 1 is prefetched while request 2 uses the
+        # resident adapter of request 0.
+        scheduler.add_request(requests[1])
+        scheduler.add_request(requests[2])
+        output = scheduler.schedule()
+        self.assertEqual([req.req_id for req in output.scheduled_new_reqs],
+                         ["2"])
+        self.assertEqual(output.prefetch_lora_requests,
+                         [requests[1].lora_request])
+        self.assertEqual([req.request_id for req in scheduler.waiting],
+                         ["1"])
+
+        output = scheduler.schedule()
+        self.assertEqual([req.req_id for req in output.scheduled_new_reqs],
+                         ["1"])
+        self.assertEqual(output.prefetch_lora_requests, [])
+
+    def test_schedule_with_lora_prefetch_chunked_prefill(self):
+        scheduler = self.create_scheduler()
+        scheduler.scheduler_config.chunked_prefill_enabled = True
+        scheduler.lora_config = MagicMock(max_loras=4)
+        scheduler.lora_prefetch_depth = 2
+        scheduler.lora_residency = LoRAResidencyTracker(capacity=8)
+        # The first request and a chunk of the second one fill the budget.
+        requests = create_requests(num_requests=3,
+                                   num_tokens=MAX_NUM_BATCHED_TOKENS * 3 // 5)
+        for i, request in enumerate(requests):
+            request.lora_request = LoRARequest(f"adapter_{i}", i + 1,
+                                               f"/adapters/{i}")
+            scheduler.add_request(request)
+
+        output = scheduler.schedule()
+        self.assertIsInstance(output, AscendSchedulerOutput)
+        self.assertEqual([req.req_id for req in output.scheduled_new_reqs],
+                         ["0", "1"])
+        self.assertEqual(output.prefetch_lora_requests,
+                         [requests[2].lora_request])
+        self.assertTrue(scheduler.lora_residency.is_resident(1))
@@ -159,6 +159,75 @@ class TestCaMem(PytestBase):
         assert data.cpu_backup_tensor is None
         assert mock_memcpy.called
 
+    @patch("vllm_ascend.device_allocator.camem.unmap_and_release")
+    @patch("vllm_ascend.device_allocator.camem.memcpy_async")
+    def test_sleep_chunked_async_copy(self, mock_memcpy_async, mock_unmap):
+        allocator = CaMemAllocator.get_instance()
+        streams = [MagicMock(npu_stream=1), MagicMock(npu_stream=2)]
+        allocator.copy_streams = streams
+        allocator.copy_chunk_size = 4
+        allocator.num_copies = 0
+
+        handle = (1, 10, 1000, 0)
+        # The existing backup is reused instead of allocating a new one.
+        backup = torch.zeros(10, dtype=torch.uint8)
+        data = AllocationData(handle, "tag1", cpu_backup_tensor=backup)
+        allocator.pointer_to_data = {1000: data}
+
+        with patch(
+                "vllm_ascend.device_allocator.camem.NPUPlatform.is_pin_memory_available",
+                return_value=True):
+            allocator.sleep(offload_tags="tag1")
+
+        cpu_ptr = backup.data_ptr()
+        assert [c.args for c in mock_memcpy_async.call_args_list] == [
+            (cpu_ptr, 10, 1000, 4, 2, 1),
+            (cpu_ptr + 4, 6, 1004, 4, 2, 2),
+            (cpu_ptr + 8, 2, 1008, 2, 2, 1),
+        ]
+        for stream in streams:
+            stream.synchronize.assert_called_once()
+        mock_unmap.assert_called_once_with(handle)
+        assert data.cpu_backup_tensor is backup
+        assert data.cpu_backup_valid
+        allocator.copy_streams = None
+
+    @patch("vllm_ascend.device_allocator.camem.create_and_map")
+    @patch("vllm_ascend.device_allocator.camem.unmap_and_release")
+    @patch("vllm_ascend.device_allocator.camem.memcpy")
+    def test_sleep_skips_unchanged_tags(self, mock_memcpy, mock_unmap,
+                                        mock_create_and_map):
+        allocator = CaMemAllocator.get_instance()
+        allocator.keep_cpu_backup = True
+        allocator.copy_chunk_size = 1 << 20
+        handle = (1, 10, 1000, 0)
+        data = AllocationData(handle, "weights")
+        allocator.pointer_to_data = {1000: data}
+
+        with patch(
+                "vllm_ascend.device_allocator.camem.NPUPlatform.is_pin_memory_available",
+                return_value=False):
+            allocator.sleep(offload_tags="weights")
+            backup = data.cpu_backup_tensor
+            assert mock_memcpy.call_count == 1
+
+            # The backup is kept after waking up.
+            allocator.wake_up()
+            assert data.cpu_backup_tensor is backup
+            assert mock_memcpy.call_count == 2
+
+            # Unchanged memory isn't copied again.
+            allocator.sleep(offload_tags="weights",
+                            unchanged_tags=["weights"])
+            assert mock_memcpy.call_count == 2
+            assert mock_unmap.call_count == 2
+
+            allocator.wake_up()
+            allocator.sleep(offload_tags="weights")
+            assert mock_memcpy.call_count == 4
+            assert data.cpu_backup_tensor is backup
+        allocator.keep_cpu_backup = False
+
     def test_use_memory_pool_context_manager(self):
         allocator = CaMemAllocator.get_instance()
         old_tag = allocator.current_tag
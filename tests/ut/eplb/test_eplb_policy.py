@@ -0,0 +1,72 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.policy import compute_rank_load, rebalance_experts
+
+
+class TestEplbPolicy(TestBase):
+
+    def test_compute_rank_load(self):
+        expert_load = torch.tensor([10, 20, 30, 40])
+        placement = torch.tensor([[0, 1], [2, 3]])
+        self.assertEqual(
+            compute_rank_load(expert_load, placement).tolist(), [30, 70])
+
+        # The load of a replicated expert is split between its replicas.
+        placement = torch.tensor([[3, 0, 1], [3, 2, 1]])
+        self.assertEqual(
+            compute_rank_load(expert_load, placement).tolist(), [40, 60])
+
+    def test_rebalance_experts(self):
+        expert_load = torch.tensor([100, 90, 10, 0])
+        placement = torch.tensor([[0, 1], [2, 3]], dtype=torch.int32)
+        new_placement = rebalance_experts(expert_load, placement)
+
+        self.assertEqual(new_placement.dtype, placement.dtype)
+        self.assertEqual(new_placement.shape, placement.shape)
+        self.assertEqual(sorted(new_placement.flatten().tolist()),
+                         [0, 1, 2, 3])
+        # The two hot experts are no longer on the same rank.
+        self.assertEqual(
+            compute_rank_load(expert_load, new_placement).max().item(), 100)
+        # Expert 0 stays in its slot, its weights are not moved.
+        self.assertEqual(new_placement[0, 0].item(), 0)
+
+    def test_rebalance_experts_balanced(self):
+        expert_load = torch.tensor([10, 10, 10, 10])
+        placement = torch.tensor([[0, 1], [2, 3]])
+        self.assertIs(rebalance_experts(expert_load, placement), placement)
+
+        # Without any load there is nothing to balance either.
+        expert_load = torch.zeros(4, dtype=torch.int64)
+        self.assertIs(rebalance_experts(expert_load, placement), placement)
+
+    def test_rebalance_experts_with_redundant_experts(self):
+        expert_load = torch.tensor([300, 10, 10, 10])
+        placement = torch.tensor([[0, 1, 2], [3, 1, 2]])
+        new_placement = rebalance_experts(expert_load, placement)
+
+        # The redundant slots go to the hottest experts, one replica per rank
+        # at most.
+        self.assertEqual(
+            torch.bincount(new_placement.flatten()).tolist(), [2, 2, 1, 1])
+        for rank_placement in new_placement.tolist():
+            self.assertEqual(len(set(rank_placement)), len(rank_placement))
+        self.assertEqual(set(new_placement.flatten().tolist()), {0, 1, 2, 3})
+        self.assertLess(
+            compute_rank_load(expert_load, new_placement).max(),
+            compute_rank_load(expert_load, placement).max())
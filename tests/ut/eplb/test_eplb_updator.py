@@ -0,0 +1,158 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+from unittest.mock import MagicMock, patch
+
+import torch
+from torch import nn
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.eplb_updator import (EplbUpdator, compute_rank_maps,
+                                           get_expert_tensors)
+
+
+class FakeMoELayer(nn.Module):
+
+    def __init__(self, moe_instance_id, placement, rank=0):
+        super().__init__()
+        num_slots = placement.shape[1]
+        self.moe_instance_id = moe_instance_id
+        self.local_num_experts = num_slots
+        self.global_num_experts = int(placement.max()) + 1
+        # The weight of each slot is the id of the expert it holds.
+        self.w13_weight = nn.Parameter(placement[rank].float().view(
+            -1, 1, 1).repeat(1, 2, 2),
+                                       requires_grad=False)
+        self.w2_weight_scale = placement[rank].float().view(-1, 1).clone()
+        self.e_score_correction_bias = torch.zeros(num_slots)
+        self.expert_placement = placement
+        self.expert_map, self.log2phy = compute_rank_maps(
+            placement, rank, self.global_num_experts)
+        self.expert_load = torch.zeros(self.global_num_experts,
+                                       dtype=torch.int64)
+
+
+class TestComputeRankMaps(TestBase):
+
+    def test_compute_rank_maps(self):
+        placement = torch.tensor([[0, 1], [2, 3]])
+        expert_map, log2phy = compute_rank_maps(placement, 1, 4)
+        self.assertEqual(expert_map.tolist(), [-1, -1, 0, 1])
+        self.assertEqual(log2phy.tolist(), [0, 1, 2, 3])
+
+    def test_compute_rank_maps_with_redundant_experts(self):
+        placement = torch.tensor([[0, 1, 2], [3, 0, 1], [2, 3, 0]])
+        expert_map, log2phy = compute_rank_maps(placement, 0, 4)
+        self.assertEqual(expert_map.tolist(), [0, 1, 2, -1])
+        # Local replicas first, otherwise the replicas are spread by rank.
+        self.assertEqual(log2phy.tolist(), [0, 1, 2, 3])
+
+        expert_map, log2phy = compute_rank_maps(placement, 2, 4)
+        self.assertEqual(expert_map.tolist(), [2, -1, 0, 1])
+        self.assertEqual(log2phy.tolist(), [8, 1, 6, 7])
+
+
+class TestEplbUpdator(TestBase):
+
+    def setUp(self):
+        self.ep_group = MagicMock()
+        self.ep_group.rank_in_group = 0
+        self.ep_group.ranks = [0, 1]
+        self.ep_group.all_reduce.side_effect = lambda tensor: tensor
+        patcher = patch("vllm_ascend.eplb.eplb_updator.get_ep_group",
+                        return_value=self.ep_group)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_updator(self, layers, update=4, wait=2):
+        model = nn.ModuleList(layers)
+        updator = EplbUpdator(model, update, wait)
+        self.addCleanup(updator.shutdown)
+        return updator
+
+    def test_get_expert_tensors(self):
+        layer = FakeMoELayer(0, torch.tensor([[0, 1], [2, 3]]))
+        # Tensors are matched by name, not by their number of rows.
+        layer.gate_bias = torch.zeros(layer.local_num_experts)
+        self.assertEqual(list(get_expert_tensors(layer)),
+                         ["w13_weight", "w2_weight_scale"])
+
+    def test_init_sorts_moe_layers(self):
+        placement = torch.tensor([[0, 1], [2, 3]])
+        layers = [FakeMoELayer(1, placement), FakeMoELayer(0, placement)]
+        layers[0].expert_load = None
+        updator = self._make_updator(layers + [nn.Linear(2, 2)])
+        self.assertEqual(updator.moe_layers, [layers[1]])
+
+    def test_step(self):
+        layer = FakeMoELayer(0, torch.tensor([[0, 1], [2, 3]]))
+        updator = self._make_updator([layer])
+        new_placement = torch.tensor([[0, 2], [1, 3]])
+        with patch.object(updator, "_compute_placements",
+                          return_value=[new_placement]) as mock_compute, \
+                patch.object(updator, "_apply_placements") as mock_apply:
+            layer.expert_load += 3
+            for _ in range(3):
+                updator.step()
+            mock_compute.assert_not_called()
+
+            # End of the window: the load is collected and reset.
+            updator.step()
+            updator.pending_placements.result()
+            mock_compute.assert_called_once()
+            self.assertEqual(mock_compute.call_args[0][0].tolist(),
+                             [[3, 3, 3, 3]])
+            self.assertEqual(layer.expert_load.tolist(), [0, 0, 0, 0])
+            self.ep_group.all_reduce.assert_called_once()
+
+            updator.step()
+            mock_apply.assert_not_called()
+            # The new placement is applied after the wait iterations.
+            updator.step()
+            mock_apply.assert_called_once_with([new_placement])
+            self.assertIsNone(updator.pending_placements)
+
+    def test_apply_placements_local_moves(self):
+        self.ep_group.ranks = [0]
+        layer = FakeMoELayer(0, torch.tensor([[0, 1, 2, 3]]))
+        updator = self._make_updator([layer])
+        new_placement = torch.tensor([[3, 2, 1, 0]])
+        with patch("torch.distributed.batch_isend_irecv") as mock_p2p:
+            updator._apply_placements([new_placement])
+        mock_p2p.assert_not_called()
+
+        self.assertEqual(layer.w13_weight[:, 0, 0].tolist(), [3, 2, 1, 0])
+        self.assertEqual(layer.w2_weight_scale[:, 0].tolist(), [3, 2, 1, 0])
+        self.assertEqual(layer.expert_map.tolist(), [3, 2, 1, 0])
+        self.assertEqual(layer.log2phy.tolist(), [3, 2, 1, 0])
+        self.assertIs(layer.expert_placement, new_placement)
+
+    @patch("torch.distributed.batch_isend_irecv")
+    @patch("torch.distributed.P2POp")
+    def test_apply_placements_exchange(self, mock_p2p_op, mock_batch):
+        layer = FakeMoELayer(0, torch.tensor([[0, 1], [2, 3]]))
+        updator = self._make_updator([layer])
+        mock_batch.return_value = [MagicMock()]
+
+        updator._apply_placements([torch.tensor([[0, 2], [1, 3]])])
+
+        # Slot 1 of rank 0 receives expert 2, expert 1 is sent to rank 1,
+        # for each of the two expert tensors.
+        self.assertEqual(mock_p2p_op.call_count, 4)
+        ops = [call.args[0] for call in mock_p2p_op.call_args_list]
+        self.assertEqual(ops, [torch.distributed.irecv] * 2 +
+                         [torch.distributed.isend] * 2)
+        mock_batch.return_value[0].wait.assert_called_once()
+        self.assertEqual(layer.expert_map.tolist(), [0, -1, 1, -1])
+        self.assertEqual(layer.log2phy.tolist(), [0, 2, 1, 3])
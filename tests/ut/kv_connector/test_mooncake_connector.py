@@ -1,3 +1,4 @@
+import itertools
 import os
 import queue
 import socket
@@ -18,8 +19,8 @@ fake_engine.TransferEngine = MagicMock()  # type: ignore[attr-defined]
 sys.modules["mooncake.engine"] = fake_engine
 
 from vllm_ascend.distributed.mooncake_connector import (  # noqa: E402
-    KVCacheRecvingThread, KVCacheSendingThread, KVCacheTaskTracker,
-    KVConnectorRole, MooncakeAgentMetadata, MooncakeConnector,
+    KVCacheLayerTracker, KVCacheRecvingThread, KVCacheSendingThread,
+    KVCacheTaskTracker, KVConnectorRole, MooncakeAgentMetadata, MooncakeConnector,
     MooncakeConnectorMetadata, MooncakeConnectorScheduler,
     MooncakeConnectorWorker, ReqMeta, ensure_zmq_recv, ensure_zmq_send,
     group_concurrent_contiguous, string_to_int64_hash, zmq_ctx)
@@ -75,6 +76,112 @@ class TestGetAndClearFinishedSingleRequests(unittest.TestCase):
         self.assertEqual(len(self.tracker.finished_requests), 0)
 
 
+class TestKVCacheLayerTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = KVCacheLayerTracker()
+
+    @staticmethod
+    def _event(ready):
+        event = MagicMock()
+        event.query.return_value = ready
+        return event
+
+    def test_unknown_request(self):
+        self.assertEqual(self.tracker.get_progress("req1"), ([], 0, False))
+
+    def test_ready_layers_form_a_prefix(self):
+        self.tracker.start_step({"req1": [1, 2], "req2": [3]})
+        self.tracker.record_layer("layer0", self._event(True))
+        self.tracker.record_layer("layer1", self._event(False))
+        self.tracker.record_layer("layer2", self._event(True))
+        self.tracker.record_layer("layer3", self._event(True))
+        self.assertEqual(self.tracker.get_progress("req1"), ([1, 2], 1, False))
+        self.assertEqual(self.tracker.get_progress("req2"), ([3], 1, False))
+
+    def test_layer_saved_per_micro_batch(self):
+        # Under DBO each layer saves its KV once per micro batch.
+        self.tracker.start_step({"req1": [1]})
+        self.tracker.record_layer("layer0", self._event(True))
+        self.tracker.record_layer("layer0", self._event(True))
+        self.tracker.record_layer("layer1", self._event(True))
+        # The second micro batch of layer1 is not saved yet.
+        self.assertEqual(self.tracker.get_progress("req1"), ([1], 1, False))
+        self.tracker.record_layer("layer1", self._event(False))
+        self.tracker.record_layer("layer2", self._event(True))
+        self.assertEqual(self.tracker.get_progress("req1"), ([1], 1, False))
+        self.tracker.finish_step(self._event(False))
+        self.assertEqual(self.tracker.get_progress("req1"), ([1], 1, False))
+
+    def test_finish_step(self):
+        self.tracker.start_step({"req1": [1, 2]})
+        self.tracker.record_layer("layer0", self._event(True))
+        self.tracker.finish_step(self._event(True))
+        self.assertIsNone(self.tracker.current_step)
+        self.assertEqual(self.tracker.get_progress("req1"), ([1, 2], 1, True))
+
+    def test_step_without_requests_is_not_tracked(self):
+        self.tracker.start_step({})
+        self.tracker.record_layer("layer0", self._event(True))
+        self.tracker.finish_step(self._event(True))
+        self.assertEqual(self.tracker.requests, {})
+
+    def test_remove_requests(self):
+        self.tracker.start_step({"req1": [1], "req2": [2]})
+        self.tracker.remove_requests({"req1", "req3"})
+        self.assertEqual(list(self.tracker.requests), ["req2"])
+
+
+class TestLayerwiseSaveFromMLA(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = KVCacheLayerTracker()
+        worker = MooncakeConnectorWorker.__new__(MooncakeConnectorWorker)
+        worker.kv_send_thread = MagicMock(layer_tracker=self.tracker)
+        worker.use_layerwise = True
+        self.connector = MooncakeConnector.__new__(MooncakeConnector)
+        self.connector.connector_worker = worker
+
+    @patch('vllm_ascend.distributed.mooncake_connector.torch.npu.Event')
+    @patch('vllm_ascend.attention.attention_v1.is_v1_kv_transfer_group',
+           return_value=True)
+    @patch('vllm_ascend.attention.attention_v1.has_kv_transfer_group',
+           return_value=True)
+    @patch('vllm_ascend.attention.attention_v1.get_kv_transfer_group')
+    @patch('vllm_ascend.attention.attention_v1.get_forward_context')
+    @patch('vllm_ascend.models.layers.mla.get_forward_context')
+    def test_mla_layer_records_event(self, mock_mla_ctx, mock_attn_ctx,
+                                     mock_get_group, mock_has_group,
+                                     mock_is_v1, mock_event):
+        import torch
+
+        from vllm_ascend.models.layers.mla import \
+            AscendMultiHeadLatentAttention
+        forward_context = MagicMock(attn_metadata=MagicMock())
+        mock_mla_ctx.return_value = forward_context
+        mock_attn_ctx.return_value = forward_context
+        mock_get_group.return_value = self.connector
+
+        layer = MagicMock(enable_shared_expert_dp=False,
+                          debug_layer_idx=0,
+                          first_k_dense_replace=0,
+                          layers=1,
+                          tp_size=1)
+        layer.mla_attn.layer_name = "model.layers.0.self_attn.attn"
+        layer.mla_attn.impl.forward.return_value = torch.zeros(2, 8)
+
+        self.tracker.start_step({"req1": [1, 2]})
+        AscendMultiHeadLatentAttention.forward(layer, torch.arange(2),
+                                               torch.randn(2, 8),
+                                               MagicMock())
+
+        layer_events = self.tracker.current_step.layer_events
+        self.assertEqual(
+            layer_events,
+            {"model.layers.0.self_attn.attn": [mock_event.return_value]})
+        mock_event.return_value.record.assert_called_once()
+
+
 class TestKVCacheSendingThreadInit(unittest.TestCase):
 
     def setUp(self):
@@ -246,11 +353,12 @@ class TestSocketManagement(unittest.TestCase):
             block_len=[1024, 2048],
             ready_event=self.ready_event)
         self.thread.remote_sockets = defaultdict(deque)
-        self.thread.remote_poller = MagicMock()
 
+    @patch('vllm_ascend.distributed.mooncake_connector.zmq.Poller')
     @patch('vllm_ascend.distributed.mooncake_connector.zmq.Context')
     @patch('vllm_ascend.distributed.mooncake_connector.make_zmq_socket')
-    def test_get_remote_socket(self, mock_make_socket, mock_context):
+    def test_get_remote_socket(self, mock_make_socket, mock_context,
+                               mock_poller):
         mock_sock = MagicMock()
         mock_make_socket.return_value = mock_sock
         test_host = "test_host"
@@ -264,7 +372,10 @@ class TestSocketManagement(unittest.TestCase):
         self.assertEqual(kwargs.get('path'), 'tcp://test_host:12345')
         self.assertEqual(kwargs.get('socket_type'), zmq.REQ)  # type: ignore
         self.assertFalse(kwargs.get('bind', True))
-        self.thread.remote_poller.register.assert_called_with(
+        # Each socket owns its poller.
+        self.assertIs(self.thread.remote_pollers[mock_sock],
+                      mock_poller.return_value)
+        mock_poller.return_value.register.assert_called_with(
             mock_sock, zmq.POLLIN)  # type: ignore
 
     def test_return_socket_to_pool(self):
@@ -277,7 +388,29 @@ class TestSocketManagement(unittest.TestCase):
 
         self.assertEqual(len(self.thread.remote_sockets[test_path]), 1)
         self.assertEqual(self.thread.remote_sockets[test_path][0], mock_sock)
-        self.thread.remote_poller.register.assert_not_called()
+        self.assertNotIn(mock_sock, self.thread.remote_pollers)
+
+    def test_failed_exchange_drops_remote_sockets(self):
+        test_host = "test_host"
+        test_port = 12345
+        test_path = make_zmq_path("tcp", test_host, test_port)
+        failed_sock, idle_sock = MagicMock(), MagicMock()
+        self.thread.remote_sockets[test_path].append(idle_sock)
+        self.thread.remote_pollers[failed_sock] = MagicMock()
+        self.thread.remote_pollers[idle_sock] = MagicMock()
+
+        with patch.object(self.thread, '_get_remote_socket',
+                          return_value=failed_sock), \
+                self.assertRaises(RuntimeError):
+            with self.thread._remote_socket(test_host, test_port):
+                raise RuntimeError("Remote engine is gone")
+
+        # The remote leaves no socket nor poller behind.
+        self.assertNotIn(test_path, self.thread.remote_sockets)
+        self.assertEqual(self.thread.remote_pollers, {})
+        for sock in (failed_sock, idle_sock):
+            sock.close.assert_called_once_with(linger=0)
+            sock.context.term.assert_called_once()
 
 
 class TestCoreFunctionality(unittest.TestCase):
@@ -311,21 +444,34 @@ class TestCoreFunctionality(unittest.TestCase):
 
     @patch.object(KVCacheRecvingThread, '_transfer_kv_cache')
     @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
-    def test_handle_request(self, mock_send, mock_transfer):
-        self.thread._handle_request(self.test_req)
-        mock_transfer.assert_called_once_with(self.test_req)
+    def test_handle_requests(self, mock_send, mock_transfer):
+        self.thread._handle_requests([self.test_req])
+        mock_transfer.assert_called_once_with([self.test_req])
         mock_send.assert_called_once_with("req1", "localhost", 6666)
         self.thread.task_tracker.update_done_task_count.assert_called_once_with(
             "req1")
         self.mock_queue.task_done.assert_called_once()
 
+    @patch.object(KVCacheRecvingThread,
+                  '_transfer_kv_cache',
+                  side_effect=RuntimeError("transfer failed"))
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_handle_requests_failure_still_signals_done(
+            self, mock_send, mock_transfer):
+        req2 = dict(self.test_req, request_id="req2")
+        self.thread._handle_requests([self.test_req, req2])
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertEqual(self.mock_queue.task_done.call_count, 2)
+        self.assertEqual(
+            self.thread.task_tracker.update_done_task_count.call_count, 2)
+
     @patch.object(KVCacheRecvingThread, '_get_remote_metadata')
     def test_transfer_kv_cache(self, mock_get_meta):
         self.thread.kv_caches_base_addr["remote_engine"] = {
             6666: [0x3000, 0x4000]
         }
 
-        self.thread._transfer_kv_cache(self.test_req)
+        self.thread._transfer_kv_cache([self.test_req])
 
         self.engine.batch_transfer_sync_read.assert_called_once()
         call_args, call_kwargs = self.engine.batch_transfer_sync_read.call_args
@@ -344,7 +490,210 @@ class TestCoreFunctionality(unittest.TestCase):
         }
 
         with self.assertRaises(RuntimeError):
-            self.thread._transfer_kv_cache(self.test_req)
+            self.thread._transfer_kv_cache([self.test_req])
+
+    @patch.object(KVCacheRecvingThread, '_get_remote_metadata')
+    def test_transfer_kv_cache_merges_requests(self, mock_get_meta):
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000]
+        }
+        req2 = dict(self.test_req,
+                    request_id="req2",
+                    local_block_ids=[3, 4],
+                    remote_block_ids=[5, 6])
+        req3 = dict(self.test_req,
+                    request_id="req3",
+                    local_block_ids=[],
+                    remote_block_ids=[])
+
+        self.thread._transfer_kv_cache([self.test_req, req2, req3])
+
+        # One batched transfer for all the requests, the contiguous block
+        # ranges of req1 and req2 are merged into one range per layer.
+        self.engine.batch_transfer_sync_read.assert_called_once()
+        call_args, _ = self.engine.batch_transfer_sync_read.call_args
+        self.assertEqual(call_args[1], [0x1000 + 1 * 1024, 0x2000 + 1 * 2048])
+        self.assertEqual(call_args[2], [0x3000 + 3 * 1024, 0x4000 + 3 * 2048])
+        self.assertEqual(call_args[3], [4 * 1024, 4 * 2048])
+
+    def test_transfer_kv_cache_full_prefix_hit(self):
+        req = dict(self.test_req, local_block_ids=[], remote_block_ids=[])
+        self.thread._transfer_kv_cache([req])
+        self.engine.batch_transfer_sync_read.assert_not_called()
+
+    @patch.object(KVCacheRecvingThread, '_transfer_kv_cache_layerwise')
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_handle_layerwise_request(self, mock_send, mock_layerwise):
+        req = dict(self.test_req, layerwise=True)
+        self.thread._handle_requests([req])
+        mock_layerwise.assert_called_once_with(req)
+        mock_send.assert_called_once_with("req1", "localhost", 6666)
+
+    @patch('time.sleep')
+    @patch.object(KVCacheRecvingThread, '_get_layer_progress')
+    def test_transfer_kv_cache_layerwise(self, mock_progress, mock_sleep):
+        # 2 layers, each registers 2 regions.
+        self.thread.kv_caches_base_addr["local_engine"][5555] = [
+            0x1000, 0x2000, 0x5000, 0x6000
+        ]
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000, 0x7000, 0x8000]
+        }
+        mock_progress.side_effect = [
+            ([], 0, False),
+            ([3, 4], 1, False),
+            ([3, 4], 1, False),
+            ([3, 4], 1, True),
+        ]
+
+        self.thread._transfer_kv_cache_layerwise(self.test_req)
+
+        self.assertEqual(mock_progress.call_count, 4)
+        self.assertEqual(mock_sleep.call_count, 2)
+        calls = self.engine.batch_transfer_sync_read.call_args_list
+        self.assertEqual(len(calls), 2)
+        # The first layer is pulled as soon as it is ready.
+        self.assertEqual(calls[0].args[1],
+                         [0x1000 + 1 * 1024, 0x2000 + 1 * 2048])
+        self.assertEqual(calls[0].args[2],
+                         [0x3000 + 3 * 1024, 0x4000 + 3 * 2048])
+        self.assertEqual(calls[0].args[3], [2 * 1024, 2 * 2048])
+        self.assertEqual(calls[1].args[1],
+                         [0x5000 + 1 * 1024, 0x6000 + 1 * 2048])
+        self.assertEqual(calls[1].args[2],
+                         [0x7000 + 3 * 1024, 0x8000 + 3 * 2048])
+
+    @patch.object(KVCacheRecvingThread,
+                  '_get_layer_progress',
+                  return_value=([3, 4, 5], 1, True))
+    def test_transfer_kv_cache_layerwise_prefix_hit(self, mock_progress):
+        self.thread.kv_caches_base_addr["local_engine"][5555] = [
+            0x1000, 0x2000
+        ]
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000]
+        }
+        # The first prompt block hit the local prefix cache, the local
+        # blocks are the tail of the prompt.
+        req = dict(self.test_req, local_block_ids=[7, 8])
+
+        self.thread._transfer_kv_cache_layerwise(req)
+
+        args = self.engine.batch_transfer_sync_read.call_args.args
+        self.assertEqual(args[1], [0x1000 + 7 * 1024, 0x2000 + 7 * 2048])
+        self.assertEqual(args[2], [0x3000 + 4 * 1024, 0x4000 + 4 * 2048])
+
+    @patch.object(KVCacheRecvingThread,
+                  '_get_layer_progress',
+                  return_value=([3], 1, True))
+    def test_transfer_kv_cache_layerwise_block_mismatch(self, mock_progress):
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000]
+        }
+        with self.assertRaisesRegex(RuntimeError, "blocks to pull"):
+            self.thread._transfer_kv_cache_layerwise(self.test_req)
+        self.engine.batch_transfer_sync_read.assert_not_called()
+
+    @patch('time.sleep')
+    @patch.object(KVCacheRecvingThread,
+                  '_get_layer_progress',
+                  return_value=([], 0, False))
+    def test_transfer_kv_cache_layerwise_timeout(self, mock_progress,
+                                                 mock_sleep):
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000]
+        }
+        clock = itertools.chain([0, 1], itertools.repeat(1e9))
+        with patch('time.time', side_effect=clock):
+            with self.assertRaises(RuntimeError):
+                self.thread._transfer_kv_cache_layerwise(self.test_req)
+        self.engine.batch_transfer_sync_read.assert_not_called()
+
+
+class TestRequestDispatching(unittest.TestCase):
+
+    def setUp(self):
+        self.thread = KVCacheRecvingThread(
+            tp_rank=0,
+            tp_size=4,
+            engine=MagicMock(),
+            local_engine_id="local_engine",
+            local_handshake_port=5555,
+            local_kv_caches_base_addr=[0x1000, 0x2000],
+            block_len=[1024, 2048],
+            ready_event=threading.Event())
+        self.thread.executor = MagicMock()
+        self.thread.max_inflight_per_remote = 2
+
+    @staticmethod
+    def make_req(request_id, remote_engine_id="remote_engine"):
+        return {
+            "request_id": request_id,
+            "local_block_ids": [1],
+            "remote_block_ids": [2],
+            "remote_engine_id": remote_engine_id,
+            "remote_host": "localhost",
+            "remote_handshake_port": 6666,
+        }
+
+    def submitted_batches(self):
+        return [
+            call.args[2] for call in self.thread.executor.submit.call_args_list
+        ]
+
+    def test_bounded_inflight_per_remote(self):
+        for i in range(3):
+            self.thread._enqueue_request(self.make_req(f"req{i}"))
+
+        # The first two requests take the two slots, the third one waits.
+        self.assertEqual(
+            [[req["request_id"] for req in batch]
+             for batch in self.submitted_batches()], [["req0"], ["req1"]])
+        remote = ("remote_engine", "localhost", 6666)
+        self.assertEqual(self.thread.num_inflight[remote], 2)
+        self.assertEqual(len(self.thread.pending_requests[remote]), 1)
+
+        # Other remote engines are not blocked.
+        self.thread._enqueue_request(self.make_req("req3", "other_engine"))
+        self.assertEqual(len(self.submitted_batches()), 3)
+
+    @patch.object(KVCacheRecvingThread, '_handle_requests')
+    def test_pending_requests_are_merged(self, mock_handle):
+        remote = ("remote_engine", "localhost", 6666)
+        for i in range(2):
+            self.thread._enqueue_request(self.make_req(f"req{i}"))
+        for i in range(2, 6):
+            self.thread._enqueue_request(self.make_req(f"req{i}"))
+
+        # Finishing a batch releases a slot, all the 4 pending requests
+        # are pulled by one batch.
+        self.thread._run_batch(remote, self.submitted_batches()[0])
+        batches = self.submitted_batches()
+        self.assertEqual([req["request_id"] for req in batches[-1]],
+                         ["req2", "req3", "req4", "req5"])
+        self.assertNotIn(remote, self.thread.pending_requests)
+        self.assertEqual(self.thread.num_inflight[remote], 2)
+
+        # Once every batch finished, nothing is kept for the remote.
+        for batch in batches[1:]:
+            self.thread._run_batch(remote, batch)
+        self.assertNotIn(remote, self.thread.pending_requests)
+        self.assertNotIn(remote, self.thread.num_inflight)
+
+    def test_layerwise_requests_are_bounded(self):
+        remote = ("remote_engine", "localhost", 6666)
+        for i in range(3):
+            req = self.make_req(f"req{i}")
+            req["layerwise"] = True
+            self.thread._enqueue_request(req)
+        self.thread._enqueue_request(self.make_req("req3"))
+
+        # Layerwise pulls take a slot each and are not merged.
+        self.assertEqual(
+            [[req["request_id"] for req in batch]
+             for batch in self.submitted_batches()], [["req0"], ["req1"]])
+        self.assertEqual(self.thread.num_inflight[remote], 2)
+        self.assertEqual(len(self.thread.pending_requests[remote]), 2)
 
 
 class TestMetadataHandling(unittest.TestCase):
@@ -376,6 +725,7 @@ class TestMetadataHandling(unittest.TestCase):
                 patch.object(self.thread, '_return_remote_socket') as mock_return_socket:
             mock_socket = MagicMock()
             mock_get_socket.return_value = mock_socket
+            self.thread.remote_pollers[mock_socket] = MagicMock()
 
             self.thread._get_remote_metadata("host1", 5555)
 
@@ -384,8 +734,8 @@ class TestMetadataHandling(unittest.TestCase):
                                                        5555)
             mock_send.assert_called_once_with(
                 mock_socket, self.thread.encoder.encode((GET_META_MSG, "")))
-            mock_recv.assert_called_once_with(mock_socket,
-                                              self.thread.remote_poller)
+            mock_recv.assert_called_once_with(
+                mock_socket, self.thread.remote_pollers[mock_socket])
             self.assertEqual(
                 self.thread.kv_caches_base_addr["remote_engine"][5555],
                 [0x3000, 0x4000])
@@ -398,12 +748,16 @@ class TestMetadataHandling(unittest.TestCase):
                 patch.object(self.thread, '_return_remote_socket') as mock_return_socket:
             mock_socket = MagicMock()
             mock_get_socket.return_value = mock_socket
+            self.thread.remote_pollers[mock_socket] = MagicMock()
 
             with self.assertRaises(Exception) as context:
                 self.thread._get_remote_metadata("host1", 5555)
 
             self.assertEqual(str(context.exception), "Network error")
-            mock_return_socket.assert_called_once()
+            # A socket that failed is closed instead of being pooled.
+            mock_return_socket.assert_not_called()
+            mock_socket.close.assert_called_once_with(linger=0)
+            self.assertNotIn(mock_socket, self.thread.remote_pollers)
 
 
 class TestMainThreadLoop(unittest.TestCase):
@@ -422,7 +776,7 @@ class TestMainThreadLoop(unittest.TestCase):
             ready_event=self.ready_event)
         self.thread.request_queue = queue.Queue()
 
-    @patch.object(KVCacheRecvingThread, '_handle_request')
+    @patch.object(KVCacheRecvingThread, '_handle_requests')
     def test_run_loop_normal(self, mock_handle):
         test_request = {
             "request_id": "req1",
@@ -442,7 +796,7 @@ class TestMainThreadLoop(unittest.TestCase):
         self.thread.join(timeout=1.0)
 
         self.assertTrue(self.thread.ready_event.is_set())
-        mock_handle.assert_called_once_with(test_request)
+        mock_handle.assert_called_once_with([test_request])
         self.assertTrue(self.thread.request_queue.empty())
 
 
@@ -473,6 +827,30 @@ class MockVllmConfig:
         }.get(k, d)
 
 
+class TestLayerwiseConfig(unittest.TestCase):
+
+    def make_config(self, chunked_prefill_enabled, max_num_batched_tokens):
+        config = MockVllmConfig()
+        config.kv_transfer_config.get_from_extra_config.side_effect = \
+            lambda k, d: True if k == "use_layerwise" else d
+        config.scheduler_config = MagicMock(
+            chunked_prefill_enabled=chunked_prefill_enabled,
+            max_num_batched_tokens=max_num_batched_tokens)
+        config.model_config.max_model_len = 4096
+        return config
+
+    def test_chunked_prefill_is_rejected(self):
+        for config in (self.make_config(True, 8192),
+                       self.make_config(False, 2048)):
+            with self.assertRaises(ValueError):
+                MooncakeConnector(config, KVConnectorRole.SCHEDULER)
+
+    def test_whole_prompt_in_one_step(self):
+        connector = MooncakeConnector(self.make_config(False, 4096),
+                                      KVConnectorRole.SCHEDULER)
+        self.assertIsNotNone(connector.connector_scheduler)
+
+
 class MockRequest:
 
     def __init__(self,
@@ -520,6 +898,16 @@ class TestKVCacheTaskTracker(unittest.TestCase):
         self.assertEqual(len(result_delay), 1)
         self.assertEqual(result_delay[0], ("req_2", current_time))
 
+    def test_done_before_delayed_request(self):
+        self.tracker.update_done_task_count("req_1")
+        self.tracker.add_delayed_request("req_1", time.time() - 600)
+        self.assertEqual(len(self.tracker.delayed_free_requests), 0)
+        self.assertEqual(self.tracker.get_and_clear_finished_requests(),
+                         {"req_1"})
+        # The request is not force freed a second time.
+        self.assertEqual(self.tracker.get_and_clear_finished_requests(),
+                         set())
+
     def test_duplicate_task_update(self):
         self.tracker.update_done_task_count("req1")
         self.tracker.update_done_task_count("req1")
@@ -742,6 +1130,36 @@ class TestMooncakeConnectorScheduler(unittest.TestCase):
         self.assertEqual(self.scheduler._reqs_need_recv["req1"][0], request)
         self.assertEqual(self.scheduler._reqs_need_recv["req1"][1], [4, 5, 6])
 
+    def test_update_state_after_alloc_layerwise_prefill(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={
+                                  "do_remote_decode": True,
+                                  "layerwise": True
+                              })
+        blocks = MagicMock()
+        blocks.get_block_ids.return_value = [[1, 2]]
+        self.scheduler.update_state_after_alloc(request, blocks, 0)
+        meta = self.scheduler.build_connector_meta(MockSchedulerOutput())
+        self.assertEqual(meta.requests_to_save, {"req1": [1, 2]})
+        self.assertEqual(self.scheduler._reqs_need_save, {})
+
+    def test_update_state_after_alloc_layerwise_decode(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={
+                                  "do_remote_prefill": True,
+                                  "remote_block_ids": None,
+                                  "remote_engine_id": "remote",
+                                  "remote_host": "localhost",
+                                  "remote_port": 5000,
+                                  "layerwise": True
+                              })
+        blocks = MockKVCacheBlocks()
+        self.scheduler.update_state_after_alloc(request, blocks, 3)
+        self.assertEqual(self.scheduler._reqs_need_recv["req1"][1], [4, 5, 6])
+        meta = self.scheduler.build_connector_meta(MockSchedulerOutput())
+        self.assertEqual(meta.requests["req1"].remote_block_ids, [])
+        self.assertTrue(meta.requests["req1"].layerwise)
+
     def test_request_finished_no_remote_decode(self):
         request = MockRequest("req1")
         delay_free, params = self.scheduler.request_finished(
@@ -0,0 +1,113 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+import torch
+from vllm.lora.request import LoRARequest
+
+from vllm_ascend.lora.adapter_cache import (LoRAAdapterPrefetcher,
+                                            LoRAResidencyTracker,
+                                            pin_lora_model)
+
+
+def make_lora_request(lora_id, load_inplace=False):
+    return LoRARequest(f"adapter_{lora_id}",
+                       lora_id,
+                       f"/adapters/{lora_id}",
+                       load_inplace=load_inplace)
+
+
+class FakeLoader:
+    """Load an empty adapter, the loads of `blocked_ids` wait for
+    `release`."""
+
+    def __init__(self, blocked_ids=()):
+        self.blocked_ids = set(blocked_ids)
+        self.release = threading.Event()
+        self.loaded_ids = []
+
+    def __call__(self, lora_request):
+        if lora_request.lora_int_id in self.blocked_ids:
+            self.release.wait(timeout=10)
+        self.loaded_ids.append(lora_request.lora_int_id)
+        return MagicMock(loras={}, id=lora_request.lora_int_id)
+
+
+def test_prefetched_adapter_is_not_loaded_again():
+    loader = FakeLoader(blocked_ids={1})
+    prefetcher = LoRAAdapterPrefetcher(loader, max_num_prefetched=4)
+    prefetcher.prefetch(make_lora_request(1))
+    # The prefetch runs in the background.
+    assert loader.loaded_ids == []
+    loader.release.set()
+
+    lora_model = prefetcher.load_adapter(make_lora_request(1))
+    assert lora_model.id == 1
+    assert loader.loaded_ids == [1]
+    # The adapters which were not prefetched are loaded synchronously.
+    assert prefetcher.load_adapter(make_lora_request(2)).id == 2
+    assert loader.loaded_ids == [1, 2]
+    prefetcher.shutdown()
+
+
+def test_prefetch_drops_the_oldest_adapters():
+    loader = FakeLoader()
+    prefetcher = LoRAAdapterPrefetcher(loader, max_num_prefetched=2)
+    for lora_id in (1, 2, 3):
+        prefetcher.prefetch(make_lora_request(lora_id))
+    prefetcher.shutdown()
+    assert list(prefetcher._prefetched) == [2, 3]
+
+
+def test_failed_prefetch_loads_synchronously():
+    load = MagicMock(side_effect=[OSError("no adapter"), MagicMock(loras={})])
+    prefetcher = LoRAAdapterPrefetcher(load, max_num_prefetched=2)
+    prefetcher.prefetch(make_lora_request(1))
+    prefetcher.load_adapter(make_lora_request(1))
+    assert load.call_count == 2
+
+    # A failing synchronous load raises as before.
+    load.side_effect = [OSError("no adapter")]
+    with pytest.raises(OSError):
+        prefetcher.load_adapter(make_lora_request(1))
+    prefetcher.shutdown()
+
+
+def test_pin_lora_model():
+    lora = MagicMock()
+    lora.lora_a = torch.zeros(2, 4)
+    lora.lora_b = [torch.zeros(4, 2), None]
+    lora.bias = None
+    lora.embeddings_tensor = None
+    pinned = torch.ones(1)
+    with patch.object(torch.Tensor, "pin_memory", return_value=pinned):
+        pin_lora_model(MagicMock(loras={"layer": lora}))
+    assert lora.lora_a is pinned
+    assert lora.lora_b[0] is pinned and lora.lora_b[1] is None
+    assert lora.bias is None
+
+
+def test_lora_residency_tracker():
+    tracker = LoRAResidencyTracker(capacity=2)
+    tracker.touch(1)
+    tracker.touch(2)
+    tracker.touch(1)
+    tracker.touch(3)
+    # The least recently used adapter is evicted.
+    assert tracker.is_resident(1)
+    assert not tracker.is_resident(2)
+    assert tracker.is_resident(3)
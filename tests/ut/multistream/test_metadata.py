@@ -164,6 +164,7 @@ class TestMetaData(TestBase):
         multistream_config.num_micro_batches = 2
         multistream_config.min_total_tokens_to_split = 256
         multistream_config.min_prefill_tokens_to_split = 64
+        multistream_config.min_decode_tokens_to_split = 32
 
         metadata = MultiStreamMetadata(calculate_stream=mock_stream,
                                        communicate_stream=mock_stream,
@@ -179,6 +180,8 @@ class TestMetaData(TestBase):
                          multistream_config.min_total_tokens_to_split)
         self.assertEqual(metadata.ms_split_config.min_prefill_tokens_to_split,
                          multistream_config.min_prefill_tokens_to_split)
+        self.assertEqual(metadata.ms_split_config.min_decode_tokens_to_split,
+                         multistream_config.min_decode_tokens_to_split)
 
     def test_try_wait_event(self):
         mock_stream = MagicMock(spec=torch.npu.Stream)
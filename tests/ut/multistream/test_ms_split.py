@@ -4,6 +4,9 @@ import torch
 
 from tests.ut.base import TestBase
 from vllm_ascend.attention.attention_v1 import AscendAttentionState
+from vllm_ascend.attention.mla_v1 import (AscendMLADecodeMetadata,
+                                          AscendMLAMetadata,
+                                          AscendMLAPrefillMetadata)
 from vllm_ascend.multistream.base import MSAttentionMetadataSplitConfig
 from vllm_ascend.multistream.ms_split import (compute_split_seq_index,
                                               model_input_split_v1_mla_attn,
@@ -34,6 +37,15 @@ class TestMsSplit(TestBase):
             query_lens=query_lens,
             attn_state=AscendAttentionState.PrefillNoCache,
             num_tokens=10)
+        # the third request is split in the middle of the batch
+        self.assertEqual(result, [5, 3])
+
+    def test_imbalance_spec_decoding(self):
+        query_lens = [4, 4, 2]
+        result = compute_split_seq_index(
+            query_lens=query_lens,
+            attn_state=AscendAttentionState.SpecDecoding,
+            num_tokens=10)
         self.assertEqual(result, [0, 0])
 
     def test_query_lens_none(self):
@@ -57,7 +69,7 @@ class TestMsSplit(TestBase):
             query_lens=query_lens,
             attn_state=AscendAttentionState.PrefillNoCache,
             num_tokens=10)
-        self.assertEqual(result, [0, 0])
+        self.assertEqual(result, [5, 1])
 
     def test_split_attn_tensor_type_middle(self):
         input_tensor = torch.tensor([1, 2, 3, 4, 5])
@@ -145,3 +157,146 @@ class TestMsSplit(TestBase):
                                                ascendMLAPrefillMetadata,
                                                ms_split_config)
         self.assertEqual(result, [None])
+
+
+def _make_prefill_metadata(query_lens, context_lens,
+                           attn_state) -> AscendMLAMetadata:
+    num_tokens = sum(query_lens)
+    seq_lens = torch.tensor(context_lens) + torch.tensor(query_lens)
+    query_start_loc = torch.tensor([0] + query_lens).cumsum(0)
+    positions = torch.cat([
+        torch.arange(context_len, seq_len)
+        for context_len, seq_len in zip(context_lens, seq_lens.tolist())
+    ])
+    block_table = torch.arange(len(query_lens)).unsqueeze(1)
+    prefill = AscendMLAPrefillMetadata(
+        attn_mask=None,
+        query_lens=torch.tensor(query_lens),
+        seq_lens=seq_lens,
+        context_lens=seq_lens,
+        input_positions=positions,
+        query_start_loc=query_start_loc,
+        block_table=block_table,
+        max_query_len=max(query_lens),
+        max_seq_lens=seq_lens.max().item(),
+        sin=positions.float(),
+        cos=positions.float(),
+    )
+    return AscendMLAMetadata(
+        num_actual_tokens=num_tokens,
+        num_input_tokens=num_tokens,
+        slot_mapping=torch.arange(num_tokens),
+        query_start_loc=query_start_loc,
+        seq_lens=seq_lens,
+        block_tables=block_table,
+        num_decodes=0,
+        num_decode_tokens=0,
+        num_prefills=len(query_lens),
+        query_lens=query_lens,
+        attn_state=attn_state,
+        prefill=prefill,
+    )
+
+
+def test_split_v1_mla_attn_in_seq():
+    attn_metadata = _make_prefill_metadata(
+        [10], [0], AscendAttentionState.PrefillNoCache)
+    pre, post = model_input_split_v1_mla_attn(
+        attn_metadata, AscendMLAMetadata, MSAttentionMetadataSplitConfig(),
+        AscendMLAPrefillMetadata.ChunkedContextMetadata)
+
+    assert pre.num_actual_tokens == post.num_actual_tokens == 5
+    assert pre.attn_state == AscendAttentionState.PrefillNoCache
+    assert pre.prefill.query_lens.tolist() == [5]
+    assert pre.prefill.context_lens.tolist() == [5]
+    assert pre.prefill.chunked_context is None
+    # the second half attends to the first one in the KV cache
+    assert post.attn_state == AscendAttentionState.ChunkedPrefill
+    assert post.query_lens == [5]
+    assert post.prefill.query_lens.tolist() == [5]
+    assert post.prefill.context_lens.tolist() == [10]
+    assert post.prefill.query_start_loc.tolist() == [0, 5]
+    assert post.prefill.input_positions.tolist() == [5, 6, 7, 8, 9]
+    assert post.prefill.cos.tolist() == [5, 6, 7, 8, 9]
+    chunked_context = post.prefill.chunked_context
+    assert chunked_context.starts.tolist() == [[0]]
+    assert chunked_context.chunk_seq_lens.tolist() == [[5]]
+    assert chunked_context.seq_tot == [5]
+
+
+def test_split_v1_mla_attn_in_seq_with_context():
+    attn_metadata = _make_prefill_metadata(
+        [2, 8], [3, 4], AscendAttentionState.ChunkedPrefill)
+    attn_metadata.prefill.chunked_context = \
+        AscendMLAPrefillMetadata.ChunkedContextMetadata(
+            cu_seq_lens=torch.tensor([[0, 3, 7]]),
+            starts=torch.tensor([[0, 0]]),
+            seq_tot=[7],
+            max_seq_lens=[4],
+            workspace=None,
+            chunk_seq_lens=torch.tensor([[3, 4]], dtype=torch.int32),
+        )
+    pre, post = model_input_split_v1_mla_attn(
+        attn_metadata, AscendMLAMetadata, MSAttentionMetadataSplitConfig(),
+        AscendMLAPrefillMetadata.ChunkedContextMetadata)
+
+    assert pre.query_lens == [2, 3]
+    assert pre.slot_mapping.tolist() == [0, 1, 2, 3, 4]
+    assert pre.prefill.query_lens.tolist() == [2, 3]
+    assert pre.prefill.context_lens.tolist() == [5, 7]
+    assert pre.prefill.query_start_loc.tolist() == [0, 2, 5]
+    assert pre.prefill.chunked_context.chunk_seq_lens.tolist() == [[3, 4]]
+    assert post.query_lens == [5]
+    assert post.block_tables.tolist() == [[1]]
+    assert post.prefill.context_lens.tolist() == [12]
+    assert post.prefill.input_positions.tolist() == [7, 8, 9, 10, 11]
+    # the cached context, then the tokens of the first micro batch
+    chunked_context = post.prefill.chunked_context
+    assert chunked_context.starts.tolist() == [[0], [4]]
+    assert chunked_context.chunk_seq_lens.tolist() == [[4], [3]]
+    assert chunked_context.seq_tot == [4, 3]
+    assert chunked_context.cu_seq_lens.tolist() == [[0, 4], [0, 3]]
+
+
+def test_split_v1_mla_attn_decode_only():
+    seq_lens = torch.tensor([5, 6, 7, 8])
+    positions = seq_lens - 1
+    decode = AscendMLADecodeMetadata(
+        input_positions=positions,
+        block_table=torch.arange(4).unsqueeze(1),
+        seq_lens=seq_lens,
+        max_seq_lens=8,
+        seq_lens_list=seq_lens.tolist(),
+        actual_seq_lengths_q=[1, 2, 3, 4],
+        sin=positions.float(),
+        cos=positions.float(),
+    )
+    attn_metadata = AscendMLAMetadata(
+        num_actual_tokens=4,
+        num_input_tokens=4,
+        slot_mapping=torch.arange(4),
+        query_start_loc=torch.arange(5),
+        seq_lens=seq_lens,
+        block_tables=decode.block_table,
+        num_decodes=4,
+        num_decode_tokens=4,
+        num_prefills=0,
+        query_lens=[1, 1, 1, 1],
+        attn_state=AscendAttentionState.DecodeOnly,
+        decode=decode,
+    )
+    pre, post = model_input_split_v1_mla_attn(
+        attn_metadata, AscendMLAMetadata, MSAttentionMetadataSplitConfig(),
+        AscendMLAPrefillMetadata.ChunkedContextMetadata)
+
+    for micro_batch in (pre, post):
+        assert micro_batch.attn_state == AscendAttentionState.DecodeOnly
+        assert micro_batch.num_decodes == 2
+        assert micro_batch.num_prefills == 0
+        assert micro_batch.prefill is None
+        assert micro_batch.decode.actual_seq_lengths_q == [1, 2]
+    assert pre.decode.seq_lens_list == [5, 6]
+    assert post.decode.seq_lens_list == [7, 8]
+    assert post.decode.max_seq_lens == 8
+    assert post.decode.sin.tolist() == [6, 7]
+    assert post.query_start_loc.tolist() == [0, 1, 2]
@@ -0,0 +1,105 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import numpy as np
+import pytest
+
+from vllm_ascend.ops.moe.comm_calibration import (MoECommCrossoverTable,
+                                                  build_crossover_table,
+                                                  load_moe_comm_table,
+                                                  measure_moe_comm_methods,
+                                                  save_moe_comm_table)
+
+METHODS = ["allgather", "alltoall", "mc2"]
+MC2_CAPACITY = 256
+
+
+class SimulatedCollectives:
+    """Advance a fake clock by a linear cost model of each method instead of
+    running the collectives."""
+
+    # (latency, time per token)
+    costs = {
+        "mc2": (5.0, 0.2),
+        "allgather": (20.0, 0.1),
+        "alltoall": (60.0, 0.02),
+    }
+
+    def __init__(self):
+        self.now = 0.0
+        self.steps = []
+
+    def timer(self):
+        return self.now
+
+    def run_step(self, method, num_tokens):
+        latency, per_token = self.costs[method]
+        self.now += latency + per_token * num_tokens
+        self.steps.append((method, num_tokens))
+
+    @staticmethod
+    def candidate_methods(num_tokens):
+        methods = ["allgather", "alltoall"]
+        if num_tokens <= MC2_CAPACITY:
+            methods.append("mc2")
+        return methods
+
+
+def test_measure_and_build_crossover_table():
+    collectives = SimulatedCollectives()
+    grid = [1, 16, 128, 256, 512, 1024]
+    timings = measure_moe_comm_methods(collectives.run_step,
+                                       collectives.candidate_methods,
+                                       METHODS,
+                                       grid,
+                                       num_iters=2,
+                                       timer=collectives.timer)
+
+    assert timings.shape == (len(grid), len(METHODS))
+    assert timings[0, METHODS.index("mc2")] == pytest.approx(5.2)
+    # MC2 is not measured beyond its capacity.
+    assert np.isinf(timings[4:, METHODS.index("mc2")]).all()
+    # A warmup step and 2 timed steps per method.
+    assert collectives.steps.count(("allgather", 16)) == 3
+    assert ("mc2", 512) not in collectives.steps
+
+    table = build_crossover_table(grid, METHODS, timings)
+    assert table.max_num_tokens == [128, 256, 1024]
+    assert table.methods == ["mc2", "allgather", "alltoall"]
+
+
+def test_crossover_table_select():
+    table = MoECommCrossoverTable([64, 512], ["mc2", "alltoall"])
+    assert table.select(1) == "mc2"
+    assert table.select(64) == "mc2"
+    assert table.select(65) == "alltoall"
+    # The last method covers the larger batches.
+    assert table.select(4096) == "alltoall"
+
+
+def test_save_and_load_moe_comm_table(tmp_path):
+    path = str(tmp_path / "moe_comm_table.json")
+    assert load_moe_comm_table(path, "model_a") is None
+
+    table_a = MoECommCrossoverTable([64, 512], ["mc2", "alltoall"])
+    table_b = MoECommCrossoverTable([1024], ["allgather"])
+    save_moe_comm_table(path, "model_a", table_a)
+    save_moe_comm_table(path, "model_b", table_b)
+
+    assert load_moe_comm_table(path, "model_a") == table_a
+    assert load_moe_comm_table(path, "model_b") == table_b
+    assert load_moe_comm_table(path, "model_c") is None
+
+    (tmp_path / "moe_comm_table.json").write_text("{\"model_a\": [")
+    assert load_moe_comm_table(path, "model_a") is None
@@ -21,7 +21,10 @@ from unittest import mock
 import torch
 
 from tests.ut.base import TestBase
-from vllm_ascend.ops.expert_load_balancer import ExpertLoadBalancer
+from vllm_ascend.ops.expert_load_balancer import (ExpertLoadBalancer,
+                                                  generate_log2phy_map,
+                                                  get_expert_load_balancer,
+                                                  record_expert_load)
 
 
 class Device(TypedDict):
@@ -139,3 +142,60 @@ class TestExpertLoadBalancer(TestBase):
         expected_redundant_expert_num = len(self.expert_map["layer_list"][0]["device_list"][0]["device_expert"]) * \
                                         self.expert_map["layer_list"][0]["device_count"] - 8
         self.assertEqual(redundant_expert_num, expected_redundant_expert_num)
+
+    def test_maps_computed_once(self):
+        with mock.patch.object(ExpertLoadBalancer,
+                               "generate_log2phy_expert_map") as mock_gen:
+            self.expert_load_balancer.get_rank_log2phy_map(0, 0)
+            self.expert_load_balancer.get_rank_log2phy_map(0, 1)
+        mock_gen.assert_not_called()
+
+    def test_get_expert_load_balancer(self):
+        json_file = os.path.dirname(__file__) + "/expert_map.json"
+        get_expert_load_balancer.cache_clear()
+        balancer = get_expert_load_balancer(json_file, 8)
+        self.assertIs(get_expert_load_balancer(json_file, 8), balancer)
+        self.assertIsNot(get_expert_load_balancer(json_file, 9), balancer)
+        get_expert_load_balancer.cache_clear()
+
+
+class TestGenerateLog2phyMap(TestBase):
+
+    def test_generate_log2phy_map(self):
+        # Expert 0 has a replica on rank 0 and rank 1, expert 1 on rank 2.
+        placement = torch.tensor([[0, 2], [3, 0], [1, 4]])
+        log2phy_map = generate_log2phy_map(placement, 5)
+        self.assertEqual(log2phy_map.dtype, torch.int32)
+        self.assertEqual(
+            log2phy_map.tolist(),
+            [[0, 4, 1, 2, 5], [3, 4, 1, 2, 5], [0, 4, 1, 2, 5]])
+
+    def test_generate_log2phy_map_spreads_replicas(self):
+        # Ranks 2 and 3 don't hold expert 0, they use different replicas.
+        placement = torch.tensor([[0, 1], [0, 2], [3, 4], [5, 6]])
+        log2phy_map = generate_log2phy_map(placement, 7)
+        self.assertEqual(log2phy_map[:2, 0].tolist(), [0, 2])
+        self.assertEqual(sorted(log2phy_map[2:, 0].tolist()), [0, 2])
+        self.assertTrue(
+            torch.equal(log2phy_map, generate_log2phy_map(placement, 7)))
+
+    def test_generate_log2phy_map_missing_expert(self):
+        placement = torch.tensor([[0, 1], [1, 0]])
+        log2phy_map = generate_log2phy_map(placement, 3)
+        self.assertEqual(log2phy_map[:, 2].tolist(), [-1, -1])
+
+
+class TestRecordExpertLoad(TestBase):
+
+    def test_record_expert_load(self):
+        layer = mock.MagicMock()
+        layer.expert_load = torch.zeros(4, dtype=torch.int64)
+        record_expert_load(layer, torch.tensor([[0, 1], [1, 3], [1, 0]]))
+        record_expert_load(layer, torch.tensor([[3, 2]]))
+        self.assertEqual(layer.expert_load.tolist(), [2, 3, 1, 2])
+
+    def test_record_expert_load_disabled(self):
+        layer = mock.MagicMock()
+        layer.expert_load = None
+        record_expert_load(layer, torch.tensor([[0, 1]]))
+        self.assertIsNone(layer.expert_load)
@@ -101,6 +101,29 @@ class TestTokenDispatcherWithMC2(TestBase):
             self.assertEqual(output["group_list_type"],
                              1)  # group_list_type == 1
 
+    def test_token_dispatch_log2phy_only_with_dynamic_eplb(self):
+        hidden_states = torch.randn(10, 128)
+        topk_weights = torch.randn(10, 1)
+        topk_ids = torch.arange(10).view(10, 1) % 8
+        expert_map = torch.tensor([0, 1, 2, 3, 4, 5, 6, 7])
+        log2phy = torch.tensor([7, 6, 5, 4, 3, 2, 1, 0])
+
+        for dynamic_eplb, expected_ids in ((False, topk_ids),
+                                           (True, log2phy[topk_ids])):
+            self.dispatcher.dynamic_eplb = dynamic_eplb
+            with patch("torch_npu.npu_moe_distribute_dispatch_v2",
+                       return_value=(torch.randn(10, 128), ) *
+                       5) as mock_dispatch:
+                self.dispatcher.token_dispatch(hidden_states,
+                                               topk_weights,
+                                               topk_ids,
+                                               self.row_idx,
+                                               expert_map,
+                                               log2phy=log2phy)
+            self.assertTrue(
+                torch.equal(mock_dispatch.call_args.kwargs["expert_ids"],
+                            expected_ids))
+
     def test_token_dispatch_with_shared_experts_and_quant(self):
         self.shared_experts = MagicMock()
         self.shared_experts.gate_up_proj.return_value = (torch.randn(10, 128),
@@ -0,0 +1,49 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+
+from unittest.mock import MagicMock, patch
+
+from vllm.lora.request import LoRARequest
+
+from tests.ut.base import TestBase
+from vllm_ascend.patch.worker.patch_common import patch_lora
+
+
+class TestPatchLoRA(TestBase):
+
+    def setUp(self):
+        self.manager = MagicMock(spec=[])
+        self.lora_request = LoRARequest("adapter_1", 1, "/adapters/1")
+
+    @patch.object(patch_lora, "_load_adapter_from_disk")
+    def test_load_adapter_from_disk(self, mock_load_from_disk):
+        lora_model = patch_lora._load_adapter(self.manager, self.lora_request)
+
+        mock_load_from_disk.assert_called_once_with(self.manager,
+                                                    self.lora_request)
+        self.assertIs(lora_model, mock_load_from_disk.return_value)
+
+    @patch.object(patch_lora, "_load_adapter_from_disk")
+    def test_load_adapter_from_prefetcher(self, mock_load_from_disk):
+        self.manager.adapter_prefetcher = MagicMock()
+
+        lora_model = patch_lora._load_adapter(self.manager, self.lora_request)
+
+        mock_load_from_disk.assert_not_called()
+        self.manager.adapter_prefetcher.load_adapter.assert_called_once_with(
+            self.lora_request)
+        self.assertIs(
+            lora_model,
+            self.manager.adapter_prefetcher.load_adapter.return_value)
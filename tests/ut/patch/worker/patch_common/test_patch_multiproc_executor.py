@@ -0,0 +1,70 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+
+import threading
+from unittest.mock import MagicMock
+
+from vllm.v1.executor.multiproc_executor import WorkerProc
+
+from tests.ut.base import TestBase
+from vllm_ascend.patch.worker.patch_common.patch_multiproc_executor import \
+    AsyncOutputResponseQueue
+
+
+class TestAsyncOutputResponseQueue(TestBase):
+
+    def setUp(self):
+        self.responses = []
+        self.num_responses = threading.Semaphore(0)
+        self.response_mq = MagicMock()
+
+        def enqueue(response):
+            self.responses.append(response)
+            self.num_responses.release()
+
+        self.response_mq.enqueue.side_effect = enqueue
+        self.response_queue = AsyncOutputResponseQueue(self.response_mq)
+
+    def _wait_for_responses(self, num_responses):
+        for _ in range(num_responses):
+            self.assertTrue(self.num_responses.acquire(timeout=10))
+
+    def test_responses_in_order(self):
+        success = WorkerProc.ResponseStatus.SUCCESS
+        async_output = MagicMock()
+        async_output.get_output.return_value = "model output"
+
+        self.response_queue.enqueue((success, async_output))
+        self.response_queue.enqueue((success, None))
+        self._wait_for_responses(2)
+
+        self.assertEqual(self.responses, [(success, "model output"),
+                                          (success, None)])
+
+    def test_get_output_failure(self):
+        async_output = MagicMock()
+        async_output.get_output.side_effect = RuntimeError("device error")
+
+        self.response_queue.enqueue(
+            (WorkerProc.ResponseStatus.SUCCESS, async_output))
+        self._wait_for_responses(1)
+
+        self.assertEqual(
+            self.responses,
+            [(WorkerProc.ResponseStatus.FAILURE, "device error")])
+
+    def test_forward_other_attributes(self):
+        self.response_queue.wait_until_ready()
+        self.response_mq.wait_until_ready.assert_called_once()
@@ -0,0 +1,147 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import numpy as np
+import pytest
+import torch
+
+from vllm_ascend.sample.grammar_bitmask import (apply_token_bitmask_inplace,
+                                                get_bitmask_logit_indices)
+
+
+def apply_token_bitmask_reference(logits, bitmask, indices=None):
+    """Per token CPU reference implementation."""
+    vocab_size = min(logits.shape[-1], bitmask.shape[-1] * 32)
+    rows = range(len(bitmask)) if indices is None else indices
+    for bitmask_row, logits_row in enumerate(rows):
+        for token_id in range(vocab_size):
+            word = int(bitmask[bitmask_row, token_id // 32])
+            if not (word >> (token_id % 32)) & 1:
+                logits[logits_row, token_id] = float("-inf")
+
+
+def get_bitmask_logit_indices_reference(req_id_to_index,
+                                        structured_output_request_ids,
+                                        scheduled_spec_decode_tokens):
+    """The per request loop previously used by NPUModelRunner."""
+    struct_out_req_batch_indices = {}
+    cumulative_offset = 0
+    for req_id, batch_index in sorted(req_id_to_index.items(),
+                                      key=lambda x: x[1]):
+        logit_index = batch_index + cumulative_offset
+        cumulative_offset += len(
+            scheduled_spec_decode_tokens.get(req_id, []))
+        if req_id in structured_output_request_ids:
+            struct_out_req_batch_indices[req_id] = logit_index
+    out_indices = []
+    for req_id, _ in sorted(structured_output_request_ids.items(),
+                            key=lambda x: x[1]):
+        num_spec_tokens = len(scheduled_spec_decode_tokens.get(req_id, []))
+        for i in range(1 + num_spec_tokens):
+            out_indices.append(struct_out_req_batch_indices[req_id] + i)
+    return out_indices
+
+
+def random_bitmask(num_rows, vocab_size, generator):
+    num_words = (vocab_size + 31) // 32
+    return torch.randint(-2**31,
+                         2**31 - 1, (num_rows, num_words),
+                         dtype=torch.int32,
+                         generator=generator)
+
+
+@pytest.mark.parametrize("vocab_size", [32, 100, 1000])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float16])
+def test_apply_token_bitmask_inplace(vocab_size, dtype):
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(6, vocab_size, generator=generator).to(dtype)
+    bitmask = random_bitmask(6, vocab_size, generator)
+    expected = logits.clone()
+    apply_token_bitmask_reference(expected, bitmask)
+
+    apply_token_bitmask_inplace(logits, bitmask)
+
+    torch.testing.assert_close(logits, expected)
+
+
+def test_apply_token_bitmask_inplace_with_indices():
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(8, 70, generator=generator)
+    bitmask = random_bitmask(3, 70, generator)
+    indices = [5, 0, 6]
+    expected = logits.clone()
+    apply_token_bitmask_reference(expected, bitmask, indices)
+
+    apply_token_bitmask_inplace(logits, bitmask, torch.tensor(indices))
+
+    torch.testing.assert_close(logits, expected)
+    # The rows without bitmask are untouched.
+    assert torch.isfinite(logits[[1, 2, 3, 4, 7]]).all()
+
+
+def test_apply_token_bitmask_inplace_padded_vocab():
+    # The logits are wider than the bitmask, the extra tokens are kept.
+    logits = torch.zeros(2, 80)
+    bitmask = torch.zeros(2, 2, dtype=torch.int32)
+    bitmask[0, 0] = 1
+    apply_token_bitmask_inplace(logits, bitmask)
+
+    assert logits[0, 0] == 0
+    assert torch.isinf(logits[0, 1:64]).all()
+    assert torch.isinf(logits[1, :64]).all()
+    assert (logits[:, 64:] == 0).all()
+
+
+def test_apply_token_bitmask_inplace_xgrammar_parity():
+    xgr = pytest.importorskip("xgrammar")
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(8, 1000, generator=generator)
+    bitmask = random_bitmask(8, 1000, generator)
+    expected = logits.clone()
+    xgr.apply_token_bitmask_inplace(expected, bitmask, indices=[1, 4, 7])
+
+    indices = torch.tensor([1, 4, 7])
+    apply_token_bitmask_inplace(logits, bitmask[indices], indices)
+
+    torch.testing.assert_close(logits, expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_bitmask_logit_indices(seed):
+    rng = np.random.default_rng(seed)
+    num_reqs = 16
+    req_ids = [f"req{i}" for i in rng.permutation(num_reqs)]
+    req_id_to_index = {req_id: i for i, req_id in enumerate(req_ids)}
+    scheduled_spec_decode_tokens = {
+        req_id: [0] * int(rng.integers(1, 4))
+        for req_id in req_ids if rng.random() < 0.5
+    }
+    struct_out_req_ids = [req_id for req_id in req_ids if rng.random() < 0.6]
+    structured_output_request_ids = {
+        req_id: i
+        for i, req_id in enumerate(rng.permutation(struct_out_req_ids))
+    }
+
+    logit_indices = get_bitmask_logit_indices(req_id_to_index,
+                                              structured_output_request_ids,
+                                              scheduled_spec_decode_tokens)
+
+    assert logit_indices.tolist() == get_bitmask_logit_indices_reference(
+        req_id_to_index, structured_output_request_ids,
+        scheduled_spec_decode_tokens)
+
+
+def test_get_bitmask_logit_indices_no_structured_output():
+    logit_indices = get_bitmask_logit_indices({"a": 0, "b": 1}, {}, {})
+    assert logit_indices.tolist() == []
@@ -12,14 +12,16 @@
 # limitations under the License.
 # This file is a part of the vllm-ascend project.
 #
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import torch
 
 from tests.ut.base import TestBase
 from vllm_ascend.sample.rejection_sampler import (
     expand_batch_to_tokens, expand_pytorch, rejection_greedy_sample_pytorch,
-    rejection_random_sample_pytorch, sample_recovered_tokens_pytorch)
+    rejection_random_sample_pytorch, sample_recovered_tokens_pytorch,
+    tree_rejection_sample)
+from vllm_ascend.spec_decode.token_tree import TokenTree
 
 # Global constants
 PLACEHOLDER_TOKEN_ID = -1
@@ -67,7 +69,7 @@ class TestAscendRejectionSampler(TestBase):
         output_token_ids = torch.full((batch_size, max_spec_len + 1),
                                       PLACEHOLDER_TOKEN_ID)
 
-        cu_num_draft_tokens = torch.tensor([2, 1])
+        cu_num_draft_tokens = torch.tensor([2, 3])
         draft_token_ids = torch.tensor([1, 0, 2])
         draft_probs = torch.tensor([
             [0.0, 0.6, 0.0, 0.4],  # vocab_size=4
@@ -104,6 +106,47 @@ class TestAscendRejectionSampler(TestBase):
         assert output_token_ids[0, 1].item() == 0
         assert output_token_ids[0, 2].item() == 100
 
+    def test_rejection_random_sample_pytorch_batched(self):
+        """Test that each request stops at its own first rejection"""
+        batch_size = 3
+        max_spec_len = 3
+        output_token_ids = torch.full((batch_size, max_spec_len + 1),
+                                      PLACEHOLDER_TOKEN_ID,
+                                      dtype=torch.int32)
+
+        cu_num_draft_tokens = torch.tensor([3, 5, 7])
+        draft_token_ids = torch.tensor([0, 1, 2, 3, 0, 1, 2])
+        target_probs = torch.full((7, 4), 0.25)
+        # Request 0 rejects its 2nd token, request 1 accepts all its tokens,
+        # request 2 is greedy and left untouched.
+        uniform_probs = torch.tensor([0.1, 0.9, 0.1, 0.1, 0.1, 0.1, 0.9])
+        bonus_token_ids = torch.tensor([[100], [200], [300]])
+        recovered_token_ids = torch.tensor([10, 11, 12, 13, 14, 15, 16])
+        is_greedy = torch.tensor([False, False, True])
+
+        rejection_random_sample_pytorch(
+            output_token_ids,
+            cu_num_draft_tokens,
+            draft_token_ids,
+            None,
+            target_probs,
+            bonus_token_ids,
+            recovered_token_ids,
+            uniform_probs,
+            is_greedy,
+            max_spec_len,
+            4,
+            IS_NGRAM=True,
+        )
+
+        expected = torch.tensor([
+            [0, 11, -1, -1],
+            [3, 0, 200, -1],
+            [-1, -1, -1, -1],
+        ],
+                                dtype=torch.int32)
+        assert torch.equal(output_token_ids, expected)
+
     def test_expand_pytorch(self):
         """Test expand_pytorch functionality"""
         input_ptr = torch.tensor([10, 20, 30], dtype=torch.int32)
@@ -170,6 +213,8 @@ class TestAscendRejectionSampler(TestBase):
 
         assert output_token_ids[0].item() == 0
         assert output_token_ids[1].item() == 1
+        # The draft token is excluded out of place.
+        assert target_probs[0, 1].item() == 0.2
 
     def test_sample_recovered_tokens_pytorch_autoregressive(self):
         """Test recovered token sampling for autoregressive models"""
@@ -201,3 +246,33 @@ class TestAscendRejectionSampler(TestBase):
             IS_NGRAM=False,
         )
         assert output_token_ids[0].item() == 0
+
+    def test_tree_rejection_sample_greedy(self):
+        """Test the greedy verification of the token trees: the longest
+        accepted path ends with the target argmax at its last node"""
+        # The nodes 0 and 1 at depth 1, the node 2 at depth 2 under node 0.
+        tree = TokenTree([2, 1])
+        draft_token_ids = torch.tensor([5, 6, 7, 3, 4, 8])
+        cu_num_draft_tokens = torch.tensor([3, 6])
+        # The target argmax at the root and at each node of each request.
+        target_argmax = torch.tensor([6, 0, 9, 0, 3, 8, 0, 11])
+        target_probs = torch.nn.functional.one_hot(target_argmax,
+                                                   12).float()
+        sampling_metadata = MagicMock(all_greedy=True)
+
+        output_token_ids, accepted_nodes = tree_rejection_sample(
+            torch.from_numpy(tree.children),
+            tree.depth,
+            draft_token_ids,
+            [3, 3],
+            cu_num_draft_tokens,
+            target_probs,
+            sampling_metadata,
+        )
+
+        # The second child of the root is accepted, it has no children.
+        assert output_token_ids[0].tolist() == [6, 9, PLACEHOLDER_TOKEN_ID]
+        assert accepted_nodes[0].tolist() == [1, -1]
+        # The whole path is accepted and followed by the bonus token.
+        assert output_token_ids[1].tolist() == [3, 8, 11]
+        assert accepted_nodes[1].tolist() == [0, 2]
@@ -0,0 +1,59 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import pytest
+
+from vllm_ascend.spec_decode.adaptive_length import SpecLengthController
+
+
+def test_draft_len_follows_acceptance():
+    controller = SpecLengthController(max_len=4, min_gain=0.3)
+    # New requests draft the full length.
+    assert controller.draft_len("a") == 4
+
+    for _ in range(20):
+        controller.observe("a", num_draft_tokens=4, num_accepted_tokens=0)
+        controller.observe("b", num_draft_tokens=4, num_accepted_tokens=4)
+    # At least one draft token keeps measuring the acceptance.
+    assert controller.draft_len("a") == 1
+    assert controller.draft_len("b") == 4
+
+    # The length grows back with the acceptance.
+    for _ in range(30):
+        controller.observe("a", num_draft_tokens=1, num_accepted_tokens=1)
+    assert controller.draft_len("a") == 4
+
+    controller.remove("a")
+    assert controller.draft_len("a") == 4
+
+
+def test_draft_len_not_adaptive():
+    controller = SpecLengthController(max_len=3, min_gain=0.3,
+                                      adaptive=False)
+    controller.observe("a", num_draft_tokens=3, num_accepted_tokens=0)
+    assert controller.draft_len("a") == 3
+
+
+def test_disable_by_batch_size():
+    controller = SpecLengthController(max_len=2,
+                                      min_gain=0.3,
+                                      disable_batch_size=8)
+    assert controller.enabled(num_reqs=7)
+    assert not controller.enabled(num_reqs=8)
+
+    controller.observe("a", num_draft_tokens=2, num_accepted_tokens=1)
+    controller.draft_len("a")
+    stats = controller.stats()
+    assert stats["acceptance_rate"] == pytest.approx(0.5)
+    assert stats["disabled_step_ratio"] == pytest.approx(0.5)
@@ -0,0 +1,59 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import numpy as np
+import pytest
+
+from unittest.mock import MagicMock
+
+import numpy as np
+import torch
+
+from vllm_ascend.spec_decode.eagle_proposer import EagleProposer
+from vllm_ascend.spec_decode.interface import SpecDcodeType
+
+
+def test_tree_target_positions():
+    proposer = EagleProposer.__new__(EagleProposer)
+    proposer.name = SpecDcodeType.EAGLE3
+    proposer.device = torch.device("cpu")
+    proposer.attn_layer_name = "attn"
+    eagle_attn_metadata = MagicMock(slot_mapping=torch.arange(100, 109))
+    proposer._get_eagle_atten_dict = MagicMock(
+        return_value={"attn": eagle_attn_metadata})
+    proposer._propose = MagicMock(return_value=torch.zeros(2, 1))
+    proposer.runner = MagicMock()
+    proposer.runner.query_start_loc_np = np.array([0, 6, 9])
+    proposer.runner.input_ids = torch.arange(9)
+    # A tree of 3 branches then 2 branches under the first node, which
+    # accepted the nodes 0 and 4, and a prefill of 3 tokens.
+    proposer.runner.tree_accepted_nodes = np.array([[0, 4], [-1, -1]])
+    # The root is at position 10, the nodes at the positions of their depth.
+    positions = torch.tensor([10, 11, 11, 11, 12, 12, 0, 1, 2])
+
+    proposer.generate_token_ids(
+        [[1, 2, 3], [4]],
+        spec_decode_metadata=MagicMock(num_draft_tokens=[5, 0]),
+        positions=positions,
+        num_scheduled_tokens=9,
+        aux_hidden_states=[torch.randn(9, 4)])
+
+    kwargs = proposer._propose.call_args.kwargs
+    # The accepted tokens follow their root like a chain.
+    assert kwargs["target_positions"].tolist() == [10, 11, 12, 0, 1, 2]
+    assert kwargs["target_token_ids"].tolist() == [0, 1, 5, 6, 7, 8]
+    assert kwargs["target_slot_mapping"].tolist() == [
+        100, 101, 102, 106, 107, 108
+    ]
+    assert kwargs["cu_num_tokens"].tolist() == [0, 3, 6]
@@ -0,0 +1,71 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import numpy as np
+
+from vllm_ascend.spec_decode.ngram_index import (HASH_COLLISION, NgramIndex,
+                                                 _hash_ngram, hash_ngrams)
+
+
+def find_by_scan(tokens, min_n, max_n):
+    """The position following the earliest occurrence of the longest n-gram
+    suffix of `tokens` that occurs earlier, by scanning the whole history."""
+    num_tokens = len(tokens)
+    for n in range(min(max_n, num_tokens - 1), min_n - 1, -1):
+        suffix = list(tokens[num_tokens - n:])
+        for start in range(num_tokens - n):
+            if list(tokens[start:start + n]) == suffix:
+                return start + n
+    return None
+
+
+def test_hash_ngrams():
+    tokens = np.array([5, 151643, 7, 5, 151643, 7], dtype=np.int32)
+    hashes = hash_ngrams(tokens, 3)
+    assert len(hashes) == 4
+    assert hashes[0] == hashes[3]
+    assert hashes[0] != hashes[1]
+    assert int(hashes[1]) == _hash_ngram([151643, 7, 5])
+
+
+def test_incremental_index_matches_scan():
+    rng = np.random.default_rng(0)
+    min_n, max_n = 2, 4
+    for _ in range(20):
+        tokens = rng.integers(0, 6, size=200).astype(np.int32)
+        index = NgramIndex(min_n, max_n)
+        num_tokens = int(rng.integers(1, 50))
+        while num_tokens <= len(tokens):
+            assert index.find(tokens, num_tokens) == find_by_scan(
+                tokens[:num_tokens], min_n, max_n)
+            # A prefill, or the accepted tokens of a decode step.
+            num_tokens += int(rng.integers(1, 5))
+
+
+def test_index_reset_on_shorter_history():
+    index = NgramIndex(1, 2)
+    tokens = np.array([1, 2, 3, 1, 2], dtype=np.int32)
+    assert index.find(tokens, 5) == 2
+    other = np.array([4, 4, 4], dtype=np.int32)
+    assert index.find(other, 3) == 2
+    assert index.num_tokens == 3
+
+
+def test_index_hash_collision():
+    index = NgramIndex(2, 2)
+    tokens = np.array([1, 2, 3, 4, 1, 2], dtype=np.int32)
+    index.update(tokens, 6)
+    # Make the suffix [1, 2] collide with the n-gram [3, 4].
+    index.positions[0][_hash_ngram([1, 2])] = 2
+    assert index.find(tokens, 6) == HASH_COLLISION
@@ -0,0 +1,60 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import numpy as np
+import pytest
+
+from vllm_ascend.spec_decode.token_tree import TokenTree, tree_token_indices
+
+
+def test_token_tree():
+    tree = TokenTree([3, 2])
+    assert tree.depth == 2
+    assert tree.num_nodes == 5
+    np.testing.assert_array_equal(tree.depths, [1, 1, 1, 2, 2])
+    np.testing.assert_array_equal(tree.parents, [-1, -1, -1, 0, 0])
+    np.testing.assert_array_equal(tree.ancestor_mask[4],
+                                  [True, False, False, False, True])
+    np.testing.assert_array_equal(tree.ancestor_mask[1],
+                                  [False, True, False, False, False])
+    # The children of the root, then of each node, as node + 1.
+    np.testing.assert_array_equal(tree.children[0], [1, 2, 3])
+    np.testing.assert_array_equal(tree.children[1], [4, 5, 0])
+    assert not tree.children[2:].any()
+    np.testing.assert_array_equal(tree.kv_position_offsets(),
+                                  [0, 1, 2, 2, 3])
+
+
+def test_invalid_token_tree():
+    with pytest.raises(ValueError):
+        TokenTree([])
+    with pytest.raises(ValueError):
+        TokenTree([2, 0])
+
+
+def test_tree_token_indices():
+    # A request with a tree of 5 nodes, which accepted the nodes 0 and 4,
+    # and a prefill of 3 tokens.
+    token_indices, compact_indices, cu_num_accepted = tree_token_indices(
+        np.array([6, 9]), np.array([5, 0]), np.array([[0, 4], [-1, -1]]))
+    np.testing.assert_array_equal(token_indices, [0, 1, 5, 6, 7, 8])
+    np.testing.assert_array_equal(compact_indices, [0, 1, 2, 6, 7, 8])
+    np.testing.assert_array_equal(cu_num_accepted, [0, 3, 6])
+
+    # A tree truncated to its first 2 nodes, without accepted nodes.
+    token_indices, compact_indices, cu_num_accepted = tree_token_indices(
+        np.array([3]), np.array([2]), np.array([[-1, -1]]))
+    np.testing.assert_array_equal(token_indices, [0])
+    np.testing.assert_array_equal(compact_indices, [0])
+    np.testing.assert_array_equal(cu_num_accepted, [0, 1])
@@ -14,6 +14,7 @@
 #
 
 import os
+from unittest.mock import MagicMock
 
 from transformers import PretrainedConfig
 from vllm.config import ModelConfig, ParallelConfig, VllmConfig
@@ -43,6 +44,9 @@ class TestAscendConfig(TestBase):
         # No additional config given, check the default value here.
         ascend_config = init_ascend_config(test_vllm_config)
         self.assertIsNone(ascend_config.expert_map_path)
+        self.assertFalse(ascend_config.dynamic_eplb)
+        self.assertEqual(ascend_config.num_iterations_eplb_update, 400)
+        self.assertEqual(ascend_config.num_wait_worker_iterations, 30)
 
         torchair_graph_config = ascend_config.torchair_graph_config
         self.assertFalse(torchair_graph_config.enabled)
@@ -141,6 +145,50 @@ class TestAscendConfig(TestBase):
         with self.assertRaises(ValueError):
             init_ascend_config(test_vllm_config)
 
+    @_clean_up_ascend_config
+    def test_init_ascend_config_with_dynamic_eplb(self):
+        test_vllm_config = VllmConfig()
+        test_vllm_config.additional_config = {
+            "dynamic_eplb": True,
+            "num_iterations_eplb_update": 100,
+            "num_wait_worker_iterations": 10,
+            "refresh": True,
+        }
+        ascend_config = init_ascend_config(test_vllm_config)
+        self.assertTrue(ascend_config.dynamic_eplb)
+        self.assertEqual(ascend_config.num_iterations_eplb_update, 100)
+        self.assertEqual(ascend_config.num_wait_worker_iterations, 10)
+
+        test_vllm_config.additional_config = {
+            "dynamic_eplb": True,
+            "num_iterations_eplb_update": 10,
+            "num_wait_worker_iterations": 10,
+            "refresh": True,
+        }
+        with self.assertRaises(ValueError):
+            init_ascend_config(test_vllm_config)
+
+    @_clean_up_ascend_config
+    def test_init_ascend_config_with_spec_token_tree(self):
+        test_vllm_config = VllmConfig()
+        # The token tree requires eagle3 speculative decoding.
+        test_vllm_config.additional_config = {
+            "spec_token_tree": [3, 2],
+            "refresh": True,
+        }
+        with self.assertRaises(ValueError):
+            init_ascend_config(test_vllm_config)
+
+        test_vllm_config.speculative_config = MagicMock(
+            method="eagle3", num_speculative_tokens=2)
+        test_vllm_config.model_config = MagicMock(use_mla=False)
+        ascend_config = init_ascend_config(test_vllm_config)
+        self.assertEqual(ascend_config.spec_token_tree, [3, 2])
+
+        test_vllm_config.speculative_config.num_speculative_tokens = 1
+        with self.assertRaises(ValueError):
+            init_ascend_config(test_vllm_config)
+
     @_clean_up_ascend_config
     def test_get_ascend_config(self):
         test_vllm_config = VllmConfig()
@@ -36,6 +36,7 @@ class TestNPUPlatform(TestBase):
         mock_ascend_config = MagicMock()
         mock_ascend_config.torchair_graph_config.enabled = False
         mock_ascend_config.ascend_scheduler_config.enabled = False
+        mock_ascend_config.aclgraph_capture_plan_path = None
         return mock_ascend_config
 
     def setUp(self):
@@ -13,8 +13,10 @@
 # This file is a part of the vllm-ascend project.
 #
 
+import json
 import math
 import os
+import tempfile
 from threading import Lock
 from unittest import mock
 
@@ -291,6 +293,27 @@ class TestUtils(TestBase):
             3,
             len(test_vllm_config.compilation_config.cudagraph_capture_sizes))
 
+    def test_update_aclgraph_sizes_with_capture_plan(self):
+        model_path = os.path.join(os.path.dirname(__file__), "fake_weight")
+        test_vllm_config = VllmConfig(
+            model_config=ModelConfig(model=model_path, enforce_eager=True),
+            compilation_config=CompilationConfig(
+                cudagraph_capture_sizes=[1, 2, 4, 8, 16, 32, 64]),
+            parallel_config=ParallelConfig(),
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            capture_plan_path = os.path.join(tmp_dir, "capture_plan.json")
+            with open(capture_plan_path, "w") as f:
+                json.dump({"num_tokens_histogram": {"24": 10, "40": 10}}, f)
+            utils.update_aclgraph_sizes(test_vllm_config, capture_plan_path)
+        capture_sizes = sorted(
+            test_vllm_config.compilation_config.cudagraph_capture_sizes)
+        # The number of sizes is kept, the recorded sizes are captured.
+        self.assertEqual(7, len(capture_sizes))
+        self.assertEqual(64, capture_sizes[-1])
+        self.assertIn(24, capture_sizes)
+        self.assertIn(40, capture_sizes)
+
     @mock.patch("vllm.model_executor.custom_op.CustomOp")
     @mock.patch("vllm_ascend.ops.activation.AscendQuickGELU")
     @mock.patch("vllm_ascend.ops.activation.AscendSiluAndMul")
@@ -369,4 +369,92 @@ def test_swap_states_in_input_batch(device: str, batch_size: int,
     input_batch.refresh_metadata()
     ref_input_batch.refresh_metadata()
 
-    _compare_objs(input_batch, ref_input_batch)
+    # The token ids are not moved by swap_states, only their rows.
+    _compare_objs(input_batch,
+                  ref_input_batch,
+                  skip=("logitsprocs", "batch_update_builder", "token_rows",
+                        "token_ids_cpu", "token_ids_cpu_tensor"))
+    for req_index in range(batch_size):
+        num_tokens = input_batch.num_tokens[req_index]
+        assert (input_batch.token_ids_row(req_index)[:num_tokens] ==
+                ref_input_batch.token_ids_row(req_index)[:num_tokens]).all()
+
+
+@pytest.mark.parametrize("device", ["cpu"])
+@pytest.mark.parametrize("batch_size", [1, 2, 32, 64])
+def test_condense_moves_token_rows(device: str, batch_size: int):
+    input_batch: InputBatch = InputBatch(
+        max_num_reqs=batch_size,
+        max_model_len=1024,
+        max_num_batched_tokens=1024,
+        device=torch.device(device),
+        pin_memory=False,
+        vocab_size=1024,
+        block_sizes=[1],
+    )
+    reqs = [_construct_cached_request_state(i) for i in range(batch_size)]
+    for req in reqs:
+        input_batch.add_request(req)
+    token_ids_cpu = input_batch.token_ids_cpu.copy()
+    assert (input_batch.prev_sampled_index == -1).all()
+    # The indices of the requests in the batch of the previous step.
+    input_batch.prev_sampled_index[:] = range(batch_size)
+
+    req_ids_to_remove = _remove_requests(input_batch, batch_size, reqs)
+    input_batch.condense()
+
+    # No token id is copied, the rows are a permutation.
+    assert (input_batch.token_ids_cpu == token_ids_cpu).all()
+    assert sorted(input_batch.token_rows.tolist()) == list(range(batch_size))
+    for prev_index, req in enumerate(reqs):
+        if req.req_id in req_ids_to_remove:
+            continue
+        req_index = input_batch.req_id_to_index[req.req_id]
+        num_tokens = input_batch.num_tokens[req_index]
+        assert num_tokens == req.num_tokens
+        assert input_batch.num_prompt_tokens[req_index] == len(
+            req.prompt_token_ids)
+        assert input_batch.prev_sampled_index[req_index] == prev_index
+        assert input_batch.token_ids_row(req_index)[:num_tokens].tolist(
+        ) == req.prompt_token_ids + req.output_token_ids
+
+
+@pytest.mark.parametrize("device", ["cpu"])
+@pytest.mark.parametrize("max_num_new_tokens", [1, 3])
+def test_append_token_ids(device: str, max_num_new_tokens: int):
+    batch_size = 8
+    input_batch: InputBatch = InputBatch(
+        max_num_reqs=batch_size,
+        max_model_len=1024,
+        max_num_batched_tokens=1024,
+        device=torch.device(device),
+        pin_memory=False,
+        vocab_size=1024,
+        block_sizes=[1],
+    )
+    reqs = [_construct_cached_request_state(i) for i in range(batch_size)]
+    for req in reqs:
+        input_batch.add_request(req)
+    num_tokens = input_batch.num_tokens[:batch_size].copy()
+    # A request with spec tokens keeps them in num_tokens if nothing is
+    # appended.
+    input_batch.num_tokens[0] += 2
+
+    token_ids = np.random.randint(0,
+                                  VOCAB_SIZE,
+                                  size=(batch_size, max_num_new_tokens))
+    num_new_tokens = np.random.randint(0,
+                                       max_num_new_tokens + 1,
+                                       size=batch_size)
+    num_new_tokens[0] = 0
+    input_batch.append_token_ids(token_ids, num_new_tokens)
+
+    for i, req in enumerate(reqs):
+        expected = req.prompt_token_ids + req.output_token_ids + token_ids[
+            i, :num_new_tokens[i]].tolist()
+        end = num_tokens[i] + num_new_tokens[i]
+        assert input_batch.num_tokens_no_spec[i] == end
+        assert input_batch.token_ids_cpu[i, :end].tolist() == expected
+    assert input_batch.num_tokens[0] == num_tokens[0] + 2
+    assert (input_batch.num_tokens[1:batch_size] ==
+            input_batch.num_tokens_no_spec[1:batch_size]).all()
@@ -11,12 +11,23 @@
 # limitations under the License.
 # This file is a part of the vllm-ascend project.
 
+from functools import partial
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
+import torch
+from vllm.lora.request import LoRARequest
 
+from vllm_ascend.core.schedule_output import AscendSchedulerOutput
+from vllm_ascend.multistream.metadata import MultiStreamConfig
+from vllm_ascend.ops.moe.comm_calibration import MoECommCrossoverTable
+from vllm_ascend.spec_decode.adaptive_length import SpecLengthController
+from vllm_ascend.spec_decode.interface import SpecDcodeType
 from vllm_ascend.utils import AscendSocVersion
-from vllm_ascend.worker.model_runner_v1 import NPUModelRunner
+from vllm_ascend.worker.model_runner_v1 import (AsyncNPUModelRunnerOutput,
+                                                NPUModelRunner)
+from vllm_ascend.worker.npu_input_batch import InputBatch
 
 
 # yapf: disable
@@ -59,6 +70,7 @@ def test_select_moe_comm_method(soc_version, enable_expert_parallel,
     mock_runner.parallel_config.enable_expert_parallel = enable_expert_parallel
     mock_runner.parallel_config.world_size = world_size
     mock_runner.mc2_tokens_capacity = mc2_tokens_capacity
+    mock_runner.moe_comm_table = None
 
     # Patch the helper functions
     with patch('vllm_ascend.worker.model_runner_v1.get_ascend_soc_version',
@@ -82,6 +94,7 @@ def test_select_moe_comm_method_unsupported_soc():
     mock_runner.parallel_config = MagicMock()
     mock_runner.parallel_config.enable_expert_parallel = True
     mock_runner.mc2_tokens_capacity = 256
+    mock_runner.moe_comm_table = None
 
     unsupported_soc = "UnsupportedSOC"
 
@@ -92,3 +105,396 @@ def test_select_moe_comm_method_unsupported_soc():
          pytest.raises(ValueError, match=f"Unsupported soc_version: {unsupported_soc}"):
 
         NPUModelRunner._select_moe_comm_method(mock_runner, 100)
+
+
+@pytest.mark.parametrize("soc_version, num_tokens, expected_method", [
+    (AscendSocVersion.A3, 32, "mc2"),
+    (AscendSocVersion.A3, 200, "allgather"),
+    (AscendSocVersion.A3, 4096, "alltoall"),
+    # MC2 is not available beyond its capacity, nor on A2 with 8 ranks.
+    (AscendSocVersion.A3, 300, "alltoall"),
+    (AscendSocVersion.A2, 32, "allgather"),
+])
+def test_select_moe_comm_method_from_table(soc_version, num_tokens,
+                                           expected_method):
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.parallel_config = MagicMock()
+    mock_runner.parallel_config.enable_expert_parallel = True
+    mock_runner.parallel_config.world_size = 8
+    mock_runner.mc2_tokens_capacity = 256
+    mock_runner.moe_comm_table = MoECommCrossoverTable(
+        [64, 256, 512, 2048], ["mc2", "allgather", "mc2", "alltoall"])
+    mock_runner._moe_comm_method_candidates = partial(
+        NPUModelRunner._moe_comm_method_candidates, mock_runner)
+
+    with patch('vllm_ascend.worker.model_runner_v1.get_ascend_soc_version',
+               return_value=soc_version), \
+         patch('vllm_ascend.worker.model_runner_v1.is_global_first_rank',
+               return_value=True):
+        method = NPUModelRunner._select_moe_comm_method(
+            mock_runner, num_tokens)
+
+    assert method == expected_method
+
+
+def test_prefetch_loras():
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.lora_prefetcher = MagicMock()
+    mock_runner.lora_manager = MagicMock()
+    mock_runner.lora_manager.list_adapters.return_value = {1}
+    scheduler_output = MagicMock(spec=AscendSchedulerOutput)
+    scheduler_output.prefetch_lora_requests = [
+        LoRARequest("adapter_1", 1, "/adapters/1"),
+        LoRARequest("adapter_2", 2, "/adapters/2"),
+    ]
+
+    NPUModelRunner._prefetch_loras(mock_runner, scheduler_output)
+
+    # The adapters already in the host memory cache are not loaded again.
+    mock_runner.lora_prefetcher.prefetch.assert_called_once_with(
+        scheduler_output.prefetch_lora_requests[1])
+
+
+def test_propose_draft_token_ids_with_adaptive_length():
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.drafter = MagicMock()
+    mock_runner.drafter.name = SpecDcodeType.EAGLE3
+    mock_runner.drafter.generate_token_ids.return_value = [[1, 2, 3],
+                                                           [4, 5, 6]]
+    mock_runner.input_batch = MagicMock(req_ids=["a", "b"])
+    mock_runner.spec_length_controller = SpecLengthController(
+        max_len=3, min_gain=0.3, disable_batch_size=3)
+    for _ in range(20):
+        mock_runner.spec_length_controller.observe("a", 3, 0)
+    spec_decode_metadata = MagicMock(num_draft_tokens=[3, 3])
+    propose = partial(NPUModelRunner.propose_draft_token_ids, mock_runner,
+                      sampling_metadata=None,
+                      scheduler_output=None,
+                      spec_decode_metadata=spec_decode_metadata,
+                      positions=None,
+                      num_scheduled_tokens=8,
+                      hidden_states=None,
+                      attn_metadata=None)
+
+    draft_token_ids = propose([[7], [8, 9, 10, 11]])
+    assert draft_token_ids == [[1], [4, 5, 6]]
+
+    # Speculation is off in the larger batches, the drafter still runs.
+    mock_runner.drafter.generate_token_ids.return_value = [[1, 2, 3]] * 3
+    mock_runner.input_batch.req_ids = ["a", "b", "c"]
+    draft_token_ids = propose([[7], [8], [9]], spec_decode_metadata=None)
+    assert draft_token_ids == [[], [], []]
+    assert mock_runner.drafter.generate_token_ids.call_count == 2
+
+
+def test_parse_spec_decode_output():
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.input_batch = MagicMock(vocab_size=100)
+    sampled_token_ids_np = np.array([[5, 6, -1], [7, -1, -1], [8, 9, 10]])
+
+    valid_sampled_token_ids, num_sampled_tokens = \
+        NPUModelRunner._parse_spec_decode_output(mock_runner,
+                                                 sampled_token_ids_np)
+
+    assert valid_sampled_token_ids == [[5, 6], [7], [8, 9, 10]]
+    assert num_sampled_tokens.tolist() == [2, 1, 3]
+
+
+def test_async_output_get_output():
+    model_runner_output = MagicMock()
+    copy_event = MagicMock()
+    async_output = AsyncNPUModelRunnerOutput(
+        model_runner_output,
+        sampled_token_ids_cpu=torch.tensor([[5], [6], [7]]),
+        logprobs_tensors=None,
+        logprobs_tensors_cpu=None,
+        invalid_req_indices=[1],
+        copy_event=copy_event,
+    )
+
+    output = async_output.get_output()
+
+    copy_event.synchronize.assert_called_once()
+    assert output is model_runner_output
+    # The token sampled for a partial prefill is dropped.
+    assert output.sampled_token_ids == [[5], [], [7]]
+
+
+def _make_async_runner(req_ids):
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.input_batch = MagicMock()
+    mock_runner.input_batch.req_ids = req_ids
+    mock_runner.input_batch.req_id_to_index = {
+        req_id: i
+        for i, req_id in enumerate(req_ids)
+    }
+    mock_runner.prev_sampled_indices_cpu = torch.zeros((2, 8),
+                                                       dtype=torch.int64)
+    mock_runner.prev_sampled_indices_np = (
+        mock_runner.prev_sampled_indices_cpu.numpy())
+    mock_runner.prev_sampled_indices = torch.zeros((2, 8), dtype=torch.int64)
+    return mock_runner
+
+
+def test_scatter_prev_sampled_token_ids():
+    mock_runner = _make_async_runner(["a", "b", "c"])
+    # "a" is a decode, "b" a new request and "c" prefilled by the last step.
+    mock_runner.query_start_loc_np = np.array([0, 1, 5, 6], dtype=np.int32)
+    mock_runner.input_ids = torch.zeros(8, dtype=torch.int32)
+    mock_runner.prev_sampled_token_ids = torch.tensor([[11], [12], [13]])
+    # The previous step had "c", "d" and "a" in this order.
+    mock_runner.input_batch.prev_sampled_index = np.array([2, -1, 0],
+                                                          dtype=np.int64)
+
+    NPUModelRunner._scatter_prev_sampled_token_ids(mock_runner, 3)
+
+    assert mock_runner.input_ids.tolist() == [13, 0, 0, 0, 0, 11, 0, 0]
+
+
+def test_cache_prev_sampled_token_ids():
+    mock_runner = _make_async_runner(["a", "b"])
+    mock_runner.model_config = MagicMock()
+    mock_runner.model_config.max_model_len = 8
+    mock_runner.input_batch.token_ids_cpu = np.zeros((2, 8), dtype=np.int32)
+    # The rows of "a" and "b" are swapped.
+    mock_runner.input_batch.token_rows = np.array([1, 0])
+    mock_runner.input_batch.token_ids_row = partial(
+        InputBatch.token_ids_row, mock_runner.input_batch)
+    mock_runner.input_batch.num_tokens_no_spec = np.array([3, 2])
+    mock_runner.input_batch.num_tokens = np.array([3, 2])
+    # "c" is no longer in the persistent batch and "d" has finished.
+    mock_runner.requests = {
+        req_id: MagicMock(output_token_ids=[])
+        for req_id in ["a", "b", "c"]
+    }
+    copy_event = MagicMock()
+    mock_runner.prev_sampled_token_ids = torch.tensor([[11], [12], [13]])
+    mock_runner.prev_sampled_token_ids_cpu = torch.tensor([[11], [12], [13]])
+    mock_runner.prev_sampled_copy_event = copy_event
+    mock_runner.prev_req_id_to_index = {"a": 0, "c": 1, "d": 2}
+
+    NPUModelRunner._cache_prev_sampled_token_ids(mock_runner)
+
+    copy_event.synchronize.assert_called_once()
+    assert mock_runner.input_batch.token_ids_cpu[1, 3] == 11
+    assert mock_runner.input_batch.token_ids_cpu[0, 3] == 0
+    assert mock_runner.input_batch.num_tokens_no_spec.tolist() == [4, 2]
+    assert mock_runner.input_batch.num_tokens.tolist() == [4, 2]
+    assert mock_runner.requests["a"].output_token_ids == [11]
+    assert mock_runner.requests["b"].output_token_ids == []
+    assert mock_runner.requests["c"].output_token_ids == [12]
+    assert mock_runner.prev_sampled_token_ids is None
+    assert mock_runner.prev_req_id_to_index is None
+
+
+class FakeSampler:
+
+    def compute_logprobs(self, logits):
+        return logits.log_softmax(dim=-1)
+
+    def gather_logprobs(self, logprobs, num_logprobs, token_ids):
+        topk_logprobs, topk_indices = torch.topk(logprobs, num_logprobs, -1)
+        token_ids = token_ids.unsqueeze(-1)
+        token_logprobs = logprobs.gather(-1, token_ids)
+        ranks = (logprobs >= token_logprobs).sum(-1)
+        return (torch.cat((token_ids, topk_indices), dim=1),
+                torch.cat((token_logprobs, topk_logprobs), dim=1), ranks)
+
+
+def test_get_prompt_logprobs_dict():
+    vocab_size = 16
+    prompts = {"a": list(range(5)), "b": list(range(6, 16))}
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.device = torch.device("cpu")
+    mock_runner.sampler = FakeSampler()
+    mock_runner.model = MagicMock()
+    mock_runner.model.compute_logits.side_effect = lambda hidden, _: hidden
+    mock_runner._compute_prompt_logprobs = partial(
+        NPUModelRunner._compute_prompt_logprobs, mock_runner)
+    # "b" is a chunk of its prompt, "a" its whole prompt.
+    mock_runner.requests = {
+        "a": MagicMock(prompt_token_ids=prompts["a"], num_computed_tokens=0),
+        "b": MagicMock(prompt_token_ids=prompts["b"], num_computed_tokens=2),
+    }
+    mock_runner.input_batch = MagicMock()
+    mock_runner.input_batch.num_prompt_logprobs = {"a": 1, "b": 3}
+    mock_runner.input_batch.in_progress_prompt_logprobs_cpu = {}
+    mock_runner.input_batch.req_id_to_index = {"b": 0, "a": 1}
+    mock_runner.input_batch.token_ids_cpu = np.zeros((2, 16), dtype=np.int32)
+    mock_runner.input_batch.token_ids_cpu[0, :10] = prompts["b"]
+    mock_runner.input_batch.token_ids_cpu[1, :5] = prompts["a"]
+    mock_runner.input_batch.token_rows = np.arange(2)
+    mock_runner.query_start_loc_np = np.array([0, 3, 8], dtype=np.int32)
+    scheduler_output = MagicMock()
+    scheduler_output.num_scheduled_tokens = {"a": 5, "b": 3}
+    hidden_states = torch.randn(8, vocab_size)
+
+    with patch("torch.npu.Event"):
+        prompt_logprobs_dict = NPUModelRunner._get_prompt_logprobs_dict(
+            mock_runner, hidden_states, scheduler_output)
+
+    # Only the completed prompt is returned, the chunk stays in progress.
+    assert list(prompt_logprobs_dict) == ["a"]
+    assert mock_runner.input_batch.num_prompt_logprobs == {"b": 3}
+    in_progress = mock_runner.input_batch.in_progress_prompt_logprobs_cpu
+    assert list(in_progress) == ["b"]
+
+    sampler = FakeSampler()
+    for req_id, logprobs_tensors, rows, chunk_slice, num_logprobs in [
+        ("a", prompt_logprobs_dict["a"], slice(3, 7), slice(0, 4), 1),
+        ("b", in_progress["b"], slice(0, 3), slice(2, 5), 3),
+    ]:
+        start_tok = chunk_slice.start + 1
+        tgt_token_ids = torch.tensor(
+            prompts[req_id][start_tok:start_tok + rows.stop - rows.start])
+        expected = sampler.gather_logprobs(
+            sampler.compute_logprobs(hidden_states[rows]), num_logprobs,
+            tgt_token_ids)
+        assert logprobs_tensors.logprob_token_ids[chunk_slice].tolist(
+        ) == expected[0].tolist()
+        torch.testing.assert_close(logprobs_tensors.logprobs[chunk_slice],
+                                   expected[1])
+        assert logprobs_tensors.selected_token_ranks[chunk_slice].tolist(
+        ) == expected[2].tolist()
+
+
+def _make_dp_runner(dp_rank, dp_decode_graph_size=None):
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.dp_size = 2
+    mock_runner.dp_rank = dp_rank
+    mock_runner.in_profile_run = False
+    mock_runner.dp_decode_graph_size = dp_decode_graph_size
+    mock_runner.dp_decode_num_tokens_across_dp = torch.full(
+        (2, ), 8, dtype=torch.int32)
+    mock_runner.dp_metadata_cpu = torch.zeros(4, dtype=torch.int32)
+    mock_runner.dp_metadata_np = mock_runner.dp_metadata_cpu.numpy()
+    for name in [
+            "_can_skip_dp_metadata_sync", "_start_dp_metadata_exchange",
+            "_wait_dp_metadata_exchange"
+    ]:
+        setattr(mock_runner, name,
+                partial(getattr(NPUModelRunner, name), mock_runner))
+    return mock_runner
+
+
+def test_sync_metadata_across_dp():
+    mock_runner = _make_dp_runner(dp_rank=1)
+    work = MagicMock()
+
+    def all_reduce(tensor, group, async_op):
+        # The other rank has 7 tokens, a prefill and DBO disabled.
+        tensor += torch.tensor([7, 0, 1, 1], dtype=torch.int32)
+        return work
+
+    with patch("vllm_ascend.worker.model_runner_v1.dist.all_reduce",
+               side_effect=all_reduce) as mock_all_reduce, \
+         patch("vllm_ascend.worker.model_runner_v1.get_dp_group"):
+        dp_metadata_work = NPUModelRunner._start_dp_metadata_exchange(
+            mock_runner, 5, False, True)
+        (max_num_tokens, num_tokens_across_dp, with_prefill,
+         enable_dbo) = NPUModelRunner._sync_metadata_across_dp(
+             mock_runner, 5, False, True, dp_metadata_work)
+
+    # The exchange runs on the CPU group and is waited for once.
+    assert mock_all_reduce.call_count == 1
+    assert mock_all_reduce.call_args.kwargs["async_op"]
+    work.wait.assert_called_once()
+    assert max_num_tokens == 7
+    assert num_tokens_across_dp.device.type == "cpu"
+    assert num_tokens_across_dp.tolist() == [7, 7]
+    assert with_prefill
+    assert not enable_dbo
+
+    # A later sync, e.g. of the MTP proposer, does not change the result.
+    with patch("vllm_ascend.worker.model_runner_v1.dist.all_reduce",
+               side_effect=all_reduce), \
+         patch("vllm_ascend.worker.model_runner_v1.get_dp_group"):
+        NPUModelRunner._sync_metadata_across_dp(mock_runner, 9, False, True)
+    assert num_tokens_across_dp.tolist() == [7, 7]
+
+
+def test_sync_metadata_across_dp_skip_in_decode():
+    mock_runner = _make_dp_runner(dp_rank=0, dp_decode_graph_size=8)
+
+    with patch("vllm_ascend.worker.model_runner_v1.dist.all_reduce"
+               ) as mock_all_reduce:
+        assert NPUModelRunner._start_dp_metadata_exchange(
+            mock_runner, 3, False, False) is None
+        (max_num_tokens, num_tokens_across_dp, with_prefill,
+         _) = NPUModelRunner._sync_metadata_across_dp(mock_runner, 3, False,
+                                                      False)
+        mock_all_reduce.assert_not_called()
+    assert max_num_tokens == 8
+    assert num_tokens_across_dp.tolist() == [8, 8]
+    assert not with_prefill
+
+    # A rank with prefill work, e.g. a request recomputed after preemption,
+    # joins the decode step the other ranks run without DBO.
+    with patch("vllm_ascend.worker.model_runner_v1.dist.all_reduce"
+               ) as mock_all_reduce:
+        (max_num_tokens, _, with_prefill,
+         enable_dbo) = NPUModelRunner._sync_metadata_across_dp(
+             mock_runner, 5, True, True)
+        mock_all_reduce.assert_not_called()
+    assert max_num_tokens == 8
+    assert not with_prefill
+    assert not enable_dbo
+
+
+@pytest.mark.parametrize("max_num_batched_tokens, expected_graph_size",
+                         [(8, 8), (16, None)])
+def test_init_dp_decode_graph_size(max_num_batched_tokens,
+                                   expected_graph_size):
+    mock_runner = _make_dp_runner(dp_rank=0)
+    mock_runner.is_kv_consumer = True
+    mock_runner.scheduler_config = MagicMock()
+    mock_runner.scheduler_config.max_num_batched_tokens = \
+        max_num_batched_tokens
+    ascend_config = MagicMock()
+    ascend_config.skip_dp_sync_in_decode = True
+
+    with patch("vllm_ascend.worker.model_runner_v1.get_ascend_config",
+               return_value=ascend_config):
+        if expected_graph_size is None:
+            # The scheduler could produce steps larger than the graph.
+            with pytest.raises(ValueError, match="max_num_batched_tokens"):
+                NPUModelRunner._init_dp_decode_graph_size(mock_runner, [8])
+        else:
+            NPUModelRunner._init_dp_decode_graph_size(mock_runner, [8])
+    assert mock_runner.dp_decode_graph_size == expected_graph_size
+
+
+@pytest.mark.parametrize(
+    "query_lens, attn_state, enable_dbo_decode, use_aclgraph, expected",
+    [
+        # a single long prompt is split in the middle
+        ([512], "PrefillNoCache", False, False, True),
+        ([100, 100], "PrefillNoCache", False, False, False),
+        ([1] * 128, "DecodeOnly", False, False, False),
+        ([1] * 128, "DecodeOnly", True, False, True),
+        # the decode graphs are captured without micro batches
+        ([1] * 128, "DecodeOnly", True, True, False),
+        ([1] * 32, "DecodeOnly", True, False, True),
+        ([1] * 16, "DecodeOnly", True, False, False),
+    ])
+def test_check_dbo_is_valid(query_lens, attn_state, enable_dbo_decode,
+                            use_aclgraph, expected):
+    from vllm_ascend.attention.attention_v1 import AscendAttentionState
+
+    mock_runner = MagicMock(spec=NPUModelRunner)
+    mock_runner.vllm_config = MagicMock()
+    mock_runner.vllm_config.model_config.use_mla = True
+    mock_runner.use_aclgraph = use_aclgraph
+    # the thresholds are read from the model instead of the defaults
+    mock_runner.get_model.return_value.model.multistream_config = \
+        MultiStreamConfig(min_decode_tokens_to_split=32)
+    ascend_config = MagicMock()
+    ascend_config.torchair_graph_config.enabled = False
+    with patch("vllm_ascend.worker.model_runner_v1.envs_ascend") as envs, \
+         patch("vllm_ascend.worker.model_runner_v1.get_ascend_config",
+               return_value=ascend_config):
+        envs.VLLM_ASCEND_ENABLE_DBO = True
+        envs.VLLM_ASCEND_ENABLE_DBO_DECODE = enable_dbo_decode
+        assert NPUModelRunner._check_dbo_is_valid(
+            mock_runner, query_lens, AscendAttentionState[attn_state],
+            sum(query_lens)) == expected
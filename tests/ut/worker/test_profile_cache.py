@@ -0,0 +1,72 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+from unittest.mock import MagicMock
+
+from vllm_ascend.worker.profile_cache import (ProfileResult,
+                                              load_profile_result,
+                                              profile_cache_key,
+                                              save_profile_result)
+
+
+def make_vllm_config():
+    vllm_config = MagicMock()
+    vllm_config.model_config.model = "Qwen/Qwen3-8B"
+    vllm_config.model_config.dtype = "bfloat16"
+    vllm_config.parallel_config.tensor_parallel_size = 2
+    vllm_config.scheduler_config.max_num_batched_tokens = 8192
+    vllm_config.lora_config = None
+    vllm_config.speculative_config = None
+    vllm_config.additional_config = {"profile_cache_dir": "/tmp/profile"}
+    return vllm_config
+
+
+def test_profile_cache_key():
+    vllm_config = make_vllm_config()
+    key = profile_cache_key(vllm_config, rank=0)
+    assert key == profile_cache_key(vllm_config, rank=0)
+    assert key["lora"] == "None"
+    assert key != profile_cache_key(vllm_config, rank=1)
+    vllm_config.scheduler_config.max_num_batched_tokens = 4096
+    assert key != profile_cache_key(vllm_config, rank=0)
+
+
+def test_save_and_load_profile_result(tmp_path):
+    path = str(tmp_path / "profile" / "memory_profile_rank0.json")
+    vllm_config = make_vllm_config()
+    key = profile_cache_key(vllm_config, rank=0)
+    assert load_profile_result(path, key) is None
+
+    result = ProfileResult(peak_memory=3 << 30,
+                           model_memory=1 << 30,
+                           profile_seconds=12.5)
+    save_profile_result(path, key, result)
+    assert load_profile_result(path, key) == result
+
+    # The result is invalidated by any change of the key.
+    vllm_config.scheduler_config.max_num_batched_tokens = 4096
+    new_key = profile_cache_key(vllm_config, rank=0)
+    assert load_profile_result(path, new_key) is None
+    new_result = ProfileResult(peak_memory=2 << 30,
+                               model_memory=1 << 30,
+                               profile_seconds=10.0)
+    save_profile_result(path, new_key, new_result)
+    assert load_profile_result(path, new_key) == new_result
+    assert load_profile_result(path, key) is None
+
+
+def test_load_invalid_profile_result(tmp_path):
+    path = tmp_path / "memory_profile_rank0.json"
+    path.write_text("{\"key\": {")
+    assert load_profile_result(str(path), {"model": "test"}) is None
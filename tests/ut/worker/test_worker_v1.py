@@ -1,3 +1,4 @@
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -219,7 +220,7 @@ class TestNPUWorker(TestBase):
             # Verify calls
             mock_sleep_mode_enabled.assert_called_once()
             mock_allocator.sleep.assert_called_once_with(
-                offload_tags=("weights", ))
+                offload_tags=("weights", ), unchanged_tags=None)
             self.assertEqual(mock_platform.mem_get_info.call_count,
                              2)  # Called 2 times in sleep method
             # Verify log output
@@ -616,6 +617,7 @@ class TestNPUWorker(TestBase):
                 8500  # Initial memory greater than current free memory
             )
             worker.model_runner = MagicMock()
+            worker.profile_cache_dir = None
             worker.cache_config = MagicMock()
             worker.cache_config.gpu_memory_utilization = 0.8
 
@@ -692,6 +694,7 @@ class TestNPUWorker(TestBase):
             worker = NPUWorker()
             worker.init_npu_memory = 8500
             worker.model_runner = MagicMock()
+            worker.profile_cache_dir = None
             worker.cache_config = MagicMock()
             worker.cache_config.gpu_memory_utilization = 0.9
 
@@ -730,6 +733,7 @@ class TestNPUWorker(TestBase):
             worker = NPUWorker()
             worker.init_npu_memory = 8500  # Initial memory < current free memory 9000
             worker.model_runner = MagicMock()
+            worker.profile_cache_dir = None
             worker.cache_config = MagicMock()
             worker.cache_config.gpu_memory_utilization = 0.8
 
@@ -784,6 +788,7 @@ class TestNPUWorker(TestBase):
             worker = NPUWorker()
             worker.init_npu_memory = 8500
             worker.model_runner = MagicMock()
+            worker.profile_cache_dir = None
             worker.cache_config = MagicMock()
             worker.cache_config.gpu_memory_utilization = 0.8
 
@@ -802,6 +807,67 @@ class TestNPUWorker(TestBase):
             #           = 10000 * 0.8 - 10000 = -2000, max(0, -2000) = 0
             self.assertEqual(result, 0)
 
+    @patch("vllm_ascend.worker.worker_v1.profile_cache_key",
+           return_value={"model": "test"})
+    @patch("vllm_ascend.worker.worker_v1.NPUPlatform.clear_npu_memory")
+    @patch("vllm_ascend.worker.worker_v1.NPUPlatform.empty_cache")
+    @patch("vllm_ascend.worker.worker_v1.NPUPlatform.mem_get_info")
+    @patch("torch_npu.npu.memory_stats")
+    @patch("torch_npu.npu.mem_get_info")
+    def test_determine_available_memory_with_profile_cache(
+        self,
+        mock_torch_mem_get_info,
+        mock_torch_memory_stats,
+        mock_platform_mem_get_info,
+        mock_platform_empty_cache,
+        mock_platform_clear_npu_memory,
+        mock_profile_cache_key,
+    ):
+        """Test determine_available_memory skips the profiling run when the
+        profile is cached"""
+        from vllm_ascend.worker.worker_v1 import NPUWorker
+
+        mock_platform_mem_get_info.side_effect = [
+            (8000, 10000),  # before profile execution
+            (7000, 10000),  # after profile execution
+            (8000, 10000),  # before the cached profile
+        ]
+        mock_torch_memory_stats.side_effect = [
+            {
+                "allocated_bytes.all.current": 1000
+            },  # model memory
+            {
+                "allocated_bytes.all.peak": 2000
+            },  # peak memory
+            {
+                "allocated_bytes.all.current": 1000
+            },  # current allocated
+            {
+                "allocated_bytes.all.current": 1000
+            },  # model memory of the restart
+        ]
+        mock_torch_mem_get_info.return_value = (9000, 10000)
+
+        with tempfile.TemporaryDirectory() as profile_cache_dir, \
+                patch.object(NPUWorker, "__init__", lambda x, **kwargs: None):
+            worker = NPUWorker()
+            worker.init_npu_memory = 8500
+            worker.rank = 0
+            worker.vllm_config = MagicMock()
+            worker.model_runner = MagicMock()
+            worker.profile_cache_dir = profile_cache_dir
+            worker.cache_config = MagicMock()
+            worker.cache_config.gpu_memory_utilization = 0.8
+
+            result = worker.determine_available_memory()
+            worker.model_runner.profile_run.assert_called_once()
+            self.assertEqual(result, int(10000 * 0.8 - 2000))
+
+            # A restart with the same key uses the cached profile.
+            worker.model_runner.reset_mock()
+            self.assertEqual(worker.determine_available_memory(), result)
+            worker.model_runner.profile_run.assert_not_called()
+
     def test_execute_model_first_rank(self):
         """Test execute_model method - first rank case"""
         from vllm.v1.outputs import ModelRunnerOutput
@@ -1045,6 +1111,7 @@ class TestNPUWorker(TestBase):
             ]
             worker.model_runner._dummy_run.assert_has_calls(expected_calls)
 
+            worker.model_runner.calibrate_moe_comm_method.assert_called_once()
             # Should not call capture_model in eager mode
             worker.model_runner.capture_model.assert_not_called()
 
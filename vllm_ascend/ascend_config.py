@@ -45,6 +45,61 @@ class AscendConfig:
             ascend_scheduler_config)
 
         self.expert_map_path = additional_config.get("expert_map_path", None)
+        self.dynamic_eplb = additional_config.get("dynamic_eplb", False)
+        self.num_iterations_eplb_update = additional_config.get(
+            "num_iterations_eplb_update", 400)
+        self.num_wait_worker_iterations = additional_config.get(
+            "num_wait_worker_iterations", 30)
+        if self.dynamic_eplb and not (0 < self.num_wait_worker_iterations <
+                                      self.num_iterations_eplb_update):
+            raise ValueError(
+                "num_wait_worker_iterations must be positive and less than "
+                "num_iterations_eplb_update when dynamic_eplb is enabled")
+        self.aclgraph_capture_plan_path = additional_config.get(
+            "aclgraph_capture_plan_path", None)
+        self.aclgraph_lazy_capture = additional_config.get(
+            "aclgraph_lazy_capture", False)
+        self.skip_dp_sync_in_decode = additional_config.get(
+            "skip_dp_sync_in_decode", False)
+        self.profile_cache_dir = additional_config.get(
+            "profile_cache_dir", None)
+        self.moe_comm_table_path = additional_config.get(
+            "moe_comm_table_path", None)
+        self.moe_comm_calibration = additional_config.get(
+            "moe_comm_calibration", False)
+        self.spec_token_tree = additional_config.get("spec_token_tree", None)
+        if self.spec_token_tree is not None:
+            speculative_config = vllm_config.speculative_config
+            if speculative_config is None or speculative_config.method != "eagle3":
+                raise ValueError(
+                    "spec_token_tree is only supported with eagle3 "
+                    "speculative decoding")
+            if vllm_config.model_config.use_mla:
+                raise ValueError(
+                    "spec_token_tree is not supported with MLA models")
+            if len(self.spec_token_tree
+                   ) != speculative_config.num_speculative_tokens:
+                raise ValueError(
+                    "The depth of spec_token_tree must be equal to "
+                    "num_speculative_tokens")
+        self.adaptive_spec_len = additional_config.get(
+            "adaptive_spec_len", False)
+        self.spec_len_min_gain = additional_config.get(
+            "spec_len_min_gain", 0.3)
+        self.spec_disable_batch_size = additional_config.get(
+            "spec_disable_batch_size", None)
+        if self.adaptive_spec_len:
+            speculative_config = vllm_config.speculative_config
+            if speculative_config is None or speculative_config.method == "deepseek_mtp":
+                raise ValueError(
+                    "adaptive_spec_len requires ngram or eagle speculative "
+                    "decoding, the MTP attention needs the same number of "
+                    "draft tokens for all the requests")
+            if self.spec_token_tree is not None:
+                raise ValueError(
+                    "adaptive_spec_len is not supported with spec_token_tree")
+            if not 0 < self.spec_len_min_gain < 1:
+                raise ValueError("spec_len_min_gain must be in (0, 1)")
         self.chunked_prefill_for_mla = additional_config.get(
             "chunked_prefill_for_mla", False)
         self.enable_shared_expert_dp = additional_config.get(
@@ -12,6 +12,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from typing import Optional
+
 import torch
 
 
@@ -39,11 +41,17 @@ class AttentionMaskBuilder:
         self,
         max_seq_len: int,
         dtype: torch.dtype,
+        max_model_len: Optional[int] = None,
     ):
         attn_mask = _generate_attn_mask(max_seq_len, dtype)
+        # The geometric growth of the caches stops at the max model len.
+        self.max_model_len = max_model_len
 
         self._seq_len_cached = attn_mask.shape[0]
         self.attn_mask_cache = attn_mask
+        # The splitfuse masks are built on the device from the positions of
+        # the query tokens and of the keys, see `get_splitfuse_attn_mask`.
+        self._key_positions: Optional[torch.Tensor] = None
 
     @staticmethod
     def get_mask_scale_factor(dtype: torch.dtype = torch.float16):
@@ -58,6 +66,14 @@ class AttentionMaskBuilder:
             )
         return mask_scale_factor
 
+    @staticmethod
+    def get_splitfuse_mask_value(dtype: torch.dtype) -> float:
+        """The scaled value of the masked positions of the splitfuse mask."""
+        # The fp16 mask value of `_generate_attn_mask` overflows to -inf.
+        if dtype == torch.float16:
+            return float("-inf")
+        return float(AttentionMaskBuilder.get_mask_scale_factor(dtype))
+
     def get_attn_mask(self, max_seq_len: int, dtype: torch.dtype,
                       device: torch.device):
         self._update_attn_cache(max_seq_len, dtype)
@@ -74,20 +90,78 @@ class AttentionMaskBuilder:
         if dtype not in [torch.float16, torch.bfloat16]:
             raise ValueError(
                 "splitfuse_attn_mask now only supports bf16 and fp16")
-        max_seq_len = max(seq_lens, default=0)
-        self._update_attn_cache(max_seq_len, dtype)
+        max_seq_len = int(max(seq_lens, default=0))
         # FIXME: Currently the mask value of chunked-prefill situation and Prefill-Only situation
         # is not the same. Fix this in the future when kernel is ready.
-        mask_scale_factor = AttentionMaskBuilder.get_mask_scale_factor(dtype)
-        attn_mask = torch.index_select(self.attn_mask_cache,
-                                       dim=0,
-                                       index=position)[:, :max_seq_len]
-        attn_mask *= mask_scale_factor
-        return attn_mask.contiguous().to(device, non_blocking=True)
+        mask_value = AttentionMaskBuilder.get_splitfuse_mask_value(dtype)
+        # A token attends to the keys up to its own position, so only the
+        # positions are needed to build its row of the causal mask.
+        key_positions = self._get_key_positions(max_seq_len, device)
+        position = position.to(device, non_blocking=True)
+        mask_flag = key_positions[:max_seq_len] > position.unsqueeze(1)
+        attn_mask = torch.zeros(mask_flag.shape, dtype=dtype, device=device)
+        return attn_mask.masked_fill_(mask_flag, mask_value)
+
+    def get_tree_attn_mask(
+        self,
+        seq_lens: torch.Tensor,
+        position: torch.Tensor,
+        tree_node_ids: torch.Tensor,
+        tree_ancestor_mask: torch.Tensor,
+        dtype: torch.dtype,
+        device: torch.device,
+    ) -> torch.Tensor:
+        """The splitfuse mask of a batch with draft token trees.
+
+        `position` is the position of each token in the KV cache, where the
+        nodes of a tree follow their root in order, and `tree_node_ids` is
+        the node of each draft token, -1 for the other tokens. A node only
+        attends to its ancestors among the nodes: `tree_ancestor_mask[i, j]`
+        is True if the node j is the node i or one of its ancestors.
+        """
+        attn_mask = self.get_splitfuse_attn_mask(seq_lens, position, dtype,
+                                                 device)
+        max_seq_len = attn_mask.shape[1]
+        num_nodes = tree_ancestor_mask.shape[0]
+        position = position.to(device, non_blocking=True)
+        node_ids = tree_node_ids.to(device, non_blocking=True)
+        # The node of each key in the tree of the token, out of [0, num_nodes)
+        # for the keys of the context.
+        key_nodes = (self._get_key_positions(max_seq_len, device)[:max_seq_len]
+                     - (position - node_ids).unsqueeze(1))
+        in_tree = ((node_ids >= 0).unsqueeze(1) & (key_nodes >= 0) &
+                   (key_nodes < num_nodes))
+        is_ancestor = tree_ancestor_mask.to(device)[
+            node_ids.clamp(min=0).unsqueeze(1),
+            key_nodes.clamp(0, num_nodes - 1)]
+        return attn_mask.masked_fill_(
+            in_tree & ~is_ancestor,
+            AttentionMaskBuilder.get_splitfuse_mask_value(dtype))
+
+    def _grown_len(self, seqlen: int, cached_len: int) -> int:
+        grown_len = 2 * cached_len
+        if self.max_model_len is not None:
+            grown_len = min(grown_len, self.max_model_len)
+        return max(seqlen, grown_len)
+
+    def _get_key_positions(self, seqlen: int,
+                           device: torch.device) -> torch.Tensor:
+        cached_len = (0 if self._key_positions is None else
+                      self._key_positions.shape[0])
+        if seqlen > cached_len:
+            # Grow geometrically so that increasing lengths rebuild it
+            # a logarithmic number of times.
+            self._key_positions = torch.arange(
+                self._grown_len(seqlen, cached_len), device=device)
+        return self._key_positions
 
     def _update_attn_cache(self, seqlen: int, dtype: torch.dtype):
         if seqlen > self._seq_len_cached:
-            self._seq_len_cached = seqlen
-            self.attn_mask_cache = _generate_attn_mask(seqlen, dtype)
+            # Grow geometrically so that increasing lengths regenerate the
+            # mask a logarithmic number of times.
+            self._seq_len_cached = self._grown_len(seqlen,
+                                                   self._seq_len_cached)
+            self.attn_mask_cache = _generate_attn_mask(self._seq_len_cached,
+                                                       dtype)
         if self.attn_mask_cache.dtype != dtype:
             self.attn_mask_cache = self.attn_mask_cache.to(dtype)
@@ -157,6 +157,7 @@ class AscendMLAMetadata:
             ms_split_config=ms_split_config,
             attn_metadata=self,
             _metadata_cls=AscendMLAMetadata,
+            _chunked_context_cls=AscendMLAPrefillMetadata.ChunkedContextMetadata,
         )
 
 
@@ -0,0 +1,162 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Traffic aware selection of the ACL graph capture sizes.
+#
+import json
+import os
+from typing import Optional
+
+import numpy as np
+from vllm.logger import logger
+
+
+def plan_capture_sizes(histogram: dict[int, int], candidate_sizes: list[int],
+                       max_num_sizes: int) -> list[int]:
+    """Choose the capture sizes minimizing the expected padding.
+
+    A batch of `n` tokens is padded to the smallest capture size >= n, so the
+    expected padding of a set of sizes is the sum over the histogram of
+    `count * (size - n)`. The largest candidate is always kept so that the
+    batches the graphs covered before are still covered.
+
+    Args:
+        histogram: number of steps run with each number of tokens.
+        candidate_sizes: the sizes to choose from.
+        max_num_sizes: the maximum number of sizes to choose.
+
+    Returns:
+        The chosen sizes in ascending order.
+    """
+    max_size = max(candidate_sizes)
+    # Only the batches covered by the graphs are padded, and it is always
+    # optimal to capture the sizes of the observed batches.
+    candidates = np.unique(
+        np.array(list(candidate_sizes) +
+                 [n for n in histogram if 0 < n <= max_size],
+                 dtype=np.int64))
+    if max_num_sizes >= len(candidates):
+        return candidates.tolist()
+    if max_num_sizes <= 1:
+        return [max_size]
+
+    counts = np.zeros(max_size + 1, dtype=np.float64)
+    for num_tokens, count in histogram.items():
+        if 0 < num_tokens <= max_size:
+            counts[num_tokens] += count
+    # Number of batches and of tokens of the batches <= each size.
+    cum_counts = np.cumsum(counts)[candidates]
+    cum_tokens = np.cumsum(counts * np.arange(max_size + 1))[candidates]
+    # padding[i, j]: padding of the batches in (candidates[i], candidates[j]]
+    # when candidates[i] and candidates[j] are consecutive capture sizes.
+    padding = candidates[None, :] * (
+        cum_counts[None, :] - cum_counts[:, None]) - (cum_tokens[None, :] -
+                                                      cum_tokens[:, None])
+    padding[np.tril_indices(len(candidates))] = np.inf
+
+    # min_padding[j]: minimal padding of the batches <= candidates[j] with
+    # the current number of sizes, the largest one being candidates[j].
+    min_padding = candidates * cum_counts - cum_tokens
+    prev_sizes = []
+    for _ in range(max_num_sizes - 1):
+        total_padding = min_padding[:, None] + padding
+        prev_sizes.append(np.argmin(total_padding, axis=0))
+        min_padding = total_padding.min(axis=0)
+
+    size_index = len(candidates) - 1
+    sizes = [int(candidates[size_index])]
+    for prev in reversed(prev_sizes):
+        size_index = prev[size_index]
+        sizes.append(int(candidates[size_index]))
+    return sizes[::-1]
+
+
+def load_capture_plan(path: str) -> dict[int, int]:
+    """Return the histogram of the number of tokens saved in `path`, empty if
+    there is no valid capture plan there."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            plan = json.load(f)
+        return {
+            int(num_tokens): int(count)
+            for num_tokens, count in plan["num_tokens_histogram"].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        logger.warning("Ignoring the invalid ACL graph capture plan %s", path)
+        return {}
+
+
+class CapturePlanRecorder:
+    """Record the number of tokens of the steps run with ACL graphs.
+
+    The histogram, merged with the one of the previous runs, is saved to the
+    capture plan every `save_interval` steps together with the capture sizes
+    planned from it. The next start captures the sizes planned from the
+    saved histogram, see `update_aclgraph_sizes`.
+    """
+
+    def __init__(self,
+                 path: str,
+                 capture_sizes: list[int],
+                 save_interval: int = 1000):
+        self.path = path
+        self.capture_sizes = sorted(capture_sizes)
+        self.save_interval = save_interval
+        self.num_tokens_counts = np.zeros(self.capture_sizes[-1] + 1,
+                                          dtype=np.int64)
+        for num_tokens, count in load_capture_plan(path).items():
+            if 0 < num_tokens < len(self.num_tokens_counts):
+                self.num_tokens_counts[num_tokens] += count
+        self.num_steps = 0
+
+    @property
+    def histogram(self) -> dict[int, int]:
+        num_tokens = np.flatnonzero(self.num_tokens_counts)
+        return dict(
+            zip(num_tokens.tolist(),
+                self.num_tokens_counts[num_tokens].tolist()))
+
+    def record(self, num_tokens: int) -> None:
+        if num_tokens < len(self.num_tokens_counts):
+            self.num_tokens_counts[num_tokens] += 1
+        self.num_steps += 1
+        if self.num_steps % self.save_interval == 0:
+            self.save()
+
+    def save(self) -> None:
+        histogram = self.histogram
+        plan = {
+            "capture_sizes":
+            plan_capture_sizes(histogram, self.capture_sizes,
+                               len(self.capture_sizes)),
+            "num_tokens_histogram": {
+                str(num_tokens): count
+                for num_tokens, count in histogram.items()
+            },
+        }
+        # Write to a temporary file first so that a reader never sees a
+        # partially written plan.
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(plan, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logger.warning("Failed to save the ACL graph capture plan to %s",
+                           self.path,
+                           exc_info=True)
@@ -0,0 +1,203 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import heapq
+import itertools
+import math
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from vllm.v1.core.sched.request_queue import (RequestQueue, SchedulingPolicy,
+                                              create_request_queue)
+from vllm.v1.request import Request
+
+SUPPORTED_POLICIES = ("fcfs", "priority", "slo")
+
+RequestKey = Callable[[Request], tuple]
+
+
+def priority_key(request: Request) -> tuple:
+    """Lower value means higher priority, ties are broken by arrival."""
+    return (request.priority, request.arrival_time)
+
+
+def get_ttft_deadline(request: Request, default_ttft_slo_ms: float) -> float:
+    """Return the absolute time by which the first token of `request` is due.
+
+    A request may carry its own SLO via
+    `SamplingParams.extra_args["ttft_slo_ms"]`, otherwise the scheduler wide
+    default is used. Requests without any SLO never expire.
+    """
+    ttft_slo_ms = default_ttft_slo_ms
+    sampling_params = request.sampling_params
+    if sampling_params is not None and sampling_params.extra_args:
+        ttft_slo_ms = sampling_params.extra_args.get("ttft_slo_ms",
+                                                     ttft_slo_ms)
+    if not ttft_slo_ms or ttft_slo_ms <= 0:
+        return math.inf
+    return request.arrival_time + ttft_slo_ms / 1000
+
+
+def get_request_key(policy: str,
+                    default_ttft_slo_ms: float = 0) -> Optional[RequestKey]:
+    """Return the ordering key of `policy`, or None for plain FCFS."""
+    if policy == "fcfs":
+        return None
+    if policy == "priority":
+        return priority_key
+    if policy == "slo":
+
+        def slo_key(request: Request) -> tuple:
+            # Earliest deadline first, fall back to priority and arrival for
+            # requests sharing the same (or no) deadline.
+            return (get_ttft_deadline(request, default_ttft_slo_ms),
+                    request.priority, request.arrival_time)
+
+        return slo_key
+    raise ValueError(f"Unknown scheduling policy: {policy}")
+
+
+class IndexedPriorityRequestQueue(RequestQueue):
+    """A binary heap of requests ordered by `key`.
+
+    Unlike vLLM's `PriorityRequestQueue`, the heap keeps a request id to slot
+    index, so removing an arbitrary request (abort, finish) is O(log n)
+    instead of a linear scan followed by a re-heapify.
+    """
+
+    def __init__(self, key: RequestKey) -> None:
+        self._key = key
+        # Entries are (key, sequence, request). The sequence number is unique
+        # so the request object itself is never compared.
+        self._heap: list[tuple[Any, int, Request]] = []
+        self._index: dict[str, int] = {}
+        self._counter = itertools.count()
+
+    def add_request(self, request: Request) -> None:
+        """Add a request to the queue according to its key."""
+        if request.request_id in self._index:
+            raise ValueError(
+                f"Request {request.request_id} is already in the queue")
+        self._heap.append((self._key(request), next(self._counter), request))
+        self._index[request.request_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def pop_request(self) -> Request:
+        """Pop the request with the highest priority."""
+        if not self._heap:
+            raise IndexError("pop from empty heap")
+        return self._remove_at(0)
+
+    def peek_request(self) -> Request:
+        """Peek at the request with the highest priority."""
+        if not self._heap:
+            raise IndexError("peek from empty heap")
+        return self._heap[0][2]
+
+    def peek_requests(self, n: int) -> list[Request]:
+        """Peek at the `n` requests with the highest priority, without
+        sorting the whole queue."""
+        return [request for _, _, request in heapq.nsmallest(n, self._heap)]
+
+    def prepend_request(self, request: Request) -> None:
+        """The position of a request is decided by its key only, so
+        prepending is the same as adding."""
+        self.add_request(request)
+
+    def prepend_requests(self, requests: RequestQueue) -> None:
+        for request in requests:
+            self.add_request(request)
+
+    def remove_request(self, request: Request) -> None:
+        """Remove a specific request from the queue in O(log n)."""
+        idx = self._index.get(request.request_id)
+        if idx is None:
+            raise ValueError(
+                f"Request {request.request_id} is not in the queue")
+        self._remove_at(idx)
+
+    def remove_requests(self, requests: Iterable[Request]) -> None:
+        for request in requests:
+            if request.request_id in self._index:
+                self._remove_at(self._index[request.request_id])
+
+    def __contains__(self, request: object) -> bool:
+        return isinstance(request, Request) and \
+            request.request_id in self._index
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[Request]:
+        """Iterate over the queue in priority order."""
+        for _, _, request in sorted(self._heap):
+            yield request
+
+    def __reversed__(self) -> Iterator[Request]:
+        """Iterate over the queue in reverse priority order."""
+        for _, _, request in sorted(self._heap, reverse=True):
+            yield request
+
+    def _remove_at(self, idx: int) -> Request:
+        request = self._heap[idx][2]
+        del self._index[request.request_id]
+        last = self._heap.pop()
+        if idx < len(self._heap):
+            self._heap[idx] = last
+            self._index[last[2].request_id] = idx
+            self._sift_up(idx)
+            self._sift_down(self._index[last[2].request_id])
+        return request
+
+    def _swap(self, i: int, j: int) -> None:
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._index[heap[i][2].request_id] = i
+        self._index[heap[j][2].request_id] = j
+
+    def _sift_up(self, idx: int) -> None:
+        heap = self._heap
+        while idx > 0:
+            parent = (idx - 1) >> 1
+            if heap[idx] >= heap[parent]:
+                break
+            self._swap(idx, parent)
+            idx = parent
+
+    def _sift_down(self, idx: int) -> None:
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = idx
+            for child in (2 * idx + 1, 2 * idx + 2):
+                if child < size and heap[child] < heap[smallest]:
+                    smallest = child
+            if smallest == idx:
+                return
+            self._swap(idx, smallest)
+            idx = smallest
+
+
+def create_ascend_request_queue(policy: str,
+                                default_ttft_slo_ms: float = 0
+                                ) -> RequestQueue:
+    """Create the waiting queue of AscendScheduler for `policy`."""
+    key = get_request_key(policy, default_ttft_slo_ms)
+    if key is None:
+        return create_request_queue(SchedulingPolicy.FCFS)
+    return IndexedPriorityRequestQueue(key)
@@ -20,6 +20,8 @@ from typing import Type, Union
 
 from vllm.config import SchedulerConfig
 
+from vllm_ascend.core.request_queue import SUPPORTED_POLICIES
+
 
 @dataclass
 class AscendSchedulerConfig(SchedulerConfig):
@@ -30,6 +32,17 @@ class AscendSchedulerConfig(SchedulerConfig):
         "vllm_ascend.core.scheduler.AscendScheduler")
     enable_pd_transfer: bool = False
     decode_max_num_seqs: int = 0
+    # Default TTFT SLO in milliseconds used by the "slo" policy for requests
+    # that don't carry their own one in `SamplingParams.extra_args`.
+    ttft_slo_ms: float = 0
+    # Chunked prefill that keeps the prefill-first strategy. 0 disables it.
+    prefill_chunk_size: int = 0
+    # Upper bound of prefill tokens per step in chunked mode, 0 means
+    # max_num_batched_tokens.
+    max_prefill_tokens_per_step: int = 0
+    # Number of waiting requests whose LoRA adapters are prefetched to the
+    # host memory of the workers ahead of their scheduling. 0 disables it.
+    lora_prefetch_depth: int = 0
 
     @classmethod
     def initialize_from_config(
@@ -49,6 +62,10 @@ class AscendSchedulerConfig(SchedulerConfig):
             "vllm_ascend.core.scheduler.AscendScheduler")
         scheduler_config["enable_pd_transfer"] = False
         scheduler_config["decode_max_num_seqs"] = 0
+        scheduler_config["ttft_slo_ms"] = 0
+        scheduler_config["prefill_chunk_size"] = 0
+        scheduler_config["max_prefill_tokens_per_step"] = 0
+        scheduler_config["lora_prefetch_depth"] = 0
         # Override params in original SchedulerConfig with params in ascend_scheduler_config
         for k, _ in scheduler_config.items():
             if hasattr(ascend_scheduler_config, k):
@@ -60,7 +77,8 @@ class AscendSchedulerConfig(SchedulerConfig):
         self.encoder_cache_size = self.max_num_batched_tokens
         self.chunked_prefill_enabled = self.enable_chunked_prefill
         if (self.max_num_batched_tokens < self.max_model_len
-                and not self.chunked_prefill_enabled):
+                and not self.chunked_prefill_enabled
+                and self.prefill_chunk_size <= 0):
             raise ValueError(
                 "Ascend scheduler is enabled without chunked prefill feature. "
                 f"Argument max_num_batched_tokens ({self.max_num_batched_tokens}) is "
@@ -69,10 +87,30 @@ class AscendSchedulerConfig(SchedulerConfig):
                 "max_num_batched_tokens and makes vLLM reject longer "
                 "sequences. Please increase max_num_batched_tokens or "
                 "decrease max_model_len.")
-        if self.policy != "fcfs":
+        if self.policy not in SUPPORTED_POLICIES:
             raise NotImplementedError(
-                f"currently AscendScheduler only supports fcfs policy, got {self.policy}"
-            )
+                f"currently AscendScheduler only supports {SUPPORTED_POLICIES} "
+                f"policies, got {self.policy}")
+        if self.prefill_chunk_size > 0:
+            if self.chunked_prefill_enabled:
+                raise ValueError(
+                    "prefill_chunk_size can't be used together with "
+                    "enable_chunked_prefill.")
+            if self.prefill_chunk_size > self.max_num_batched_tokens:
+                raise ValueError(
+                    f"prefill_chunk_size ({self.prefill_chunk_size}) must "
+                    "not be larger than max_num_batched_tokens "
+                    f"({self.max_num_batched_tokens}).")
+        if self.max_prefill_tokens_per_step < 0:
+            raise ValueError("max_prefill_tokens_per_step must be "
+                             "non-negative, got "
+                             f"{self.max_prefill_tokens_per_step}")
+        if self.lora_prefetch_depth < 0:
+            raise ValueError("lora_prefetch_depth must be non-negative, got "
+                             f"{self.lora_prefetch_depth}")
+        if self.ttft_slo_ms < 0:
+            raise ValueError(
+                f"ttft_slo_ms must be non-negative, got {self.ttft_slo_ms}")
         if self.is_multimodal_model:
             raise NotImplementedError(
                 "currently AscendScheduler only supports LLM models.")
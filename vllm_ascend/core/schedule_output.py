@@ -0,0 +1,38 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+
+from dataclasses import dataclass, field, fields
+
+from vllm.lora.request import LoRARequest
+from vllm.v1.core.sched.output import SchedulerOutput
+
+
+@dataclass
+class AscendSchedulerOutput(SchedulerOutput):
+    # The adapters of the waiting requests which are going to be scheduled
+    # soon. The model runner loads them in the background so that the disk
+    # load is off the critical path once the requests are scheduled.
+    prefetch_lora_requests: list[LoRARequest] = field(default_factory=list)
+
+    @classmethod
+    def from_scheduler_output(cls, scheduler_output: SchedulerOutput,
+                              **kwargs) -> "AscendSchedulerOutput":
+        """Extend the output of the vLLM scheduler with the Ascend fields."""
+        for output_field in fields(SchedulerOutput):
+            kwargs.setdefault(output_field.name,
+                              getattr(scheduler_output, output_field.name))
+        return cls(**kwargs)
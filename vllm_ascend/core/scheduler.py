@@ -14,17 +14,21 @@
 # limitations under the License.
 # This file is a part of the vllm-ascend project.
 #
+import itertools
 import time
 from collections import deque
-from typing import Iterable, Union
+from typing import Iterable, Optional, Union
 
 from vllm.config import VllmConfig
 from vllm.distributed.kv_events import KVEventBatch
 from vllm.logger import logger
+from vllm.lora.request import LoRARequest
 from vllm.multimodal import MULTIMODAL_REGISTRY, MultiModalRegistry
 from vllm.utils import cdiv
 from vllm.v1.core.kv_cache_manager import KVCacheBlocks
 from vllm.v1.core.sched.output import NewRequestData, SchedulerOutput
+from vllm.v1.core.sched.request_queue import (SchedulingPolicy,
+                                              create_request_queue)
 from vllm.v1.core.sched.scheduler import Scheduler
 from vllm.v1.engine import EngineCoreEventType, EngineCoreOutputs
 from vllm.v1.kv_cache_interface import KVCacheConfig
@@ -32,6 +36,12 @@ from vllm.v1.outputs import ModelRunnerOutput
 from vllm.v1.request import Request, RequestStatus
 from vllm.v1.structured_output import StructuredOutputManager
 
+from vllm_ascend.core.request_queue import (IndexedPriorityRequestQueue,
+                                            create_ascend_request_queue,
+                                            get_request_key)
+from vllm_ascend.core.schedule_output import AscendSchedulerOutput
+from vllm_ascend.lora.adapter_cache import LoRAResidencyTracker
+
 
 class AscendScheduler(Scheduler):
     """This Scheduler extends vllm's original v1 scheduler
@@ -46,12 +56,31 @@ class AscendScheduler(Scheduler):
         include_finished_set: bool = False,
         log_stats: bool = False,
     ) -> None:
-        super().__init__(vllm_config, kv_cache_config,
-                         structured_output_manager, mm_registry,
-                         include_finished_set, log_stats)
+        # vLLM's scheduler only knows about fcfs and priority policies, the
+        # ascend specific ones are served by our own waiting queue below.
+        policy = vllm_config.scheduler_config.policy
+        if policy not in ("fcfs", "priority"):
+            vllm_config.scheduler_config.policy = "priority"
+        try:
+            super().__init__(vllm_config, kv_cache_config,
+                             structured_output_manager, mm_registry,
+                             include_finished_set, log_stats)
+        finally:
+            vllm_config.scheduler_config.policy = policy
+        # NOTE: `self.policy` stays SchedulingPolicy.PRIORITY for the slo
+        # policy, vLLM has no value for it and rejects unknown ones when
+        # building its queues. It only matters in the chunked prefill path,
+        # delegated to vLLM, which preempts by (priority, arrival_time)
+        # instead of the TTFT deadline. The prefill-first path orders both
+        # the waiting queue and the preemptions by `self.request_key`.
         self.scheduled_req_ids: set[str] = set()
         self.running: list[Request] = []
 
+        ttft_slo_ms = getattr(self.scheduler_config, 'ttft_slo_ms', 0)
+        # Ordering key of the policy, None means plain FCFS.
+        self.request_key = get_request_key(policy, ttft_slo_ms)
+        self.waiting = create_ascend_request_queue(policy, ttft_slo_ms)
+
         self.finished_prefill_reqs: deque[Request] = deque()
         enable_pd_transfer = getattr(self.scheduler_config,
                                      'enable_pd_transfer', False)
@@ -61,9 +90,32 @@ class AscendScheduler(Scheduler):
         self.decode_max_num_running_reqs = max(self.max_num_running_reqs,
                                                decode_max_num_seqs)
 
+        # Chunked prefill inside the prefill-first path. Long prompts are
+        # split into chunks of `prefill_chunk_size` tokens and at most
+        # `max_prefill_tokens_per_step` prefill tokens are scheduled per step.
+        self.prefill_chunk_size = getattr(self.scheduler_config,
+                                          'prefill_chunk_size', 0)
+        self.max_prefill_tokens_per_step = (getattr(
+            self.scheduler_config, 'max_prefill_tokens_per_step', 0)
+                                            or self.max_num_scheduled_tokens)
+        self.prefilled_last_step = False
+
+        # The LoRA adapters of the first `lora_prefetch_depth` waiting
+        # requests are prefetched to the host memory of the workers.
+        self.lora_prefetch_depth = getattr(self.scheduler_config,
+                                           'lora_prefetch_depth', 0)
+        self.lora_residency: Optional[LoRAResidencyTracker] = None
+        if self.lora_config and self.lora_prefetch_depth > 0:
+            self.lora_residency = LoRAResidencyTracker(
+                self.lora_config.max_cpu_loras)
+
     def schedule(self) -> SchedulerOutput:
         if self.scheduler_config.chunked_prefill_enabled:
-            return super().schedule()
+            scheduler_output = super().schedule()
+            if self.lora_residency is not None:
+                scheduler_output = self._prefetch_waiting_loras(
+                    scheduler_output)
+            return scheduler_output
         scheduled_new_reqs: list[Request] = []
         scheduled_resumed_reqs: list[Request] = []
         scheduled_running_reqs: list[Request] = []
@@ -80,10 +132,12 @@ class AscendScheduler(Scheduler):
 
         # Record scheduled LoRA requests.
         scheduled_loras: set[int] = set()
+        # The adapters the workers should load in the background.
+        prefetch_lora_requests: list[LoRARequest] = []
 
-        # Use a temporary deque to collect requests that need to be skipped
+        # Use a temporary queue to collect requests that need to be skipped
         # and put back at the head of the waiting queue later
-        skipped_waiting_requests: deque[Request] = deque()
+        skipped_waiting_requests = create_request_queue(SchedulingPolicy.FCFS)
 
         if self.phase == "prefill":
             remaining_running_reqs = []
@@ -98,19 +152,65 @@ class AscendScheduler(Scheduler):
             if not self.waiting and not self.running:
                 self.phase = "decode"
 
-        # Schedule prefill requests first.
-        while self.waiting and token_budget > 0:
+        prefill_token_budget = token_budget
+        if self.prefill_chunk_size > 0:
+            prefill_token_budget = min(token_budget,
+                                       self.max_prefill_tokens_per_step)
+            # Don't let a long chunked prompt starve running decodes, give
+            # them a step in between two prefill steps.
+            if self.prefilled_last_step and self._has_decode_requests():
+                prefill_token_budget = 0
+
+            # Continue the prompts which were partially prefilled before.
+            req_index = 0
+            while req_index < len(self.running) and prefill_token_budget > 0:
+                request = self.running[req_index]
+                if not self._is_partial_prefill(request):
+                    req_index += 1
+                    continue
+                num_new_tokens = min(
+                    request.num_tokens - request.num_computed_tokens,
+                    self.prefill_chunk_size, prefill_token_budget)
+                while True:
+                    new_blocks = self.kv_cache_manager.allocate_slots(
+                        request,
+                        num_new_tokens,
+                        num_lookahead_tokens=self.num_lookahead_tokens)
+                    if new_blocks is not None:
+                        break
+                    # Out of kv cache, the decode path skips partial
+                    # prefills, so preempt the lowest-priority request here.
+                    preempted_req = self._pick_preempted_request(req_index)
+                    self._preempt_request(preempted_req, scheduled_timestamp)
+                    preempted_reqs.append(preempted_req)
+                    if preempted_req == request:
+                        break
+                if new_blocks is None:
+                    break
+                req_index += 1
+                scheduled_running_reqs.append(request)
+                self.scheduled_req_ids.add(request.request_id)
+                req_to_new_blocks[request.request_id] = new_blocks
+                num_scheduled_tokens[request.request_id] = num_new_tokens
+                token_budget -= num_new_tokens
+                prefill_token_budget -= num_new_tokens
+                if self.lora_config and request.lora_request:
+                    scheduled_loras.add(request.lora_request.lora_int_id)
+
+        # Schedule prefill requests first. The requests preempted above wait
+        # for the next step.
+        while self.waiting and prefill_token_budget > 0 and not preempted_reqs:
             if len(self.running) == (self.decode_max_num_running_reqs
                                      if self.phase == "decode" else
                                      self.max_num_running_reqs):
 
                 break
 
-            request = self.waiting[0]
+            request = self.waiting.peek_request()
 
             def skip_cur_request():
-                self.waiting.popleft()
-                skipped_waiting_requests.appendleft(request)
+                self.waiting.pop_request()
+                skipped_waiting_requests.add_request(request)
 
             # P/D: skip request if still waiting for remote kvs.
             if request.status == RequestStatus.WAITING_FOR_REMOTE_KVS:
@@ -130,6 +230,14 @@ class AscendScheduler(Scheduler):
                 skip_cur_request()
                 continue
 
+            # Don't stall the running requests on loading the adapter from
+            # the disk, schedule the request once it is prefetched.
+            if (self.lora_residency is not None and request.lora_request
+                    and self.running and self._prefetch_lora(
+                        request.lora_request, prefetch_lora_requests)):
+                skip_cur_request()
+                continue
+
             num_external_computed_tokens = 0
             load_kv_async = False
 
@@ -182,10 +290,16 @@ class AscendScheduler(Scheduler):
                     request.status = RequestStatus.FINISHED_IGNORED
                     self.finished_req_ids.add(  # type: ignore
                         request.request_id)  # type: ignore
-                    self.waiting.popleft()
+                    self.waiting.pop_request()
                     continue
 
-                if num_new_tokens > token_budget:
+                if self.prefill_chunk_size > 0:
+                    # Only schedule the first chunk of a long prompt, the
+                    # rest is continued in the following steps.
+                    num_new_tokens = min(num_new_tokens,
+                                         self.prefill_chunk_size,
+                                         prefill_token_budget)
+                if num_new_tokens > prefill_token_budget:
                     # Scheduling would exceed token_budget, skip.
                     skip_cur_request()
                     continue
@@ -220,11 +334,11 @@ class AscendScheduler(Scheduler):
                     num_external_computed_tokens,
                 )
 
-            self.waiting.popleft()
+            self.waiting.pop_request()
             if load_kv_async:
                 # If loading async, allocate memory and put request
                 # into the WAITING_FOR_REMOTE_KV state.
-                skipped_waiting_requests.appendleft(request)
+                skipped_waiting_requests.add_request(request)
                 request.status = RequestStatus.WAITING_FOR_REMOTE_KVS
                 continue
 
@@ -250,6 +364,7 @@ class AscendScheduler(Scheduler):
             # Update request info.
             num_scheduled_tokens[request.request_id] = num_new_tokens
             token_budget -= num_new_tokens
+            prefill_token_budget -= num_new_tokens
             request.status = RequestStatus.RUNNING
             request.num_computed_tokens = num_computed_tokens
             # Count the number of prefix cached tokens.
@@ -258,7 +373,13 @@ class AscendScheduler(Scheduler):
 
         # Put back any skipped requests at the head of the waiting queue
         if skipped_waiting_requests:
-            self.waiting.extendleft(skipped_waiting_requests)
+            self.waiting.prepend_requests(skipped_waiting_requests)
+
+        if self.lora_residency is not None:
+            for request in self._peek_waiting(self.lora_prefetch_depth):
+                if request.lora_request:
+                    self._prefetch_lora(request.lora_request,
+                                        prefetch_lora_requests)
 
         if self.phase == "decode":
             while len(
@@ -267,6 +388,8 @@ class AscendScheduler(Scheduler):
                 request = self.finished_prefill_reqs.popleft()
                 self.running.append(request)
 
+        self.prefilled_last_step = len(self.scheduled_req_ids) > 0
+
         # If no prefill requests are scheduled,
         # Schedule decode requests next.
         if len(self.scheduled_req_ids) == 0:
@@ -277,6 +400,10 @@ class AscendScheduler(Scheduler):
                     # This request has already been scheduled.
                     req_index += 1
                     continue
+                if self._is_partial_prefill(request):
+                    # The rest of its prompt is scheduled by a prefill step.
+                    req_index += 1
+                    continue
 
                 num_new_tokens = (request.num_tokens_with_spec -
                                   request.num_computed_tokens)
@@ -317,15 +444,10 @@ class AscendScheduler(Scheduler):
                     if new_blocks is None:
                         # The request cannot be scheduled.
                         # Preempt the lowest-priority request.
-                        preempted_req = self.running.pop()
-                        self.kv_cache_manager.free(preempted_req)
-                        preempted_req.status = RequestStatus.PREEMPTED
-                        preempted_req.num_computed_tokens = 0
-                        if self.log_stats:
-                            preempted_req.record_event(
-                                EngineCoreEventType.PREEMPTED,
-                                scheduled_timestamp)
-                        self.waiting.appendleft(preempted_req)
+                        preempted_req = self._pick_preempted_request(
+                            req_index)
+                        self._preempt_request(preempted_req,
+                                              scheduled_timestamp)
                         preempted_reqs.append(preempted_req)
                         if preempted_req == request:
                             # No more request to preempt.
@@ -362,6 +484,10 @@ class AscendScheduler(Scheduler):
                 if self.lora_config and request.lora_request:
                     scheduled_loras.add(request.lora_request.lora_int_id)
 
+        if self.lora_residency is not None:
+            for lora_id in scheduled_loras:
+                self.lora_residency.touch(lora_id)
+
         # Check if the scheduling constraints are satisfied.
         total_num_scheduled_tokens = sum(num_scheduled_tokens.values())
         assert total_num_scheduled_tokens <= self.max_num_scheduled_tokens
@@ -395,7 +521,7 @@ class AscendScheduler(Scheduler):
             req_to_new_blocks)
         scheduled_cached_reqs = cached_reqs_data
 
-        scheduler_output = SchedulerOutput(
+        scheduler_output = AscendSchedulerOutput(
             scheduled_new_reqs=new_reqs_data,
             scheduled_cached_reqs=scheduled_cached_reqs,
             num_scheduled_tokens=num_scheduled_tokens,
@@ -412,6 +538,7 @@ class AscendScheduler(Scheduler):
             get_freed_mm_hashes(),
             structured_output_request_ids={},
             grammar_bitmask=None,
+            prefetch_lora_requests=prefetch_lora_requests,
         )
 
         # NOTE(Kuntai): this function is designed for multiple purposes:
@@ -442,6 +569,75 @@ class AscendScheduler(Scheduler):
         self.finished_req_ids = set()  # type: ignore
         return scheduler_output
 
+    def _peek_waiting(self, n: int) -> list[Request]:
+        """The first `n` waiting requests in scheduling order."""
+        if isinstance(self.waiting, IndexedPriorityRequestQueue):
+            return self.waiting.peek_requests(n)
+        return list(itertools.islice(self.waiting, n))
+
+    def _prefetch_waiting_loras(
+            self,
+            scheduler_output: SchedulerOutput) -> AscendSchedulerOutput:
+        """Prefetch the adapters of the first waiting requests after a step
+        scheduled by vLLM's chunked prefill scheduler."""
+        assert self.lora_residency is not None
+        prefetch_lora_requests: list[LoRARequest] = []
+        for request in self._peek_waiting(self.lora_prefetch_depth):
+            if request.lora_request:
+                self._prefetch_lora(request.lora_request,
+                                    prefetch_lora_requests)
+        for req_id in scheduler_output.num_scheduled_tokens:
+            lora_request = self.requests[req_id].lora_request
+            if lora_request:
+                self.lora_residency.touch(lora_request.lora_int_id)
+        return AscendSchedulerOutput.from_scheduler_output(
+            scheduler_output, prefetch_lora_requests=prefetch_lora_requests)
+
+    def _prefetch_lora(self, lora_request: LoRARequest,
+                       prefetch_lora_requests: list[LoRARequest]) -> bool:
+        """Ask the workers to prefetch the adapter if it is not in their host
+        memory, return whether it was requested."""
+        assert self.lora_residency is not None
+        if (self.lora_residency.is_resident(lora_request.lora_int_id)
+                or len(prefetch_lora_requests) >= min(
+                    self.lora_prefetch_depth, self.lora_residency.capacity)):
+            return False
+        self.lora_residency.touch(lora_request.lora_int_id)
+        prefetch_lora_requests.append(lora_request)
+        return True
+
+    def _is_partial_prefill(self, request: Request) -> bool:
+        """Whether `request` is running with a partially prefilled prompt."""
+        return request.num_tokens - request.num_computed_tokens > 1
+
+    def _has_decode_requests(self) -> bool:
+        return any(not self._is_partial_prefill(request)
+                   for request in self.running)
+
+    def _pick_preempted_request(self, req_index: int) -> Request:
+        """Remove and return the lowest-priority running request.
+
+        Only requests from `req_index` on are candidates, the ones before it
+        have already been scheduled in this step.
+        """
+        if self.request_key is None:
+            return self.running.pop()
+        preempted_req = max(self.running[req_index:], key=self.request_key)
+        self.running.remove(preempted_req)
+        return preempted_req
+
+    def _preempt_request(self, request: Request,
+                         scheduled_timestamp: float) -> None:
+        """Free the KV cache of `request`, removed from the running queue,
+        and put it back at the head of the waiting queue."""
+        self.kv_cache_manager.free(request)
+        request.status = RequestStatus.PREEMPTED
+        request.num_computed_tokens = 0
+        if self.log_stats:
+            request.record_event(EngineCoreEventType.PREEMPTED,
+                                 scheduled_timestamp)
+        self.waiting.prepend_request(request)
+
     def _check_watermark_for_prefill(self,
                                      request,
                                      num_new_tokens,
@@ -467,7 +663,8 @@ class AscendScheduler(Scheduler):
         return True
 
     def _get_prompt_limit(self, request: Request) -> int:
-        if (self.scheduler_config.chunked_prefill_enabled
+        if ((self.scheduler_config.chunked_prefill_enabled
+             or self.prefill_chunk_size > 0)
                 and not self.scheduler_config.is_multi_step):
             prompt_limit = self.scheduler_config.max_model_len
         else:
@@ -18,13 +18,15 @@
 #
 import dataclasses
 import os
+import time
 from contextlib import contextmanager
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import torch
-from acl.rt import memcpy  # type: ignore # noqa: F401
+from acl.rt import memcpy, memcpy_async  # type: ignore # noqa: F401
 from vllm.logger import logger
 
+import vllm_ascend.envs as envs_ascend
 from vllm_ascend.platform import NPUPlatform
 
 
@@ -72,12 +74,18 @@ except ImportError as e:
 # py_device, py_alignedSize, py_d_mem, py_p_memHandle
 HandleType = Tuple[int, int, int, int]
 
+ACL_MEMCPY_HOST_TO_DEVICE = 1
+ACL_MEMCPY_DEVICE_TO_HOST = 2
+
 
 @dataclasses.dataclass
 class AllocationData:
     handle: HandleType
     tag: str
     cpu_backup_tensor: Optional[torch.Tensor] = None
+    # Whether cpu_backup_tensor holds the current content of the memory,
+    # i.e. it was kept after waking up and the memory is unchanged since.
+    cpu_backup_valid: bool = False
 
 
 def create_and_map(allocation_handle: HandleType) -> None:
@@ -153,6 +161,11 @@ class CaMemAllocator:
         self.pointer_to_data: Dict[int, AllocationData] = {}
         self.current_tag: str = CaMemAllocator.default_tag
         self.allocator_and_pools: Dict[str, Any] = {}
+        self.copy_chunk_size = (
+            envs_ascend.VLLM_ASCEND_SLEEP_COPY_CHUNK_MB << 20)
+        self.keep_cpu_backup = envs_ascend.VLLM_ASCEND_SLEEP_KEEP_CPU_BACKUP
+        self.copy_streams: Optional[List[Any]] = None
+        self.num_copies = 0
 
     def python_malloc_callback(self, allocation_handle: HandleType) -> None:
         """
@@ -172,16 +185,58 @@ class CaMemAllocator:
             data.cpu_backup_tensor = None
         return data.handle
 
-    def sleep(
-            self,
-            offload_tags: Optional[Union[Tuple[str, ...],
-                                         str]] = None) -> None:
+    def _get_copy_streams(self) -> List[Any]:
+        if self.copy_streams is None:
+            self.copy_streams = [
+                torch.npu.Stream()
+                for _ in range(envs_ascend.VLLM_ASCEND_SLEEP_COPY_STREAMS)
+            ]
+        return self.copy_streams
+
+    def _copy(self, dst_ptr: int, src_ptr: int, size_in_bytes: int,
+              kind: int, use_async: bool) -> None:
+        """Copy `size_in_bytes` in chunks. The asynchronous copies (only
+        possible with pinned host memory) are spread over the copy streams
+        so that they overlap, `_wait_copies` waits for them."""
+        streams = self._get_copy_streams() if use_async else []
+        for offset in range(0, size_in_bytes, self.copy_chunk_size):
+            count = min(self.copy_chunk_size, size_in_bytes - offset)
+            dest_max = size_in_bytes - offset
+            if streams:
+                stream = streams[self.num_copies % len(streams)]
+                memcpy_async(dst_ptr + offset, dest_max, src_ptr + offset,
+                             count, kind, stream.npu_stream)
+                self.num_copies += 1
+            else:
+                memcpy(dst_ptr + offset, dest_max, src_ptr + offset, count,
+                       kind)
+
+    def _wait_copies(self) -> None:
+        for stream in self.copy_streams or []:
+            stream.synchronize()
+
+    @staticmethod
+    def _log_throughput(action: str, num_bytes: int,
+                        start_time: float) -> None:
+        if num_bytes == 0:
+            return
+        elapsed = time.perf_counter() - start_time
+        logger.info("Sleep mode %s %.2f GiB in %.2f s (%.2f GB/s).", action,
+                    num_bytes / (1 << 30), elapsed, num_bytes / elapsed / 1e9)
+
+    def sleep(self,
+              offload_tags: Optional[Union[Tuple[str, ...], str]] = None,
+              unchanged_tags: Optional[list[str]] = None) -> None:
         """
         Put the allocator in sleep mode.
         All data in the memory allocation with the specified tag will be 
         offloaded to CPU memory, and others will be discarded.
         :param offload_tags: The tags of the memory allocation that will be
             offloaded. The rest of the memory allocation will be discarded.
+        :param unchanged_tags: The tags of the memory allocation that were
+            not written since the last wake up. With
+            VLLM_ASCEND_SLEEP_KEEP_CPU_BACKUP, their CPU backup is still up to
+            date and they are not copied again.
         """
         if offload_tags is None:
             # by default, allocated tensors are offloaded
@@ -192,43 +247,61 @@ class CaMemAllocator:
 
         assert isinstance(offload_tags, tuple)
 
+        start_time = time.perf_counter()
+        offloaded_bytes = 0
+        pin_memory = NPUPlatform.is_pin_memory_available()
         for ptr, data in self.pointer_to_data.items():
-            handle = data.handle
-            if data.tag in offload_tags:
-                size_in_bytes = handle[1]
-                cpu_backup_tensor = torch.empty(
-                    size_in_bytes,
-                    dtype=torch.uint8,
-                    device='cpu',
-                    pin_memory=NPUPlatform.is_pin_memory_available())
-                cpu_ptr = cpu_backup_tensor.data_ptr()
-                ACL_MEMCPY_DEVICE_TO_HOST = 2
-                dest_max = cpu_ptr + size_in_bytes * 2
-                memcpy(cpu_ptr, dest_max, ptr, size_in_bytes,
-                       ACL_MEMCPY_DEVICE_TO_HOST)
-                data.cpu_backup_tensor = cpu_backup_tensor
-            unmap_and_release(handle)
+            if data.tag not in offload_tags:
+                data.cpu_backup_tensor = None
+                data.cpu_backup_valid = False
+                continue
+            if data.cpu_backup_valid and data.tag in (unchanged_tags or ()):
+                continue
+            size_in_bytes = data.handle[1]
+            cpu_backup_tensor = data.cpu_backup_tensor
+            if cpu_backup_tensor is None:
+                cpu_backup_tensor = torch.empty(size_in_bytes,
+                                                dtype=torch.uint8,
+                                                device='cpu',
+                                                pin_memory=pin_memory)
+            self._copy(cpu_backup_tensor.data_ptr(), ptr, size_in_bytes,
+                       ACL_MEMCPY_DEVICE_TO_HOST, pin_memory)
+            data.cpu_backup_tensor = cpu_backup_tensor
+            data.cpu_backup_valid = True
+            offloaded_bytes += size_in_bytes
+        # The memory can only be released once the copies are done.
+        self._wait_copies()
+        for data in self.pointer_to_data.values():
+            unmap_and_release(data.handle)
+        self._log_throughput("offloaded", offloaded_bytes, start_time)
 
     def wake_up(self, tags: Optional[list[str]] = None) -> None:
         """
         Wake up the allocator from sleep mode.
         All data that is previously offloaded will be loaded back to GPU 
         memory, and the rest of the data will have empty memory."""
+        start_time = time.perf_counter()
+        loaded_bytes = 0
+        woken_up = []
         for ptr, data in self.pointer_to_data.items():
             if tags is None or data.tag in tags:
-                handle = data.handle
-                create_and_map(handle)
-                if data.cpu_backup_tensor is not None:
-                    cpu_backup_tensor = data.cpu_backup_tensor
-                    if cpu_backup_tensor is not None:
-                        size_in_bytes = cpu_backup_tensor.numel(
-                        ) * cpu_backup_tensor.element_size()
-                        cpu_ptr = cpu_backup_tensor.data_ptr()
-                        ACL_MEMCPY_HOST_TO_DEVICE = 1
-                        dest_max = ptr + size_in_bytes * 2
-                        memcpy(ptr, dest_max, cpu_ptr, size_in_bytes,
-                               ACL_MEMCPY_HOST_TO_DEVICE)
-                        data.cpu_backup_tensor = None
+                create_and_map(data.handle)
+                woken_up.append((ptr, data))
+        for ptr, data in woken_up:
+            cpu_backup_tensor = data.cpu_backup_tensor
+            if cpu_backup_tensor is not None:
+                size_in_bytes = cpu_backup_tensor.numel(
+                ) * cpu_backup_tensor.element_size()
+                self._copy(ptr, cpu_backup_tensor.data_ptr(), size_in_bytes,
+                           ACL_MEMCPY_HOST_TO_DEVICE,
+                           cpu_backup_tensor.is_pinned())
+                loaded_bytes += size_in_bytes
+        self._wait_copies()
+        for _, data in woken_up:
+            if not self.keep_cpu_backup:
+                data.cpu_backup_tensor = None
+                data.cpu_backup_valid = False
+        self._log_throughput("loaded", loaded_bytes, start_time)
 
     @contextmanager
     def use_memory_pool(self, tag: Optional[str] = None):
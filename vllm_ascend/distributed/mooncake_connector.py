@@ -38,6 +38,7 @@ if TYPE_CHECKING:
 
 GET_META_MSG = b"get_meta_msg"
 DONE_RECVING_MSG = b"done_recving_msg"
+LAYER_PROGRESS_MSG = b"layer_progress_msg"
 
 
 class MooncakeAgentMetadata(msgspec.Struct, omit_defaults=True, dict=True):
@@ -54,6 +55,8 @@ class ReqMeta:
     remote_host: str
     remote_port: int
     remote_engine_id: str
+    # Pull the KV cache layer by layer while the remote prefill is running.
+    layerwise: bool = False
 
 
 class KVCacheTaskTracker:
@@ -68,11 +71,18 @@ class KVCacheTaskTracker:
         # timestamp). If a request remains in this queue for too long, it will
         # be force-freed.
         self.delayed_free_requests: deque[Tuple[str, float]] = deque()
+        # Requests done before their delayed free entry is added. In layerwise
+        # mode the decode node can finish pulling before the prefill node
+        # has processed the end of the request.
+        self.done_before_delayed_requests: set[str] = set()
 
     def update_done_task_count(self, request_id: str):
         with self.done_task_lock:
             self.finished_requests.add(request_id)
-            self._remove_delayed_requests(request_id)
+            if any(r == request_id for r, _ in self.delayed_free_requests):
+                self._remove_delayed_requests(request_id)
+            else:
+                self.done_before_delayed_requests.add(request_id)
 
     def get_and_clear_finished_requests(self) -> set[str]:
         """
@@ -90,6 +100,10 @@ class KVCacheTaskTracker:
     def add_delayed_request(self, request_id: str, delay_start_time: float):
         """Add a delayed free request."""
         with self.done_task_lock:
+            if request_id in self.done_before_delayed_requests:
+                # Already reported as finished, don't force free it again.
+                self.done_before_delayed_requests.discard(request_id)
+                return
             self.delayed_free_requests.append((request_id, delay_start_time))
 
     def _retrieve_expired_requests(self):
@@ -114,6 +128,87 @@ class KVCacheTaskTracker:
             (r, t) for r, t in self.delayed_free_requests if r != request_id)
 
 
+class _LayerwiseStep:
+    """Layer events of the KV caches computed by one forward step."""
+
+    def __init__(self):
+        # The events of each layer, in the order the layers are computed.
+        # A layer saves its KV once per micro batch under DBO.
+        self.layer_events: dict[str, list[Any]] = {}
+        self.done_event: Optional[Any] = None
+        self.num_ready_layers = 0
+        self.finished = False
+
+    def record_layer(self, layer_name: str, event: Any):
+        self.layer_events.setdefault(layer_name, []).append(event)
+
+    def progress(self) -> tuple[int, bool]:
+        step_done = self.done_event is not None
+        layers = list(self.layer_events.values())
+        # The last recorded layer may still get the event of another micro
+        # batch, until a later layer or the end of the step is recorded.
+        num_complete_layers = len(layers) if step_done else len(layers) - 1
+        # Layer events are recorded in order, so the ready layers always
+        # form a prefix.
+        while self.num_ready_layers < num_complete_layers and all(
+                event.query() for event in layers[self.num_ready_layers]):
+            self.num_ready_layers += 1
+        if not self.finished and step_done:
+            self.finished = self.done_event.query()
+        return self.num_ready_layers, self.finished
+
+
+class KVCacheLayerTracker:
+    """Only used in prefill node with layerwise transfer. Tracks how many
+    layers of the KV cache of a request have been computed, so that the
+    decode node can pull them while the remaining layers are computed."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests: dict[str, tuple[list[int], _LayerwiseStep]] = {}
+        self.current_step: Optional[_LayerwiseStep] = None
+
+    def start_step(self, requests_to_save: dict[str, list[int]]):
+        """Start tracking the requests prefilled by the current step."""
+        if not requests_to_save:
+            self.current_step = None
+            return
+        step = _LayerwiseStep()
+        with self.lock:
+            for request_id, block_ids in requests_to_save.items():
+                self.requests[request_id] = (block_ids, step)
+        self.current_step = step
+
+    def record_layer(self, layer_name: str, event: Any):
+        if self.current_step is not None:
+            self.current_step.record_layer(layer_name, event)
+
+    def finish_step(self, event: Any):
+        if self.current_step is not None:
+            self.current_step.done_event = event
+            self.current_step = None
+
+    def get_progress(self, request_id: str) -> tuple[list[int], int, bool]:
+        """
+        Returns:
+            The block ids of the request, the number of ready layers and
+            whether all the layers are ready. A request that is not scheduled
+            yet reports no block and no ready layer.
+        """
+        with self.lock:
+            entry = self.requests.get(request_id)
+        if entry is None:
+            return [], 0, False
+        block_ids, step = entry
+        num_ready_layers, finished = step.progress()
+        return block_ids, num_ready_layers, finished
+
+    def remove_requests(self, request_ids: set[str]):
+        with self.lock:
+            for request_id in request_ids:
+                self.requests.pop(request_id, None)
+
+
 class KVCacheSendingThread(threading.Thread):
 
     def __init__(self, tp_rank: int, decode_tp_size: int, local_engine_id: str,
@@ -130,6 +225,7 @@ class KVCacheSendingThread(threading.Thread):
         self.ready_event = ready_event
 
         self.task_tracker = KVCacheTaskTracker()
+        self.layer_tracker = KVCacheLayerTracker()
 
     def get_and_clear_finished_requests(self) -> set[str]:
         """
@@ -137,7 +233,10 @@ class KVCacheSendingThread(threading.Thread):
         Returns:
             A set of request IDs that have been completed.
         """
-        return self.task_tracker.get_and_clear_finished_requests()
+        finished_requests = \
+            self.task_tracker.get_and_clear_finished_requests()
+        self.layer_tracker.remove_requests(finished_requests)
+        return finished_requests
 
     def add_delayed_request(self, request_id: str, delay_start_time: float):
         return self.task_tracker.add_delayed_request(request_id,
@@ -178,6 +277,10 @@ class KVCacheSendingThread(threading.Thread):
                     msg = decoder.decode(payload[0])
                     if msg[0] == GET_META_MSG:
                         sock.send_multipart((identity, b"", encoded_data))
+                    elif msg[0] == LAYER_PROGRESS_MSG:
+                        progress = self.layer_tracker.get_progress(msg[1])
+                        sock.send_multipart(
+                            (identity, b"", encoder.encode(progress)))
                     elif msg[0] == DONE_RECVING_MSG:
                         logger.debug("Got DONE_RECVING_MSG for request %s",
                                      msg[1])
@@ -234,21 +337,44 @@ class KVCacheRecvingThread(threading.Thread):
         self.request_queue: queue.Queue[Any] = queue.Queue()
         # TODO(jianzs): make this configurable
         self.executor = ThreadPoolExecutor(max_workers=32)
+        # Requests are pulled concurrently, with a bounded number of batches
+        # in flight per remote engine. Requests waiting for a free slot are
+        # merged into one batched transfer when the slot is released. The
+        # entries of a remote are removed once it has no request left.
+        self.max_inflight_per_remote = max(
+            1, envs_ascend.VLLM_ASCEND_MOONCAKE_MAX_INFLIGHT_PER_REMOTE)
+        self.pending_lock = threading.Lock()
+        self.pending_requests: dict[tuple[str, str, int],
+                                    deque[dict[str, Any]]] = defaultdict(deque)
+        self.num_inflight: dict[tuple[str, str, int], int] = defaultdict(int)
 
         self.task_tracker = KVCacheTaskTracker()
 
         self.encoder = msgspec.msgpack.Encoder()
         self.decoder = msgspec.msgpack.Decoder(MooncakeAgentMetadata)
+        self.progress_decoder = msgspec.msgpack.Decoder(type=tuple)
+        # Interval (seconds) between two layer progress queries.
+        self.layer_poll_interval = 0.002
+        self.remote_metadata_lock = threading.Lock()
         self.remote_sockets_lock = threading.Lock()
         self.remote_sockets: dict[  # type: ignore
             str, deque[zmq.Socket]] = defaultdict(  # type: ignore
                 deque)
-        self.remote_poller = zmq.Poller()  # type: ignore
+        # zmq sockets and pollers are not thread safe, each pooled socket
+        # owns its poller so that transfers of different batches don't poll
+        # each other's sockets.
+        self.remote_pollers: dict[zmq.Socket,  # type: ignore
+                                  zmq.Poller] = {}  # type: ignore
         self.timeout = 1.0  # seconds
 
-    def add_request(self, request_id: str, local_block_ids: list[int],
-                    remote_block_ids: list[int], remote_engine_id: str,
-                    remote_host: str, remote_handshake_port: int):
+    def add_request(self,
+                    request_id: str,
+                    local_block_ids: list[int],
+                    remote_block_ids: list[int],
+                    remote_engine_id: str,
+                    remote_host: str,
+                    remote_handshake_port: int,
+                    layerwise: bool = False):
         """Add a new request to the queue for processing."""
         logger.debug(f"Adding request {request_id} to the queue.")
         self.request_queue.put({
@@ -258,6 +384,7 @@ class KVCacheRecvingThread(threading.Thread):
             "remote_engine_id": remote_engine_id,
             "remote_host": remote_host,
             "remote_handshake_port": remote_handshake_port,
+            "layerwise": layerwise,
         })
 
     def get_and_clear_finished_requests(self) -> set[str]:
@@ -278,69 +405,220 @@ class KVCacheRecvingThread(threading.Thread):
                     logger.warning("Received a None request!")
                     self.request_queue.task_done()
                     continue
-                self._handle_request(request_data)
+                self._enqueue_request(request_data)
             except Exception as e:
                 logger.error(f"Error in KVCacheTransferThread: {e}")
 
-    def _handle_request(self, req_meta: dict[str, Any]):
-        request_id = req_meta["request_id"]
-        remote_host = req_meta["remote_host"]
-        remote_handshake_port = req_meta["remote_handshake_port"]
+    def _enqueue_request(self, req_meta: dict[str, Any]):
+        """Queue a request for its remote engine and dispatch it if a
+        transfer slot is free."""
+        remote = (req_meta["remote_engine_id"], req_meta["remote_host"],
+                  req_meta["remote_handshake_port"])
+        with self.pending_lock:
+            self.pending_requests[remote].append(req_meta)
+            self._dispatch(remote)
+
+    def _dispatch(self, remote: tuple[str, str, int]):
+        """Submit the pending requests of `remote` to the executor.
+
+        Must be called with `pending_lock` held. The pending requests are
+        spread over the free slots, requests sharing a slot are pulled by
+        one batched transfer. Layerwise pulls follow the progress of the
+        remote prefill, they take a slot on their own.
+        """
+        pending = self.pending_requests[remote]
+        while pending and \
+                self.num_inflight[remote] < self.max_inflight_per_remote:
+            free_slots = self.max_inflight_per_remote - \
+                self.num_inflight[remote]
+            batch_size = math.ceil(len(pending) / free_slots)
+            batch = [pending.popleft()]
+            if not batch[0].get("layerwise"):
+                while pending and len(batch) < batch_size and \
+                        not pending[0].get("layerwise"):
+                    batch.append(pending.popleft())
+            self.num_inflight[remote] += 1
+            self.executor.submit(self._run_batch, remote, batch)
+        if not pending:
+            del self.pending_requests[remote]
+            if not self.num_inflight[remote]:
+                del self.num_inflight[remote]
+
+    def _run_batch(self, remote: tuple[str, str, int],
+                   req_metas: list[dict[str, Any]]):
+        try:
+            self._handle_requests(req_metas)
+        except Exception as e:
+            logger.error(f"Error in KVCacheTransferThread: {e}")
+        finally:
+            with self.pending_lock:
+                self.num_inflight[remote] -= 1
+                self._dispatch(remote)
 
+    def _handle_requests(self, req_metas: list[dict[str, Any]]):
+        """Pull the KV cache of requests sharing the same remote engine."""
+        request_ids = [req_meta["request_id"] for req_meta in req_metas]
         try:
             logger.debug(
-                f"Starting to transfer KV cache for request {request_id}.")
-            self._transfer_kv_cache(req_meta)
+                f"Starting to transfer KV cache for requests {request_ids}.")
+            if req_metas[0].get("layerwise"):
+                self._transfer_kv_cache_layerwise(req_metas[0])
+            else:
+                self._transfer_kv_cache(req_metas)
             logger.debug(
-                f"Finished transferring KV cache for request {request_id}.")
+                f"Finished transferring KV cache for requests {request_ids}.")
         except Exception as e:
-            logger.error("Failed to transfer KV cache for request "
-                         f"{request_id}: {e}")
+            logger.error("Failed to transfer KV cache for requests "
+                         f"{request_ids}: {e}")
         finally:
-            self.task_tracker.update_done_task_count(request_id)
-            # Always send the done signal to the remote host to ensure proper
-            # resource cleanup. Failing to do so may cause a memory leak on the
-            # remote host.
-            self._send_done_recv_signal(request_id, remote_host,
-                                        remote_handshake_port)
-            self.request_queue.task_done()
-
-    def _transfer_kv_cache(self, req_meta: dict[str, Any]):
-        """Handle a KV cache transfer request."""
+            for req_meta in req_metas:
+                request_id = req_meta["request_id"]
+                self.task_tracker.update_done_task_count(request_id)
+                # Always send the done signal to the remote host to ensure
+                # proper resource cleanup. Failing to do so may cause a
+                # memory leak on the remote host.
+                try:
+                    self._send_done_recv_signal(
+                        request_id, req_meta["remote_host"],
+                        req_meta["remote_handshake_port"])
+                except Exception as e:
+                    logger.error("Failed to send done signal for request "
+                                 f"{request_id}: {e}")
+                finally:
+                    self.request_queue.task_done()
+
+    def _transfer_kv_cache(self, req_metas: list[dict[str, Any]]):
+        """Pull the KV cache of requests from the same remote engine with a
+        single batched transfer."""
+        request_ids = [req_meta["request_id"] for req_meta in req_metas]
+        remote_engine_id = req_metas[0]["remote_engine_id"]
+        remote_host = req_metas[0]["remote_host"]
+        remote_handshake_port = req_metas[0]["remote_handshake_port"]
+
+        # Full prefix cache hit: do not need to read remote blocks, just notify
+        # P worker that we have the blocks we need.
+        remote_block_ids: list[int] = []
+        local_block_ids: list[int] = []
+        for req_meta in req_metas:
+            if len(req_meta["local_block_ids"]) == 0:
+                continue
+            remote_block_ids.extend(req_meta["remote_block_ids"])
+            local_block_ids.extend(req_meta["local_block_ids"])
+        if len(local_block_ids) == 0:
+            return
+
+        self._ensure_remote_metadata(remote_engine_id, remote_host,
+                                     remote_handshake_port)
+
+        req_start_time = time.perf_counter()
+        num_transfer_groups, num_blocks = self._batch_transfer(
+            local_block_ids, remote_block_ids, remote_engine_id,
+            remote_host, remote_handshake_port)
+
+        req_end_time = time.perf_counter()
+        req_transfer_elapsed = (req_end_time - req_start_time) * 1000
+        logger.info(
+            "KV cache transfer for requests %s took %.2f ms (%d groups,"
+            " %d blocks).", request_ids, req_transfer_elapsed,
+            num_transfer_groups, num_blocks)
+
+    def _transfer_kv_cache_layerwise(self, req_meta: dict[str, Any]):
+        """Pull the KV cache of a request layer by layer, following the
+        progress of its prefill on the remote engine."""
         request_id = req_meta["request_id"]
-        remote_block_ids = req_meta["remote_block_ids"]
         local_block_ids = req_meta["local_block_ids"]
         remote_engine_id = req_meta["remote_engine_id"]
         remote_host = req_meta["remote_host"]
         remote_handshake_port = req_meta["remote_handshake_port"]
-
-        # Full prefix cache hit: do not need to read remote blocks, just notify
-        # P worker that we have the blocks we need.
         if len(local_block_ids) == 0:
             return
 
-        # Check if we have the remote metadata cached.
-        if remote_engine_id not in self.kv_caches_base_addr or \
-                remote_handshake_port not in self.kv_caches_base_addr[remote_engine_id]:
-            self._get_remote_metadata(remote_host, remote_handshake_port)
+        self._ensure_remote_metadata(remote_engine_id, remote_host,
+                                     remote_handshake_port)
+        # Each layer registers 2 regions: k/v caches, or nope/rope for MLA.
+        num_layers = len(self.kv_caches_base_addr[self.local_engine_id][
+            self.local_handshake_port]) // 2
+
+        req_start_time = time.perf_counter()
+        deadline = time.time() + \
+            envs_ascend.VLLM_ASCEND_KVCACHE_DELAY_FREE_TIMEOUT
+        num_pulled_layers = 0
+        while num_pulled_layers < num_layers:
+            remote_block_ids, num_ready_layers, finished = \
+                self._get_layer_progress(request_id, remote_host,
+                                         remote_handshake_port)
+            if finished:
+                num_ready_layers = num_layers
+            num_ready_layers = min(num_ready_layers, num_layers)
+            if num_ready_layers > num_pulled_layers:
+                # The local blocks are the ones missed by the local prefix
+                # cache, i.e. the tail of the prompt.
+                if len(remote_block_ids) < len(local_block_ids):
+                    raise RuntimeError(
+                        f"Request {request_id} has {len(local_block_ids)} "
+                        "blocks to pull but the remote engine reports "
+                        f"{len(remote_block_ids)} blocks.")
+                self._batch_transfer(local_block_ids,
+                                     remote_block_ids[-len(local_block_ids):],
+                                     remote_engine_id,
+                                     remote_host,
+                                     remote_handshake_port,
+                                     layers=(num_pulled_layers,
+                                             num_ready_layers))
+                num_pulled_layers = num_ready_layers
+                continue
+            if time.time() > deadline:
+                raise RuntimeError(
+                    f"Timeout waiting for the prefill of request {request_id}"
+                    f", {num_pulled_layers}/{num_layers} layers pulled.")
+            time.sleep(self.layer_poll_interval)
+
+        req_transfer_elapsed = (time.perf_counter() - req_start_time) * 1000
+        logger.info(
+            "Layerwise KV cache transfer for request %s took %.2f ms "
+            "(%d layers, %d blocks).", request_id, req_transfer_elapsed,
+            num_layers, len(local_block_ids))
+
+    def _ensure_remote_metadata(self, remote_engine_id: str, remote_host: str,
+                                remote_handshake_port: int):
+        """Fetch the metadata of the remote engine if not cached yet."""
+        with self.remote_metadata_lock:
+            if remote_engine_id not in self.kv_caches_base_addr or \
+                    remote_handshake_port not in self.kv_caches_base_addr[remote_engine_id]:
+                self._get_remote_metadata(remote_host, remote_handshake_port)
+
+    def _batch_transfer(
+            self,
+            local_block_ids: list[int],
+            remote_block_ids: list[int],
+            remote_engine_id: str,
+            remote_host: str,
+            remote_handshake_port: int,
+            layers: Optional[tuple[int, int]] = None) -> tuple[int, int]:
+        """Read the remote blocks into the local blocks with one batched
+        transfer, optionally restricted to the layers in [start, end).
 
+        Returns:
+            The number of transfer groups and of blocks per layer.
+        """
         grouped_remote_block_ids, grouped_local_block_ids = \
             group_concurrent_contiguous(remote_block_ids, local_block_ids)
         remote_kv_caches_base_addrs = \
             self.kv_caches_base_addr[remote_engine_id][remote_handshake_port]
         local_kv_caches_base_addrs = \
             self.kv_caches_base_addr[self.local_engine_id][self.local_handshake_port]
-
-        req_start_time = time.perf_counter()
-        num_transfer_groups = len(grouped_remote_block_ids)
-        num_blocks = len(local_block_ids)
+        start_layer, end_layer = layers if layers is not None else (0, None)
+        first_region = 2 * start_layer
+        last_region = None if end_layer is None else 2 * end_layer
 
         remote_transfer_port = self.remote_te_port[remote_engine_id][
             remote_handshake_port]
         session_id = f"{remote_host}:{remote_transfer_port}"
         src_list, dst_list, length_list = [], [], []
         for k, (src_layer_base_addr, dst_layer_base_addr) in enumerate(
-                zip(local_kv_caches_base_addrs, remote_kv_caches_base_addrs)):
+                zip(local_kv_caches_base_addrs[first_region:last_region],
+                    remote_kv_caches_base_addrs[first_region:last_region]),
+                start=first_region):
             block_len = (self.block_len[k % 2]
                          if self.use_mla else self.block_len[0])
             for i, remote_block_id in enumerate(grouped_remote_block_ids):
@@ -354,67 +632,79 @@ class KVCacheRecvingThread(threading.Thread):
         ret = self.engine.batch_transfer_sync_read(session_id, src_list,
                                                    dst_list, length_list)
         if ret < 0:
-            logger.error("Mooncake transfer failed for request %s",
-                         req_meta["request_id"])
+            logger.error("Mooncake transfer failed for requests %s",
+                         request_ids)
             raise RuntimeError(f"Mooncake transfer failed, ret: {ret}")
-
-        req_end_time = time.perf_counter()
-        req_transfer_elapsed = (req_end_time - req_start_time) * 1000
-        logger.info(
-            "KV cache transfer for request %s took %.2f ms (%d groups,"
-            " %d blocks).", request_id, req_transfer_elapsed,
-            num_transfer_groups, num_blocks)
+        return len(grouped_remote_block_ids), len(local_block_ids)
 
     def _get_remote_metadata(self, remote_host: str,
                              remote_handshake_port: int) -> None:
         """Get the metadata from the remote host."""
-        sock: Optional[zmq.Socket] = None  # type: ignore
-        try:
-            sock = self._get_remote_socket(remote_host, remote_handshake_port)
+        with self._remote_socket(remote_host, remote_handshake_port) as sock:
             ensure_zmq_send(sock, self.encoder.encode((GET_META_MSG, "")))
-            metadata_bytes = ensure_zmq_recv(sock, self.remote_poller)
-            agent_meta = self.decoder.decode(metadata_bytes)
-            engine_id = agent_meta.engine_id
-            assert engine_id != self.local_engine_id, (
-                f"Conflict engine id {engine_id} with local engine id "
-                f"{self.local_engine_id}.")
-            self.kv_caches_base_addr[engine_id][remote_handshake_port] = \
-                agent_meta.kv_caches_base_addr
-            self.remote_te_port[engine_id][remote_handshake_port] = \
-                agent_meta.te_rpc_port
-        finally:
-            if sock is not None:
-                self._return_remote_socket(sock, remote_host,
-                                           remote_handshake_port)
-                logger.debug("Returned socket to pool for %s:%d", remote_host,
-                             remote_handshake_port)
+            metadata_bytes = ensure_zmq_recv(sock, self.remote_pollers[sock])
+        agent_meta = self.decoder.decode(metadata_bytes)
+        engine_id = agent_meta.engine_id
+        assert engine_id != self.local_engine_id, (
+            f"Conflict engine id {engine_id} with local engine id "
+            f"{self.local_engine_id}.")
+        self.kv_caches_base_addr[engine_id][remote_handshake_port] = \
+            agent_meta.kv_caches_base_addr
+        self.remote_te_port[engine_id][remote_handshake_port] = \
+            agent_meta.te_rpc_port
+
+    def _get_layer_progress(
+            self, request_id: str, remote_host: str,
+            remote_handshake_port: int) -> tuple[list[int], int, bool]:
+        """Query the prefill progress of a request on the remote host."""
+        with self._remote_socket(remote_host, remote_handshake_port) as sock:
+            ensure_zmq_send(
+                sock, self.encoder.encode((LAYER_PROGRESS_MSG, request_id)))
+            resp = ensure_zmq_recv(sock,
+                                   self.remote_pollers[sock],
+                                   timeout=self.timeout)
+        block_ids, num_ready_layers, finished = \
+            self.progress_decoder.decode(resp)
+        return list(block_ids), num_ready_layers, finished
 
     def _send_done_recv_signal(self, request_id: str, remote_host: str,
                                remote_handshake_port: int):
         logger.debug("Sending done recving signal for request %s to %s:%d",
                      request_id, remote_host, remote_handshake_port)
-        sock: Optional[zmq.Socket] = None  # type: ignore
-        try:
-            sock = self._get_remote_socket(remote_host, remote_handshake_port)
+        with self._remote_socket(remote_host, remote_handshake_port) as sock:
             data_bytes = self.encoder.encode((DONE_RECVING_MSG, request_id))
             ensure_zmq_send(sock, data_bytes)
             resp = ensure_zmq_recv(sock,
-                                   self.remote_poller,
+                                   self.remote_pollers[sock],
                                    timeout=self.timeout)
-            logger.debug(
-                f"Received response for request {request_id}: {resp.decode('utf-8')}"
-            )
-            if resp != b"ACK":
-                logger.error("Failed to receive ACK for request %s from %s:%d",
-                             request_id, remote_host, remote_handshake_port)
-                raise RuntimeError(
-                    f"Failed to receive ACK, resp: {resp.decode('utf-8')}")
-        finally:
-            if sock is not None:
-                self._return_remote_socket(sock, remote_host,
-                                           remote_handshake_port)
-                logger.debug("Returned socket to pool for %s:%d", remote_host,
-                             remote_handshake_port)
+        logger.debug(
+            f"Received response for request {request_id}: {resp.decode('utf-8')}"
+        )
+        if resp != b"ACK":
+            logger.error("Failed to receive ACK for request %s from %s:%d",
+                         request_id, remote_host, remote_handshake_port)
+            raise RuntimeError(
+                f"Failed to receive ACK, resp: {resp.decode('utf-8')}")
+
+    @contextlib.contextmanager
+    def _remote_socket(
+            self, remote_host: str,
+            remote_handshake_port: int) -> Iterator[zmq.Socket]:  # type: ignore
+        """Borrow a pooled socket to the remote host for one exchange.
+
+        The socket goes back to the pool when the exchange succeeds. A REQ
+        socket that failed can't be reused and the remote engine may be
+        gone, so it is closed with the idle sockets of the remote.
+        """
+        sock = self._get_remote_socket(remote_host, remote_handshake_port)
+        try:
+            yield sock
+        except Exception:
+            self._drop_remote_sockets(sock, remote_host, remote_handshake_port)
+            raise
+        self._return_remote_socket(sock, remote_host, remote_handshake_port)
+        logger.debug("Returned socket to pool for %s:%d", remote_host,
+                     remote_handshake_port)
 
     def _get_remote_socket(
             self, remote_host: str,
@@ -434,7 +724,9 @@ class KVCacheRecvingThread(threading.Thread):
             sock.setsockopt(
                 zmq.SNDTIMEO,  # type: ignore
                 int(self.timeout * 1000))
-            self.remote_poller.register(sock, zmq.POLLIN)  # type: ignore
+            poller = zmq.Poller()  # type: ignore
+            poller.register(sock, zmq.POLLIN)  # type: ignore
+            self.remote_pollers[sock] = poller
             return sock
 
     def _return_remote_socket(
@@ -447,12 +739,33 @@ class KVCacheRecvingThread(threading.Thread):
         with self.remote_sockets_lock:
             self.remote_sockets[remote_path].append(sock)
 
+    def _drop_remote_sockets(
+            self,
+            sock: zmq.Socket,  # type: ignore
+            remote_host: str,
+            remote_handshake_port: int) -> None:
+        """Close `sock` and the idle pooled sockets to the remote host."""
+        remote_path = make_zmq_path("tcp", remote_host, remote_handshake_port)
+        with self.remote_sockets_lock:
+            socks = [sock, *self.remote_sockets.pop(remote_path, ())]
+            for dropped in socks:
+                self.remote_pollers.pop(dropped, None)
+        logger.warning("Dropped %d socket(s) to %s after a failed exchange",
+                       len(socks), remote_path)
+        for dropped in socks:
+            # Each socket owns its context, see `_get_remote_socket`.
+            dropped.close(linger=0)
+            dropped.context.term()
+
 
 class MooncakeConnectorMetadata(KVConnectorMetadata):
 
     def __init__(self):
         self.requests: dict[str, ReqMeta] = {}
         self.requests_to_send: dict[str, float] = {}
+        # Only for layerwise transfer in prefill node, the block ids of the
+        # requests prefilled by this step.
+        self.requests_to_save: dict[str, list[int]] = {}
 
     def add_new_req(
         self,
@@ -462,10 +775,11 @@ class MooncakeConnectorMetadata(KVConnectorMetadata):
     ):
         self.requests[request_id] = ReqMeta(
             local_block_ids=local_block_ids,
-            remote_block_ids=kv_transfer_params["remote_block_ids"],
+            remote_block_ids=kv_transfer_params["remote_block_ids"] or [],
             remote_engine_id=kv_transfer_params["remote_engine_id"],
             remote_host=kv_transfer_params["remote_host"],
             remote_port=kv_transfer_params["remote_port"],
+            layerwise=kv_transfer_params.get("layerwise", False),
         )
 
 
@@ -475,6 +789,19 @@ class MooncakeConnector(KVConnectorBase_V1):
         assert vllm_config.kv_transfer_config is not None
         self.engine_id = vllm_config.kv_transfer_config.engine_id
 
+        if vllm_config.kv_transfer_config.get_from_extra_config(
+                "use_layerwise", False):
+            # The layer progress of a request is only tracked for the step
+            # that prefills it, so the whole prompt must fit in one step.
+            scheduler_config = vllm_config.scheduler_config
+            if scheduler_config.chunked_prefill_enabled or \
+                    scheduler_config.max_num_batched_tokens < \
+                    vllm_config.model_config.max_model_len:
+                raise ValueError(
+                    "Layerwise KV transfer does not support chunked prefill, "
+                    "please disable chunked prefill and set "
+                    "max_num_batched_tokens >= max_model_len.")
+
         if role == KVConnectorRole.SCHEDULER:
             self.connector_scheduler: Optional[MooncakeConnectorScheduler] = \
                 MooncakeConnectorScheduler(vllm_config, str(self.engine_id))
@@ -541,17 +868,19 @@ class MooncakeConnector(KVConnectorBase_V1):
         self.connector_worker.start_load_kv(self._connector_metadata)
 
     def wait_for_layer_load(self, layer_name: str) -> None:
-        """MooncakeConnector does not do layerwise saving."""
+        """The KV cache is pulled between steps, nothing to wait for."""
         pass
 
     def save_kv_layer(self, layer_name: str, kv_layer: torch.Tensor,
                       attn_metadata: "AttentionMetadata", **kwargs) -> None:
-        """MooncakeConnector does not save explicitly."""
-        pass
+        """Publish the layer to the decode node in layerwise mode."""
+        assert self.connector_worker is not None
+        self.connector_worker.save_kv_layer(layer_name)
 
     def wait_for_save(self):
-        """MooncakeConnector does not save explicitly."""
-        pass
+        """Mark the end of the step in layerwise mode."""
+        assert self.connector_worker is not None
+        self.connector_worker.wait_for_save()
 
 
 class MooncakeConnectorScheduler:
@@ -578,6 +907,9 @@ class MooncakeConnectorScheduler:
         # the scheduler. Used to make metadata passed to Worker.
         self._reqs_need_recv: dict[str, tuple[Request, list[int]]] = {}
         self._reqs_need_send: dict[str, float] = {}
+        # Layerwise transfer: block ids of the requests to publish layer by
+        # layer in the prefill node.
+        self._reqs_need_save: dict[str, list[int]] = {}
 
     def get_num_new_matched_tokens(
             self, request: "Request",
@@ -625,8 +957,16 @@ class MooncakeConnectorScheduler:
             "num_external_tokens=%s, kv_transfer_params=%s",
             num_external_tokens, params)
 
+        if params is not None and params.get("do_remote_decode") and \
+                params.get("layerwise"):
+            # The decode node pulls the KV cache while it is being computed.
+            self._reqs_need_save[request.request_id] = \
+                blocks.get_block_ids()[0]
+
         if params is not None and params.get("do_remote_prefill"):
-            if params.get("remote_block_ids"):
+            # In layerwise mode, the remote block ids are only known once the
+            # remote prefill is scheduled, the worker queries them.
+            if params.get("remote_block_ids") or params.get("layerwise"):
                 if all(p in params for p in ("remote_engine_id", "remote_host",
                                              "remote_port")):
                     local_block_ids = (blocks.get_unhashed_block_ids()
@@ -665,6 +1005,8 @@ class MooncakeConnectorScheduler:
         self._reqs_need_recv.clear()
         meta.requests_to_send = self._reqs_need_send
         self._reqs_need_send = {}
+        meta.requests_to_save = self._reqs_need_save
+        self._reqs_need_save = {}
 
         return meta
 
@@ -794,6 +1136,9 @@ class MooncakeConnectorWorker:
 
         self.vllm_config = vllm_config
         self.block_size = vllm_config.cache_config.block_size
+        self.use_layerwise = \
+            vllm_config.kv_transfer_config.get_from_extra_config(
+                "use_layerwise", False)
 
     def _get_prefill_decode_size(self, vllm_config: VllmConfig):
         # get prefill tp and dp size from extra config
@@ -949,6 +1294,7 @@ class MooncakeConnectorWorker:
                 remote_engine_id=meta.remote_engine_id,
                 remote_host=meta.remote_host,
                 remote_handshake_port=remote_handshake_port,
+                layerwise=meta.layerwise,
             )
 
         if self.kv_send_thread is not None:
@@ -956,6 +1302,33 @@ class MooncakeConnectorWorker:
                 if self.tp_rank in self._get_remote_tp_ranks_for_req(req_id):
                     self.kv_send_thread.add_delayed_request(
                         req_id, delay_start_time)
+            if self.use_layerwise:
+                self.kv_send_thread.layer_tracker.start_step(
+                    metadata.requests_to_save)
+
+    def save_kv_layer(self, layer_name: str):
+        """Record the completion of a layer on the compute stream, the layer
+        can be pulled by the decode node as soon as the event is reached."""
+        if self.kv_send_thread is None or not self.use_layerwise:
+            return
+        layer_tracker = self.kv_send_thread.layer_tracker
+        if layer_tracker.current_step is None:
+            return
+        event = torch.npu.Event()
+        event.record()
+        layer_tracker.record_layer(layer_name, event)
+
+    def wait_for_save(self):
+        if self.kv_send_thread is None or not self.use_layerwise:
+            return
+        layer_tracker = self.kv_send_thread.layer_tracker
+        if layer_tracker.current_step is None:
+            return
+        # Layers without attention (e.g. the MTP layer) don't save KV, the
+        # end of the step covers them.
+        event = torch.npu.Event()
+        event.record()
+        layer_tracker.finish_step(event)
 
     def _get_remote_tp_rank(self, req_id: str) -> int:
         return self._get_remote_tp_ranks_for_req(req_id)[self.tp_rank]
@@ -85,6 +85,10 @@ env_variables: Dict[str, Callable[[], Any]] = {
     # Whether to enable DBO feature for deepseek model.
     "VLLM_ASCEND_ENABLE_DBO":
     lambda: bool(int(os.getenv("VLLM_ASCEND_ENABLE_DBO", '0'))),
+    # Whether to also split the decode batches into two micro batches with DBO.
+    # It only takes effect in eager mode, with VLLM_ASCEND_ENABLE_DBO enabled.
+    "VLLM_ASCEND_ENABLE_DBO_DECODE":
+    lambda: bool(int(os.getenv("VLLM_ASCEND_ENABLE_DBO_DECODE", '0'))),
     # Whether to enable the model execute time observe profile. Disable it when
     # running vllm ascend in production environment.
     "VLLM_ASCEND_MODEL_EXECUTE_TIME_OBSERVE":
@@ -153,6 +157,24 @@ env_variables: Dict[str, Callable[[], Any]] = {
     # are not freed within this timeout, they will be forcibly released.
     "VLLM_ASCEND_KVCACHE_DELAY_FREE_TIMEOUT":
     lambda: int(os.getenv("VLLM_ASCEND_KVCACHE_DELAY_FREE_TIMEOUT", 250)),
+    # Maximum number of concurrent KV cache pulls from the same remote engine
+    # in the decode node of the Mooncake connector. Requests queued for the
+    # same remote engine beyond this limit are merged into one batched
+    # transfer once a slot is free.
+    "VLLM_ASCEND_MOONCAKE_MAX_INFLIGHT_PER_REMOTE":
+    lambda: int(os.getenv("VLLM_ASCEND_MOONCAKE_MAX_INFLIGHT_PER_REMOTE", 4)),
+    # Number of streams used to copy the memory offloaded by sleep mode from
+    # and back to the device. The copies of each allocation are split in
+    # chunks of VLLM_ASCEND_SLEEP_COPY_CHUNK_MB MB spread over the streams.
+    "VLLM_ASCEND_SLEEP_COPY_STREAMS":
+    lambda: int(os.getenv("VLLM_ASCEND_SLEEP_COPY_STREAMS", 4)),
+    "VLLM_ASCEND_SLEEP_COPY_CHUNK_MB":
+    lambda: int(os.getenv("VLLM_ASCEND_SLEEP_COPY_CHUNK_MB", 64)),
+    # Whether to keep the pinned CPU backup of the offloaded memory after
+    # waking up. The next sleep reuses it instead of pinning new memory, and
+    # skips the copy of the tags declared unchanged since the wake up.
+    "VLLM_ASCEND_SLEEP_KEEP_CPU_BACKUP":
+    lambda: bool(int(os.getenv("VLLM_ASCEND_SLEEP_KEEP_CPU_BACKUP", '0'))),
 }
 
 # end-env-vars-definition
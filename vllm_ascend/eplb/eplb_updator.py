@@ -0,0 +1,211 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import torch
+import torch.distributed as dist
+from torch import nn
+from vllm.distributed.parallel_state import get_ep_group
+from vllm.logger import logger
+
+from vllm_ascend.eplb.policy import rebalance_experts
+from vllm_ascend.ops.expert_load_balancer import (generate_expert_map,
+                                                  generate_log2phy_map)
+
+# Per layer tensors that must not be swapped with the expert weights.
+# The tensors registered per expert slot by the MoE quant methods.
+_EXPERT_TENSORS = ("w13_weight", "w2_weight", "w13_bias", "w2_bias",
+                   "w13_weight_scale", "w2_weight_scale",
+                   "w13_weight_scale_fp32", "w13_weight_offset",
+                   "w2_weight_offset", "w13_weight_scale_second",
+                   "w2_weight_scale_second", "w13_scale_bias", "w2_scale_bias",
+                   "w13_input_scale", "w2_input_scale", "w13_input_offset",
+                   "w2_input_offset")
+
+
+def compute_rank_maps(placement: torch.Tensor, rank: int,
+                      num_experts: int) -> tuple[torch.Tensor, torch.Tensor]:
+    """Compute the maps used by `rank` to route tokens under `placement`.
+
+    Args:
+        placement: [num_ranks, num_slots] logical expert held by each slot.
+    Returns:
+        expert_map: [num_experts] local slot of each logical expert, -1 if
+            the expert is not held by `rank`.
+        log2phy: [num_experts] physical expert (rank * num_slots + slot) that
+            serves each logical expert, see `generate_log2phy_map`.
+    """
+    expert_map = generate_expert_map(placement[rank], num_experts)
+    log2phy = generate_log2phy_map(placement, num_experts)[rank]
+    return expert_map, log2phy
+
+
+def get_expert_tensors(layer: nn.Module) -> dict[str, torch.Tensor]:
+    """Return the per expert tensors (weights, scales, offsets...) of a MoE
+    layer, looked up by name in `_EXPERT_TENSORS`."""
+    tensors: dict[str, torch.Tensor] = {}
+    for name in _EXPERT_TENSORS:
+        tensor = getattr(layer, name, None)
+        if isinstance(tensor, nn.Parameter):
+            tensor = tensor.data
+        if isinstance(tensor, torch.Tensor):
+            tensors[name] = tensor
+    return tensors
+
+
+class EplbUpdator:
+    """Rebalance the experts of the MoE layers while serving.
+
+    Every `num_iterations_eplb_update` steps, the expert load accumulated by
+    the layers is all-reduced over the EP group and a new placement is
+    computed by a background thread. It is applied
+    `num_wait_worker_iterations` steps later, at the same step on every rank:
+    the expert weights are exchanged between ranks and the routing maps are
+    updated in place, so captured graphs stay valid.
+    """
+
+    def __init__(self, model: nn.Module, num_iterations_eplb_update: int,
+                 num_wait_worker_iterations: int):
+        self.num_iterations_eplb_update = num_iterations_eplb_update
+        self.num_wait_worker_iterations = num_wait_worker_iterations
+        self.moe_layers = sorted(
+            (module for module in model.modules()
+             if getattr(module, "expert_load", None) is not None),
+            key=lambda module: module.moe_instance_id)
+        self.ep_group = get_ep_group()
+        self.num_steps = 0
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="eplb_worker")
+        self.pending_placements: Optional[Future] = None
+
+    def step(self):
+        """Called once per engine step, on every rank of the EP group."""
+        if not self.moe_layers:
+            return
+        self.num_steps += 1
+        step_in_window = self.num_steps % self.num_iterations_eplb_update
+        if step_in_window == 0:
+            expert_load = self._collect_expert_load()
+            placements = [layer.expert_placement for layer in self.moe_layers]
+            self.pending_placements = self.executor.submit(
+                self._compute_placements, expert_load, placements)
+        elif step_in_window == self.num_wait_worker_iterations and \
+                self.pending_placements is not None:
+            new_placements = self.pending_placements.result()
+            self.pending_placements = None
+            self._apply_placements(new_placements)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def _collect_expert_load(self) -> torch.Tensor:
+        # [num_layers, num_experts]
+        expert_load = torch.stack(
+            [layer.expert_load for layer in self.moe_layers])
+        expert_load = self.ep_group.all_reduce(expert_load)
+        for layer in self.moe_layers:
+            layer.expert_load.zero_()
+        return expert_load.cpu()
+
+    @staticmethod
+    def _compute_placements(
+            expert_load: torch.Tensor,
+            placements: list[torch.Tensor]) -> list[torch.Tensor]:
+        return [
+            rebalance_experts(layer_load, placement)
+            for layer_load, placement in zip(expert_load, placements)
+        ]
+
+    def _apply_placements(self, new_placements: list[torch.Tensor]):
+        start_time = time.perf_counter()
+        num_updated_layers = 0
+        for layer, new_placement in zip(self.moe_layers, new_placements):
+            if torch.equal(layer.expert_placement, new_placement):
+                continue
+            self._swap_expert_weights(layer, new_placement)
+            expert_map, log2phy = compute_rank_maps(
+                new_placement, self.ep_group.rank_in_group,
+                layer.global_num_experts)
+            layer.expert_map.copy_(expert_map)
+            layer.log2phy.copy_(log2phy)
+            layer.expert_placement = new_placement
+            num_updated_layers += 1
+        if num_updated_layers > 0:
+            logger.info("EPLB updated the experts of %d layers in %.2f ms.",
+                        num_updated_layers,
+                        (time.perf_counter() - start_time) * 1000)
+
+    def _swap_expert_weights(self, layer: nn.Module,
+                             new_placement: torch.Tensor):
+        """Move the expert weights of `layer` to `new_placement`.
+
+        Every rank walks the slots in the same order, so the sends and the
+        receives of each pair of ranks are posted in the same order.
+        """
+        old_placement = layer.expert_placement
+        rank = self.ep_group.rank_in_group
+        tensors = get_expert_tensors(layer)
+        p2p_ops = []
+        received: list[tuple[int, dict[str, torch.Tensor]]] = []
+        local_moves: list[tuple[int, int]] = []
+        num_ranks, num_slots = new_placement.shape
+        for dst_rank in range(num_ranks):
+            for slot in range(num_slots):
+                expert = new_placement[dst_rank, slot]
+                if old_placement[dst_rank, slot] == expert:
+                    continue
+                old_slots = torch.nonzero(
+                    old_placement[dst_rank] == expert).flatten()
+                if len(old_slots) > 0:
+                    if dst_rank == rank:
+                        local_moves.append((slot, int(old_slots[0])))
+                    continue
+                holders = torch.nonzero(old_placement == expert)
+                src_rank, src_slot = holders[dst_rank % len(holders)].tolist()
+                if dst_rank == rank:
+                    buffers = {
+                        name: torch.empty_like(tensor[0])
+                        for name, tensor in tensors.items()
+                    }
+                    p2p_ops.extend(
+                        dist.P2POp(dist.irecv, buffer,
+                                   self.ep_group.ranks[src_rank],
+                                   self.ep_group.device_group)
+                        for buffer in buffers.values())
+                    received.append((slot, buffers))
+                elif src_rank == rank:
+                    p2p_ops.extend(
+                        dist.P2POp(dist.isend, tensor[src_slot],
+                                   self.ep_group.ranks[dst_rank],
+                                   self.ep_group.device_group)
+                        for tensor in tensors.values())
+
+        # The local sources may be overwritten, copy them before writing.
+        staged = {
+            name: tensor[[src_slot for _, src_slot in local_moves]].clone()
+            for name, tensor in tensors.items()
+        } if local_moves else {}
+        if p2p_ops:
+            for req in dist.batch_isend_irecv(p2p_ops):
+                req.wait()
+        for name, tensor in tensors.items():
+            for i, (slot, _) in enumerate(local_moves):
+                tensor[slot].copy_(staged[name][i])
+            for slot, buffers in received:
+                tensor[slot].copy_(buffers[name])
@@ -0,0 +1,151 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import heapq
+from typing import Optional
+
+import torch
+
+# A new placement is only adopted if it lowers the load of the busiest rank
+# by at least this ratio, so that weights are not moved for a marginal gain.
+MIN_IMBALANCE_IMPROVEMENT = 0.05
+
+
+def compute_rank_load(expert_load: torch.Tensor,
+                      placement: torch.Tensor) -> torch.Tensor:
+    """Estimate the load of each rank under `placement`.
+
+    Args:
+        expert_load: [num_experts] number of tokens routed to each logical
+            expert.
+        placement: [num_ranks, num_slots] logical expert held by each slot.
+    Returns:
+        [num_ranks] load of each rank, the load of an expert is split evenly
+        between its replicas.
+    """
+    expert_load = expert_load.to(torch.float64)
+    num_replicas = torch.bincount(placement.flatten().long(),
+                                  minlength=expert_load.shape[0])
+    replica_load = expert_load / num_replicas.clamp(min=1)
+    return replica_load[placement.long()].sum(dim=1)
+
+
+def _replicate_experts(expert_load: list[float], num_replicas: int,
+                       max_replicas: int) -> list[int]:
+    """Give the redundant slots to the experts with the highest load per
+    replica."""
+    counts = [1] * len(expert_load)
+    heap = [(-load, expert) for expert, load in enumerate(expert_load)]
+    heapq.heapify(heap)
+    for _ in range(num_replicas - len(expert_load)):
+        while heap:
+            _, expert = heapq.heappop(heap)
+            if counts[expert] < max_replicas:
+                break
+        else:
+            break
+        counts[expert] += 1
+        if counts[expert] < max_replicas:
+            heapq.heappush(
+                heap, (-expert_load[expert] / counts[expert], expert))
+    return counts
+
+
+def _assign_replicas(expert_load: list[float], counts: list[int],
+                     num_ranks: int,
+                     num_slots: int) -> Optional[list[list[int]]]:
+    """Assign the replicas, heaviest first, to the least loaded rank that
+    still has a free slot and doesn't hold the same expert yet.
+
+    Returns:
+        The experts of each rank, or None if no valid assignment is found.
+    """
+    replicas = sorted(((expert_load[expert] / count, expert)
+                       for expert, count in enumerate(counts)
+                       for _ in range(count)),
+                      key=lambda item: (-item[0], item[1]))
+    rank_experts: list[list[int]] = [[] for _ in range(num_ranks)]
+    rank_load = [0.0] * num_ranks
+    for load, expert in replicas:
+        candidates = [
+            rank for rank in range(num_ranks)
+            if len(rank_experts[rank]) < num_slots
+            and expert not in rank_experts[rank]
+        ]
+        if not candidates:
+            return None
+        rank = min(candidates, key=lambda r: (rank_load[r], r))
+        rank_experts[rank].append(expert)
+        rank_load[rank] += load
+    return rank_experts
+
+
+def _keep_slots(rank_experts: list[int],
+                old_rank_placement: list[int]) -> list[int]:
+    """Order the experts of a rank so that the experts it already holds stay
+    in their slot, which avoids moving their weights."""
+    num_slots = len(old_rank_placement)
+    new_rank_placement: list[Optional[int]] = [None] * num_slots
+    moved = []
+    for expert in rank_experts:
+        if expert in old_rank_placement:
+            new_rank_placement[old_rank_placement.index(expert)] = expert
+        else:
+            moved.append(expert)
+    free_slots = [
+        slot for slot in range(num_slots) if new_rank_placement[slot] is None
+    ]
+    for slot, expert in zip(free_slots, moved):
+        new_rank_placement[slot] = expert
+    return new_rank_placement  # type: ignore[return-value]
+
+
+def rebalance_experts(expert_load: torch.Tensor,
+                      placement: torch.Tensor) -> torch.Tensor:
+    """Compute a new placement of the experts of one MoE layer.
+
+    The number of slots per rank is fixed by the weights allocated at
+    startup, the redundant slots (if any) hold replicas of the hottest
+    experts. The result is deterministic, so every rank computes the same
+    placement from the same (all-reduced) load.
+
+    Args:
+        expert_load: [num_experts] number of tokens routed to each logical
+            expert.
+        placement: [num_ranks, num_slots] current placement.
+    Returns:
+        [num_ranks, num_slots] the new placement, or `placement` itself if
+        the new one doesn't lower the imbalance enough.
+    """
+    num_ranks, num_slots = placement.shape
+    load = expert_load.to(torch.float64).tolist()
+    counts = _replicate_experts(load, num_ranks * num_slots, num_ranks)
+    rank_experts = _assign_replicas(load, counts, num_ranks, num_slots)
+    if rank_experts is None:
+        return placement
+
+    old_placement = placement.tolist()
+    new_placement = torch.tensor([
+        _keep_slots(experts, old_rank_placement)
+        for experts, old_rank_placement in zip(rank_experts, old_placement)
+    ],
+                                 dtype=placement.dtype)
+
+    old_max_load = compute_rank_load(expert_load, placement).max()
+    new_max_load = compute_rank_load(expert_load, new_placement).max()
+    if new_max_load >= old_max_load * (1 - MIN_IMBALANCE_IMPROVEMENT):
+        return placement
+    return new_placement
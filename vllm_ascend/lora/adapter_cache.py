@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Prefetch of the LoRA adapters of the waiting requests.
+#
+# The adapters live in three tiers: the device LoRA slots (`max_loras`) and
+# the host memory cache (`max_cpu_loras`) of vLLM's LRU LoRA manager, and the
+# disk. The scheduler mirrors the host cache with `LoRAResidencyTracker` and
+# asks the workers to prefetch the adapters of the waiting requests, which
+# `LoRAAdapterPrefetcher` loads from the disk to pinned host memory in the
+# background. The activation then copies them to the device slots
+# asynchronously instead of reading them from the disk in the step.
+#
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import torch
+from vllm.logger import logger
+from vllm.lora.models import LoRAModel
+from vllm.lora.request import LoRARequest
+
+
+def pin_lora_model(lora_model: LoRAModel) -> LoRAModel:
+    """Move the weights of `lora_model` to pinned host memory so that their
+    copies to the device slots are asynchronous."""
+
+    def pin(tensor):
+        if isinstance(tensor, torch.Tensor) and not tensor.is_pinned():
+            return tensor.pin_memory()
+        return tensor
+
+    for lora in lora_model.loras.values():
+        for name in ("lora_a", "lora_b", "bias", "embeddings_tensor"):
+            weights = getattr(lora, name, None)
+            if isinstance(weights, list):
+                # The weights of the packed modules.
+                setattr(lora, name, [pin(w) for w in weights])
+            elif weights is not None:
+                setattr(lora, name, pin(weights))
+    return lora_model
+
+
+class LoRAAdapterPrefetcher:
+    """Load LoRA adapters to pinned host memory in a background thread.
+
+    `load_adapter` replaces the disk load of the worker LoRA manager: it
+    returns the prefetched adapter, waiting for its load if it is still in
+    flight, and loads the other ones synchronously.
+    """
+
+    def __init__(self,
+                 load_adapter: Callable[[LoRARequest], LoRAModel],
+                 max_num_prefetched: int,
+                 max_workers: int = 1):
+        self._load_adapter = load_adapter
+        self.max_num_prefetched = max_num_prefetched
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="lora_prefetch")
+        self._prefetched: OrderedDict[int, Future] = OrderedDict()
+
+    def _load_pinned(self, lora_request: LoRARequest) -> LoRAModel:
+        return pin_lora_model(self._load_adapter(lora_request))
+
+    def prefetch(self, lora_request: LoRARequest) -> None:
+        lora_id = lora_request.lora_int_id
+        if lora_id in self._prefetched:
+            return
+        self._prefetched[lora_id] = self._executor.submit(
+            self._load_pinned, lora_request)
+        # Drop the oldest adapters that were never used.
+        while len(self._prefetched) > self.max_num_prefetched:
+            self._prefetched.popitem(last=False)[1].cancel()
+
+    def load_adapter(self, lora_request: LoRARequest) -> LoRAModel:
+        future = self._prefetched.pop(lora_request.lora_int_id, None)
+        if future is not None and not lora_request.load_inplace:
+            try:
+                return future.result()
+            except Exception:
+                logger.warning(
+                    "Failed to prefetch the LoRA adapter %s, loading it "
+                    "again",
+                    lora_request.lora_name,
+                    exc_info=True)
+        return self._load_pinned(lora_request)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoRAResidencyTracker:
+    """Mirror on the scheduler of the LRU host memory cache of the adapters
+    of the workers."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lora_ids: OrderedDict[int, None] = OrderedDict()
+
+    def is_resident(self, lora_id: int) -> bool:
+        return lora_id in self._lora_ids
+
+    def touch(self, lora_id: int) -> None:
+        """Record a use or a prefetch of the adapter by the workers."""
+        self._lora_ids[lora_id] = None
+        self._lora_ids.move_to_end(lora_id)
+        while len(self._lora_ids) > self.capacity:
+            self._lora_ids.popitem(last=False)
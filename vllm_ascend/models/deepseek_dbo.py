@@ -64,6 +64,8 @@ from vllm.sequence import IntermediateTensors
 
 import vllm_ascend.envs as envs_ascend
 from vllm_ascend.ascend_config import get_ascend_config
+from vllm_ascend.attention.attention_v1 import (
+    maybe_save_kv_layer_to_connector, wait_for_kv_layer_from_connector)
 from vllm_ascend.models.deepseek_v2 import (CustomDeepseekV2MLP,
                                             CustomDeepseekV2RowParallelLinear)
 from vllm_ascend.multistream.base import MSEventKey
@@ -392,11 +394,19 @@ class CustomDeepseekDBOMLAAttention(DeepseekV2MLAAttention):
                                  dtype=hidden_states_or_q_c.dtype,
                                  device=hidden_states_or_q_c.device)
             forward_kwargs['output'] = output
+            forward_context = get_forward_context()
+            # Only the eager prefill pass talks to the kv connector, the
+            # compiled decode graphs must not capture these host-side hooks.
+            if forward_context.with_prefill:
+                wait_for_kv_layer_from_connector(self.mla_attn.layer_name)
             output = self.mla_attn.impl.forward(self.mla_attn,
                                                 hidden_states_or_q_c,
                                                 hidden_states, None, kv_cache,
                                                 attn_metadata,
                                                 **forward_kwargs)
+            if forward_context.with_prefill:
+                maybe_save_kv_layer_to_connector(self.mla_attn.layer_name,
+                                                 kv_cache)
             output = output.view(-1, output_shape[-1])
             return output
         else:
@@ -871,8 +881,9 @@ class CustomDeepseekDBOModel(nn.Module):
 
     def can_run_ms(self):
         attn_metadata = get_forward_context().attn_metadata
-        # enable prefill overlap
-        return not (attn_metadata is None or attn_metadata.num_prefills == 0
+        # enable prefill overlap, and decode overlap if the model runner
+        # enabled it for the decode batch
+        return not (attn_metadata is None
                     or not attn_metadata.enable_dbo_across_dp)
 
     def _forward_ms_layers(
@@ -30,6 +30,9 @@ from vllm.forward_context import get_forward_context
 from vllm.model_executor.layers.mla import MultiHeadLatentAttention
 from vllm.model_executor.layers.quantization import QuantizationConfig
 
+from vllm_ascend.attention.attention_v1 import (
+    maybe_save_kv_layer_to_connector, wait_for_kv_layer_from_connector)
+
 
 @dataclass
 class AscendMLAModules:
@@ -132,8 +135,10 @@ class AscendMultiHeadLatentAttention(MultiHeadLatentAttention):
         output = torch.empty(output_shape,
                              dtype=hidden_states.dtype,
                              device=hidden_states.device)
+        wait_for_kv_layer_from_connector(self.mla_attn.layer_name)
         output = self.mla_attn.impl.forward(hidden_states, kv_cache,
                                             forward_context.attn_metadata,
                                             need_gather_q_kv, output)
+        maybe_save_kv_layer_to_connector(self.mla_attn.layer_name, kv_cache)
         output = output.view(-1, output_shape[-1])
         return output
@@ -27,3 +27,5 @@ class MSAttentionMetadataSplitConfig:
     min_total_tokens_to_split: int = 256
     # split micro batches only when prefill tokens >= min_prefill_tokens_to_split
     min_prefill_tokens_to_split: int = 64
+    # split decode micro batches only when total tokens >= min_decode_tokens_to_split
+    min_decode_tokens_to_split: int = 64
@@ -50,6 +50,7 @@ class MultiStreamConfig:
     """Controls the behavior of multi-stream models."""
     min_total_tokens_to_split: int = 256
     min_prefill_tokens_to_split: int = 64
+    min_decode_tokens_to_split: int = 64
     num_micro_batches: int = 2
     imbalance_ratio: float = 0.1
 
@@ -100,6 +101,8 @@ class MultiStreamMetadata:
                 min_total_tokens_to_split,
                 min_prefill_tokens_to_split=self.ms_config.
                 min_prefill_tokens_to_split,
+                min_decode_tokens_to_split=self.ms_config.
+                min_decode_tokens_to_split,
             )
 
     def try_wait_event(self, layer_index: int, micro_batch_index: int,
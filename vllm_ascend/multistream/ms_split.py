@@ -1,7 +1,6 @@
-from copy import deepcopy
+from dataclasses import replace
 from typing import Any, List, Optional
 
-import numpy as np
 import torch
 
 from vllm_ascend.attention.attention_v1 import AscendAttentionState
@@ -15,6 +14,15 @@ def compute_split_seq_index(
     num_tokens: int,
     imbalance_ratio: float = 0.1,
 ) -> list[int]:
+    """Find where to split a batch into two micro batches.
+
+    Returns `[token_index, seq_index]`: the first micro batch has the tokens
+    before `token_index` and the first `seq_index` requests. A prefill batch
+    is split at the request boundary closest to its middle if it is balanced
+    within `imbalance_ratio`, otherwise in the middle of the request that
+    holds it, which then has tokens in both micro batches. `[0, 0]` if the
+    batch can not be split.
+    """
     if attn_state != AscendAttentionState.DecodeOnly:
         assert query_lens is not None
         total_tokens = sum(query_lens)
@@ -32,10 +40,12 @@ def compute_split_seq_index(
                 elif abs(tokens - total_tokens // 2 -
                          value) < total_tokens * imbalance_ratio:
                     return [tokens - value, split_index - 1]
-                # fail to split if it is imbalanced
-                # TODO: split tokens in seq
-                else:
+                # the draft tokens of a request are verified together
+                elif attn_state == AscendAttentionState.SpecDecoding:
                     return [0, 0]
+                # split the tokens of the request in the middle
+                else:
+                    return [total_tokens // 2, split_index]
     else:
         tokens = num_tokens // 2
         return [tokens, tokens]
@@ -56,10 +66,195 @@ def split_attn_int_type(
     return [min(var, index), max(var - index, 0)]
 
 
+def _split_chunked_context(
+    chunked_context: Any,
+    chunked_context_cls: Any,
+    req_start: int,
+    req_end: int,
+    device: torch.device,
+    head_context: Optional[list[int]] = None,
+) -> Any:
+    """The chunked context of the prefill requests in [req_start, req_end).
+
+    `head_context` is `[start, num_tokens]` of the tokens of the first
+    request in the KV cache which are computed by the other micro batch. They
+    are loaded as one more chunk of the context.
+    """
+    if chunked_context is not None:
+        starts = chunked_context.starts[:, req_start:req_end]
+        chunk_seq_lens = chunked_context.chunk_seq_lens[:, req_start:req_end]
+        workspace = chunked_context.workspace
+    else:
+        starts = chunk_seq_lens = workspace = None
+    if head_context is not None:
+        num_split_reqs = req_end - req_start
+        head_starts = torch.zeros((1, num_split_reqs), dtype=torch.int32)
+        head_seq_lens = torch.zeros((1, num_split_reqs), dtype=torch.int32)
+        head_starts[0, 0], head_seq_lens[0, 0] = head_context
+        if chunked_context is None:
+            starts = head_starts.to(device, non_blocking=True)
+            chunk_seq_lens = head_seq_lens
+        else:
+            starts = torch.cat([
+                starts,
+                head_starts.to(device=device,
+                               dtype=starts.dtype,
+                               non_blocking=True)
+            ])
+            chunk_seq_lens = torch.cat(
+                [chunk_seq_lens,
+                 head_seq_lens.to(chunk_seq_lens.dtype)])
+    if chunk_seq_lens is None:
+        return None
+    # the chunks without any token of the requests are skipped
+    seq_tot = chunk_seq_lens.sum(dim=1)
+    chunks = torch.nonzero(seq_tot).flatten()
+    if chunks.numel() == 0:
+        return None
+    chunk_seq_lens = chunk_seq_lens[chunks]
+    cu_seq_lens = torch.zeros(chunk_seq_lens.shape[0],
+                              chunk_seq_lens.shape[1] + 1,
+                              dtype=torch.int32)
+    torch.cumsum(chunk_seq_lens,
+                 dim=1,
+                 out=cu_seq_lens[:, 1:],
+                 dtype=torch.int32)
+    return chunked_context_cls(
+        cu_seq_lens=cu_seq_lens.to(device, non_blocking=True),
+        starts=starts[chunks.to(device)],
+        seq_tot=seq_tot[chunks].tolist(),
+        max_seq_lens=chunk_seq_lens.max(dim=1).values.tolist(),
+        workspace=workspace,
+        chunk_seq_lens=chunk_seq_lens,
+    )
+
+
+def _split_decode_metadata(
+    decode: Any,
+    seq_index: int,
+    token_index: int,
+) -> List[Any]:
+    """Split the decode metadata before the request `seq_index`, which
+    starts at the token `token_index`."""
+    [seq_lens_pre, seq_lens_post] = split_attn_tensor_type(
+        decode.seq_lens, seq_index)
+    actual_seq_lengths_q_pre = actual_seq_lengths_q_post = None
+    if decode.actual_seq_lengths_q is not None:
+        actual_seq_lengths_q_pre = decode.actual_seq_lengths_q[:seq_index]
+        actual_seq_lengths_q_post = [
+            end - token_index
+            for end in decode.actual_seq_lengths_q[seq_index:]
+        ]
+    decode_pre = replace(
+        decode,
+        input_positions=decode.input_positions[:token_index],
+        block_table=decode.block_table[:seq_index],
+        seq_lens=seq_lens_pre,
+        seq_lens_list=decode.seq_lens_list[:seq_index],
+        max_seq_lens=max(decode.seq_lens_list[:seq_index]),
+        actual_seq_lengths_q=actual_seq_lengths_q_pre,
+        sin=None if decode.sin is None else decode.sin[:token_index],
+        cos=None if decode.cos is None else decode.cos[:token_index],
+    )
+    if seq_index == len(decode.seq_lens_list):
+        return [decode_pre, None]
+    decode_post = replace(
+        decode,
+        input_positions=decode.input_positions[token_index:],
+        block_table=decode.block_table[seq_index:],
+        seq_lens=seq_lens_post,
+        seq_lens_list=decode.seq_lens_list[seq_index:],
+        max_seq_lens=max(decode.seq_lens_list[seq_index:]),
+        actual_seq_lengths_q=actual_seq_lengths_q_post,
+        sin=None if decode.sin is None else decode.sin[token_index:],
+        cos=None if decode.cos is None else decode.cos[token_index:],
+    )
+    return [decode_pre, decode_post]
+
+
+def _split_prefill_metadata(
+    prefill: Any,
+    seq_index: int,
+    token_index: int,
+    chunked_context_cls: Any,
+    attn_mask_pre: Optional[torch.Tensor],
+    attn_mask_post: Optional[torch.Tensor],
+) -> List[Any]:
+    """Split the prefill metadata at the token `token_index`, which is in
+    the first `seq_index` requests. If it is inside the last of them, its
+    tokens after the split form the first request of the second part, with
+    the tokens before the split as context."""
+    query_lens = prefill.query_lens
+    context_lens = prefill.context_lens
+    num_reqs = len(query_lens)
+    query_start = int(query_lens[:seq_index - 1].sum())
+    split_in_seq = (seq_index > 0 and
+                    query_start + int(query_lens[seq_index - 1]) > token_index)
+    post_start = seq_index - 1 if split_in_seq else seq_index
+
+    query_lens_pre = query_lens[:seq_index].clone()
+    context_lens_pre = context_lens[:seq_index].clone()
+    query_lens_post = query_lens[post_start:].clone()
+    head_context = None
+    if split_in_seq:
+        num_head_tokens = token_index - query_start
+        num_tail_tokens = int(query_lens[seq_index - 1]) - num_head_tokens
+        query_lens_pre[-1] = num_head_tokens
+        context_lens_pre[-1] -= num_tail_tokens
+        query_lens_post[0] = num_tail_tokens
+        # the tail of the request attends to its head in the KV cache
+        num_computed_tokens = int(context_lens[seq_index - 1] -
+                                  query_lens[seq_index - 1])
+        head_context = [num_computed_tokens, num_head_tokens]
+    context_lens_post = context_lens[post_start:]
+
+    query_start_loc = prefill.query_start_loc
+    device = query_start_loc.device
+    prefill_pre = replace(
+        prefill,
+        attn_mask=attn_mask_pre,
+        query_lens=query_lens_pre,
+        seq_lens=context_lens_pre,
+        context_lens=context_lens_pre,
+        input_positions=prefill.input_positions[:token_index],
+        query_start_loc=query_start_loc[:seq_index + 1].clamp(
+            max=token_index),
+        block_table=prefill.block_table[:seq_index],
+        max_query_len=query_lens_pre.max().item(),
+        max_seq_lens=context_lens_pre.max().item(),
+        chunked_context=_split_chunked_context(prefill.chunked_context,
+                                               chunked_context_cls, 0,
+                                               seq_index, device),
+        sin=None if prefill.sin is None else prefill.sin[:token_index],
+        cos=None if prefill.cos is None else prefill.cos[:token_index],
+    )
+    prefill_post = replace(
+        prefill,
+        attn_mask=attn_mask_post,
+        query_lens=query_lens_post,
+        seq_lens=context_lens_post,
+        context_lens=context_lens_post,
+        input_positions=prefill.input_positions[token_index:],
+        query_start_loc=(query_start_loc[post_start:] -
+                         token_index).clamp(min=0),
+        block_table=prefill.block_table[post_start:],
+        max_query_len=query_lens_post.max().item(),
+        max_seq_lens=context_lens_post.max().item(),
+        chunked_context=_split_chunked_context(prefill.chunked_context,
+                                               chunked_context_cls,
+                                               post_start, num_reqs, device,
+                                               head_context),
+        sin=None if prefill.sin is None else prefill.sin[token_index:],
+        cos=None if prefill.cos is None else prefill.cos[token_index:],
+    )
+    return [prefill_pre, prefill_post]
+
+
 def model_input_split_v1_mla_attn(
     attn_metadata,
     _metadata_cls,
     ms_split_config: MSAttentionMetadataSplitConfig,
+    _chunked_context_cls=None,
 ) -> List[Any]:
     assert 0 < ms_split_config.num_micro_batches < 3
     if attn_metadata is None:
@@ -68,148 +263,83 @@ def model_input_split_v1_mla_attn(
      seq_index] = compute_split_seq_index(attn_metadata.query_lens,
                                           attn_metadata.attn_state,
                                           attn_metadata.num_decode_tokens)
-    if token_index == 0 or seq_index == 0 or seq_index == len(
-            attn_metadata.query_lens):
+    if token_index <= 0 or token_index >= attn_metadata.num_actual_tokens:
         return [attn_metadata]
 
-    query_start_loc_cpu = np.zeros(shape=(len(attn_metadata.query_lens) + 1, ),
-                                   dtype=int)
-    np.cumsum(attn_metadata.query_lens, out=query_start_loc_cpu[1:])
-    if attn_metadata.num_prefills > 0:
-        prefill_query_start_loc = np.zeros(
-            shape=(len(attn_metadata.prefill.query_lens) + 1, ), dtype=int)
-        np.cumsum(attn_metadata.prefill.query_lens,
-                  out=prefill_query_start_loc[1:])
+    query_lens = attn_metadata.query_lens
+    num_reqs = len(query_lens)
+    # the request split in the middle has tokens in both micro batches
+    split_in_seq = sum(query_lens[:seq_index]) > token_index
+    post_start = seq_index - 1 if split_in_seq else seq_index
+    num_decodes = attn_metadata.num_decodes
+    num_decode_tokens = attn_metadata.num_decode_tokens
 
     # split attn metadata
     [slot_mapping_pre,
      slot_mapping_post] = split_attn_tensor_type(attn_metadata.slot_mapping,
                                                  token_index)
-    [num_decodes_pre,
-     num_decodes_post] = split_attn_int_type(attn_metadata.num_decodes,
-                                             seq_index)
-    [num_decode_tokens_pre, num_decode_tokens_post
-     ] = split_attn_int_type(attn_metadata.num_decode_tokens, token_index)
-    [num_prefills_pre, num_prefills_post
-     ] = split_attn_int_type(attn_metadata.num_prefills,
-                             max(0, seq_index - attn_metadata.num_decodes))
-    seq_lens = attn_metadata.prefill.seq_lens if attn_metadata.num_prefills > 0 else attn_metadata.decode.seq_lens
-    [seq_lens_pre, seq_lens_post] = split_attn_tensor_type(seq_lens, seq_index)
+    num_decodes_pre = min(num_decodes, seq_index)
+    num_decodes_post = max(num_decodes - post_start, 0)
+    [num_decode_tokens_pre,
+     num_decode_tokens_post] = split_attn_int_type(num_decode_tokens,
+                                                   token_index)
+    num_prefills_pre = seq_index - num_decodes_pre
+    num_prefills_post = num_reqs - post_start - num_decodes_post
+    seq_lens_pre = attn_metadata.seq_lens[:seq_index]
+    seq_lens_post = attn_metadata.seq_lens[post_start:]
+    block_table_pre = attn_metadata.block_tables[:seq_index]
+    block_table_post = attn_metadata.block_tables[post_start:]
 
     query_start_loc_pre = query_start_loc_post = None
     if attn_metadata.query_start_loc is not None:
-        query_start_loc_pre = attn_metadata.query_start_loc[:seq_index + 1]
-        query_start_loc_post = deepcopy(
-            attn_metadata.query_start_loc[seq_index:]
-        ) - attn_metadata.query_start_loc[seq_index]
-    [block_table_pre,
-     block_table_post] = split_attn_tensor_type(attn_metadata.block_tables,
-                                                seq_index)
-    assert attn_metadata.attn_mask is not None
-    if attn_metadata.attn_state == AscendAttentionState.PrefillNoCache or attn_metadata.attn_state == AscendAttentionState.PrefillCacheHit:
-        # the attn_mla kernel in torch npu only accept 128*128 attn mask
-        attn_mask_pre = attn_mask_post = attn_metadata.attn_mask
-        attn_state_pre = attn_state_post = attn_metadata.attn_state
-    elif attn_metadata.attn_state == AscendAttentionState.DecodeOnly:
-        # should be none in decode only state
-        attn_mask_pre = attn_mask_post = attn_metadata.attn_mask
-        attn_state_pre = attn_state_post = AscendAttentionState.DecodeOnly
-    else:
-        # chunked prefill
+        query_start_loc = attn_metadata.query_start_loc
+        query_start_loc_pre = query_start_loc[:seq_index + 1].clamp(
+            max=token_index)
+        query_start_loc_post = (
+            query_start_loc[post_start:num_reqs + 1] -
+            token_index).clamp(min=0)
+
+    attn_state = attn_metadata.attn_state
+    attn_state_pre = attn_state_post = attn_state
+    attn_mask_pre = attn_mask_post = attn_metadata.attn_mask
+    if (num_prefills_pre == 0
+            and attn_state != AscendAttentionState.SpecDecoding):
+        attn_state_pre = AscendAttentionState.DecodeOnly
+        attn_mask_pre = None
+    if split_in_seq and attn_state == AscendAttentionState.PrefillNoCache:
+        # the tail of the split request reads its head from the KV cache
+        attn_state_post = AscendAttentionState.ChunkedPrefill
+    if (attn_state == AscendAttentionState.ChunkedPrefill
+            and attn_metadata.attn_mask is not None):
+        attn_mask_post = attn_metadata.attn_mask[
+            token_index:, :max(seq_lens_post)].contiguous()
         if num_prefills_pre > 0:
-            attn_state_pre = attn_state_post = AscendAttentionState.ChunkedPrefill
             attn_mask_pre = attn_metadata.attn_mask[:token_index, :max(
                 seq_lens_pre)].contiguous()
-            attn_state_post = AscendAttentionState.ChunkedPrefill
-            attn_mask_post = attn_metadata.attn_mask[
-                token_index:, :max(seq_lens_post)].contiguous()
-        else:
-            attn_state_pre = AscendAttentionState.DecodeOnly
-            attn_mask_pre = None
-            attn_state_post = AscendAttentionState.ChunkedPrefill
-            attn_mask_post = attn_metadata.attn_mask[
-                token_index:, :max(seq_lens_post)].contiguous()
-    from vllm_ascend.attention.mla_v1 import (AscendMLADecodeMetadata,
-                                              AscendMLAPrefillMetadata)
-    if num_prefills_pre > 0:
-        # split metadata.prefill
-        [input_positions_pre, input_positions_post] = split_attn_tensor_type(
-            attn_metadata.prefill.input_positions,
-            token_index - attn_metadata.num_decode_tokens)
-        [block_tables_pre, block_tables_post
-         ] = split_attn_tensor_type(attn_metadata.prefill.block_table,
-                                    seq_index - attn_metadata.num_decodes)
-        [prefill_query_lens_pre, prefill_query_lens_post
-         ] = split_attn_tensor_type(attn_metadata.prefill.query_lens,
-                                    seq_index - attn_metadata.num_decodes)
-        prefill_query_start_loc_pre = attn_metadata.prefill.query_start_loc[:
-                                                                            seq_index
-                                                                            +
-                                                                            1 -
-                                                                            attn_metadata
-                                                                            .
-                                                                            num_decodes]
-        prefill_query_start_loc_post = deepcopy(
-            attn_metadata.prefill.query_start_loc[seq_index -
-                                                  attn_metadata.num_decodes:]
-        ) - attn_metadata.prefill.query_start_loc[seq_index -
-                                                  attn_metadata.num_decodes]
-        context_len_pre = seq_lens_pre[attn_metadata.num_decodes:]
-        context_len_post = seq_lens_post
-        prefill_max_query_len_pre = max(prefill_query_lens_pre)
-        prefill_max_query_len_post = max(prefill_query_lens_post)
-        prefill_pre = AscendMLAPrefillMetadata(
-            attn_mask=attn_mask_pre,
-            query_lens=prefill_query_lens_pre,
-            seq_lens=seq_lens_pre,
-            query_start_loc=prefill_query_start_loc_pre,
-            input_positions=input_positions_pre,
-            context_lens=context_len_pre,
-            block_table=block_tables_pre,
-            max_query_len=prefill_max_query_len_pre,
-            max_seq_lens=context_len_pre.max().item(),
-        )
-        prefill_post = AscendMLAPrefillMetadata(
-            attn_mask=attn_mask_post,
-            query_lens=prefill_query_lens_post,
-            seq_lens=seq_lens_post,
-            query_start_loc=prefill_query_start_loc_post,
-            input_positions=input_positions_post,
-            context_lens=context_len_post,
-            block_table=block_tables_post,
-            max_query_len=prefill_max_query_len_post,
-            max_seq_lens=context_len_post.max().item(),
-        )
+
+    if num_prefills_pre == 0:
+        # split in the decode requests, the prefill ones are all in the
+        # second micro batch
+        [decode_pre,
+         decode_post] = _split_decode_metadata(attn_metadata.decode,
+                                               seq_index, token_index)
+        prefill_pre = None
+        prefill_post = attn_metadata.prefill
+    else:
+        # split in the prefill requests, the decode ones are all in the first
+        # micro batch
         decode_pre = attn_metadata.decode
         decode_post = None
-    else:
-        # prefill is None, split metadata.decode
-        [input_positions_pre, input_positions_post
-         ] = split_attn_tensor_type(attn_metadata.decode.input_positions,
-                                    token_index)
-        [block_tables_pre, block_tables_post
-         ] = split_attn_tensor_type(attn_metadata.decode.block_table,
-                                    seq_index)
-        [decode_seq_lens_pre,
-         decode_seq_lens_post] = split_attn_tensor_type(seq_lens, seq_index)
-        decode_pre = AscendMLADecodeMetadata(
-            input_positions=input_positions_pre,
-            block_table=block_tables_pre,
-            seq_lens=decode_seq_lens_pre,
-            max_seq_lens=max(decode_seq_lens_pre),
-            seq_lens_list=decode_seq_lens_pre.tolist(),
+        [prefill_pre, prefill_post] = _split_prefill_metadata(
+            attn_metadata.prefill,
+            seq_index - num_decodes,
+            token_index - num_decode_tokens,
+            _chunked_context_cls,
+            attn_mask_pre,
+            attn_mask_post,
         )
-        decode_post = AscendMLADecodeMetadata(
-            input_positions=input_positions_post,
-            block_table=block_tables_post,
-            seq_lens=decode_seq_lens_post,
-            max_seq_lens=max(decode_seq_lens_post),
-            seq_lens_list=decode_seq_lens_post.tolist(),
-        )
-        prefill_pre = None
-        prefill_post = attn_metadata.prefill
+
     # construct metadata
-    from vllm_ascend.attention.mla_v1 import AscendMLAPrefillMetadata
     attention_metadata_pre = _metadata_cls(
         num_actual_tokens=token_index,
         num_input_tokens=token_index,
@@ -221,6 +351,8 @@ def model_input_split_v1_mla_attn(
         num_decodes=num_decodes_pre,
         num_prefills=num_prefills_pre,
         num_decode_tokens=num_decode_tokens_pre,
+        query_lens=query_lens[:seq_index - 1] +
+        [token_index - sum(query_lens[:seq_index - 1])],
         attn_state=attn_state_pre,
         attn_mask=attn_mask_pre,
         prefill=prefill_pre,
@@ -238,6 +370,8 @@ def model_input_split_v1_mla_attn(
         num_decodes=num_decodes_post,
         num_prefills=num_prefills_post,
         num_decode_tokens=num_decode_tokens_post,
+        query_lens=[sum(query_lens[:post_start + 1]) - token_index] +
+        query_lens[post_start + 1:],
         attn_mask=attn_mask_post,
         attn_state=attn_state_post,
         prefill=prefill_post,
@@ -1,10 +1,60 @@
+import functools
 import json
-import random
-from typing import Dict, List
 
 import torch
 
 
+def generate_expert_map(placement: torch.Tensor,
+                        num_experts: int) -> torch.Tensor:
+    """Invert `placement` (the logical expert held by each slot, in its last
+    dim) into the local slot of each logical expert, -1 if not held."""
+    expert_map = torch.full((*placement.shape[:-1], num_experts),
+                            -1,
+                            dtype=torch.int32)
+    slots = torch.arange(placement.shape[-1],
+                         dtype=torch.int32).expand(placement.shape)
+    return expert_map.scatter_(-1, placement.long(), slots)
+
+
+def generate_log2phy_map(placement: torch.Tensor,
+                         num_experts: int) -> torch.Tensor:
+    """Map the logical experts to the physical ones (rank * num_slots + slot)
+    for every rank of `placement` ([num_ranks, num_slots]).
+
+    A rank always uses its local replica. The ranks that don't hold a
+    redundant expert are spread across its replicas, each one going to the
+    replica whose rank serves the fewest remote routes so far, so that the
+    result is deterministic and doesn't overload a single replica.
+    """
+    num_ranks, num_slots = placement.shape
+    expert_map = generate_expert_map(placement, num_experts)
+    is_local = expert_map != -1
+    rank_offsets = torch.arange(num_ranks).unsqueeze(1) * num_slots
+    log2phy = torch.where(is_local, expert_map + rank_offsets,
+                          -1).to(torch.int32)
+
+    # An expert with a single replica is served by it on every rank.
+    num_replicas = is_local.sum(dim=0)
+    single = num_replicas == 1
+    log2phy[:, single] = log2phy[:, single].amax(dim=0)
+
+    hosts = is_local[:, single].int().argmax(dim=0)
+    rank_routes = (torch.bincount(hosts, minlength=num_ranks) *
+                   (num_ranks - 1)).tolist()
+    for expert in torch.nonzero(num_replicas > 1).flatten().tolist():
+        holders = torch.nonzero(is_local[:, expert]).flatten().tolist()
+        phy_ids = log2phy[holders, expert].tolist()
+        others = torch.nonzero(~is_local[:, expert]).flatten()
+        chosen = []
+        for _ in range(len(others)):
+            i = min(range(len(holders)),
+                    key=lambda i: (rank_routes[holders[i]], holders[i]))
+            chosen.append(phy_ids[i])
+            rank_routes[holders[i]] += 1
+        log2phy[others, expert] = torch.tensor(chosen, dtype=torch.int32)
+    return log2phy
+
+
 class ExpertLoadBalancer(object):
 
     def __init__(self, expert_map_path, global_expert_num):
@@ -12,6 +62,13 @@ class ExpertLoadBalancer(object):
         self.global_expert_num = global_expert_num
         self.expert_map_tensor, self.layers_num, self.ranks_num = (
             self._expert_file_to_tensor())
+        # The maps of all layers and ranks are computed once, every MoE layer
+        # then only picks its own.
+        self.expert_placement_map = self.generate_expert_placement_map()
+        self.log2phy_map = torch.stack([
+            self.generate_log2phy_expert_map(layer_id)
+            for layer_id in range(self.layers_num)
+        ])
 
     def _expert_file_to_tensor(self):
         with open(self.expert_map_path, "r") as f:
@@ -32,68 +89,53 @@ class ExpertLoadBalancer(object):
         dict_list = []
         current_idx = 0
 
-        for row in tensor_2d:
-            value_to_index = {}
-            for i in range(row.size(0)):
-                value = row[i].item()
-                value_to_index[value] = current_idx + i
-            dict_list.append(value_to_index)
-            current_idx += row.size(0)
+        for row in tensor_2d.tolist():
+            dict_list.append(
+                {value: current_idx + i
+                 for i, value in enumerate(row)})
+            current_idx += len(row)
 
         return dict_list
 
     def generate_expert_placement_map(self):
-        expert_placement_map = torch.full(
-            (self.layers_num, self.ranks_num, self.global_expert_num),
-            -1,
-            dtype=torch.int32,
-        )
-        for layer_id in range(self.layers_num):
-            for gpu_id in range(self.ranks_num):
-                e_ids = self.expert_map_tensor[layer_id, gpu_id]
-                expert_placement_map[layer_id, gpu_id,
-                                     e_ids] = torch.arange(len(e_ids),
-                                                           dtype=torch.int32)
-        return expert_placement_map
+        return generate_expert_map(self.expert_map_tensor,
+                                   self.global_expert_num)
 
     def generate_log2phy_expert_map(self, layer_id):
-        concatenated = torch.flatten(self.expert_map_tensor[layer_id])
-        rank_expert_to_global = self.generate_index_dicts(
-            self.expert_map_tensor[layer_id])
-        result_dict: Dict[int, List[int]] = {}
-        for idx, value in enumerate(concatenated):
-            key = value.item()
-            if key not in result_dict:
-                result_dict[key] = []
-            result_dict[key].append(idx)
-
-        log2phy_map = torch.full((self.ranks_num, self.global_expert_num),
-                                 -1,
-                                 dtype=torch.int32)
-        for rank in range(self.ranks_num):
-            for key in result_dict:
-                indices_in_concat = result_dict[key]
-                if key in rank_expert_to_global[rank]:
-                    log2phy_map[rank][key] = rank_expert_to_global[rank][key]
-                else:
-                    chosen_index = random.choice(indices_in_concat)
-                    log2phy_map[rank][key] = chosen_index
-        return log2phy_map
+        return generate_log2phy_map(self.expert_map_tensor[layer_id],
+                                    self.global_expert_num)
 
     def get_rank_placement_map(self, layer_id, rank_id):
-        expert_placement_map = self.generate_expert_placement_map()
-        layer_expert_map = expert_placement_map[layer_id]
-        rank_expert_map = layer_expert_map[rank_id].to(
+        rank_expert_map = self.expert_placement_map[layer_id, rank_id]
+        rank_local_expert_num = torch.sum(torch.ne(rank_expert_map,
+                                                   -1)).item()
+        return rank_local_expert_num, rank_expert_map.to(
             torch.npu.current_device())
-        rank_local_expert_num = torch.sum(torch.ne(rank_expert_map, -1)).item()
-        return rank_local_expert_num, rank_expert_map
 
     def get_rank_log2phy_map(self, layer_id, rank_id):
-        layer_log2phy_map = self.generate_log2phy_expert_map(layer_id)
-        return layer_log2phy_map[rank_id]
+        return self.log2phy_map[layer_id, rank_id].clone()
 
     def get_global_redundant_expert_num(self):
         global_redundant_expert_num = (
             len(self.expert_map_tensor[0][0]) * self.ranks_num -
             self.global_expert_num)
         return global_redundant_expert_num
+
+
+@functools.cache
+def get_expert_load_balancer(expert_map_path: str,
+                             global_expert_num: int) -> ExpertLoadBalancer:
+    """Share one ExpertLoadBalancer between all the MoE layers, so the expert
+    map file is only read and converted once."""
+    return ExpertLoadBalancer(expert_map_path, global_expert_num)
+
+
+def record_expert_load(layer: torch.nn.Module, topk_ids: torch.Tensor):
+    """Accumulate the number of tokens routed to each logical expert of
+    `layer`, only when dynamic EPLB allocated the counter. The counter stays
+    on device so that no host sync is added to the forward."""
+    expert_load = getattr(layer, "expert_load", None)
+    if expert_load is None:
+        return
+    topk_ids = topk_ids.flatten().to(torch.int64)
+    expert_load.scatter_add_(0, topk_ids, torch.ones_like(topk_ids))
@@ -41,7 +41,8 @@ from vllm.model_executor.layers.quantization.base_config import \
 from vllm_ascend.ascend_config import get_ascend_config
 from vllm_ascend.ascend_forward_context import FusedMoEState
 from vllm_ascend.distributed.parallel_state import get_mc2_group
-from vllm_ascend.ops.expert_load_balancer import ExpertLoadBalancer
+from vllm_ascend.ops.expert_load_balancer import (get_expert_load_balancer,
+                                                  record_expert_load)
 from vllm_ascend.ops.moe.experts_selector import select_experts
 from vllm_ascend.ops.moe.moe_mlp import unified_apply_mlp
 from vllm_ascend.ops.sequence_parallel import MetadataForPadding
@@ -181,6 +182,14 @@ class AscendUnquantizedFusedMoEMethod(UnquantizedFusedMoEMethod):
         # currently it is only activated when doing profile runs.
         if enable_force_load_balance and not self.use_aclgraph:
             topk_ids = torch.randint_like(topk_ids, 0, global_num_experts)
+        elif not enable_force_load_balance:
+            record_expert_load(layer, topk_ids)
+        # The unquantized experts are only remapped when dynamic EPLB moves
+        # them, i.e. when the layer records its expert load.
+        log2phy = kwargs.get("log2phy") if getattr(
+            layer, "expert_load", None) is not None else None
+        global_redundant_expert_num = kwargs.get("global_redundant_expert_num",
+                                                 0)
 
         return unified_fused_experts_eager(hidden_states=x,
                                            w1=layer.w13_weight,
@@ -189,6 +198,9 @@ class AscendUnquantizedFusedMoEMethod(UnquantizedFusedMoEMethod):
                                            topk_ids=topk_ids,
                                            row_idx=row_idx,
                                            expert_map=expert_map,
+                                           log2phy=log2phy,
+                                           global_redundant_expert_num=
+                                           global_redundant_expert_num,
                                            shared_experts=shared_experts,
                                            mc2_mask=kwargs.get(
                                                "mc2_mask", None),
@@ -291,10 +303,15 @@ class AscendFusedMoE(FusedMoE):
 
         ascend_config = get_ascend_config()
         expert_map_path = ascend_config.expert_map_path
+        # Only used by dynamic EPLB: the logical expert held by each slot of
+        # each rank, shape [ep_size, local_num_experts].
+        self.expert_placement = None
         if expert_map_path and os.path.exists(expert_map_path):
             # moe expert load balance
-            expert_load_balancer = ExpertLoadBalancer(expert_map_path,
-                                                      self.global_num_experts)
+            expert_load_balancer = get_expert_load_balancer(
+                expert_map_path, self.global_num_experts)
+            self.expert_placement = expert_load_balancer.expert_map_tensor[
+                self.moe_instance_id].clone()
             self.local_num_experts, self.expert_map = \
                                 expert_load_balancer.get_rank_placement_map(
                                                 self.moe_instance_id,
@@ -310,6 +327,24 @@ class AscendFusedMoE(FusedMoE):
                 self.ep_size,
                 get_ep_group().rank_in_group, self.global_num_experts)
 
+        # Dynamic EPLB counts the tokens routed to each logical expert and
+        # moves the experts between ranks while serving.
+        self.expert_load = None
+        if ascend_config.dynamic_eplb and self.expert_map is not None:
+            if self.expert_placement is None:
+                assert self.global_num_experts % self.ep_size == 0, \
+                    "dynamic EPLB requires the experts to be evenly split " \
+                    "across EP ranks"
+                self.expert_placement = torch.arange(
+                    self.global_num_experts,
+                    dtype=torch.int32).view(self.ep_size, -1)
+                self.log2phy = torch.arange(self.global_num_experts,
+                                            dtype=torch.int32,
+                                            device="npu")
+            self.expert_load = torch.zeros(self.global_num_experts,
+                                           dtype=torch.int64,
+                                           device="npu")
+
         self.enable_shared_expert_dp = ascend_config.enable_shared_expert_dp
 
         if self.scoring_func != "softmax" and not self.use_grouped_topk:
@@ -365,7 +400,8 @@ class AscendFusedMoE(FusedMoE):
             top_k=self.top_k,
             num_experts=self.global_num_experts,
             num_global_redundant_experts=self.global_redundant_expert_num,
-            num_local_experts=self.local_num_experts)
+            num_local_experts=self.local_num_experts,
+            dynamic_eplb=ascend_config.dynamic_eplb)
 
     def naive_multicast(self, x: torch.Tensor,
                         cu_tokens_across_dp_cpu: torch.Tensor):
@@ -0,0 +1,140 @@
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+# Measured selection of the MoE communication method, see
+# `NPUModelRunner.calibrate_moe_comm_method`.
+
+import bisect
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+from vllm.logger import logger
+
+
+@dataclass
+class MoECommCrossoverTable:
+    """The fastest MoE communication method by number of tokens.
+
+    `methods[i]` is used for the batches of at most `max_num_tokens[i]`
+    tokens and larger than `max_num_tokens[i - 1]`, the last method is also
+    used for the batches larger than all the bounds.
+    """
+    max_num_tokens: list[int]
+    methods: list[str]
+
+    def select(self, num_tokens: int) -> str:
+        index = bisect.bisect_left(self.max_num_tokens, num_tokens)
+        return self.methods[min(index, len(self.methods) - 1)]
+
+    def to_json(self) -> list[list]:
+        return [[n, method]
+                for n, method in zip(self.max_num_tokens, self.methods)]
+
+    @classmethod
+    def from_json(cls, table: list[list]) -> "MoECommCrossoverTable":
+        return cls(max_num_tokens=[int(n) for n, _ in table],
+                   methods=[str(method) for _, method in table])
+
+
+def measure_moe_comm_methods(run_step: Callable[[str, int], None],
+                             candidate_methods: Callable[[int], list[str]],
+                             methods: list[str],
+                             num_tokens_grid: list[int],
+                             num_iters: int = 3,
+                             timer: Callable[[], float] = time.perf_counter
+                             ) -> np.ndarray:
+    """Time a step with each method over the grid of numbers of tokens.
+
+    Args:
+        run_step: runs a step of `num_tokens` tokens with the given method
+            and waits for its completion.
+        candidate_methods: the methods available for a number of tokens.
+        methods: all the methods, the columns of the result.
+        num_tokens_grid: the numbers of tokens to measure, the rows of the
+            result.
+        num_iters: number of timed steps after a warmup step, the minimum
+            time is kept.
+
+    Returns:
+        The step time of each number of tokens and method, inf if the method
+        is not available.
+    """
+    timings = np.full((len(num_tokens_grid), len(methods)), np.inf)
+    for row, num_tokens in enumerate(num_tokens_grid):
+        for method in candidate_methods(num_tokens):
+            column = methods.index(method)
+            # Warmup.
+            run_step(method, num_tokens)
+            for _ in range(num_iters):
+                start = timer()
+                run_step(method, num_tokens)
+                timings[row, column] = min(timings[row, column],
+                                           timer() - start)
+    return timings
+
+
+def build_crossover_table(num_tokens_grid: list[int], methods: list[str],
+                          timings: np.ndarray) -> MoECommCrossoverTable:
+    """Keep the fastest method of each number of tokens of the grid, merging
+    the consecutive numbers of tokens with the same fastest method."""
+    fastest = [methods[i] for i in np.argmin(timings, axis=1)]
+    max_num_tokens: list[int] = []
+    table_methods: list[str] = []
+    for num_tokens, method in zip(num_tokens_grid, fastest):
+        if table_methods and table_methods[-1] == method:
+            max_num_tokens[-1] = num_tokens
+        else:
+            max_num_tokens.append(num_tokens)
+            table_methods.append(method)
+    return MoECommCrossoverTable(max_num_tokens, table_methods)
+
+
+def load_moe_comm_table(path: str,
+                        key: str) -> Optional[MoECommCrossoverTable]:
+    """Return the crossover table of `key` stored in `path`, if any."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            tables = json.load(f)
+        if key not in tables:
+            return None
+        return MoECommCrossoverTable.from_json(tables[key])
+    except (OSError, ValueError, TypeError):
+        logger.warning("Ignoring the invalid MoE communication table %s",
+                       path)
+        return None
+
+
+def save_moe_comm_table(path: str, key: str,
+                        table: MoECommCrossoverTable) -> None:
+    """Store the crossover table of `key` in `path`, keeping the tables of
+    the other models and topologies."""
+    tables = {}
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                tables = json.load(f)
+        except (OSError, ValueError):
+            tables = {}
+    tables[key] = table.to_json()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(tables, f, indent=2)
+    os.replace(tmp_path, path)
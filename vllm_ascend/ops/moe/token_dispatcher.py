@@ -128,6 +128,8 @@ class TokenDispatcherWithMC2(MoETokenDispatcher):
         # NOTE: Currently, when in A3, we need to pass in some extra param into dispatch & combine
         self.a3_need_extra_args = \
             get_ascend_soc_version() == AscendSocVersion.A3
+        # MC2 only routes to physical experts when dynamic EPLB moves them.
+        self.dynamic_eplb = kwargs.get("dynamic_eplb", False)
         self.output = None
         self.assist_info_for_combine = None
         self.ep_recv_counts = None
@@ -199,6 +201,10 @@ class TokenDispatcherWithMC2(MoETokenDispatcher):
                        mc2_mask: Optional[torch.Tensor] = None,
                        apply_router_weight_on_input: bool = False,
                        with_quant: bool = False):
+        # Route the tokens to physical experts when the experts are
+        # placed by dynamic EPLB.
+        if self.dynamic_eplb and log2phy is not None:
+            topk_ids = log2phy[topk_ids]
         self.with_quant = with_quant
         self.expert_map = expert_map
         self.topk_ids = topk_ids
@@ -107,3 +107,32 @@
 #       - this is a bug by Ascend only. It can' be fixed in vLLM.
 #    Future Plan:
 #       Fix this bug in torch-npu, bump torch-npu version and remove this patch.
+#
+# ** File: worker/patch_common/patch_lora.py **
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#   1. `vllm.lora.worker_manager.WorkerLoRAManager._load_adapter`
+#    Why:
+#       With `lora_prefetch_depth`, NPUModelRunner loads the adapters of the waiting requests in a background
+#       thread, but the worker LoRA manager always loads an adapter from disk when its request is scheduled and
+#       has no hook to take an adapter which was loaded elsewhere.
+#    How：
+#       Keep the original disk load as `load_adapter_from_disk` and serve `_load_adapter` from the
+#       `adapter_prefetcher` of the manager when the model runner has set one.
+#    Related PR (if no, explain why):
+#       No, adapter prefetching is only implemented in vllm-ascend yet.
+#    Future Plan:
+#       Remove this patch when vLLM exposes a way to plug in the adapter loader of the worker LoRA manager.
+#
+# ** File: worker/patch_common/patch_multiproc_executor.py **
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#   1. `vllm.v1.executor.multiproc_executor.WorkerProc.worker_busy_loop`
+#    Why:
+#       With async scheduling, NPUModelRunner returns before the sampled tokens are copied to the host, but
+#       the busy loop serializes the output right away, which would wait for the device and prevent the
+#       worker from preparing the next step during the current one.
+#    How：
+#       Send the responses from a background thread, which waits for the async outputs in order.
+#    Related PR (if no, explain why):
+#       No, vLLM 0.10.1 doesn't have async model runner outputs yet.
+#    Future Plan:
+#       Remove this patch when vLLM resolves async model runner outputs in the worker itself.
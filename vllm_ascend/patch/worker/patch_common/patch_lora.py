@@ -0,0 +1,36 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from vllm.lora.models import LoRAModel
+from vllm.lora.request import LoRARequest
+from vllm.lora.worker_manager import WorkerLoRAManager
+
+_load_adapter_from_disk = WorkerLoRAManager._load_adapter
+
+
+def _load_adapter(self: WorkerLoRAManager,
+                  lora_request: LoRARequest) -> LoRAModel:
+    """Serve the adapter from the `LoRAAdapterPrefetcher` of the manager when
+    the model runner has set one."""
+    adapter_prefetcher = getattr(self, "adapter_prefetcher", None)
+    if adapter_prefetcher is not None:
+        return adapter_prefetcher.load_adapter(lora_request)
+    return _load_adapter_from_disk(self, lora_request)
+
+
+WorkerLoRAManager.load_adapter_from_disk = _load_adapter_from_disk
+WorkerLoRAManager._load_adapter = _load_adapter
@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import queue
+import threading
+
+from vllm.logger import logger
+from vllm.v1.executor.multiproc_executor import WorkerProc
+
+
+class AsyncOutputResponseQueue:
+    """Send the responses of a worker in order from a background thread.
+
+    With async scheduling, `NPUModelRunner.execute_model` returns before the
+    sampled tokens are on the host. Waiting for them here instead of in the
+    busy loop lets the worker receive and prepare the next step while the
+    device is still running the current one.
+    """
+
+    def __init__(self, response_mq):
+        self.response_mq = response_mq
+        self._responses: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._send_responses,
+                                        name="WorkerAsyncOutputThread",
+                                        daemon=True)
+        self._thread.start()
+
+    def enqueue(self, response):
+        self._responses.put(response)
+
+    def _send_responses(self):
+        while True:
+            status, output = self._responses.get()
+            if status == WorkerProc.ResponseStatus.SUCCESS and hasattr(
+                    output, "get_output"):
+                try:
+                    output = output.get_output()
+                except Exception as e:
+                    logger.exception("WorkerProc hit an exception.")
+                    status, output = WorkerProc.ResponseStatus.FAILURE, str(e)
+            self.response_mq.enqueue((status, output))
+
+    def __getattr__(self, name):
+        return getattr(self.response_mq, name)
+
+
+_worker_busy_loop = WorkerProc.worker_busy_loop
+
+
+def worker_busy_loop(self):
+    scheduler_config = self.worker.worker.vllm_config.scheduler_config
+    if scheduler_config.async_scheduling:
+        self.worker_response_mq = AsyncOutputResponseQueue(
+            self.worker_response_mq)
+    _worker_busy_loop(self)
+
+
+WorkerProc.worker_busy_loop = worker_busy_loop
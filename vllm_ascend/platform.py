@@ -199,7 +199,8 @@ class NPUPlatform(Platform):
             compilation_config.use_inductor = False
             compilation_config.splitting_ops.extend(
                 ["vllm.unified_ascend_attention_with_output"])
-            update_aclgraph_sizes(vllm_config)
+            update_aclgraph_sizes(vllm_config,
+                                  ascend_config.aclgraph_capture_plan_path)
         else:
             logger.info(
                 "%s cudagraph_mode is not support on NPU. falling back to NONE",
@@ -26,6 +26,7 @@ from vllm.forward_context import get_forward_context
 
 from vllm_ascend.ascend_forward_context import FusedMoEState
 from vllm_ascend.distributed.parallel_state import get_mc2_group
+from vllm_ascend.ops.expert_load_balancer import record_expert_load
 from vllm_ascend.ops.fused_moe import unified_fused_experts_eager
 from vllm_ascend.ops.moe.experts_selector import select_experts
 
@@ -288,6 +289,8 @@ class AscendW4A8DynamicFusedMoEMethod:
         # currently it is only activated when doing profile runs.
         if enable_force_load_balance:
             topk_ids = torch.randint_like(topk_ids, 0, global_num_experts)
+        else:
+            record_expert_load(layer, topk_ids)
 
         topk_weights = topk_weights.to(x.dtype)
 
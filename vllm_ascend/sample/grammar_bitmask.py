@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Structured output bitmask applied on the device, XGrammar only supports
+# CPU and GPU.
+#
+from typing import Optional
+
+import numpy as np
+import torch
+
+
+def get_bitmask_logit_indices(
+        req_id_to_index: dict[str, int],
+        structured_output_request_ids: dict[str, int],
+        scheduled_spec_decode_tokens: dict[str, list[int]]) -> np.ndarray:
+    """Return the logits row of each row of the grammar bitmask.
+
+    The scheduler compacts the bitmask to the structured output requests,
+    ordered by `structured_output_request_ids` values, with one row per
+    scheduled token (1 + the number of spec tokens). The logits have one row
+    per scheduled token of every request, in batch order.
+    """
+    num_reqs = max(req_id_to_index.values(), default=-1) + 1
+    num_spec_tokens = np.zeros(num_reqs, dtype=np.int64)
+    for req_id, spec_token_ids in scheduled_spec_decode_tokens.items():
+        num_spec_tokens[req_id_to_index[req_id]] = len(spec_token_ids)
+    # First logits row of each request.
+    logit_starts = np.arange(num_reqs) + np.cumsum(
+        num_spec_tokens) - num_spec_tokens
+
+    struct_out_req_ids = sorted(structured_output_request_ids,
+                                key=structured_output_request_ids.__getitem__)
+    batch_indices = np.array(
+        [req_id_to_index[req_id] for req_id in struct_out_req_ids],
+        dtype=np.int64)
+    num_rows = 1 + num_spec_tokens[batch_indices]
+    row_offsets = np.arange(num_rows.sum()) - np.repeat(
+        np.cumsum(num_rows) - num_rows, num_rows)
+    return np.repeat(logit_starts[batch_indices], num_rows) + row_offsets
+
+
+def apply_token_bitmask_inplace(logits: torch.Tensor,
+                                bitmask: torch.Tensor,
+                                indices: Optional[torch.Tensor] = None):
+    """Set the logits of the tokens rejected by the grammar to -inf.
+
+    Args:
+        logits: [num_logits, vocab_size] logits, modified in place.
+        bitmask: [num_rows, ceil(vocab_size / 32)] int32, bit `j % 32` of
+            word `j // 32` tells whether token `j` is allowed. Like XGrammar,
+            the tokens beyond the bitmask are left unchanged.
+        indices: [num_rows] logits row of each bitmask row, all the rows if
+            None.
+    """
+    vocab_size = min(logits.shape[-1], bitmask.shape[-1] * 32)
+    shifts = torch.arange(32, dtype=torch.int32, device=bitmask.device)
+    rejected = ((bitmask.unsqueeze(-1) >> shifts) & 1) == 0
+    rejected = rejected.flatten(1)[:, :vocab_size]
+    if indices is None:
+        logits[:, :vocab_size].masked_fill_(rejected, float("-inf"))
+    else:
+        logits[indices, :vocab_size] = logits[
+            indices, :vocab_size].masked_fill(rejected, float("-inf"))
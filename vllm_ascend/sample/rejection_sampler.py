@@ -100,6 +100,38 @@ class AscendRejectionSampler(RejectionSampler, nn.Module):
         )
         return output_token_ids
 
+    def tree_forward(
+        self,
+        metadata: SpecDecodeMetadata,
+        # [num_nodes + 1, max_width]
+        tree_children: torch.Tensor,
+        tree_depth: int,
+        # [num_tokens + batch_size, vocab_size]
+        logits: torch.Tensor,
+        sampling_metadata: SamplingMetadata,
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """Verify draft token trees instead of chains, see `TokenTree`.
+
+        `logits` are the target logits at the root and at each node of every
+        request, they are updated in place. Returns the output token ids,
+        [batch_size, tree_depth + 1], and the accepted node at each depth,
+        [batch_size, tree_depth], -1 after the last accepted one.
+        """
+        num_sampled_tokens = torch.tensor(metadata.num_draft_tokens,
+                                          device=logits.device) + 1
+        cu_num_sampled_tokens = torch.cumsum(num_sampled_tokens, dim=0)
+        target_probs = compute_probs(logits, cu_num_sampled_tokens,
+                                     sampling_metadata)
+        return tree_rejection_sample(
+            tree_children,
+            tree_depth,
+            metadata.draft_token_ids,
+            metadata.num_draft_tokens,
+            metadata.cu_num_draft_tokens,
+            target_probs,
+            sampling_metadata,
+        )
+
 
 def rejection_sample(
     # [num_tokens]
@@ -378,6 +410,30 @@ def rejection_greedy_sample_pytorch(
         output_token_ids[bonus_rows, bonus_cols] = bonus_token_ids[bonus_rows]
 
 
+def _get_token_positions(
+    cu_num_tokens,  # [batch_size]
+    num_tokens,
+):
+    """Map each flattened token to its request and to its position inside
+    the request, without any host-device synchronization.
+
+    Returns:
+        token_req_ids: [num_tokens] request index of each token.
+        token_positions: [num_tokens] position of each token in its request.
+        num_tokens_per_req: [batch_size] number of tokens of each request.
+    """
+    batch_size = cu_num_tokens.shape[0]
+    device = cu_num_tokens.device
+    cu_num_tokens = cu_num_tokens.to(torch.long)
+    token_ids = torch.arange(num_tokens, device=device)
+    token_req_ids = torch.searchsorted(cu_num_tokens, token_ids, right=True)
+    token_req_ids.clamp_(max=batch_size - 1)
+    start_indices = torch.zeros_like(cu_num_tokens)
+    start_indices[1:] = cu_num_tokens[:-1]
+    token_positions = token_ids - start_indices[token_req_ids]
+    return token_req_ids, token_positions, cu_num_tokens - start_indices
+
+
 def rejection_random_sample_pytorch(
     output_token_ids,  # [batch_size, max_spec_len + 1]
     cu_num_draft_tokens,  # [batch_size]
@@ -393,44 +449,172 @@ def rejection_random_sample_pytorch(
     IS_NGRAM=False,
 ):
     batch_size = output_token_ids.shape[0]
+    num_tokens = draft_token_ids.shape[0]
+    device = output_token_ids.device
+    if num_tokens == 0:
+        return
+    token_req_ids, token_positions, num_draft_tokens = _get_token_positions(
+        cu_num_draft_tokens, num_tokens)
+
+    # A draft token is accepted if target_prob / draft_prob >= uniform_prob.
+    token_ids = torch.arange(num_tokens, device=device)
+    target_prob = target_probs[token_ids, draft_token_ids]
+    if IS_NGRAM:
+        draft_prob = torch.ones_like(target_prob)
+    else:
+        draft_prob = draft_probs[token_ids, draft_token_ids]
+    accepted = (draft_prob > 0) & (target_prob / draft_prob >= uniform_probs)
+
+    # Find the first rejected position of each request, or the number of
+    # draft tokens if all of them are accepted.
+    first_rejected_pos = torch.full((batch_size, max_spec_len + 1),
+                                    max_spec_len,
+                                    dtype=torch.long,
+                                    device=device)
+    first_rejected_pos[token_req_ids, token_positions] = torch.where(
+        accepted, max_spec_len, token_positions)
+    first_rejected_pos = torch.minimum(
+        first_rejected_pos.min(dim=1).values, num_draft_tokens)
+
+    # Accepted draft tokens, then the recovered token at the first rejected
+    # position, or the bonus token if all draft tokens are accepted.
+    candidates = torch.full_like(output_token_ids, PLACEHOLDER_TOKEN_ID)
+    candidates[token_req_ids, token_positions] = torch.where(
+        token_positions < first_rejected_pos[token_req_ids], draft_token_ids,
+        recovered_token_ids).to(candidates.dtype)
+    req_ids = torch.arange(batch_size, device=device)
+    bonus_pos = num_draft_tokens.clamp(min=0)
+    candidates[req_ids, bonus_pos] = torch.where(
+        first_rejected_pos == num_draft_tokens,
+        bonus_token_ids.reshape(-1).to(candidates.dtype),
+        candidates[req_ids, bonus_pos])
+
+    write_mask = torch.arange(max_spec_len + 1, device=device).unsqueeze(
+        0) <= first_rejected_pos.unsqueeze(1)
+    if is_greedy is not None:
+        write_mask &= ~is_greedy.unsqueeze(1)
+    output_token_ids.copy_(
+        torch.where(write_mask, candidates, output_token_ids))
+
+
+def tree_rejection_sample(
+    # [num_nodes + 1, max_width]
+    tree_children: torch.Tensor,
+    tree_depth: int,
+    # [num_tokens]
+    draft_token_ids: torch.Tensor,
+    # [batch_size]
+    num_draft_tokens: list[int],
+    # [batch_size]
+    cu_num_draft_tokens: torch.Tensor,
+    # [num_tokens + batch_size, vocab_size]
+    target_probs: torch.Tensor,
+    sampling_metadata: SamplingMetadata,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Walk down the draft token tree of each request from its root.
+
+    The children of a node are tried in order, each one is a draft token with
+    a draft probability of 1, as for ngram: it is accepted with its target
+    probability, renormalized after the rejection of its previous siblings,
+    or if it is the target argmax for the greedy requests. The walk stops at
+    the first node without accepted children, where the recovered token is
+    sampled from the target probabilities without the rejected children.
+    This recursive rejection keeps the target distribution.
+    """
+    batch_size = len(num_draft_tokens)
+    num_tokens = draft_token_ids.shape[0]
+    max_width = tree_children.shape[1]
+    device = target_probs.device
+    tree_children = tree_children.to(device)
+    num_draft = torch.tensor(num_draft_tokens, device=device)
+    req_ids = torch.arange(batch_size, device=device)
+    # The row of the root of each request in `target_probs`.
+    root_rows = cu_num_draft_tokens.to(torch.long) - num_draft + req_ids
+    draft_starts = cu_num_draft_tokens.to(torch.long) - num_draft
 
-    for req_idx in range(batch_size):
-        if is_greedy[req_idx]:
-            continue
-
-        if req_idx == 0:
-            start_idx = 0
-        else:
-            start_idx = cu_num_draft_tokens[req_idx - 1].item()
-        end_idx = cu_num_draft_tokens[req_idx].item()
-        num_draft_tokens = end_idx - start_idx
-
-        rejected = False
-        for pos in range(num_draft_tokens):
-            if not rejected:
-                draft_token_id = draft_token_ids[start_idx + pos].item()
-
-                if IS_NGRAM:
-                    draft_prob = 1.0
-                else:
-                    draft_prob = draft_probs[start_idx + pos,
-                                             draft_token_id].item()
-
-                target_prob = target_probs[start_idx + pos,
-                                           draft_token_id].item()
-                uniform_prob = uniform_probs[start_idx + pos].item()
-
-                if draft_prob > 0 and target_prob / draft_prob >= uniform_prob:
-                    token_id = draft_token_id
-                else:
-                    rejected = True
-                    token_id = recovered_token_ids[start_idx + pos].item()
+    if sampling_metadata.all_greedy:
+        is_greedy = torch.ones(batch_size, dtype=torch.bool, device=device)
+        uniform_probs = None
+    else:
+        is_greedy = sampling_metadata.temperature == GREEDY_TEMPERATURE
+        # [num_tokens]
+        uniform_probs = generate_uniform_probs(
+            num_tokens,
+            num_draft_tokens,
+            sampling_metadata.generators,
+            device,
+        )
 
-                output_token_ids[req_idx, pos] = token_id
+    def sample(probs, argmax):
+        if uniform_probs is None:
+            return argmax
+        q = torch.empty_like(probs).exponential_()
+        for i, generator in sampling_metadata.generators.items():
+            q[i].exponential_(generator=generator)
+        return torch.where(is_greedy, argmax, torch.argmax(probs / q, dim=-1))
 
-        if not rejected:
-            bonus_token_id = bonus_token_ids[req_idx].item()
-            output_token_ids[req_idx, num_draft_tokens] = bonus_token_id
+    output_token_ids = torch.full((batch_size, tree_depth + 1),
+                                  PLACEHOLDER_TOKEN_ID,
+                                  dtype=torch.int32,
+                                  device=device)
+    accepted_nodes = torch.full((batch_size, tree_depth),
+                                -1,
+                                dtype=torch.long,
+                                device=device)
+    # The current node of each request as node + 1, 0 for the root.
+    current = torch.zeros(batch_size, dtype=torch.long, device=device)
+    active = torch.ones(batch_size, dtype=torch.bool, device=device)
+    # The target probabilities at the current node, without the rejected
+    # children.
+    residual = target_probs[root_rows]
+    argmax = residual.argmax(dim=-1)
+    for depth in range(tree_depth):
+        found = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        next_node = current
+        next_token = argmax
+        for rank in range(max_width):
+            child = tree_children[current, rank]
+            valid = active & ~found & (child > 0) & (child <= num_draft)
+            draft_index = (draft_starts + child - 1).clamp(0, num_tokens - 1)
+            token = draft_token_ids[draft_index].to(torch.long)
+            accept = token == argmax
+            if uniform_probs is not None:
+                prob = residual.gather(1, token.unsqueeze(1)).squeeze(1)
+                prob = prob / residual.sum(dim=-1)
+                random_accept = (prob > 0) & (prob
+                                              >= uniform_probs[draft_index])
+                accept = torch.where(is_greedy, accept, random_accept)
+                # Remove the rejected token from the residual distribution.
+                rejected = valid & ~accept
+                residual.scatter_(
+                    1, token.unsqueeze(1),
+                    torch.where(rejected.unsqueeze(1), 0,
+                                residual.gather(1, token.unsqueeze(1))))
+            accept &= valid
+            next_node = torch.where(accept, child, next_node)
+            next_token = torch.where(accept, token, next_token)
+            found |= accept
+
+        # The requests without accepted children end with a recovered token.
+        stop = active & ~found
+        recovered = sample(residual, argmax)
+        output_token_ids[:, depth] = torch.where(
+            found, next_token,
+            torch.where(stop, recovered,
+                        output_token_ids[:, depth])).to(torch.int32)
+        accepted_nodes[:, depth] = torch.where(found, next_node - 1, -1)
+        active &= found
+        current = next_node
+        residual = torch.where(found.unsqueeze(1),
+                               target_probs[root_rows + current], residual)
+        argmax = torch.where(found, residual.argmax(dim=-1), argmax)
+
+    # The requests that accepted a whole path end with a bonus token sampled
+    # at its leaf.
+    bonus = sample(residual, argmax)
+    output_token_ids[:, tree_depth] = torch.where(
+        active, bonus, output_token_ids[:, tree_depth]).to(torch.int32)
+    return output_token_ids, accepted_nodes
 
 
 def expand_pytorch(
@@ -441,21 +625,13 @@ def expand_pytorch(
     replace_to,
     MAX_NUM_TOKENS,
 ):
-    batch_size = len(input_ptr)
-
-    for req_idx in range(batch_size):
-        start_idx = 0 if req_idx == 0 else cu_num_tokens_ptr[req_idx - 1]
-        end_idx = cu_num_tokens_ptr[req_idx]
-        num_tokens = end_idx - start_idx
-
-        src_val = input_ptr[req_idx]
-        src_val = replace_to if src_val == replace_from else src_val
-
-        offset = torch.arange(MAX_NUM_TOKENS, device=num_tokens.device)
-        mask = offset < num_tokens
-
-        output_slice = start_idx + offset[mask]
-        output_ptr[output_slice] = src_val
+    num_tokens = output_ptr.shape[0]
+    if num_tokens == 0:
+        return
+    token_req_ids, _, _ = _get_token_positions(cu_num_tokens_ptr, num_tokens)
+    src_val = torch.where(input_ptr == replace_from,
+                          torch.full_like(input_ptr, replace_to), input_ptr)
+    output_ptr.copy_(src_val[token_req_ids])
 
 
 def sample_recovered_tokens_pytorch(
@@ -468,37 +644,23 @@ def sample_recovered_tokens_pytorch(
     vocab_size,
     IS_NGRAM=False,
 ):
-    batch_size = len(cu_num_draft_tokens)
-
-    for req_idx in range(batch_size):
-        start_idx = 0 if req_idx == 0 else cu_num_draft_tokens[req_idx - 1]
-        end_idx = cu_num_draft_tokens[req_idx]
-        num_draft_tokens = end_idx - start_idx
-
-        for pos in range(num_draft_tokens):
-            token_idx = start_idx + pos
-
-            if IS_NGRAM:
-                draft_token_id = draft_token_ids[token_idx]
-                orig_prob = target_probs[token_idx, draft_token_id].item()
-                target_probs[token_idx, draft_token_id] = 0
-                prob = target_probs[token_idx].clone()
-            else:
-                draft_p = draft_probs[token_idx].clone()
-                target_p = target_probs[token_idx].clone()
-                prob = torch.maximum(target_p - draft_p,
-                                     torch.tensor(0.0, device=target_p.device))
-
-            q_values = torch.full((vocab_size, ),
-                                  float('-inf'),
-                                  device=q.device)
-            q_values[:vocab_size] = q[req_idx, :vocab_size]
-
-            recovered_id = torch.argmax(prob / q_values).item()
-            output_token_ids[token_idx] = recovered_id
-
-            if IS_NGRAM:
-                target_probs[token_idx, draft_token_id] = orig_prob
+    num_tokens = draft_token_ids.shape[0]
+    if num_tokens == 0:
+        return
+    token_req_ids, _, _ = _get_token_positions(cu_num_draft_tokens,
+                                               num_tokens)
+
+    if IS_NGRAM:
+        # The draft token is excluded from the target distribution, it is
+        # done out of place so that `target_probs` is left untouched.
+        prob = target_probs.scatter(1, draft_token_ids.unsqueeze(1).long(),
+                                    0)
+    else:
+        prob = torch.clamp_min(target_probs - draft_probs, 0)
+
+    recovered_ids = torch.argmax(prob / q[token_req_ids, :vocab_size],
+                                 dim=-1)
+    output_token_ids.copy_(recovered_ids)
 
 
 rs.expand_batch_to_tokens = expand_batch_to_tokens
@@ -0,0 +1,139 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Per-request speculation length, see the `adaptive_spec_len` option.
+#
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from vllm.logger import logger
+
+# Weight of the previous steps in the acceptance statistics of a request.
+_DECAY = 0.9
+# Number of verification steps between two logs of the statistics.
+_LOG_INTERVAL = 500
+
+
+@dataclass
+class _Acceptance:
+    # Decayed numbers of accepted draft tokens and of rejections.
+    num_accepted: float
+    num_rejected: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """The acceptance rate of a draft token, which follows the accepted
+        ones, as a geometric model of the accepted lengths."""
+        return self.num_accepted / (self.num_accepted + self.num_rejected)
+
+
+class SpecLengthController:
+    """Choose the number of draft tokens of each request from its recent
+    acceptance rate.
+
+    With an acceptance rate `a`, the k-th draft token is accepted with a
+    probability `a ** k`, its expected gain. A request drafts the tokens whose
+    gain is at least `min_gain`, at least one so that its rate keeps being
+    measured. Without `adaptive`, the requests draft `max_len` tokens.
+
+    A batch of `disable_batch_size` requests or more is compute-bound: it
+    gains more from the target forward of fewer tokens than from
+    speculation, which is turned off.
+    """
+
+    def __init__(self,
+                 max_len: int,
+                 min_gain: float,
+                 disable_batch_size: Optional[int] = None,
+                 adaptive: bool = True):
+        self.max_len = max_len
+        self.min_gain = min_gain
+        self.adaptive = adaptive
+        self.disable_batch_size = disable_batch_size
+        self._acceptance: dict[str, _Acceptance] = {}
+        # Statistics for the tuning of the options.
+        self.num_steps = 0
+        self.num_disabled_steps = 0
+        self.num_draft_tokens = 0
+        self.num_accepted_tokens = 0
+        self.num_proposed_tokens = 0
+        self.num_proposals = 0
+
+    def observe(self, req_id: str, num_draft_tokens: int,
+                num_accepted_tokens: int) -> None:
+        """Record the verification of the draft tokens of a request."""
+        if num_draft_tokens == 0:
+            return
+        # New requests start with the full length.
+        acceptance = self._acceptance.setdefault(req_id,
+                                                 _Acceptance(self.max_len))
+        acceptance.num_accepted = (_DECAY * acceptance.num_accepted +
+                                   num_accepted_tokens)
+        acceptance.num_rejected = (
+            _DECAY * acceptance.num_rejected +
+            (num_accepted_tokens < num_draft_tokens))
+        self.num_draft_tokens += num_draft_tokens
+        self.num_accepted_tokens += num_accepted_tokens
+
+    def enabled(self, num_reqs: int) -> bool:
+        """Whether a batch of `num_reqs` requests speculates."""
+        self.num_steps += 1
+        if self.num_steps % _LOG_INTERVAL == 0:
+            self.log_stats()
+        if (self.disable_batch_size is not None
+                and num_reqs >= self.disable_batch_size):
+            self.num_disabled_steps += 1
+            return False
+        return True
+
+    def draft_len(self, req_id: str) -> int:
+        acceptance = self._acceptance.get(req_id)
+        if acceptance is None or not self.adaptive:
+            num_tokens = self.max_len
+        else:
+            rate = acceptance.rate
+            if rate >= 1.0:
+                num_tokens = self.max_len
+            elif rate <= 0.0:
+                num_tokens = 1
+            else:
+                num_tokens = int(math.log(self.min_gain) / math.log(rate))
+                num_tokens = min(max(num_tokens, 1), self.max_len)
+        self.num_proposed_tokens += num_tokens
+        self.num_proposals += 1
+        return num_tokens
+
+    def remove(self, req_id: str) -> None:
+        self._acceptance.pop(req_id, None)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "acceptance_rate":
+            self.num_accepted_tokens / max(self.num_draft_tokens, 1),
+            "mean_draft_len":
+            self.num_proposed_tokens / max(self.num_proposals, 1),
+            "disabled_step_ratio":
+            self.num_disabled_steps / max(self.num_steps, 1),
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logger.info(
+            "Adaptive speculation: acceptance rate %.3f, mean draft length "
+            "%.2f, speculation disabled in %.1f%% of the steps",
+            stats["acceptance_rate"], stats["mean_draft_len"],
+            100 * stats["disabled_step_ratio"])
@@ -22,6 +22,7 @@ from vllm_ascend.attention.attention_mask import AttentionMaskBuilder
 from vllm_ascend.attention.attention_v1 import AscendAttentionState
 from vllm_ascend.attention.utils import AscendCommonAttentionMetadata
 from vllm_ascend.spec_decode.interface import Proposer, SpecDcodeType
+from vllm_ascend.spec_decode.token_tree import tree_token_indices
 
 PADDING_SLOT_ID = -1
 
@@ -74,7 +75,8 @@ class EagleProposer(Proposer):
         attn_mask_len = min(self.vllm_config.model_config.max_model_len,
                             int(os.getenv("PAGED_ATTENTION_MASK_LEN", 10000)))
         self.attn_mask_builder = AttentionMaskBuilder(
-            attn_mask_len, self.vllm_config.model_config.dtype)
+            attn_mask_len, self.vllm_config.model_config.dtype,
+            self.vllm_config.model_config.max_model_len)
 
     def load_model(self, model: nn.Module) -> None:
         target_attn_layer_names = set(
@@ -171,6 +173,30 @@ class EagleProposer(Proposer):
                 target_hidden_states = hidden_states[:num_scheduled_tokens]
             target_slot_mapping = eagle_attn_metadata.slot_mapping
             cu_num_tokens = eagle_attn_metadata.query_start_loc
+        elif self.runner.token_tree is not None:
+            # The roots and the accepted path of each token tree, whose KV
+            # was moved next to the roots. The positions of the tree nodes
+            # are their positions in the sequence, which are the KV cache
+            # positions of the accepted tokens once compacted.
+            token_indices, compact_indices, cu_num_tokens = tree_token_indices(
+                self.runner.query_start_loc_np[1:len(valid_sampled_token_ids)
+                                               + 1],
+                np.array(spec_decode_metadata.num_draft_tokens),
+                self.runner.tree_accepted_nodes)
+            token_indices = torch.from_numpy(token_indices).to(self.device)
+            compact_indices = torch.from_numpy(compact_indices).to(
+                self.device)
+            cu_num_tokens = torch.from_numpy(cu_num_tokens).to(
+                self.device, torch.int32)
+            target_token_ids = self.runner.input_ids[token_indices]
+            target_positions = positions[token_indices]
+            if self.name == SpecDcodeType.EAGLE3:
+                target_hidden_states = torch.cat(
+                    [h[token_indices] for h in aux_hidden_states], dim=-1)
+            else:
+                target_hidden_states = hidden_states[token_indices]
+            target_slot_mapping = eagle_attn_metadata.slot_mapping[
+                compact_indices]
         else:
             num_draft_tokens = spec_decode_metadata.num_draft_tokens
             num_rejected_tokens = [
@@ -253,9 +279,9 @@ class EagleProposer(Proposer):
         # E.g., [0, 1, 0, 1, 2, 3, 4, 0, 1, 2]
         # -> [0, 1, M, M + 1, M + 2, M + 3, M + 4, 2 * M, 2 * M + 1, 2 * M + 2]
         # where M is the max_model_len.
-        token_indices = (
-            positions_np +
-            req_indices * self.runner.input_batch.token_ids_cpu.shape[1])
+        token_indices = (positions_np +
+                         self.runner.input_batch.token_rows[req_indices] *
+                         self.runner.input_batch.token_ids_cpu.shape[1])
 
         # NOTE(woosuk): We use torch.index_select instead of np.take here
         # because torch.index_select is much faster than np.take for large
@@ -419,6 +445,16 @@ class EagleProposer(Proposer):
         query_lens = cu_num_tokens[1:] - cu_num_tokens[:-1]
         max_query_len = query_lens.max().item()
 
+        attn_mask = self.runner.attn_mask
+        if self.runner.token_tree is not None:
+            # The accepted tokens of the token trees form chains, the mask of
+            # the target forward does not apply.
+            attn_mask = self.attn_mask_builder.get_splitfuse_attn_mask(
+                self.runner.seq_lens_cpu[:batch_size], target_positions,
+                self.vllm_config.model_config.dtype, self.device)
+        # The draft tokens of each depth of the token tree.
+        tree_level_token_ids: list[torch.Tensor] = []
+
         common_attn_metadata = AscendCommonAttentionMetadata(
             query_start_loc=self.runner.query_start_loc[:batch_size + 1],
             query_start_loc_cpu=self.runner.query_start_loc_cpu[:batch_size +
@@ -432,7 +468,7 @@ class EagleProposer(Proposer):
             get_device_tensor(),
             slot_mapping_cpu=target_slot_mapping,
             positions=target_positions,
-            attn_mask=self.runner.attn_mask,
+            attn_mask=attn_mask,
             spec_attn_mask=self.runner.spec_attn_mask,
             attn_state=self.runner.attn_state,
             decode_token_per_req=self.runner.decode_token_per_req,
@@ -459,10 +495,13 @@ class EagleProposer(Proposer):
             )
         sample_hidden_states = last_hidden_states[last_token_indices]
         logits = self.model.compute_logits(sample_hidden_states, None)
-        draft_token_ids = logits.argmax(dim=-1)
+        draft_token_ids = self._sample_draft_token_ids(logits,
+                                                       tree_level_token_ids)
 
         # Early exit if there is only one draft token to be generated.
         if self.vllm_config.speculative_config.num_speculative_tokens == 1:
+            if tree_level_token_ids:
+                return tree_level_token_ids[0]
             # [batch_size, 1]
             return draft_token_ids.view(-1, 1)
 
@@ -562,14 +601,32 @@ class EagleProposer(Proposer):
             logits = self.model.compute_logits(last_hidden_states[:batch_size],
                                                None)
 
-            # TODO(wenlong): get more than one token for tree attention
-            draft_token_ids = logits.argmax(dim=-1)
+            draft_token_ids = self._sample_draft_token_ids(
+                logits, tree_level_token_ids)
             draft_token_ids_tensor[now_speculative + 1] = draft_token_ids.cpu()
 
+        if tree_level_token_ids:
+            # [batch_size, num_nodes]
+            return torch.cat(tree_level_token_ids, dim=1)
         # [batch_size, num_speculative_tokens]
         draft_token_ids = draft_token_ids_tensor.swapaxes(0, 1)
         return draft_token_ids
 
+    def _sample_draft_token_ids(
+            self, logits: torch.Tensor,
+            tree_level_token_ids: list[torch.Tensor]) -> torch.Tensor:
+        """The top-1 draft tokens, which the next draft step follows. With a
+        token tree, the top-k ones of this depth are appended to
+        `tree_level_token_ids`."""
+        token_tree = self.runner.token_tree
+        if token_tree is None:
+            return logits.argmax(dim=-1)
+        depth = len(tree_level_token_ids)
+        top_token_ids = logits.topk(token_tree.branching[depth],
+                                    dim=-1).indices
+        tree_level_token_ids.append(top_token_ids)
+        return top_token_ids[:, 0]
+
     def _prepare_inputs(
         self,
         # [batch_size + 1]
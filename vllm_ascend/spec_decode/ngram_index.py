@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Incremental n-gram index of the token history of a request, see
+# `NgramProposer.generate_token_ids`.
+#
+from typing import Optional
+
+import numpy as np
+
+_HASH_BASE = 1000003
+_HASH_MASK = (1 << 64) - 1
+
+# Returned by `NgramIndex.find` when the n-gram hash of the suffix collides.
+HASH_COLLISION = -1
+
+
+def hash_ngrams(tokens: np.ndarray, n: int) -> np.ndarray:
+    """64-bit polynomial hashes of all the n-grams of `tokens`."""
+    num_ngrams = len(tokens) - n + 1
+    values = tokens.astype(np.uint64)
+    hashes = np.zeros(num_ngrams, dtype=np.uint64)
+    for j in range(n):
+        # Wraps around modulo 2**64.
+        hashes = hashes * np.uint64(_HASH_BASE) + values[j:j + num_ngrams]
+    return hashes
+
+
+def _hash_ngram(tokens: list[int]) -> int:
+    """`hash_ngrams` of a single n-gram, cheaper in python for small n."""
+    h = 0
+    for token in tokens:
+        h = (h * _HASH_BASE + token) & _HASH_MASK
+    return h
+
+
+class NgramIndex:
+    """Earliest start position of each n-gram of a token history, for n in
+    [min_n, max_n], updated with the new tokens only.
+
+    Only the n-grams followed by at least one token are indexed since the
+    proposal is made of the tokens following the match. `find` gives the
+    same match as vLLM's `NgramProposer.propose`: the longest n-gram suffix
+    of the history that occurs earlier, at its earliest occurrence.
+    """
+
+    def __init__(self, min_n: int, max_n: int):
+        self.min_n = min_n
+        self.max_n = max_n
+        self.reset()
+
+    def reset(self) -> None:
+        # Number of tokens of the history indexed.
+        self.num_tokens = 0
+        # Per n, hash of the n-gram -> earliest start position.
+        self.positions: list[dict[int, int]] = [
+            {} for _ in range(self.max_n - self.min_n + 1)
+        ]
+
+    def update(self, tokens: np.ndarray, num_tokens: int) -> None:
+        """Index the n-grams of `tokens[:num_tokens]` that are not indexed
+        yet. The history only grows, `tokens[:self.num_tokens]` is the one
+        indexed before."""
+        if num_tokens < self.num_tokens:
+            self.reset()
+        for n, positions in zip(range(self.min_n, self.max_n + 1),
+                                self.positions):
+            # The n-grams ending at self.num_tokens - 1 and later now have a
+            # following token, up to the one ending at num_tokens - 2.
+            first_start = max(self.num_tokens - n, 0)
+            last_start = num_tokens - 1 - n
+            if last_start < first_start:
+                continue
+            hashes = hash_ngrams(tokens[first_start:last_start + n], n)
+            unique_hashes, first_indices = np.unique(hashes,
+                                                     return_index=True)
+            starts = (first_indices + first_start).tolist()
+            if not positions:
+                positions.update(zip(unique_hashes.tolist(), starts))
+            else:
+                # Keep the earlier occurrences.
+                for h, start in zip(unique_hashes.tolist(), starts):
+                    positions.setdefault(h, start)
+        self.num_tokens = num_tokens
+
+    def find(self, tokens: np.ndarray, num_tokens: int) -> Optional[int]:
+        """Index `tokens[:num_tokens]` and return the position following the
+        earliest occurrence of its longest matching n-gram suffix, None if
+        there is no match or `HASH_COLLISION`."""
+        self.update(tokens, num_tokens)
+        for n in range(min(self.max_n, num_tokens - 1), self.min_n - 1, -1):
+            suffix = tokens[num_tokens - n:num_tokens]
+            start = self.positions[n - self.min_n].get(
+                _hash_ngram(suffix.tolist()))
+            if start is None:
+                continue
+            if not np.array_equal(tokens[start:start + n], suffix):
+                return HASH_COLLISION
+            return start + n
+        return None
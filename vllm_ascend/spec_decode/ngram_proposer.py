@@ -1,8 +1,12 @@
+from typing import Optional
+
+import numpy as np
 import torch
 from vllm.v1.spec_decode.ngram_proposer import \
     NgramProposer as VllmNgramProposer
 
 from vllm_ascend.spec_decode.interface import Proposer, SpecDcodeType
+from vllm_ascend.spec_decode.ngram_index import HASH_COLLISION, NgramIndex
 
 
 class NgramProposer(VllmNgramProposer, Proposer):
@@ -12,6 +16,8 @@ class NgramProposer(VllmNgramProposer, Proposer):
         self.name = SpecDcodeType.NGRAM
         self.device = device
         self.runner = runner
+        # Incremental n-gram index of the token history of each request.
+        self.ngram_indexes: dict[str, NgramIndex] = {}
 
     def load_model(self, *args, **kwargs):
         # No model to load.
@@ -36,7 +42,7 @@ class NgramProposer(VllmNgramProposer, Proposer):
                            hidden_states=None,
                            attn_metadata=None,
                            aux_hidden_states=None) -> list[list[int]]:
-        # TODO(woosuk): Optimize.
+        self._free_ngram_indexes(scheduler_output)
         draft_token_ids: list[list[int]] = []
         for i, sampled_ids in enumerate(valid_sampled_token_ids):
             num_sampled_ids = len(sampled_ids)
@@ -54,12 +60,42 @@ class NgramProposer(VllmNgramProposer, Proposer):
             # Add sampled_token_ids to token_ids_cpu.
             start_idx = self.runner.input_batch.num_tokens_no_spec[i]
             end_idx = start_idx + num_sampled_ids
-            self.runner.input_batch.token_ids_cpu[
-                i, start_idx:end_idx] = sampled_ids
-            drafter_output = self.propose(
-                self.runner.input_batch.token_ids_cpu[i, :end_idx])
+            token_ids = self.runner.input_batch.token_ids_row(i)
+            token_ids[start_idx:end_idx] = sampled_ids
+            drafter_output = self._propose_with_index(req_id, token_ids,
+                                                      end_idx)
             if drafter_output is None or len(drafter_output) == 0:
                 draft_token_ids.append([])
             else:
                 draft_token_ids.append(drafter_output.tolist())
         return draft_token_ids
+
+    def _propose_with_index(self, req_id: str, token_ids: np.ndarray,
+                            num_tokens: int) -> Optional[np.ndarray]:
+        """`propose` on `token_ids[:num_tokens]` looking up the n-gram index
+        of the request instead of scanning its whole history."""
+        if num_tokens < self.min_n:
+            return None
+        k = min(self.k, self.max_model_len - num_tokens)
+        if k <= 0:
+            return None
+        index = self.ngram_indexes.get(req_id)
+        if index is None:
+            index = self.ngram_indexes[req_id] = NgramIndex(
+                self.min_n, self.max_n)
+        begin = index.find(token_ids, num_tokens)
+        if begin is None:
+            return None
+        if begin == HASH_COLLISION:
+            return self.propose(token_ids[:num_tokens])
+        return token_ids[begin:min(begin + k, num_tokens)]
+
+    def _free_ngram_indexes(self, scheduler_output) -> None:
+        if scheduler_output is not None:
+            for req_id in scheduler_output.finished_req_ids:
+                self.ngram_indexes.pop(req_id, None)
+        # The requests that finished in the steps without drafting. The
+        # preempted requests keep their cached state and their index.
+        if len(self.ngram_indexes) > len(self.runner.requests):
+            for req_id in self.ngram_indexes.keys() - self.runner.requests:
+                del self.ngram_indexes[req_id]
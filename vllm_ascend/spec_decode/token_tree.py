@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Static token tree of the draft tokens, see the `spec_token_tree` option.
+#
+# The draft tokens of a request are the nodes of the tree in depth-major
+# order, following the root, i.e. the last sampled token. They are stored in
+# the KV cache in this order and verified in one target forward with a mask
+# where each node only attends to its ancestors. After the verification, the
+# KV of the accepted path is moved next to the root.
+#
+import numpy as np
+
+
+class TokenTree:
+    """The top-k draft tokens of each depth, all children of the top-1
+    draft token of the previous depth.
+
+    E.g. the branching [3, 2] has the nodes 0, 1, 2 at depth 1, children of
+    the root, and the nodes 3, 4 at depth 2, children of the node 0.
+    """
+
+    def __init__(self, branching: list[int]):
+        if not branching or any(
+                not isinstance(k, int) or k < 1 for k in branching):
+            raise ValueError("The branching of the token tree must be a "
+                             f"non-empty list of positive ints: {branching}")
+        self.branching = list(branching)
+        self.depth = len(branching)
+        self.num_nodes = sum(branching)
+        self.max_width = max(branching)
+        # The first node of each depth, and the number of nodes.
+        self.level_starts = np.cumsum([0] + self.branching)
+        # Depth of each node, from 1.
+        self.depths = np.repeat(np.arange(1, self.depth + 1), self.branching)
+        # Parent of each node, -1 for the root.
+        self.parents = np.concatenate(
+            [[-1] * branching[0]] +
+            [[self.level_starts[d - 1]] * k
+             for d, k in enumerate(branching[1:], start=1)]).astype(np.int64)
+        # ancestor_mask[i, j] is True if the node j is the node i or one of
+        # its ancestors.
+        self.ancestor_mask = np.eye(self.num_nodes, dtype=bool)
+        for node in range(self.num_nodes):
+            parent = self.parents[node]
+            if parent >= 0:
+                self.ancestor_mask[node] |= self.ancestor_mask[parent]
+        # children[i + 1] are the children of the node i and children[0] the
+        # ones of the root, as node + 1, padded with 0.
+        self.children = np.zeros((self.num_nodes + 1, self.max_width),
+                                 dtype=np.int64)
+        for node in range(self.num_nodes):
+            siblings = self.children[self.parents[node] + 1]
+            siblings[np.argmax(siblings == 0)] = node + 1
+
+    def kv_position_offsets(self) -> np.ndarray:
+        """The position in the KV cache of each node minus its position in
+        the sequence, before the compaction."""
+        return np.arange(1, self.num_nodes + 1) - self.depths
+
+
+def tree_token_indices(
+    cu_num_tokens: np.ndarray,
+    num_draft_tokens: np.ndarray,
+    accepted_nodes: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Select the accepted tokens of a verified batch of token trees.
+
+    Args:
+        cu_num_tokens: [batch_size] cumulative number of scheduled tokens.
+        num_draft_tokens: [batch_size] number of draft tokens, i.e. nodes.
+        accepted_nodes: [batch_size, depth] accepted node at each depth, -1
+            after the last accepted one.
+    Returns:
+        token_indices: the scheduled tokens up to the roots followed by the
+            accepted nodes of each request.
+        compact_indices: the scheduled tokens that hold the accepted tokens
+            once compacted, i.e. the ones following the roots.
+        cu_num_accepted: [batch_size + 1] cumulative number of selected
+            tokens, from 0.
+    """
+    depth = accepted_nodes.shape[1]
+    num_accepted = (accepted_nodes >= 0).sum(axis=1)
+    roots = cu_num_tokens - num_draft_tokens - 1
+    starts = np.concatenate([[0], cu_num_tokens[:-1]])
+    num_selected = roots - starts + 1 + num_accepted
+    cu_num_accepted = np.concatenate([[0], np.cumsum(num_selected)])
+    # The selected tokens relative to the start of their request.
+    req_indices = np.repeat(np.arange(len(num_selected)), num_selected)
+    offsets = np.arange(cu_num_accepted[-1]) - cu_num_accepted[req_indices]
+    compact_indices = starts[req_indices] + offsets
+    # The accepted tokens after the roots are read from their nodes.
+    num_prefix = (roots - starts + 1)[req_indices]
+    path_depths = offsets - num_prefix
+    is_path = path_depths >= 0
+    path_nodes = accepted_nodes[req_indices[is_path],
+                                np.minimum(path_depths[is_path], depth - 1)]
+    token_indices = compact_indices.copy()
+    token_indices[is_path] = roots[req_indices[is_path]] + 1 + path_nodes
+    return token_indices, compact_indices, cu_num_accepted
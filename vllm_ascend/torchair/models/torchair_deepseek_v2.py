@@ -70,6 +70,8 @@ from vllm.model_executor.models.utils import (
 from vllm.sequence import IntermediateTensors
 
 from vllm_ascend.ascend_config import get_ascend_config
+from vllm_ascend.attention.attention_v1 import (
+    maybe_save_kv_layer_to_connector, wait_for_kv_layer_from_connector)
 from vllm_ascend.quantization.quant_config import AscendLinearMethod
 from vllm_ascend.torchair.ops.torchair_fused_moe import TorchairAscendFusedMoE
 from vllm_ascend.torchair.quantization.torchair_w8a8_dynamic import \
@@ -611,11 +613,18 @@ class TorchairDeepseekV2MLAAttention(DeepseekV2MLAAttention):
                                  dtype=hidden_states_or_q_c.dtype,
                                  device=hidden_states_or_q_c.device)
             forward_kwargs['output'] = output
+            # Only the eager prefill pass talks to the kv connector, the
+            # compiled decode graphs must not capture these host-side hooks.
+            if forward_context.with_prefill:
+                wait_for_kv_layer_from_connector(self.mla_attn.layer_name)
             output = self.mla_attn.impl.forward(self.mla_attn,
                                                 hidden_states_or_q_c,
                                                 hidden_states, None, kv_cache,
                                                 attn_metadata,
                                                 **forward_kwargs)
+            if forward_context.with_prefill:
+                maybe_save_kv_layer_to_connector(self.mla_attn.layer_name,
+                                                 kv_cache)
             output = output.view(-1, output_shape[-1])
             return output
         else:
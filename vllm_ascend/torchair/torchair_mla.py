@@ -162,6 +162,7 @@ class AscendMLATorchairMetadata:
             ms_split_config=ms_split_config,
             attn_metadata=self,
             _metadata_cls=AscendMLATorchairMetadata,
+            _chunked_context_cls=AscendMLATorchairPrefillMetadata.TorchairChunkedContextMetadata,
         )
 
 
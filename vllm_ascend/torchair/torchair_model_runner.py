@@ -74,7 +74,11 @@ class NPUTorchairModelRunner(NPUModelRunner):
         torchair_quant_method_register()
 
     def _sync_metadata_across_dp(
-            self, num_tokens: int, with_prefill: bool, enable_dbo: bool
+        self,
+        num_tokens: int,
+        with_prefill: bool,
+        enable_dbo: bool,
+        dp_metadata_work: Optional[dist.Work] = None
     ) -> tuple[int, Optional[torch.Tensor], bool, bool]:
         """Override from NPUModelRunner to pad num_tokens"""
         if self.dp_size == 1:
@@ -83,29 +87,24 @@ class NPUTorchairModelRunner(NPUModelRunner):
                     num_tokens)
                 return maybe_padded_num_tokens, None, with_prefill, enable_dbo
             return num_tokens, None, with_prefill, enable_dbo
-
-        num_tokens_across_dp = torch.zeros(self.dp_size + 2,
-                                           dtype=torch.int32,
-                                           device="npu")
-        num_tokens_across_dp[self.dp_rank] = num_tokens
-        num_tokens_across_dp[-2] = int(with_prefill)
-        num_tokens_across_dp[-1] = int(not enable_dbo)
-        dist.all_reduce(num_tokens_across_dp,
-                        group=get_dp_group().device_group)
-        with_prefill = bool(num_tokens_across_dp[-2])
-        enable_dbo = not bool(num_tokens_across_dp[-1])
-        num_tokens_across_dp = num_tokens_across_dp[:-2]
+        if dp_metadata_work is None:
+            dp_metadata_work = self._start_dp_metadata_exchange(
+                num_tokens, with_prefill, enable_dbo)
+        assert dp_metadata_work is not None
+        num_tokens_across_dp, with_prefill, enable_dbo = \
+            self._wait_dp_metadata_exchange(dp_metadata_work)
 
         if not with_prefill:
-            max_num_token = num_tokens_across_dp.max().item()
+            max_num_token = int(num_tokens_across_dp.max())
             maybe_padded_num_tokens = self.select_torchair_padded_batch_size(
                 max_num_token)
             num_tokens_across_dp = torch.full((self.dp_size, ),
                                               maybe_padded_num_tokens,
-                                              dtype=torch.int32,
-                                              device="npu")
+                                              dtype=torch.int32)
         else:
             maybe_padded_num_tokens = num_tokens
+            # A view of the exchange buffer, which the next step overwrites.
+            num_tokens_across_dp = num_tokens_across_dp.clone()
 
         return maybe_padded_num_tokens, num_tokens_across_dp, with_prefill, enable_dbo
 
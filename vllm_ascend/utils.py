@@ -24,7 +24,7 @@ import os
 from contextlib import contextmanager
 from enum import Enum
 from threading import Lock
-from typing import TYPE_CHECKING, List, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import torch
 import torch_npu  # noqa: F401  # noqa: F401
@@ -34,6 +34,8 @@ from vllm.logger import logger
 
 import vllm_ascend.envs as envs_ascend
 from vllm_ascend.ascend_config import get_ascend_config
+from vllm_ascend.compilation.capture_plan import (load_capture_plan,
+                                                  plan_capture_sizes)
 
 if TYPE_CHECKING:
     from vllm.config import VllmConfig
@@ -290,8 +292,14 @@ def get_max_hidden_layers(hf_config) -> int:
     return max(layer_counts)
 
 
-def update_aclgraph_sizes(vllm_config: VllmConfig) -> None:
-    """Update ACL graph capture sizes based on hardware limitations"""
+def update_aclgraph_sizes(vllm_config: VllmConfig,
+                          capture_plan_path: Optional[str] = None) -> None:
+    """Update ACL graph capture sizes based on hardware limitations
+
+    If the capture plan at `capture_plan_path` has the histogram of the
+    number of tokens of previous runs, the sizes minimizing its padding are
+    captured instead of a uniform sample of the original sizes.
+    """
     # Store original configuration and temporarily clear it
     compilation_config = vllm_config.compilation_config
     original_sizes, compilation_config.cudagraph_capture_sizes = \
@@ -356,8 +364,18 @@ def update_aclgraph_sizes(vllm_config: VllmConfig) -> None:
             "increase the number of supported shapes, set HCCL_OP_EXPANSION_MODE=AIV."
         )
 
+    histogram = load_capture_plan(
+        capture_plan_path) if capture_plan_path else {}
+    if histogram:
+        planned_sizes = plan_capture_sizes(
+            histogram, original_sizes,
+            min(max_num_batch_sizes, len(original_sizes)))
+        compilation_config.init_with_cudagraph_sizes(planned_sizes)
+        logger.info(
+            "Planned %d ACL graph batch sizes from the capture plan %s: %s",
+            len(planned_sizes), capture_plan_path, planned_sizes)
     # If original sizes exceed maximum, sample a representative subset
-    if max_num_batch_sizes < len(original_sizes):
+    elif max_num_batch_sizes < len(original_sizes):
         # Sample uniformly from original sizes
         step = (len(original_sizes) - 1) / (max_num_batch_sizes - 1)
         indices = [round(i * step) for i in range(max_num_batch_sizes)]
@@ -42,7 +42,7 @@ from vllm.distributed.kv_transfer import (get_kv_transfer_group,
                                           has_kv_transfer_group)
 from vllm.distributed.kv_transfer.kv_connector.v1 import KVConnectorBase_V1
 from vllm.distributed.parallel_state import (get_dp_group, get_pp_group,
-                                             get_tp_group,
+                                             get_tp_group, get_world_group,
                                              is_global_first_rank)
 from vllm.forward_context import BatchDescriptor, get_forward_context
 from vllm.logger import logger
@@ -58,8 +58,8 @@ from vllm.pooling_params import PoolingParams
 from vllm.sampling_params import SamplingType
 from vllm.sequence import IntermediateTensors, PoolerOutput
 from vllm.tasks import GenerationTask, PoolingTask, SupportedTask
-from vllm.utils import (STR_DTYPE_TO_TORCH_DTYPE, DeviceMemoryProfiler,
-                        LazyLoader, cdiv, is_pin_memory_available)
+from vllm.utils import (STR_DTYPE_TO_TORCH_DTYPE, DeviceMemoryProfiler, cdiv,
+                        is_pin_memory_available)
 from vllm.v1.cudagraph_dispatcher import CudagraphDispatcher
 from vllm.v1.kv_cache_interface import (FullAttentionSpec, KVCacheConfig,
                                         KVCacheSpec)
@@ -83,27 +83,38 @@ from vllm_ascend.attention.attention_v1 import (AscendAttentionState,
 from vllm_ascend.attention.mla_v1 import AscendMLAMetadata
 from vllm_ascend.attention.utils import AscendCommonAttentionMetadata
 from vllm_ascend.compilation.acl_graph import ACLGraphWrapper
+from vllm_ascend.compilation.capture_plan import CapturePlanRecorder
+from vllm_ascend.core.schedule_output import AscendSchedulerOutput
+from vllm_ascend.eplb.eplb_updator import EplbUpdator
+from vllm_ascend.lora.adapter_cache import LoRAAdapterPrefetcher
 from vllm_ascend.multistream.ms_split import compute_split_seq_index
+from vllm_ascend.ops.moe.comm_calibration import (MoECommCrossoverTable,
+                                                  build_crossover_table,
+                                                  load_moe_comm_table,
+                                                  measure_moe_comm_methods,
+                                                  save_moe_comm_table)
 from vllm_ascend.platform import NPUPlatform
+from vllm_ascend.sample.grammar_bitmask import (apply_token_bitmask_inplace,
+                                                get_bitmask_logit_indices)
 from vllm_ascend.sample.logits_processor import build_logitsprocs
-from vllm_ascend.sample.rejection_sampler import AscendRejectionSampler
+from vllm_ascend.sample.rejection_sampler import (PLACEHOLDER_TOKEN_ID,
+                                                   AscendRejectionSampler)
 from vllm_ascend.spec_decode import get_spec_decode_method
+from vllm_ascend.spec_decode.adaptive_length import SpecLengthController
 from vllm_ascend.spec_decode.eagle_proposer import EagleProposer
 from vllm_ascend.spec_decode.interface import SpecDcodeType
 from vllm_ascend.spec_decode.mtp_proposer import MtpProposer
+from vllm_ascend.spec_decode.token_tree import TokenTree, tree_token_indices
 from vllm_ascend.torchair.torchair_attention import AscendTorchairMetadata
 from vllm_ascend.torchair.torchair_mla import AscendMLATorchairMetadata
 from vllm_ascend.utils import (ACL_FORMAT_FRACTAL_ND, ACL_FORMAT_FRACTAL_NZ,
                                AscendSocVersion, ProfileExecuteDuration,
                                get_ascend_soc_version, is_310p,
-                               lmhead_tp_enable)
+                               is_moe_model, lmhead_tp_enable)
 from vllm_ascend.worker.npu_input_batch import CachedRequestState, InputBatch
 
 if TYPE_CHECKING:
-    import xgrammar as xgr  # type: ignore[import-untyped]
     from vllm.v1.core.sched.output import SchedulerOutput
-else:
-    xgr = LazyLoader("xgr", globals(), "xgrammar")
 
 import torch_npu
 
@@ -156,6 +167,46 @@ def graph_capture(device: torch.device):
         yield graph_capture_context
 
 
+class AsyncNPUModelRunnerOutput:
+    """The output of a step with async scheduling.
+
+    The sampled token ids and logprobs are copied to the host on a side
+    stream, `get_output` waits for the copy and fills them in the
+    ModelRunnerOutput. Meanwhile the worker prepares the next step.
+    """
+
+    def __init__(
+        self,
+        model_runner_output: ModelRunnerOutput,
+        sampled_token_ids_cpu: torch.Tensor,
+        logprobs_tensors: Optional[LogprobsTensors],
+        logprobs_tensors_cpu: Optional[LogprobsTensors],
+        invalid_req_indices: list[int],
+        copy_event: torch.npu.Event,
+    ):
+        self._model_runner_output = model_runner_output
+        self._sampled_token_ids_cpu = sampled_token_ids_cpu
+        # Keep the device tensors alive until the copy is done.
+        self._logprobs_tensors = logprobs_tensors
+        self._logprobs_tensors_cpu = logprobs_tensors_cpu
+        self._invalid_req_indices = invalid_req_indices
+        self._copy_event = copy_event
+
+    def get_output(self) -> ModelRunnerOutput:
+        self._copy_event.synchronize()
+        self._logprobs_tensors = None
+
+        valid_sampled_token_ids = self._sampled_token_ids_cpu.tolist()
+        for i in self._invalid_req_indices:
+            valid_sampled_token_ids[i].clear()
+
+        output = self._model_runner_output
+        output.sampled_token_ids = valid_sampled_token_ids
+        if self._logprobs_tensors_cpu is not None:
+            output.logprobs = self._logprobs_tensors_cpu.tolists()
+        return output
+
+
 class NPUModelRunner(LoRAModelRunnerMixin):
 
     def __init__(self, vllm_config: VllmConfig, device: torch.device):
@@ -168,6 +219,9 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         self.parallel_config = vllm_config.parallel_config
         self.pin_memory = is_pin_memory_available()
         self.scheduler_config = vllm_config.scheduler_config
+        # Loads the LoRA adapters the scheduler asks to prefetch, see
+        # `AscendScheduler._prefetch_lora`.
+        self.lora_prefetcher: Optional[LoRAAdapterPrefetcher] = None
         self.speculative_config = vllm_config.speculative_config
         self.block_size = vllm_config.cache_config.block_size
         self.max_num_blocks_per_req = cdiv(self.model_config.max_model_len,
@@ -179,6 +233,15 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                                 decode_max_num_seqs)
         self.dp_size = vllm_config.parallel_config.data_parallel_size
         self.dp_rank = vllm_config.parallel_config.data_parallel_rank
+        if self.dp_size > 1:
+            # Persistent host buffers of the metadata exchanged between the
+            # DP ranks every step: the number of tokens of each rank, then
+            # the with_prefill and (not enable_dbo) flags.
+            self.dp_metadata_cpu = torch.zeros(self.dp_size + 2,
+                                               dtype=torch.int32,
+                                               device="cpu",
+                                               pin_memory=self.pin_memory)
+            self.dp_metadata_np = self.dp_metadata_cpu.numpy()
         self.device = device
         self.dtype = self.model_config.dtype
         if envs_ascend.VLLM_ASCEND_ENABLE_TOPK_TOPP_OPTIMIZATION:
@@ -204,6 +267,8 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             self.chunked_prefill_enabled = self.scheduler_config.chunked_prefill_enabled
         else:
             self.chunked_prefill_enabled = True
+        self.dynamic_eplb = ascend_config.dynamic_eplb
+        self.eplb_updator: Optional[EplbUpdator] = None
 
         if self.cache_config.cache_dtype == "auto":
             self.kv_cache_dtype = self.dtype
@@ -230,8 +295,11 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         )
         self.attn_metadata_builder = self.attn_backend.get_builder_cls()(
             vllm_config, device)
+        # The mask cache grows with the prompts, so it does not need to start
+        # at the max model len.
         self.attn_mask_builder = AttentionMaskBuilder(
-            self.model_config.max_model_len, self.dtype)
+            min(self.model_config.max_model_len, 2048), self.dtype,
+            self.model_config.max_model_len)
 
         # Set up speculative decoding.
         self.spec_attn_mask = None
@@ -239,9 +307,25 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                                      MtpProposer]] = None
         self.actual_seq_lengths_q = []
         self.decode_token_per_req = 1
+        # The static draft token tree, None for chains of draft tokens.
+        self.token_tree: Optional[TokenTree] = None
+        self.num_tree_tokens = 0
+        self.tree_accepted_nodes: Optional[np.ndarray] = None
+        self.spec_length_controller: Optional[SpecLengthController] = None
         if self.speculative_config:
             spec_token_num = self.speculative_config.num_speculative_tokens
             assert spec_token_num > 0
+            if ascend_config.spec_token_tree is not None:
+                self.token_tree = TokenTree(ascend_config.spec_token_tree)
+                spec_token_num = self.token_tree.num_nodes
+                self._init_token_tree_buffers()
+            if (ascend_config.adaptive_spec_len
+                    or ascend_config.spec_disable_batch_size is not None):
+                self.spec_length_controller = SpecLengthController(
+                    spec_token_num,
+                    ascend_config.spec_len_min_gain,
+                    ascend_config.spec_disable_batch_size,
+                    adaptive=ascend_config.adaptive_spec_len)
             self.decode_token_per_req = 1 + spec_token_num
             self.actual_seq_lengths_q = [
                 len for len in
@@ -332,15 +416,69 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         self.use_aclgraph = self._use_aclgraph()
         self.aclgraph_batch_sizes = list(
             reversed(self.compilation_config.cudagraph_capture_sizes))
+        # The number of tokens of the steps is recorded to plan the capture
+        # sizes of the next start.
+        self.capture_plan_recorder: Optional[CapturePlanRecorder] = None
+        if (self.use_aclgraph and ascend_config.aclgraph_capture_plan_path
+                and is_global_first_rank()):
+            self.capture_plan_recorder = CapturePlanRecorder(
+                ascend_config.aclgraph_capture_plan_path,
+                self.aclgraph_batch_sizes)
+        # Capturing outside of startup runs dummy steps, which must neither
+        # be synchronized with other DP ranks nor change the LoRA or drafter
+        # states.
+        self.aclgraph_lazy_capture = ascend_config.aclgraph_lazy_capture
+        if self.aclgraph_lazy_capture and (
+                not self.use_aclgraph
+                or self.parallel_config.data_parallel_size > 1
+                or self.lora_config or self.speculative_config):
+            logger.warning(
+                "aclgraph_lazy_capture is ignored, it is only supported with "
+                "ACL graph mode without data parallel, LoRA and speculative "
+                "decoding.")
+            self.aclgraph_lazy_capture = False
+        self.captured_aclgraph_sizes: set[int] = set()
 
-        self.uniform_decode_query_len = 1 if not self.speculative_config else \
-            1 + self.speculative_config.num_speculative_tokens
+        self.uniform_decode_query_len = self.decode_token_per_req
         # aclgraph dispatcher for runtime aclgraph dispatching.
         self.aclgraph_dispatcher = CudagraphDispatcher(self.vllm_config)
         # Cached outputs.
         self._draft_token_ids: Optional[Union[list[list[int]],
                                               torch.Tensor]] = None
 
+        # With async scheduling, the sampled token ids stay on the device and
+        # are copied to the host on a side stream. They are fed to the next
+        # step on the device and cached in the persistent batch once the
+        # next step has been launched.
+        self.use_async_scheduling = self.scheduler_config.async_scheduling
+        if self.use_async_scheduling:
+            if self.speculative_config:
+                raise NotImplementedError(
+                    "Async scheduling is not supported with speculative "
+                    "decoding.")
+            self.async_output_copy_stream = torch.npu.Stream()
+            # The pinned host buffers of the inputs are reused by the next
+            # step, which must not overwrite them before they are copied.
+            self.prepare_inputs_event = torch.npu.Event()
+            # The input_ids positions and the previous batch indices of the
+            # token ids sampled by the previous step.
+            self.prev_sampled_indices_cpu = torch.zeros(
+                (2, self.max_num_reqs),
+                dtype=torch.int64,
+                device="cpu",
+                pin_memory=True)
+            self.prev_sampled_indices_np = \
+                self.prev_sampled_indices_cpu.numpy()
+            self.prev_sampled_indices = torch.zeros((2, self.max_num_reqs),
+                                                    dtype=torch.int64,
+                                                    device=self.device)
+        self.prev_sampled_token_ids: Optional[torch.Tensor] = None
+        self.prev_sampled_token_ids_cpu: Optional[torch.Tensor] = None
+        self.prev_sampled_copy_event: Optional[torch.npu.Event] = None
+        # Batch index of the previous step of the requests with a valid
+        # sampled token.
+        self.prev_req_id_to_index: Optional[dict[str, int]] = None
+
         # NOTE: we need to use `in_profile_run` to determine whether `enable_force_load_balance` is True
         self.in_profile_run = False
 
@@ -351,7 +489,17 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             self.is_kv_producer = vllm_config.kv_transfer_config.is_kv_producer
             self.is_kv_consumer = vllm_config.kv_transfer_config.is_kv_consumer
 
+        # The number of tokens every DP rank runs when the metadata exchange
+        # is skipped, see `_can_skip_dp_metadata_sync`.
+        self.dp_decode_graph_size: Optional[int] = None
+        if not ascend_config.torchair_graph_config.enabled:
+            self._init_dp_decode_graph_size(
+                self.aclgraph_batch_sizes if self.use_aclgraph else [])
+
         self.mc2_tokens_capacity = 512 * self.parallel_config.tensor_parallel_size
+        # The measured fastest MoE communication methods, see
+        # `calibrate_moe_comm_method`.
+        self.moe_comm_table: Optional[MoECommCrossoverTable] = None
         self.reserved_mc2_mask = torch.zeros(
             self.mc2_tokens_capacity,
             dtype=torch.bool,
@@ -365,6 +513,8 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         # Remove finished requests from the cached states.
         for req_id in scheduler_output.finished_req_ids:
             self.requests.pop(req_id, None)
+            if self.spec_length_controller is not None:
+                self.spec_length_controller.remove(req_id)
 
         # Remove the finished requests from the persistent batch.
         # NOTE(woosuk): There could be an edge case where finished_req_ids and
@@ -529,8 +679,7 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 # Add new_token_ids to token_ids_cpu.
                 start_token_index = num_computed_tokens
                 end_token_index = num_computed_tokens + len(new_token_ids)
-                self.input_batch.token_ids_cpu[
-                    req_index,
+                self.input_batch.token_ids_row(req_index)[
                     start_token_index:end_token_index] = new_token_ids
                 self.input_batch.num_tokens_no_spec[
                     req_index] = end_token_index
@@ -543,8 +692,8 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 num_spec_tokens = len(spec_token_ids)
                 start_index = self.input_batch.num_tokens_no_spec[req_index]
                 end_token_index = start_index + num_spec_tokens
-                self.input_batch.token_ids_cpu[
-                    req_index, start_index:end_token_index] = spec_token_ids
+                self.input_batch.token_ids_row(
+                    req_index)[start_index:end_token_index] = spec_token_ids
                 # NOTE(woosuk): `num_tokens` here may include spec tokens.
                 self.input_batch.num_tokens[req_index] += num_spec_tokens
 
@@ -560,9 +709,80 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         # Refresh batch metadata with any pending updates.
         self.input_batch.refresh_metadata()
 
+    def _init_dp_decode_graph_size(self,
+                                   graph_batch_sizes: list[int]) -> None:
+        if not get_ascend_config().skip_dp_sync_in_decode:
+            return
+        if (self.dp_size == 1 or not self.is_kv_consumer
+                or len(graph_batch_sizes) != 1):
+            logger.warning(
+                "skip_dp_sync_in_decode is ignored, it is only supported with "
+                "data parallel on a decode instance (kv consumer) with a "
+                "single aclgraph batch size.")
+            return
+        # Every step of every rank is padded to the graph batch size, the
+        # scheduler must not produce larger ones, e.g. when it recomputes a
+        # preempted request.
+        max_num_batched_tokens = self.scheduler_config.max_num_batched_tokens
+        if max_num_batched_tokens > graph_batch_sizes[0]:
+            raise ValueError(
+                "skip_dp_sync_in_decode requires max_num_batched_tokens "
+                f"({max_num_batched_tokens}) to be at most the graph batch "
+                f"size ({graph_batch_sizes[0]}).")
+        self.dp_decode_graph_size = graph_batch_sizes[0]
+        self.dp_decode_num_tokens_across_dp = torch.full(
+            (self.dp_size, ), self.dp_decode_graph_size, dtype=torch.int32)
+
+    def _can_skip_dp_metadata_sync(self) -> bool:
+        """Whether all the DP ranks run a step of `dp_decode_graph_size`
+        tokens without exchanging their metadata.
+
+        The ranks agree on the step without knowing what the others run: no
+        prefill and no DBO across the ranks, for the MoE communication. A
+        rank that has prefill work, e.g. a request recomputed after its
+        preemption, still runs its attention as a prefill within the padded
+        step.
+        """
+        return self.dp_decode_graph_size is not None and \
+            not self.in_profile_run
+
+    def _start_dp_metadata_exchange(
+            self, num_tokens: int, with_prefill: bool,
+            enable_dbo: bool) -> Optional[dist.Work]:
+        """Start the all-reduce of the metadata of this step over the DP CPU
+        group, without synchronizing with the device. Returns None if there
+        is nothing to exchange."""
+        if self.dp_size == 1 or self._can_skip_dp_metadata_sync():
+            return None
+        self.dp_metadata_np[:] = 0
+        self.dp_metadata_np[self.dp_rank] = num_tokens
+        self.dp_metadata_np[-2] = int(with_prefill)
+        self.dp_metadata_np[-1] = int(not enable_dbo)
+        return dist.all_reduce(self.dp_metadata_cpu,
+                               group=get_dp_group().cpu_group,
+                               async_op=True)
+
+    def _wait_dp_metadata_exchange(
+            self, dp_metadata_work: dist.Work) -> tuple[torch.Tensor, bool, bool]:
+        dp_metadata_work.wait()
+        num_tokens_across_dp = self.dp_metadata_cpu[:-2]
+        with_prefill = bool(self.dp_metadata_np[-2])
+        enable_dbo = not bool(self.dp_metadata_np[-1])
+        return num_tokens_across_dp, with_prefill, enable_dbo
+
     def _sync_metadata_across_dp(
-            self, num_tokens: int, with_prefill: bool, enable_dbo: bool
+        self,
+        num_tokens: int,
+        with_prefill: bool,
+        enable_dbo: bool,
+        dp_metadata_work: Optional[dist.Work] = None
     ) -> tuple[int, Optional[torch.Tensor], bool, bool]:
+        """Sync num_tokens, with_prefill and enable_dbo across the DP ranks.
+
+        If `dp_metadata_work` is given, it is the exchange started by
+        `_start_dp_metadata_exchange` with the same arguments. The returned
+        number of tokens of each rank is a host tensor.
+        """
         # TODO: In vLLM, the only thing that needs to be synced is num_tokens, but in
         # our case, we still need to sync the other two flags as well. So we need to
         # include them in the all_reduce operation, and more over, we CANNOT skip it
@@ -571,36 +791,23 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         # immediately once the other two flags are no longer needed.
         if self.dp_size == 1:
             return num_tokens, None, with_prefill, enable_dbo
-
-        # Sync num_tokens, with_prefill, enable_dbo across dp ranks
-        num_tokens_tensor = torch.tensor([
-            num_tokens if i == self.dp_rank else 0 for i in range(self.dp_size)
-        ],
-                                         dtype=torch.int32,
-                                         device="npu")
-
-        flags_tensor = torch.tensor(
-            [int(with_prefill), int(not enable_dbo)],
-            dtype=torch.int32,
-            device="npu")
-
-        packed_tensor = torch.cat([num_tokens_tensor, flags_tensor])
-
-        dist.all_reduce(packed_tensor, group=get_dp_group().device_group)
-
-        # Unpack the results
-        num_tokens_across_dp = packed_tensor[:-2]
-        synced_flags = packed_tensor[-2:]
-
-        max_tokens_across_dp = torch.max(num_tokens_across_dp).item()
-        global_with_prefill = bool(synced_flags[0])
-        global_enable_dbo = not bool(synced_flags[1])
-
-        # Create a tensor for num_tokens_after_padding
-        num_tokens_after_padding = torch.tensor([max_tokens_across_dp] *
-                                                self.dp_size,
-                                                device="npu",
-                                                dtype=torch.int32)
+        if self._can_skip_dp_metadata_sync():
+            return (self.dp_decode_graph_size,
+                    self.dp_decode_num_tokens_across_dp, False, False)
+
+        if dp_metadata_work is None:
+            dp_metadata_work = self._start_dp_metadata_exchange(
+                num_tokens, with_prefill, enable_dbo)
+        assert dp_metadata_work is not None
+        num_tokens_across_dp, global_with_prefill, global_enable_dbo = \
+            self._wait_dp_metadata_exchange(dp_metadata_work)
+
+        max_tokens_across_dp = int(num_tokens_across_dp.max())
+        # A new tensor, the callers keep it across the later syncs (e.g. of
+        # the MTP proposer).
+        num_tokens_after_padding = torch.full((self.dp_size, ),
+                                              max_tokens_across_dp,
+                                              dtype=torch.int32)
 
         return max_tokens_across_dp, num_tokens_after_padding, global_with_prefill, global_enable_dbo
 
@@ -608,22 +815,32 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                             attn_state: AscendAttentionState,
                             num_tokens: int) -> bool:
         # do the checks for dp + dbo
+        # considering the case that one dp rank may enable dbo while others may not
+        if not self.vllm_config.model_config.use_mla or not envs_ascend.VLLM_ASCEND_ENABLE_DBO:
+            return False
+        # the split thresholds of the model, see `CustomDeepseekDBOModel`
+        ms_config = getattr(getattr(self.get_model(), "model", None),
+                            "multistream_config", None)
+        if ms_config is None:
+            return False
         if attn_state in [
                 AscendAttentionState.DecodeOnly,
                 AscendAttentionState.SpecDecoding
         ]:
+            # the graphs are captured without micro batches
+            if (not envs_ascend.VLLM_ASCEND_ENABLE_DBO_DECODE
+                    or self.use_aclgraph
+                    or get_ascend_config().torchair_graph_config.enabled):
+                return False
+            min_num_tokens = ms_config.min_decode_tokens_to_split
+        else:
+            min_num_tokens = ms_config.min_total_tokens_to_split
+        if num_tokens < min_num_tokens:
             return False
-        # considering the case that one dp rank may enable dbo while others may not
-        if not self.vllm_config.model_config.use_mla or not envs_ascend.VLLM_ASCEND_ENABLE_DBO:
-            return False
-        # TODO: remove it if token-level microbatch is enabled
-        [token_index,
-         seq_index] = compute_split_seq_index(query_lens, attn_state,
-                                              num_tokens)
-        if token_index == 0 or seq_index == 0 or seq_index == len(
-                query_lens) or num_tokens < 256:
-            return False
-        return True
+        # the prefill requests may be split in the middle
+        [token_index, _] = compute_split_seq_index(query_lens, attn_state,
+                                                   num_tokens)
+        return 0 < token_index < num_tokens
 
     def get_model(self) -> nn.Module:
         # get raw model out of the aclgraph wrapper.
@@ -656,10 +873,79 @@ class NPUModelRunner(LoRAModelRunnerMixin):
 
         return tuple(tasks)
 
+    def _init_token_tree_buffers(self):
+        assert self.token_tree is not None
+        # The node of each scheduled token, -1 if it is not a draft token,
+        # and its position in the KV cache.
+        self.tree_node_ids_cpu = torch.full((self.max_num_tokens, ),
+                                            -1,
+                                            dtype=torch.int64,
+                                            device="cpu")
+        self.tree_node_ids_np = self.tree_node_ids_cpu.numpy()
+        self.tree_kv_positions_cpu = torch.zeros(self.max_num_tokens,
+                                                 dtype=torch.int64,
+                                                 device="cpu")
+        self.tree_kv_positions_np = self.tree_kv_positions_cpu.numpy()
+        self.tree_position_offsets = self.token_tree.kv_position_offsets()
+        self.tree_ancestor_mask = torch.from_numpy(
+            self.token_tree.ancestor_mask).to(self.device)
+        self.tree_children = torch.from_numpy(self.token_tree.children).to(
+            self.device)
+
+    def _prepare_tree_positions(self, scheduler_output: "SchedulerOutput",
+                                cu_num_tokens: np.ndarray,
+                                total_num_scheduled_tokens: int) -> None:
+        """Give the draft tokens the positions of their nodes in the token
+        tree, they keep their KV cache positions in
+        `tree_kv_positions_np` for the attention mask."""
+        positions_np = self.positions_np[:total_num_scheduled_tokens]
+        self.tree_kv_positions_np.fill(0)
+        self.tree_kv_positions_np[:total_num_scheduled_tokens] = positions_np
+        self.tree_node_ids_np.fill(-1)
+        self.num_tree_tokens = 0
+        for req_id, draft_token_ids in (
+                scheduler_output.scheduled_spec_decode_tokens.items()):
+            req_idx = self.input_batch.req_id_to_index[req_id]
+            num_nodes = len(draft_token_ids)
+            end = cu_num_tokens[req_idx]
+            self.tree_node_ids_np[end - num_nodes:end] = np.arange(num_nodes)
+            positions_np[end - num_nodes:end] -= (
+                self.tree_position_offsets[:num_nodes])
+            self.num_tree_tokens += num_nodes
+
+    def _compact_tree_kv_cache(self, spec_decode_metadata: SpecDecodeMetadata,
+                               cu_num_tokens: np.ndarray,
+                               accepted_nodes: torch.Tensor) -> None:
+        """Move the KV of the accepted draft tokens next to their roots, the
+        KV cache then holds the accepted path of each tree like a chain."""
+        # NOTE: NPU -> CPU Sync happens here, as for the sampled tokens.
+        self.tree_accepted_nodes = accepted_nodes.cpu().numpy()
+        token_indices, compact_indices, _ = tree_token_indices(
+            cu_num_tokens, np.array(spec_decode_metadata.num_draft_tokens),
+            self.tree_accepted_nodes)
+        moved = token_indices != compact_indices
+        if not moved.any():
+            return
+        src_slots = self.slot_mapping_cpu[torch.from_numpy(
+            token_indices[moved])].to(self.device, torch.long)
+        dst_slots = self.slot_mapping_cpu[torch.from_numpy(
+            compact_indices[moved])].to(self.device, torch.long)
+        for kv_cache in self.kv_caches:
+            for cache in kv_cache:
+                # [num_blocks, block_size, ...] -> [num_slots, ...]
+                cache = cache.view(-1, *cache.shape[2:])
+                cache[dst_slots] = cache[src_slots]
+
     def _make_attention_mask(self, seq_lens, position,
                              attn_state) -> torch.Tensor:
         # Chunk Prefill situation.
         if attn_state == AscendAttentionState.ChunkedPrefill and not self.vllm_config.model_config.use_mla:
+            if self.num_tree_tokens > 0:
+                num_tokens = position.shape[0]
+                return self.attn_mask_builder.get_tree_attn_mask(
+                    seq_lens, self.tree_kv_positions_cpu[:num_tokens],
+                    self.tree_node_ids_cpu[:num_tokens],
+                    self.tree_ancestor_mask, self.dtype, self.device)
             return self.attn_mask_builder.get_splitfuse_attn_mask(
                 seq_lens, position, self.dtype, self.device)
         # Prefill without cache situation.
@@ -901,16 +1187,10 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                                               attn_state,
                                               total_num_scheduled_tokens)
 
-        # Get info across DP ranks.
-        # NOTE: maybe_padded_num_tokens is only used when using TorchAir with DP,
-        # Otherwise, it's just max_tokens_across_dp_cpu
-        (maybe_padded_num_tokens, num_tokens_across_dp, with_prefill,
-         enable_dbo) = self._sync_metadata_across_dp(num_input_tokens,
-                                                     with_prefill, enable_dbo)
-
-        # TODO: Now that num_input_tokens is basically identical with maybe_padded_num_tokens
-        # We should consider removing maybe_padded_num_tokens later
-        num_input_tokens = maybe_padded_num_tokens
+        # Exchange the info with the other DP ranks on the host while the
+        # inputs are prepared.
+        dp_metadata_work = self._start_dp_metadata_exchange(
+            num_input_tokens, with_prefill, enable_dbo)
 
         # Hot-Swap lora model
         if self.lora_config:
@@ -944,9 +1224,11 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         # Get token indices.
         # E.g., [0, 1, 0, 1, 2, 3, 4, 0, 1, 2]
         # -> [0, 1, M, M + 1, M + 2, M + 3, M + 4, 2 * M, 2 * M + 1, 2 * M + 2]
-        # where M is the max_model_len.
+        # where M is the max_model_len, if the requests are in the rows 0, 1
+        # and 2 of token_ids_cpu.
         token_indices = (positions_np +
-                         req_indices * self.input_batch.token_ids_cpu.shape[1])
+                         self.input_batch.token_rows[req_indices] *
+                         self.input_batch.token_ids_cpu.shape[1])
 
         # Prepare input_ids.
         # NOTE(woosuk): We use torch.index_select instead of np.take here
@@ -966,6 +1248,10 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         self.slot_mapping_cpu[:total_num_scheduled_tokens].copy_(
             self.input_batch.block_table[0].
             slot_mapping_cpu[:total_num_scheduled_tokens])
+        if self.token_tree is not None:
+            # After the slot mapping, which uses the KV cache positions.
+            self._prepare_tree_positions(scheduler_output, cu_num_tokens,
+                                         total_num_scheduled_tokens)
 
         self.query_start_loc_np[0] = 0
         self.query_start_loc_np[1:num_reqs + 1] = cu_num_tokens
@@ -987,19 +1273,31 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         # Copy the tensors to the NPU.
         self.input_ids[:total_num_scheduled_tokens].copy_(
             self.input_ids_cpu[:total_num_scheduled_tokens], non_blocking=True)
+        self._scatter_prev_sampled_token_ids(num_reqs)
+
+        # Get info across DP ranks.
+        # NOTE: maybe_padded_num_tokens is only used when using TorchAir with DP,
+        # Otherwise, it's just max_tokens_across_dp_cpu
+        (maybe_padded_num_tokens, num_tokens_across_dp, with_prefill,
+         enable_dbo) = self._sync_metadata_across_dp(num_input_tokens,
+                                                     with_prefill, enable_dbo,
+                                                     dp_metadata_work)
+
+        # TODO: Now that num_input_tokens is basically identical with maybe_padded_num_tokens
+        # We should consider removing maybe_padded_num_tokens later
+        num_input_tokens = maybe_padded_num_tokens
 
         self.positions_cpu[total_num_scheduled_tokens:num_input_tokens].zero_()
         self.positions[:num_input_tokens].copy_(
             self.positions_cpu[:num_input_tokens], non_blocking=True)
 
         # Make Attention metadata
-        positions_cpu = self.positions_cpu[:num_input_tokens]
         positions = self.positions[:num_input_tokens]
         seq_lens_cpu = self.seq_lens_cpu[:num_reqs]
         attn_state = self._build_attn_state(num_reqs, num_scheduled_tokens,
                                             num_valid_tokens)
         self.attn_mask = self._make_attention_mask(seq_lens=seq_lens_cpu,
-                                                   position=positions_cpu,
+                                                   position=positions,
                                                    attn_state=attn_state)
         self.attn_state = attn_state  # type: ignore
 
@@ -1170,6 +1468,21 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             positions = self.mrope_positions[:, :num_input_tokens]
         return input_ids, positions
 
+    def _parse_spec_decode_output(
+        self, sampled_token_ids_np: np.ndarray
+    ) -> tuple[list[list[int]], np.ndarray]:
+        """Return the valid sampled tokens of each request and their number,
+        from the host copy of the rejection sampler output. The valid tokens
+        come first in each row, the rejected ones are placeholders."""
+        valid_mask = ((sampled_token_ids_np != PLACEHOLDER_TOKEN_ID) &
+                      (sampled_token_ids_np < self.input_batch.vocab_size))
+        num_sampled_tokens = valid_mask.sum(axis=1, dtype=np.int32)
+        valid_sampled_token_ids = [
+            row[:num_tokens].tolist() for row, num_tokens in zip(
+                sampled_token_ids_np, num_sampled_tokens.tolist())
+        ]
+        return valid_sampled_token_ids, num_sampled_tokens
+
     def _calc_spec_decode_metadata(
         self,
         num_draft_tokens: np.ndarray,
@@ -1250,64 +1563,24 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         scheduler_output: "SchedulerOutput",
         logits: torch.Tensor,
     ) -> torch.Tensor:
-        grammar_bitmask = scheduler_output.grammar_bitmask
-
         # We receive the structured output bitmask from the scheduler,
-        # compacted to contain bitmasks only for structured output requests.
-        # The order of the requests in the bitmask is not guaranteed to be the
-        # same as the order of the requests in the gpu runner's batch. We need
-        # to sort the bitmask to match the order of the requests used here.
-
-        # Get the batch indices of the structured output requests.
-        # Keep track of the number of speculative tokens scheduled for every
-        # request in the batch, as the logit indices are offset by this amount.
-        struct_out_req_batch_indices: dict[str, int] = {}
-        cumulative_offset = 0
-        seq = sorted(self.input_batch.req_id_to_index.items(),
-                     key=lambda x: x[1])
-        for req_id, batch_index in seq:
-            logit_index = batch_index + cumulative_offset
-            cumulative_offset += len(
-                scheduler_output.scheduled_spec_decode_tokens.get(req_id, []))
-            if req_id in scheduler_output.structured_output_request_ids:
-                struct_out_req_batch_indices[req_id] = logit_index
-
-        out_indices = []
-
-        # Reorder the bitmask to match the order of the requests in the batch.
-        sorted_bitmask = np.zeros_like(grammar_bitmask,
-                                       shape=(logits.shape[0],
-                                              grammar_bitmask.shape[1]))
-        cumulative_index = 0
-        seq = sorted(scheduler_output.structured_output_request_ids.items(),
-                     key=lambda x: x[1])
-        for req_id, _ in seq:
-            logit_index = struct_out_req_batch_indices[req_id]
-            num_spec_tokens = len(
-                scheduler_output.scheduled_spec_decode_tokens.get(req_id, []))
-            for i in range(1 + num_spec_tokens):
-                sorted_bitmask[logit_index + i] = \
-                    grammar_bitmask[cumulative_index + i]
-                out_indices.append(logit_index + i)
-            cumulative_index += 1 + num_spec_tokens
-        grammar_bitmask = sorted_bitmask
+        # compacted to contain bitmasks only for structured output requests,
+        # and in an order which is not the one of the requests in the batch.
+        logit_indices = get_bitmask_logit_indices(
+            self.input_batch.req_id_to_index,
+            scheduler_output.structured_output_request_ids,
+            scheduler_output.scheduled_spec_decode_tokens)
 
         # Serialization of np.ndarray is much more efficient than a tensor,
-        # so we receive it in that format.
-        grammar_bitmask = torch.from_numpy(grammar_bitmask)
-
-        # NOTE:
-        # 1. XGrammar bitmask applying only supports CPU and GPU.
-        # 2. The logits and bitmask should be on the same device.
-        # 3. XGrammar logits on CPU only supports float32 dtype.
-        logits_dtype = logits.dtype
-        logits = logits.to("cpu").float()
-        xgr.apply_token_bitmask_inplace(
-            logits,
-            grammar_bitmask,
-            indices=out_indices,
-        )
-        return logits.to(self.device).to(logits_dtype)
+        # so we receive it in that format. The bitmask is applied on the
+        # device, so the logits never leave it.
+        grammar_bitmask = torch.from_numpy(
+            scheduler_output.grammar_bitmask).to(self.device,
+                                                 non_blocking=True)
+        logit_indices = torch.from_numpy(logit_indices).to(self.device,
+                                                           non_blocking=True)
+        apply_token_bitmask_inplace(logits, grammar_bitmask, logit_indices)
+        return logits
 
     def propose_draft_token_ids(
         self,
@@ -1327,10 +1600,35 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             # Speculative decoding is not enabled.
             draft_token_ids = None
         else:
+            controller = self.spec_length_controller
+            if controller is None:
+                return self.drafter.generate_token_ids(
+                    valid_sampled_token_ids, sampling_metadata,
+                    scheduler_output, spec_decode_metadata, positions,
+                    num_scheduled_tokens, hidden_states, attn_metadata,
+                    aux_hidden_states)
+            req_ids = self.input_batch.req_ids
+            if spec_decode_metadata is not None:
+                for i, num_draft_tokens in enumerate(
+                        spec_decode_metadata.num_draft_tokens):
+                    if num_draft_tokens and valid_sampled_token_ids[i]:
+                        controller.observe(
+                            req_ids[i], num_draft_tokens,
+                            len(valid_sampled_token_ids[i]) - 1)
+            enabled = controller.enabled(len(valid_sampled_token_ids))
+            if not enabled and self.drafter.name == SpecDcodeType.NGRAM:
+                return [[] for _ in valid_sampled_token_ids]
+            # The draft models still run to fill their KV cache.
             draft_token_ids = self.drafter.generate_token_ids(
                 valid_sampled_token_ids, sampling_metadata, scheduler_output,
                 spec_decode_metadata, positions, num_scheduled_tokens,
                 hidden_states, attn_metadata, aux_hidden_states)
+            if not enabled:
+                return [[] for _ in draft_token_ids]
+            draft_token_ids = [
+                token_ids[:controller.draft_len(req_id)] if token_ids else
+                token_ids for req_id, token_ids in zip(req_ids, draft_token_ids)
+            ]
         return draft_token_ids
 
     def _pool(
@@ -1389,6 +1687,9 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             
             In both cases, we use MC2 when the number of tokens is smaller than
             a its capacity threshold.
+        3. If a crossover table was measured or loaded by
+        `calibrate_moe_comm_method`, we use its method when it is available
+        for the number of tokens instead.
 
         Args:
             num_tokens (int): The number of tokens in the current batch.
@@ -1400,8 +1701,13 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             str: The selected MoE communication method, either "allgather", "mc2", or "alltoall".
         """
         soc_version = get_ascend_soc_version()
+        measured_method = (self.moe_comm_table.select(num_tokens)
+                           if self.moe_comm_table is not None else None)
 
-        if not self.parallel_config.enable_expert_parallel:
+        if (measured_method is not None and measured_method
+                in self._moe_comm_method_candidates(num_tokens)):
+            moe_comm_method = measured_method
+        elif not self.parallel_config.enable_expert_parallel:
             moe_comm_method = "allgather"
         elif soc_version in {AscendSocVersion.A2}:
             if num_tokens <= self.mc2_tokens_capacity and self.parallel_config.world_size >= 16:
@@ -1419,15 +1725,223 @@ class NPUModelRunner(LoRAModelRunnerMixin):
 
         return moe_comm_method
 
+    def _moe_comm_method_candidates(self, num_tokens: int) -> list[str]:
+        """The MoE communication methods available for a batch of
+        `num_tokens` tokens."""
+        if not self.parallel_config.enable_expert_parallel:
+            return ["allgather"]
+        methods = ["allgather", "alltoall"]
+        if num_tokens <= self.mc2_tokens_capacity and (
+                get_ascend_soc_version() == AscendSocVersion.A3
+                or self.parallel_config.world_size >= 16):
+            methods.append("mc2")
+        return methods
+
+    def _moe_comm_table_key(self) -> str:
+        """The model and topology a crossover table is measured for."""
+        hf_config = self.model_config.hf_config
+        return (f"{self.model_config.architectures[0]}"
+                f"_hidden{hf_config.hidden_size}"
+                f"_{self.model_config.quantization}"
+                f"_{get_ascend_soc_version().name}"
+                f"_tp{self.parallel_config.tensor_parallel_size}"
+                f"_dp{self.parallel_config.data_parallel_size}")
+
+    def calibrate_moe_comm_method(self) -> None:
+        """Load the crossover table of the MoE communication methods of the
+        model and topology from `moe_comm_table_path`, or measure and store it
+        with `moe_comm_calibration`.
+
+        Each method is timed with dummy steps over a grid of numbers of
+        tokens, the slowest rank's timings are kept so that all the ranks
+        build the same table and select the same methods. Must run before
+        the graphs are captured since they bake in the method.
+        """
+        ascend_config = get_ascend_config()
+        path = ascend_config.moe_comm_table_path
+        if (path is None or not self.parallel_config.enable_expert_parallel
+                or not is_moe_model(self.vllm_config)):
+            return
+        if ascend_config.torchair_graph_config.enabled:
+            # The torchair MoE layers select their communication from the
+            # fused MoE state, and each dummy step of the grid would compile
+            # a graph.
+            logger.warning(
+                "moe_comm_table_path is ignored in torchair graph mode.")
+            return
+        key = self._moe_comm_table_key()
+        table = load_moe_comm_table(path, key)
+        # Use the table only if all the ranks have it.
+        world_group = get_world_group().cpu_group
+        has_table = torch.tensor([table is not None], dtype=torch.int32)
+        dist.all_reduce(has_table, op=dist.ReduceOp.MIN, group=world_group)
+        if not has_table.item():
+            table = None
+
+        if table is None and ascend_config.moe_comm_calibration:
+            methods = ["allgather", "alltoall", "mc2"]
+            num_tokens_grid = sorted({
+                min(1 << i, self.max_num_tokens)
+                for i in range(self.max_num_tokens.bit_length() + 1)
+            })
+
+            def run_step(method: str, num_tokens: int) -> None:
+                self.moe_comm_table = MoECommCrossoverTable([num_tokens],
+                                                            [method])
+                self._dummy_run(num_tokens)
+                torch.npu.synchronize()
+
+            try:
+                # Like the profiling run, the eager dummy steps route the
+                # tokens evenly over the experts and always exchange their
+                # metadata between the DP ranks, even with
+                # skip_dp_sync_in_decode.
+                with self.set_in_profile_run():
+                    timings = measure_moe_comm_methods(
+                        run_step, self._moe_comm_method_candidates, methods,
+                        num_tokens_grid)
+            finally:
+                self.moe_comm_table = None
+            timings_tensor = torch.from_numpy(timings)
+            dist.all_reduce(timings_tensor,
+                            op=dist.ReduceOp.MAX,
+                            group=world_group)
+            table = build_crossover_table(num_tokens_grid, methods,
+                                          timings_tensor.numpy())
+            if is_global_first_rank():
+                save_moe_comm_table(path, key, table)
+
+        if table is not None:
+            logger.info("Selecting the MoE communication method from %s",
+                        table.to_json())
+        self.moe_comm_table = table
+
     @torch.inference_mode()
+    def _scatter_prev_sampled_token_ids(self, num_reqs: int) -> None:
+        """Write the token ids sampled by the previous step to input_ids.
+
+        With async scheduling, they are not in the persistent batch yet when
+        the inputs are prepared. They are the first scheduled token of the
+        requests that were sampled by the previous step.
+        """
+        if self.prev_sampled_token_ids is None:
+            return
+        prev_sampled_index = self.input_batch.prev_sampled_index[:num_reqs]
+        req_indices = np.flatnonzero(prev_sampled_index >= 0)
+        num_prev_sampled = len(req_indices)
+        if num_prev_sampled == 0:
+            return
+        self.prev_sampled_indices_np[0, :num_prev_sampled] = (
+            self.query_start_loc_np[req_indices])
+        self.prev_sampled_indices_np[1, :num_prev_sampled] = (
+            prev_sampled_index[req_indices])
+
+        self.prev_sampled_indices[:, :num_prev_sampled].copy_(
+            self.prev_sampled_indices_cpu[:, :num_prev_sampled],
+            non_blocking=True)
+        token_indices = self.prev_sampled_indices[0, :num_prev_sampled]
+        prev_indices = self.prev_sampled_indices[1, :num_prev_sampled]
+        self.input_ids.index_copy_(
+            0, token_indices,
+            self.prev_sampled_token_ids[prev_indices,
+                                        0].to(self.input_ids.dtype))
+
+    def _cache_prev_sampled_token_ids(self) -> None:
+        """Cache the token ids sampled by the previous step in the persistent
+        batch and the request states, one step late with async scheduling.
+        """
+        if self.prev_sampled_token_ids is None:
+            return
+        assert self.prev_sampled_token_ids_cpu is not None
+        assert self.prev_sampled_copy_event is not None
+        assert self.prev_req_id_to_index is not None
+        self.prev_sampled_copy_event.synchronize()
+        sampled_token_ids = self.prev_sampled_token_ids_cpu.tolist()
+
+        for req_id, prev_index in self.prev_req_id_to_index.items():
+            req_state = self.requests.get(req_id)
+            if req_state is None:
+                # The request has finished meanwhile.
+                continue
+            sampled_ids = sampled_token_ids[prev_index]
+            req_idx = self.input_batch.req_id_to_index.get(req_id)
+            if req_idx is not None:
+                start_idx = self.input_batch.num_tokens_no_spec[req_idx]
+                end_idx = start_idx + len(sampled_ids)
+                assert end_idx <= self.model_config.max_model_len, (
+                    "Sampled token IDs exceed the max model length. "
+                    f"Total number of tokens: {end_idx} > max_model_len: "
+                    f"{self.model_config.max_model_len}")
+                self.input_batch.token_ids_row(
+                    req_idx)[start_idx:end_idx] = sampled_ids
+                self.input_batch.num_tokens_no_spec[req_idx] = end_idx
+                self.input_batch.num_tokens[req_idx] = end_idx
+            req_state.output_token_ids.extend(sampled_ids)
+
+        self.prev_sampled_token_ids = None
+        self.prev_sampled_token_ids_cpu = None
+        self.prev_sampled_copy_event = None
+        self.prev_req_id_to_index = None
+
+    def _copy_sampler_output_async(
+        self,
+        model_runner_output: ModelRunnerOutput,
+        sampled_token_ids: torch.Tensor,
+        logprobs_tensors: Optional[LogprobsTensors],
+        discard_sampled_tokens_req_indices: list[int],
+    ) -> AsyncNPUModelRunnerOutput:
+        """Start copying the sampler output to the host without waiting for
+        the device, and keep the sampled token ids for the next step."""
+        copy_stream = self.async_output_copy_stream
+        copy_stream.wait_stream(torch.npu.current_stream())
+        with torch.npu.stream(copy_stream):
+            sampled_token_ids_cpu = sampled_token_ids.to("cpu",
+                                                         non_blocking=True)
+            logprobs_tensors_cpu = None
+            if logprobs_tensors is not None:
+                logprobs_tensors_cpu = LogprobsTensors(
+                    *(tensor.to("cpu", non_blocking=True)
+                      for tensor in logprobs_tensors))
+            copy_event = torch.npu.Event()
+            copy_event.record(copy_stream)
+
+        discarded = set(discard_sampled_tokens_req_indices)
+        # The requests keep this index through the batch updates of the next
+        # step, see `_scatter_prev_sampled_token_ids`.
+        num_reqs = self.input_batch.num_reqs
+        prev_sampled_index = self.input_batch.prev_sampled_index
+        prev_sampled_index[:num_reqs] = self.arange_np[:num_reqs]
+        prev_sampled_index[discard_sampled_tokens_req_indices] = -1
+        self.prev_sampled_token_ids = sampled_token_ids
+        self.prev_sampled_token_ids_cpu = sampled_token_ids_cpu
+        self.prev_sampled_copy_event = copy_event
+        self.prev_req_id_to_index = {
+            req_id: i
+            for i, req_id in enumerate(self.input_batch.req_ids)
+            if i not in discarded
+        }
+        return AsyncNPUModelRunnerOutput(
+            model_runner_output,
+            sampled_token_ids_cpu,
+            logprobs_tensors,
+            logprobs_tensors_cpu,
+            discard_sampled_tokens_req_indices,
+            copy_event,
+        )
+
     def execute_model(
         self,
         scheduler_output: "SchedulerOutput",
         intermediate_tensors: Optional[IntermediateTensors] = None,
-    ) -> Union[ModelRunnerOutput, torch.Tensor]:
+    ) -> Union[ModelRunnerOutput, AsyncNPUModelRunnerOutput, torch.Tensor]:
         with ProfileExecuteDuration().capture_async("prepare input"):
+            if self.use_async_scheduling:
+                self.prepare_inputs_event.synchronize()
             self._update_states(scheduler_output)
+            if self.lora_prefetcher is not None:
+                self._prefetch_loras(scheduler_output)
             if not scheduler_output.total_num_scheduled_tokens:
+                self._cache_prev_sampled_token_ids()
                 if not has_kv_transfer_group():
                     logger.debug(
                         "skip this step for we receive the data from remote disaggregate prefill node"
@@ -1435,11 +1949,16 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                     # Return empty ModelRunnerOuptut if there's no work to do.
                     return EMPTY_MODEL_RUNNER_OUTPUT
                 return self.kv_connector_no_forward(scheduler_output)
+            if self.use_aclgraph:
+                self._maybe_capture_aclgraph(
+                    scheduler_output.total_num_scheduled_tokens)
             (attn_metadata, positions, num_scheduled_tokens_np,
              num_input_tokens, num_tokens_across_dp, maybe_padded_num_tokens,
              logits_indices, spec_decode_metadata, input_ids, inputs_embeds,
              intermediate_tensors) = (self._prepare_inputs(
                  scheduler_output, intermediate_tensors))
+            if self.use_async_scheduling:
+                self.prepare_inputs_event.record()
 
         moe_comm_method = self._select_moe_comm_method(num_input_tokens)
 
@@ -1486,6 +2005,9 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         finished_sending = None
         finished_recving = None
         with ProfileExecuteDuration().capture_async("post process"):
+            # The forward pass has been launched, the host can now wait for
+            # the tokens sampled by the previous step.
+            self._cache_prev_sampled_token_ids()
             # Broadcast PP output for external_launcher (torchrun)
             # to make sure we are synced across pp ranks
             # TODO: Support overlapping mirco-batches
@@ -1550,41 +2072,59 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 )
                 bonus_token_ids = sampler_output.sampled_token_ids
 
-                # Just like `bonus_logits`, `target_logits` is a new tensor with
-                # separate storage from the original `logits` tensor. Therefore,
-                # it is safe to update `target_logits` in place.
-                target_logits = logits[
-                    spec_decode_metadata.target_logits_indices]
-                output_token_ids = self.rejection_sampler(
-                    spec_decode_metadata,
-                    None,  # draft_probs
-                    target_logits,
-                    bonus_token_ids,
-                    sampling_metadata,
-                )
+                if self.token_tree is not None:
+                    # The bonus token is sampled at the leaf of the accepted
+                    # path instead of at the last node.
+                    output_token_ids, accepted_nodes = (
+                        self.rejection_sampler.tree_forward(
+                            spec_decode_metadata,
+                            self.tree_children,
+                            self.token_tree.depth,
+                            logits,
+                            sampling_metadata,
+                        ))
+                    self._compact_tree_kv_cache(
+                        spec_decode_metadata,
+                        self.query_start_loc_np[1:self.input_batch.num_reqs +
+                                                1], accepted_nodes)
+                else:
+                    # Just like `bonus_logits`, `target_logits` is a new tensor with
+                    # separate storage from the original `logits` tensor. Therefore,
+                    # it is safe to update `target_logits` in place.
+                    target_logits = logits[
+                        spec_decode_metadata.target_logits_indices]
+                    output_token_ids = self.rejection_sampler(
+                        spec_decode_metadata,
+                        None,  # draft_probs
+                        target_logits,
+                        bonus_token_ids,
+                        sampling_metadata,
+                    )
                 sampler_output.sampled_token_ids = output_token_ids
 
-            discard_sampled_tokens_req_indices: list[int] = []
-            # TODO(woosuk): The following loop can be slow since it iterates over
-            # the requests one by one. Optimize.
-            discard_sampled_tokens_req_indices = []
-            for i, req_id in enumerate(self.input_batch.req_ids):
-                req_state = self.requests[req_id]
-                seq_len = (req_state.num_computed_tokens +
-                           scheduler_output.num_scheduled_tokens[req_id])
-                if seq_len < req_state.num_tokens:
-                    # Ignore the sampled token.
-                    # Rewind the generator state as if the token was not sampled.
-                    generator = self.input_batch.generators.get(i)
-                    if generator is not None:
-                        generator.set_offset(generator.get_offset() - 4)
-                    discard_sampled_tokens_req_indices.append(i)
-
-            # NOTE: NPU -> CPU Sync happens here.
-            # Move as many CPU operations as possible before this sync point.
+            # Ignore the tokens sampled for the partial prefills.
+            num_reqs = self.input_batch.num_reqs
+            seq_lens = (self.input_batch.num_computed_tokens_cpu[:num_reqs] +
+                        num_scheduled_tokens_np)
+            discard_sampled_tokens_req_indices: list[int] = np.flatnonzero(
+                seq_lens <
+                self.input_batch.num_tokens_no_spec[:num_reqs]).tolist()
+            for i in discard_sampled_tokens_req_indices:
+                # Rewind the generator state as if the token was not sampled.
+                generator = self.input_batch.generators.get(i)
+                if generator is not None:
+                    generator.set_offset(generator.get_offset() - 4)
+
             logprobs_tensors = sampler_output.logprobs_tensors
-            logprobs_lists = logprobs_tensors.tolists() \
-                if logprobs_tensors is not None else None
+            if self.use_async_scheduling:
+                # The logprobs are copied to the host asynchronously.
+                logprobs_lists = None
+            else:
+                # NOTE: NPU -> CPU Sync happens here.
+                # Move as many CPU operations as possible before this sync
+                # point.
+                logprobs_lists = logprobs_tensors.tolists() \
+                    if logprobs_tensors is not None else None
 
             # Compute prompt logprobs if needed.
             prompt_logprobs_dict = self._get_prompt_logprobs_dict(
@@ -1595,41 +2135,48 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             # Get the valid generated tokens.
             sampled_token_ids = sampler_output.sampled_token_ids
             max_gen_len = sampled_token_ids.shape[-1]
-            if max_gen_len == 1:
-                # No spec decode tokens.
-                valid_sampled_token_ids = sampled_token_ids.tolist()
-            else:
-                # Includes spec decode tokens.
-                valid_sampled_token_ids = self.rejection_sampler.parse_output(
-                    sampled_token_ids,
-                    self.input_batch.vocab_size,
-                )
-
-            for i in discard_sampled_tokens_req_indices:
-                valid_sampled_token_ids[i].clear()
-            # Cache the sampled tokens in the model runner, so that the schedulerAdd commentMore actions
-            # doesn't need to send them back.
-            # NOTE(woosuk): As an exception, when using PP, the scheduler sends
-            # the sampled tokens back, because there's no direct communication
-            # between the first-stage worker and the last-stage worker.
-            for req_idx, sampled_ids in enumerate(valid_sampled_token_ids):
-                if not sampled_ids:
-                    continue
-
-                start_idx = self.input_batch.num_tokens_no_spec[req_idx]
-                end_idx = start_idx + len(sampled_ids)
-                assert end_idx <= self.model_config.max_model_len, (
+            if not self.use_async_scheduling:
+                # NOTE: NPU -> CPU Sync happens here.
+                sampled_token_ids_np = sampled_token_ids.cpu().numpy()
+                if max_gen_len == 1:
+                    # No spec decode tokens.
+                    valid_sampled_token_ids = sampled_token_ids_np.tolist()
+                    num_sampled_tokens = np.ones(num_reqs, dtype=np.int32)
+                else:
+                    # Includes spec decode tokens.
+                    valid_sampled_token_ids, num_sampled_tokens = \
+                        self._parse_spec_decode_output(sampled_token_ids_np)
+
+                for i in discard_sampled_tokens_req_indices:
+                    valid_sampled_token_ids[i].clear()
+                num_sampled_tokens[discard_sampled_tokens_req_indices] = 0
+
+                # Cache the sampled tokens in the model runner, so that the
+                # scheduler doesn't need to send them back.
+                # NOTE(woosuk): As an exception, when using PP, the scheduler
+                # sends the sampled tokens back, because there's no direct
+                # communication between the first-stage worker and the
+                # last-stage worker.
+                end_indices = (self.input_batch.num_tokens_no_spec[:num_reqs] +
+                               num_sampled_tokens)
+                max_end_index = int(end_indices.max(initial=0))
+                assert max_end_index <= self.model_config.max_model_len, (
                     "Sampled token IDs exceed the max model length. "
-                    f"Total number of tokens: {end_idx} > max_model_len: "
-                    f"{self.model_config.max_model_len}")
-
-                self.input_batch.token_ids_cpu[req_idx,
-                                               start_idx:end_idx] = sampled_ids
-                self.input_batch.num_tokens_no_spec[req_idx] = end_idx
-                self.input_batch.num_tokens[req_idx] = end_idx
-                req_id = self.input_batch.req_ids[req_idx]
-                req_state = self.requests[req_id]
-                req_state.output_token_ids.extend(sampled_ids)
+                    f"Total number of tokens: {max_end_index} > "
+                    f"max_model_len: {self.model_config.max_model_len}")
+                self.input_batch.append_token_ids(sampled_token_ids_np,
+                                                  num_sampled_tokens)
+                # The output token ids of the persistent batch are the lists
+                # of the request states.
+                req_output_token_ids = self.input_batch.req_output_token_ids
+                for req_idx in np.flatnonzero(num_sampled_tokens).tolist():
+                    output_token_ids = req_output_token_ids[req_idx]
+                    assert output_token_ids is not None
+                    output_token_ids.extend(valid_sampled_token_ids[req_idx])
+            else:
+                # The sampled tokens are filled in by the async output, and
+                # cached in the persistent batch during the next step.
+                valid_sampled_token_ids = []
 
             if self.speculative_config:
                 self._draft_token_ids = self.propose_draft_token_ids(
@@ -1658,6 +2205,15 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             pooler_output=[],
             **extra_args,
         )
+        async_output = None
+        if self.use_async_scheduling:
+            # The persistent batch changes before the output is sent.
+            model_runner_output.req_ids = list(model_runner_output.req_ids)
+            model_runner_output.req_id_to_index = dict(
+                model_runner_output.req_id_to_index)
+            async_output = self._copy_sampler_output_async(
+                model_runner_output, sampled_token_ids, logprobs_tensors,
+                discard_sampled_tokens_req_indices)
 
         durations = ProfileExecuteDuration().pop_captured_sync()
         if durations:
@@ -1669,6 +2225,8 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             logger.info("Profile execute duration [%s]:%s", captured_name,
                         " ".join(dr_str))
 
+        if async_output is not None:
+            return async_output
         return model_runner_output
 
     def take_draft_token_ids(self) -> Optional[DraftTokenIds]:
@@ -2039,9 +2597,35 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                                                   self.scheduler_config,
                                                   self.lora_config,
                                                   self.device)
+                if getattr(self.scheduler_config, "lora_prefetch_depth",
+                           0) > 0:
+                    self.lora_prefetcher = LoRAAdapterPrefetcher(
+                        self.lora_manager.load_adapter_from_disk,
+                        max_num_prefetched=self.lora_config.max_cpu_loras)
+                    # Read by the `WorkerLoRAManager._load_adapter` patch.
+                    self.lora_manager.adapter_prefetcher = \
+                        self.lora_prefetcher
         logger.info("Loading model weights took %.4f GB",
                     m.consumed_memory / float(2**30))
 
+        if self.dynamic_eplb:
+            ascend_config = get_ascend_config()
+            self.eplb_updator = EplbUpdator(
+                self.model, ascend_config.num_iterations_eplb_update,
+                ascend_config.num_wait_worker_iterations)
+
+    def _prefetch_loras(self, scheduler_output: "SchedulerOutput") -> None:
+        """Start loading the adapters of the waiting requests which are not
+        in the host memory cache of the LoRA manager yet."""
+        assert self.lora_prefetcher is not None
+        if not isinstance(scheduler_output, AscendSchedulerOutput) or \
+                not scheduler_output.prefetch_lora_requests:
+            return
+        loaded_lora_ids = self.lora_manager.list_adapters()
+        for lora_request in scheduler_output.prefetch_lora_requests:
+            if lora_request.lora_int_id not in loaded_lora_ids:
+                self.lora_prefetcher.prefetch(lora_request)
+
     def _convert_torch_format(self, tensor):
         tensor = torch_npu.npu_format_cast(tensor, ACL_FORMAT)
         return tensor
@@ -2272,37 +2856,60 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                             aclgraph_runtime_mode=aclgraph_runtime_mode,
                             uniform_decode=uniform_decode)
 
-    def _capture_model(self):
-        if not self.use_aclgraph:
-            logger.warning(
-                "Skipping ACL graph capture. To turn on ACL graph capture, "
-                "ensure `aclraph_mode` was not manually set to `NONE`")
+    def _maybe_capture_aclgraph(self, num_tokens: int) -> None:
+        """Record the number of tokens of the step and, with lazy capture,
+        capture the graph of its padded size if it is the first use.
+
+        This runs dummy steps and must be called before the inputs of the
+        step are prepared.
+        """
+        if num_tokens > self.aclgraph_batch_sizes[-1]:
             return
-        else:
-            self.initialize_aclgraph_capture()
+        if self.capture_plan_recorder is not None:
+            self.capture_plan_recorder.record(num_tokens)
+        if not self.aclgraph_lazy_capture:
+            return
+        num_input_tokens = self.vllm_config.pad_for_cudagraph(num_tokens)
+        if num_input_tokens in self.captured_aclgraph_sizes:
+            return
+        logger.info("Capturing the ACL graph of size %d on first use",
+                    num_input_tokens)
+        self._capture_aclgraph_sizes([num_input_tokens])
 
+    def _capture_aclgraph_sizes(self, sizes: list[int]) -> None:
         set_cudagraph_capturing_enabled(True)
-        # Trigger ACL graph capture for specific shapes.
-        # Capture the large shapes first so that the smaller shapes
-        # can reuse the memory pool allocated for the large shapes.
         with graph_capture(device=self.device):
             aclgraph_mode = self.compilation_config.cudagraph_mode
             if aclgraph_mode.mixed_mode() != CUDAGraphMode.NONE:
                 aclgraph_runtime_mode = aclgraph_mode.mixed_mode()
 
-                compilation_cases = list(reversed(self.aclgraph_batch_sizes))
                 self._capture_aclgraphs(
-                    compilation_cases,
+                    sizes,
                     aclgraph_runtime_mode=aclgraph_runtime_mode,
                     uniform_decode=False)
-
-        # Disable aclgraph capturing globally, so any unexpected aclgraph
-        # capturing will be detected and raise an error after here.
-        # Note: We don't put it into graph_capture context manager because
-        # we may doing lazy capturing in future that still allows capturing
-        # after here.
+                self.captured_aclgraph_sizes.update(sizes)
         set_cudagraph_capturing_enabled(False)
 
+    def _capture_model(self):
+        if not self.use_aclgraph:
+            logger.warning(
+                "Skipping ACL graph capture. To turn on ACL graph capture, "
+                "ensure `aclraph_mode` was not manually set to `NONE`")
+            return
+        else:
+            self.initialize_aclgraph_capture()
+
+        # Trigger ACL graph capture for specific shapes.
+        # Capture the large shapes first so that the smaller shapes
+        # can reuse the memory pool allocated for the large shapes. With lazy
+        # capture, the other shapes are captured on their first use.
+        compilation_cases = list(reversed(self.aclgraph_batch_sizes))
+        if self.aclgraph_lazy_capture:
+            compilation_cases = compilation_cases[:1]
+        # Aclgraph capturing is disabled globally after capturing, so any
+        # unexpected aclgraph capturing will be detected and raise an error.
+        self._capture_aclgraph_sizes(compilation_cases)
+
     def capture_model(self) -> None:
 
         compilation_counter.num_gpu_runner_capture_triggers += 1
@@ -2320,6 +2927,73 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         logger.info("Graph capturing finished in %.0f secs, took %.2f GiB",
                     elapsed_time, npu_graph_size / (1 << 30))
 
+    def _compute_prompt_logprobs(
+        self,
+        hidden_states: torch.Tensor,
+        req_indices: list[int],
+        start_toks: list[int],
+        chunks: list[tuple[LogprobsTensors, int, int, int]],
+    ) -> None:
+        """Compute the prompt logprobs of several requests in one pass.
+
+        Request `req_indices[i]` gets the logprobs of its prompt tokens from
+        `start_toks[i]` on. `chunks[i]` holds its CPU LogprobsTensors, the
+        index of its first logprob, its number of logprobs and its number of
+        prompt logprobs.
+        """
+        req_indices_np = np.array(req_indices, dtype=np.int64)
+        num_logits = np.array([chunk[2] for chunk in chunks], dtype=np.int64)
+        token_offsets = np.arange(num_logits.sum()) - np.repeat(
+            np.cumsum(num_logits) - num_logits, num_logits)
+
+        # Get the logits corresponding to the prompt tokens. If this is a
+        # partial request (i.e. chunked prefill), then there is prompt logprob
+        # generated for each index.
+        logits_indices = np.repeat(self.query_start_loc_np[req_indices_np],
+                                   num_logits) + token_offsets
+        # Get the "target" tokens for each index. For prompt at index i, the
+        # token at prompt index i+1 is the "sampled" token we want to gather
+        # the logprob for. The prompts are in the persistent batch already.
+        tgt_token_ids = self.input_batch.token_ids_cpu[
+            np.repeat(self.input_batch.token_rows[req_indices_np], num_logits),
+            np.repeat(start_toks, num_logits) + token_offsets]
+
+        logits_indices_npu = torch.from_numpy(logits_indices).to(
+            self.device, non_blocking=True)
+        tgt_token_ids_npu = torch.from_numpy(
+            tgt_token_ids.astype(np.int64)).to(self.device, non_blocking=True)
+        logits = self.model.compute_logits(hidden_states[logits_indices_npu],
+                                           None)
+
+        # Compute prompt logprobs. The top logprobs are sorted, the requests
+        # asking for fewer of them take the first columns.
+        max_num_prompt_logprobs = max(chunk[3] for chunk in chunks)
+        logprobs = self.sampler.compute_logprobs(logits)
+        token_ids, logprobs, ranks = self.sampler.gather_logprobs(
+            logprobs, max_num_prompt_logprobs, tgt_token_ids_npu)
+
+        # Transfer NPU->CPU once for all the requests.
+        token_ids = token_ids.to("cpu", non_blocking=True)
+        logprobs = logprobs.to("cpu", non_blocking=True)
+        ranks = ranks.to("cpu", non_blocking=True)
+        copy_event = torch.npu.Event()
+        copy_event.record()
+        copy_event.synchronize()
+
+        cu_num_logits = 0
+        for logprobs_tensors, start_idx, num_logits_req, num_prompt_logprobs \
+                in chunks:
+            rows = slice(cu_num_logits, cu_num_logits + num_logits_req)
+            columns = slice(0, num_prompt_logprobs + 1)
+            chunk_slice = slice(start_idx, start_idx + num_logits_req)
+            logprobs_tensors.logprob_token_ids[chunk_slice].copy_(
+                token_ids[rows, columns])
+            logprobs_tensors.logprobs[chunk_slice].copy_(logprobs[rows,
+                                                                  columns])
+            logprobs_tensors.selected_token_ranks[chunk_slice].copy_(
+                ranks[rows])
+            cu_num_logits += num_logits_req
+
     def _get_prompt_logprobs_dict(
         self,
         hidden_states: torch.Tensor,
@@ -2332,9 +3006,12 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         in_progress_dict = self.input_batch.in_progress_prompt_logprobs_cpu
         prompt_logprobs_dict: dict[str, Optional[LogprobsTensors]] = {}
 
-        # Since prompt logprobs are a rare feature, prioritize simple,
-        # maintainable loop over optimal performance.
+        # The prompt logprobs of all the requests are computed at once, only
+        # the bookkeeping is done per request.
         completed_prefill_reqs = []
+        req_indices: list[int] = []
+        start_toks: list[int] = []
+        chunks: list[tuple[LogprobsTensors, int, int, int]] = []
         for req_id, num_prompt_logprobs in num_prompt_logprobs_dict.items():
 
             num_tokens = scheduler_output.num_scheduled_tokens[req_id]
@@ -2342,8 +3019,6 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             # Get metadata for this request.
             request = self.requests[req_id]
             num_prompt_tokens = len(request.prompt_token_ids)
-            prompt_token_ids = torch.tensor(request.prompt_token_ids).to(
-                self.device, non_blocking=True)
 
             # Set up target LogprobsTensors object.
             logprobs_tensors = in_progress_dict.get(req_id)
@@ -2376,32 +3051,14 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 # step. There are no more prompt logprobs to produce.
                 continue
 
-            # Get the logits corresponding to this req's prompt tokens.
-            # If this is a partial request (i.e. chunked prefill),
-            # then there is prompt logprob generated for each index.
-            req_idx = self.input_batch.req_id_to_index[req_id]
-            offset = self.query_start_loc_np[req_idx].item()
-            prompt_hidden_states = hidden_states[offset:offset + num_logits]
-            logits = self.model.compute_logits(prompt_hidden_states, None)
-
-            # Get the "target" tokens for each index. For prompt at index i,
-            # the token at prompt index i+1 is the "sampled" token we want
-            # to gather the logprob for.
-            tgt_token_ids = prompt_token_ids[start_tok:start_tok + num_logits]
-
-            # Compute prompt logprobs.
-            logprobs = self.sampler.compute_logprobs(logits)
-            token_ids, logprobs, ranks = self.sampler.gather_logprobs(
-                logprobs, num_prompt_logprobs, tgt_token_ids)
-
-            # Transfer NPU->CPU async.
-            chunk_slice = slice(start_idx, start_idx + num_logits)
-            logprobs_tensors.logprob_token_ids[chunk_slice].copy_(
-                token_ids, non_blocking=True)
-            logprobs_tensors.logprobs[chunk_slice].copy_(logprobs,
-                                                         non_blocking=True)
-            logprobs_tensors.selected_token_ranks[chunk_slice].copy_(
-                ranks, non_blocking=True)
+            req_indices.append(self.input_batch.req_id_to_index[req_id])
+            start_toks.append(start_tok)
+            chunks.append((logprobs_tensors, start_idx, num_logits,
+                           num_prompt_logprobs))
+
+        if chunks:
+            self._compute_prompt_logprobs(hidden_states, req_indices,
+                                          start_toks, chunks)
 
         # Remove requests that have completed prefill from the batch
         # num_prompt_logprobs_dict.
@@ -2409,10 +3066,6 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             del num_prompt_logprobs_dict[req_id]
             del in_progress_dict[req_id]
 
-        # Must synchronize the non-blocking NPU->CPU transfers.
-        if prompt_logprobs_dict:
-            torch.npu.synchronize()
-
         return prompt_logprobs_dict
 
     def get_supported_pooling_tasks(self):
@@ -120,6 +120,10 @@ class InputBatch:
             pin_memory=False,
         )
         self.token_ids_cpu = self.token_ids_cpu_tensor.numpy()
+        # The token ids of request i are in row token_rows[i] of
+        # token_ids_cpu. Moving requests permutes the rows instead of copying
+        # the token ids.
+        self.token_rows = np.arange(max_num_reqs, dtype=np.int64)
         self.num_tokens = np.zeros(max_num_reqs, dtype=np.int32)
         self.num_tokens_no_spec = np.zeros(max_num_reqs, dtype=np.int32)
         self.num_prompt_tokens = np.zeros(max_num_reqs, dtype=np.int32)
@@ -131,6 +135,9 @@ class InputBatch:
         )
         self.num_computed_tokens_cpu = \
             self.num_computed_tokens_cpu_tensor.numpy()
+        # With async scheduling, the index of the request in the batch of the
+        # previous step if that step sampled a token for it, otherwise -1.
+        self.prev_sampled_index = np.full(max_num_reqs, -1, dtype=np.int64)
 
         # Block table.
         self.block_table = MultiGroupBlockTable(
@@ -263,6 +270,23 @@ class InputBatch:
 
         self.pooling_params: dict[str, PoolingParams] = {}
 
+        # The arrays of the per request states, indexed by request index,
+        # moved with a single gather each by condense() and swap_states().
+        self._request_state_arrays = (
+            "num_tokens",
+            "num_tokens_no_spec",
+            "num_prompt_tokens",
+            "num_computed_tokens_cpu",
+            "temperature_cpu",
+            "top_p_cpu",
+            "top_k_cpu",
+            "frequency_penalties_cpu",
+            "presence_penalties_cpu",
+            "repetition_penalties_cpu",
+            "request_lora_mapping",
+            "prev_sampled_index",
+        )
+
     @property
     def req_ids(self) -> list[str]:
         # None elements should only be present transiently
@@ -312,12 +336,11 @@ class InputBatch:
         # Copy the prompt token ids and output token ids.
         num_prompt_tokens = len(request.prompt_token_ids)
         self.num_prompt_tokens[req_index] = num_prompt_tokens
-        self.token_ids_cpu[
-            req_index, :num_prompt_tokens] = request.prompt_token_ids
+        token_ids = self.token_ids_row(req_index)
+        token_ids[:num_prompt_tokens] = request.prompt_token_ids
         start_idx = num_prompt_tokens
         end_idx = start_idx + len(request.output_token_ids)
-        self.token_ids_cpu[req_index,
-                           start_idx:end_idx] = request.output_token_ids
+        token_ids[start_idx:end_idx] = request.output_token_ids
         # Number of token ids in token_ids_cpu.
         # NOTE(woosuk): This may include spec decode tokens.
         self.num_tokens[req_index] = request.num_tokens
@@ -325,6 +348,7 @@ class InputBatch:
         self.num_tokens_no_spec[req_index] = request.num_tokens
 
         self.num_computed_tokens_cpu[req_index] = request.num_computed_tokens
+        self.prev_sampled_index[req_index] = -1
         self.block_table.add_row(request.block_ids, req_index)
 
         if sampling_params := request.sampling_params:
@@ -483,47 +507,19 @@ class InputBatch:
         assert old_id_i1 is not None and old_id_i2 is not None
         self.req_id_to_index[old_id_i1], self.req_id_to_index[old_id_i2] =\
             self.req_id_to_index[old_id_i2], self.req_id_to_index[old_id_i1]
-        self.num_tokens[i1], self.num_tokens[i2] =\
-            self.num_tokens[i2], self.num_tokens[i1]
-        self.num_tokens_no_spec[i1], self.num_tokens_no_spec[i2] =\
-            self.num_tokens_no_spec[i2], self.num_tokens_no_spec[i1]
-        self.num_prompt_tokens[i1], self.num_prompt_tokens[i2] =\
-            self.num_prompt_tokens[i2], self.num_prompt_tokens[i1]
-        self.num_computed_tokens_cpu[i1], self.num_computed_tokens_cpu[i2] =\
-            self.num_computed_tokens_cpu[i2], self.num_computed_tokens_cpu[i1]
-        self.temperature_cpu[i1], self.temperature_cpu[i2] =\
-            self.temperature_cpu[i2], self.temperature_cpu[i1]
-        self.top_p_cpu[i1], self.top_p_cpu[i2] =\
-            self.top_p_cpu[i2], self.top_p_cpu[i1]
-        self.top_k_cpu[i1], self.top_k_cpu[i2] =\
-            self.top_k_cpu[i2], self.top_k_cpu[i1]
-        self.frequency_penalties_cpu[i1], self.frequency_penalties_cpu[i2] =\
-            self.frequency_penalties_cpu[i2], self.frequency_penalties_cpu[i1]
-        self.presence_penalties_cpu[i1], self.presence_penalties_cpu[i2] =\
-            self.presence_penalties_cpu[i2], self.presence_penalties_cpu[i1]
-        self.repetition_penalties_cpu[i1], self.repetition_penalties_cpu[i2] =\
-            self.repetition_penalties_cpu[i2], self.repetition_penalties_cpu[i1]
-
-        # NOTE: the following is unsafe
-        # self.token_ids_cpu[i1, ...], self.token_ids_cpu[i2, ...], =\
-        #     self.token_ids_cpu[i2, ...], self.token_ids_cpu[i1, ...]
-        # instead, we need to temporiarily copy the data for one of the indices
-        # TODO(lucas): optimize this by only copying valid indices
-        tmp = self.token_ids_cpu[i1, ...].copy()
-        self.token_ids_cpu[i1, ...] = self.token_ids_cpu[i2, ...]
-        self.token_ids_cpu[i2, ...] = tmp
+        swapped = [i1, i2]
+        for name in self._request_state_arrays:
+            array = getattr(self, name)
+            array[swapped] = array[[i2, i1]]
+        # The token ids stay in place, only their rows are swapped.
+        self.token_rows[swapped] = self.token_rows[[i2, i1]]
 
         swap_dict_values(self.generators, i1, i2)
         swap_dict_values(self.bad_words_token_ids, i1, i2)
 
-        self.request_lora_mapping[i1], self.request_lora_mapping[i2] =\
-            self.request_lora_mapping[i2], self.request_lora_mapping[i1]
-
         if self.allowed_token_ids_mask_cpu_tensor is not None:
-            self.allowed_token_ids_mask_cpu_tensor[i1], \
-                self.allowed_token_ids_mask_cpu_tensor[i2] =\
-                self.allowed_token_ids_mask_cpu_tensor[i2], \
-                    self.allowed_token_ids_mask_cpu_tensor[i1]
+            self.allowed_token_ids_mask_cpu_tensor[swapped] = \
+                self.allowed_token_ids_mask_cpu_tensor[[i2, i1]]
         self.block_table.swap_row(i1, i2)
 
     def condense(self) -> None:
@@ -559,6 +555,10 @@ class InputBatch:
 
         # NOTE(woosuk): This function assumes that the empty_req_indices
         # is sorted in descending order.
+        # The moves are collected first and the per request arrays are then
+        # moved at once.
+        src_indices: list[int] = []
+        dst_indices: list[int] = []
         last_req_index = num_reqs + len(empty_req_indices) - 1
         while empty_req_indices:
             # Find the largest non-empty index.
@@ -588,52 +588,77 @@ class InputBatch:
             self.req_output_token_ids[last_req_index] = None
             self.req_id_to_index[req_id] = empty_index
 
-            num_tokens = self.num_tokens[last_req_index]
-            self.token_ids_cpu[empty_index, :num_tokens] = self.token_ids_cpu[
-                last_req_index, :num_tokens]
-            self.num_tokens[empty_index] = num_tokens
-            self.num_tokens_no_spec[empty_index] = self.num_tokens_no_spec[
-                last_req_index]
-            self.num_prompt_tokens[empty_index] = self.num_prompt_tokens[
-                last_req_index]
-            self.num_computed_tokens_cpu[
-                empty_index] = self.num_computed_tokens_cpu[last_req_index]
             self.block_table.move_row(last_req_index, empty_index)
-            self.temperature_cpu[empty_index] = self.temperature_cpu[
-                last_req_index]
-            self.top_p_cpu[empty_index] = self.top_p_cpu[last_req_index]
-            self.top_k_cpu[empty_index] = self.top_k_cpu[last_req_index]
-            self.frequency_penalties_cpu[
-                empty_index] = self.frequency_penalties_cpu[last_req_index]
-            self.presence_penalties_cpu[
-                empty_index] = self.presence_penalties_cpu[last_req_index]
-            self.repetition_penalties_cpu[
-                empty_index] = self.repetition_penalties_cpu[last_req_index]
             generator = self.generators.pop(last_req_index, None)
             if generator is not None:
                 self.generators[empty_index] = generator
 
-            self.request_lora_mapping[empty_index] = self.request_lora_mapping[
-                last_req_index]
-
-            # TODO convert these to LogitsProcessors
-            if self.allowed_token_ids_mask_cpu_tensor is not None:
-                self.allowed_token_ids_mask_cpu_tensor[
-                    empty_index] = self.allowed_token_ids_mask_cpu_tensor[
-                        last_req_index]
-
             bad_words_token_ids = self.bad_words_token_ids.pop(
                 last_req_index, None)
             if bad_words_token_ids is not None:
                 self.bad_words_token_ids[empty_index] = bad_words_token_ids
 
+            src_indices.append(last_req_index)
+            dst_indices.append(empty_index)
             # Decrement last_req_index since it is now empty.
             last_req_index -= 1
 
+        if src_indices:
+            self._move_request_states(np.array(src_indices),
+                                      np.array(dst_indices))
+
         # Trim lists to the batch size.
         del self._req_ids[num_reqs:]
         del self.req_output_token_ids[num_reqs:]
 
+    def _move_request_states(self, src_indices: np.ndarray,
+                             dst_indices: np.ndarray) -> None:
+        """Move the per request arrays from `src_indices` to the empty
+        `dst_indices`, one gather per array."""
+        for name in self._request_state_arrays:
+            array = getattr(self, name)
+            array[dst_indices] = array[src_indices]
+        # The rows of the token ids of the moved requests and of the removed
+        # requests are exchanged, no token id is copied.
+        self.token_rows[np.concatenate((dst_indices, src_indices))] = \
+            self.token_rows[np.concatenate((src_indices, dst_indices))]
+
+        # TODO convert these to LogitsProcessors
+        if self.allowed_token_ids_mask_cpu_tensor is not None:
+            self.allowed_token_ids_mask_cpu_tensor[torch.from_numpy(
+                dst_indices)] = self.allowed_token_ids_mask_cpu_tensor[
+                    torch.from_numpy(src_indices)]
+
+    def token_ids_row(self, req_index: int) -> np.ndarray:
+        """The token ids of the request at `req_index`, a view of its row of
+        token_ids_cpu."""
+        return self.token_ids_cpu[self.token_rows[req_index]]
+
+    def append_token_ids(self, token_ids: np.ndarray,
+                         num_new_tokens: np.ndarray) -> None:
+        """Append the sampled tokens of the first requests of the batch.
+
+        Args:
+            token_ids: [num_reqs, max_num_new_tokens] the first
+                `num_new_tokens[i]` tokens of row i are appended to request i.
+            num_new_tokens: [num_reqs] 0 for the requests without new tokens.
+        """
+        num_reqs = len(num_new_tokens)
+        req_indices = np.repeat(np.arange(num_reqs), num_new_tokens)
+        token_offsets = np.arange(len(req_indices)) - np.repeat(
+            np.cumsum(num_new_tokens) - num_new_tokens, num_new_tokens)
+        start_indices = self.num_tokens_no_spec[:num_reqs]
+        self.token_ids_cpu[self.token_rows[req_indices],
+                           start_indices[req_indices] +
+                           token_offsets] = token_ids[req_indices,
+                                                      token_offsets]
+
+        has_new_tokens = num_new_tokens > 0
+        self.num_tokens_no_spec[:num_reqs] += num_new_tokens
+        self.num_tokens[:num_reqs] = np.where(
+            has_new_tokens, self.num_tokens_no_spec[:num_reqs],
+            self.num_tokens[:num_reqs])
+
     def refresh_metadata(self):
         """Apply any batch updates to sampling metadata."""
 
@@ -740,8 +765,8 @@ class InputBatch:
             pin_memory=self.pin_memory,
         )
         prompt_token_ids = prompt_token_ids_cpu_tensor.numpy()
-        prompt_token_ids[:] = self.token_ids_cpu[:self.
-                                                 num_reqs, :max_prompt_len]
+        prompt_token_ids[:] = self.token_ids_cpu[
+            self.token_rows[:self.num_reqs], :max_prompt_len]
         # Use the value of vocab_size as a pad since we don't have a
         # token_id of this value.
         for i in range(self.num_reqs):
@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Cache of the memory profiled at startup, see
+# `NPUWorker.determine_available_memory`.
+#
+import json
+import os
+from dataclasses import asdict, dataclass
+from importlib.metadata import PackageNotFoundError, version
+from typing import Optional
+
+import torch
+import torch_npu
+import vllm
+from vllm.config import VllmConfig
+from vllm.logger import logger
+
+
+@dataclass
+class ProfileResult:
+    """The memory profiled by `NPUModelRunner.profile_run`."""
+    # Peak device memory of the profiling run, in bytes.
+    peak_memory: int
+    # Device memory allocated by torch before the profiling run, i.e. the
+    # model weights.
+    model_memory: int
+    # Duration of the profiling run.
+    profile_seconds: float
+
+
+def _package_version(name: str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def profile_cache_key(vllm_config: VllmConfig, rank: int) -> dict[str, str]:
+    """Everything the profiled memory of `rank` depends on. A cached result
+    is only used with the same key."""
+    model_config = vllm_config.model_config
+    parallel_config = vllm_config.parallel_config
+    scheduler_config = vllm_config.scheduler_config
+    lora_config = vllm_config.lora_config
+    speculative_config = vllm_config.speculative_config
+    return {
+        "model": str(model_config.model),
+        "revision": str(model_config.revision),
+        "dtype": str(model_config.dtype),
+        "quantization": str(model_config.quantization),
+        "max_model_len": str(model_config.max_model_len),
+        "enforce_eager": str(model_config.enforce_eager),
+        "parallel": (f"tp{parallel_config.tensor_parallel_size}"
+                     f"_pp{parallel_config.pipeline_parallel_size}"
+                     f"_dp{parallel_config.data_parallel_size}"
+                     f"_ep{parallel_config.enable_expert_parallel}"),
+        "rank": str(rank),
+        "max_num_batched_tokens": str(scheduler_config.max_num_batched_tokens),
+        "max_num_seqs": str(scheduler_config.max_num_seqs),
+        "compilation_level": str(vllm_config.compilation_config.level),
+        "lora": ("None" if lora_config is None else
+                 f"{lora_config.max_loras}_{lora_config.max_lora_rank}"),
+        "speculative":
+        ("None" if speculative_config is None else
+         f"{speculative_config.method}"
+         f"_{speculative_config.num_speculative_tokens}"),
+        "additional_config":
+        json.dumps(vllm_config.additional_config or {},
+                   sort_keys=True,
+                   default=str),
+        "versions": (f"vllm={vllm.__version__}"
+                     f",vllm_ascend={_package_version('vllm_ascend')}"
+                     f",torch={torch.__version__}"
+                     f",torch_npu={torch_npu.__version__}"),
+    }
+
+
+def load_profile_result(path: str,
+                        key: dict[str, str]) -> Optional[ProfileResult]:
+    """Return the profile result cached in `path` if it was profiled with the
+    same key."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if cached["key"] != key:
+            changed = sorted(k for k in key if cached["key"].get(k) != key[k])
+            logger.info(
+                "Ignoring the cached memory profile %s, changed keys: %s",
+                path, changed)
+            return None
+        return ProfileResult(peak_memory=int(cached["peak_memory"]),
+                             model_memory=int(cached["model_memory"]),
+                             profile_seconds=float(cached["profile_seconds"]))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        logger.warning("Ignoring the invalid memory profile %s", path)
+        return None
+
+
+def save_profile_result(path: str, key: dict[str, str],
+                        result: ProfileResult) -> None:
+    """Cache the profile result of `key` in `path`, replacing the result of
+    any other key."""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": key, **asdict(result)}, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Failed to save the memory profile to %s",
+                       path,
+                       exc_info=True)
@@ -18,9 +18,12 @@
 #
 
 import copy
-from typing import Optional
+import os
+import time
+from typing import Optional, Union
 
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch_npu
 import vllm.envs as envs_vllm
@@ -30,7 +33,8 @@ from vllm.distributed import (ensure_model_parallel_initialized,
                               init_distributed_environment)
 from vllm.distributed.kv_transfer import (ensure_kv_transfer_initialized,
                                           has_kv_transfer_group)
-from vllm.distributed.parallel_state import get_pp_group, get_tp_group
+from vllm.distributed.parallel_state import (get_pp_group, get_tp_group,
+                                             get_world_group)
 from vllm.logger import logger
 from vllm.lora.request import LoRARequest
 from vllm.sequence import IntermediateTensors
@@ -49,7 +53,12 @@ from vllm_ascend.platform import NPUPlatform
 from vllm_ascend.utils import (init_ascend_soc_version,
                                register_ascend_customop, sleep_mode_enabled,
                                try_register_lib)
-from vllm_ascend.worker.model_runner_v1 import NPUModelRunner
+from vllm_ascend.worker.model_runner_v1 import (AsyncNPUModelRunnerOutput,
+                                                 NPUModelRunner)
+from vllm_ascend.worker.profile_cache import (ProfileResult,
+                                              load_profile_result,
+                                              profile_cache_key,
+                                              save_profile_result)
 
 
 class NPUWorker(WorkerBase):
@@ -73,8 +82,9 @@ class NPUWorker(WorkerBase):
         _register_atb_extensions()
         register_ascend_customop()
         # init ascend config and soc version
-        init_ascend_config(vllm_config)
+        ascend_config = init_ascend_config(vllm_config)
         init_ascend_soc_version()
+        self.profile_cache_dir = ascend_config.profile_cache_dir
 
         super().__init__(vllm_config=vllm_config,
                          local_rank=local_rank,
@@ -100,14 +110,17 @@ class NPUWorker(WorkerBase):
 
         self.profiler = self._init_profiler()
 
-    def sleep(self, level: int = 1) -> None:
+    def sleep(self,
+              level: int = 1,
+              unchanged_tags: Optional[list[str]] = None) -> None:
         if not sleep_mode_enabled():
             raise ValueError(
                 "Sleep mode is not enabled. Please compile vllm-ascend with COMPILE_CUSTOM_KERNELS=1."
             )
         free_bytes_before_sleep = NPUPlatform.mem_get_info()[0]
         allocator = CaMemAllocator.get_instance()
-        allocator.sleep(offload_tags=("weights", ) if level == 1 else tuple())
+        allocator.sleep(offload_tags=("weights", ) if level == 1 else tuple(),
+                        unchanged_tags=unchanged_tags)
         free_bytes_after_sleep, total = NPUPlatform.mem_get_info()
         freed_bytes = free_bytes_after_sleep - free_bytes_before_sleep
         used_bytes = total - free_bytes_after_sleep
@@ -151,9 +164,50 @@ class NPUWorker(WorkerBase):
         # cache blocks that can be allocated with the remaining free memory.
         NPUPlatform.clear_npu_memory()
 
+        _, total_npu_memory = NPUPlatform.mem_get_info()
+        peak_memory = self._profile_peak_memory()
+        available_kv_cache_memory = int(
+            total_npu_memory * self.cache_config.gpu_memory_utilization -
+            peak_memory)
+        available_kv_cache_memory = int(max(available_kv_cache_memory, 0))
+        logger.info(
+            f"Available memory: {available_kv_cache_memory}, total memory: {total_npu_memory}"
+        )
+        return available_kv_cache_memory
+
+    def _profile_peak_memory(self) -> int:
+        """Return the peak memory of a forward pass with dummy inputs, cached
+        in `profile_cache_dir` across the restarts with the same model,
+        configuration and versions."""
+        cache_path = None
+        if self.profile_cache_dir is not None:
+            cache_path = os.path.join(self.profile_cache_dir,
+                                      f"memory_profile_rank{self.rank}.json")
+            cache_key = profile_cache_key(self.vllm_config, self.rank)
+            model_memory = torch_npu.npu.memory_stats(
+            )["allocated_bytes.all.current"]
+            cached = load_profile_result(cache_path, cache_key)
+            # The weights are already loaded, a different size means that the
+            # model changed in a way the key misses.
+            if cached is not None and cached.model_memory != model_memory:
+                cached = None
+            # The profiling run has collectives, skip it only if all the
+            # ranks have their profile.
+            has_profile = torch.tensor([cached is not None],
+                                       dtype=torch.int32)
+            dist.all_reduce(has_profile,
+                            op=dist.ReduceOp.MIN,
+                            group=get_world_group().cpu_group)
+            if cached is not None and has_profile.item():
+                logger.info(
+                    "Using the cached memory profile %s, skipping the "
+                    "profiling run saves %.2f seconds", cache_path,
+                    cached.profile_seconds)
+                return cached.peak_memory
+
         # Execute a forward pass with dummy inputs to profile the memory usage
         # of the model.
-        _, total_npu_memory = NPUPlatform.mem_get_info()
+        start_time = time.perf_counter()
         self.model_runner.profile_run()
 
         # Calculate the number of blocks that can be allocated with the
@@ -179,19 +233,19 @@ class NPUWorker(WorkerBase):
         non_torch_allocations = total_allocated_bytes - torch_allocated_bytes
         if non_torch_allocations > 0:
             peak_memory += non_torch_allocations
-        available_kv_cache_memory = int(
-            total_npu_memory * self.cache_config.gpu_memory_utilization -
-            peak_memory)
-        available_kv_cache_memory = int(max(available_kv_cache_memory, 0))
-        logger.info(
-            f"Available memory: {available_kv_cache_memory}, total memory: {total_npu_memory}"
-        )
-        return available_kv_cache_memory
+        if cache_path is not None:
+            save_profile_result(
+                cache_path, cache_key,
+                ProfileResult(peak_memory=peak_memory,
+                              model_memory=model_memory,
+                              profile_seconds=time.perf_counter() -
+                              start_time))
+        return peak_memory
 
     def execute_model(
         self,
         scheduler_output: "SchedulerOutput",
-    ) -> Optional[ModelRunnerOutput]:
+    ) -> Optional[Union[ModelRunnerOutput, AsyncNPUModelRunnerOutput]]:
         intermediate_tensors = None
         if not get_pp_group().is_first_rank:
             intermediate_tensors = IntermediateTensors(
@@ -200,6 +254,8 @@ class NPUWorker(WorkerBase):
 
         output = self.model_runner.execute_model(scheduler_output,
                                                  intermediate_tensors)
+        if self.model_runner.eplb_updator is not None:
+            self.model_runner.eplb_updator.step()
         parallel_config = self.vllm_config.parallel_config
         if parallel_config.distributed_executor_backend != "external_launcher" \
             and not get_pp_group().is_last_rank:
@@ -220,7 +276,8 @@ class NPUWorker(WorkerBase):
             new_output.kv_connector_output = kv_connector_output
             return new_output
 
-        assert isinstance(output, ModelRunnerOutput)
+        assert isinstance(output,
+                          (ModelRunnerOutput, AsyncNPUModelRunnerOutput))
         return output
 
     def load_model(self) -> None:
@@ -237,6 +294,9 @@ class NPUWorker(WorkerBase):
             self.model_runner.load_model()
 
     def compile_or_warm_up_model(self) -> None:
+        # The graphs bake in the MoE communication method, so it is selected
+        # before they are captured.
+        self.model_runner.calibrate_moe_comm_method()
         # Note: need to adapt for graph mode.
         warmup_sizes = (self.vllm_config.compilation_config.compile_sizes
                         or []).copy()
@@ -302,6 +362,8 @@ class NPUWorker(WorkerBase):
 
     def execute_dummy_batch(self) -> None:
         self.model_runner._dummy_run(1)
+        if self.model_runner.eplb_updator is not None:
+            self.model_runner.eplb_updator.step()
 
     def _init_worker_distributed_environment(self) -> None:
         """Initialize the distributed environment."""